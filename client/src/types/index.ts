@@ -20,6 +20,7 @@ export interface INFTRental {
 
     pricePerHour: string;
     isFractional: boolean;
+    shareCount: number; // Number of shares of a fractional rental, 0 otherwise
     collateralToken: string;
     collateralAmount: string;
 
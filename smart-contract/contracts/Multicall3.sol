@@ -0,0 +1,46 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.24;
+
+/**
+ * @dev Minimal Multicall3 for local chains that have no deployment at the canonical
+ * address 0xcA11bde05977b3631167028862bE2a173976CA11 (anvil without forking, ape's test provider).
+ * `aggregate3` and `getBlockNumber` have the same ABI as the canonical contract, so off-chain
+ * readers work against either.
+ */
+contract Multicall3 {
+    // Structs
+    struct Call3 {
+        address target;
+        bool allowFailure;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    // Errors
+    error Multicall3__CallFailed(uint256 index);
+
+    /**
+     * @dev Executes every call and returns their results in order.
+     * @param _calls Target, calldata and whether the call may fail without reverting the batch.
+     */
+    function aggregate3(Call3[] calldata _calls) external payable returns (Result[] memory returnData) {
+        uint256 length = _calls.length;
+        returnData = new Result[](length);
+        for (uint256 i = 0; i < length; i++) {
+            Call3 calldata item = _calls[i];
+            (bool success, bytes memory data) = item.target.call(item.callData);
+            if (!success && !item.allowFailure) {
+                revert Multicall3__CallFailed(i);
+            }
+            returnData[i] = Result(success, data);
+        }
+    }
+
+    function getBlockNumber() external view returns (uint256) {
+        return block.number;
+    }
+}
@@ -2,43 +2,141 @@
 pragma solidity ^0.8.24;
 
 import {IERC20} from "@openzeppelin/contracts/token/ERC20/IERC20.sol";
+import {IERC20Permit} from "@openzeppelin/contracts/token/ERC20/extensions/IERC20Permit.sol";
 import {IERC721} from "@openzeppelin/contracts/token/ERC721/IERC721.sol";
+import {ECDSA} from "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
+import {EIP712} from "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
 
 // https://docs.soliditylang.org/en/latest/style-guide.html#order-of-layout
-contract NFTFlex {
+contract NFTFlex is EIP712 {
+    // Type declarations
+    enum RentalStatus {
+        Available, // Listed and not rented
+        Active, // Rented and the rental period has not ended yet
+        PendingWithdrawal, // Rental period ended, owner has not claimed the earnings through `withdrawEarnings` yet
+        Ended // Rental period ended and earnings claimed (or left on the ledger), renter has not called `endRental` yet
+    }
+
     // Structs
+    // Packed into 5 storage slots; fields sharing a slot are written together by the lifecycle functions.
     struct Rental {
-        address nftAddress;
+        address nftAddress; // slot 0
+        uint64 startTime; // slot 0
+        bool isFractional; // slot 0
+        bool pendingWithdrawal; // slot 0
+        uint16 shareCount; // slot 0, number of shares of a rental listed with `createFractionalRental` (0 otherwise)
+        address renter; // slot 1
+        uint64 endTime; // slot 1
+        uint32 creditEpoch; // slot 1, epoch of the owner's balance the earnings were credited in, see `Balance`
+        address owner; // slot 2
+        uint96 pricePerHour; // slot 2
+        address collateralToken; // slot 3
+        uint96 collateralAmount; // slot 3
+        uint256 tokenId; // slot 4
+    }
+
+    // Funds owed to an account in one payment token. `epoch` counts the account's `withdrawAll` calls, so the
+    // earnings a rental credited in an earlier epoch are known to be withdrawn with the rest of the balance.
+    struct Balance {
+        uint224 amount;
+        uint32 epoch;
+    }
+
+    // One word per rented share of a fractional rental
+    struct Share {
+        address renter;
+        uint64 endTime;
+    }
+
+    // Running state of `_releaseShares`: the bitmap word in use and the refund owed to the current renter
+    struct ShareRelease {
+        uint256 wordIndex;
+        uint256 word;
+        address renter;
+        uint256 refund;
+    }
+
+    struct RentalParams {
         uint256 tokenId;
+        uint256 pricePerHour;
+        bool isFractional;
+        address collateralToken;
+        uint256 collateralAmount;
+    }
+
+    // A listing signed off-chain by the NFT's owner (EIP-712), listed and rented at once by `fillListing`
+    struct ListingOrder {
         address owner;
-        address renter;
-        uint256 startTime;
-        uint256 endTime;
+        address nftAddress;
+        uint256 tokenId;
         uint256 pricePerHour;
         bool isFractional;
         address collateralToken;
         uint256 collateralAmount;
-        bool pendingWithdrawal;
+        uint256 nonce; // One fill per nonce; `cancelListingOrders` retires nonces
+        uint256 deadline; // Timestamp after which the order cannot be filled
     }
 
     // Variables
-    mapping(uint256 => Rental) public s_rentals;
+    bytes32 public constant LISTING_ORDER_TYPEHASH = keccak256(
+        "ListingOrder(address owner,address nftAddress,uint256 tokenId,uint256 pricePerHour,bool isFractional,"
+        "address collateralToken,uint256 collateralAmount,uint256 nonce,uint256 deadline)"
+    );
+
+    // Flag of `s_listings` entries: the listing was created by `fillListing` and cannot be rented again
+    uint256 private constant SPENT_ORDER_LISTING = 1 << 255;
+
+    mapping(uint256 => Rental) private s_packedRentals;
     uint256 private s_rentalCounter;
+    // Funds owed to an account, credited when a rental is paid (owner earnings) or a share or expired
+    // rental is released (renter collateral): account => payment token (0x0 for ETH) => balance
+    mapping(address => mapping(address => Balance)) private s_balances;
+    // Latest listing of each NFT: nftAddress => tokenId => rentalId + 1 (0 when never listed), with
+    // `SPENT_ORDER_LISTING` set once the listing of a filled order was rented
+    mapping(address => mapping(uint256 => uint256)) private s_listings;
+    // Fractional rentals: rentalId => word index => occupancy bits of shares 256 * index .. 256 * index + 255
+    mapping(uint256 => mapping(uint256 => uint256)) private s_shareBitmaps;
+    // Fractional rentals: rentalId => shareId => current renter and end time
+    mapping(uint256 => mapping(uint256 => Share)) private s_shares;
+    // Signed listing orders filled or cancelled: owner => nonce => used
+    mapping(address => mapping(uint256 => bool)) private s_usedOrderNonces;
 
     // Events
+    // Every event of a rental has `rentalId` as its first topic, so one rental's history is a single
+    // `eth_getLogs` filter; `NFTFlex__RentalCreated` also indexes the NFT, to find the rentals of a
+    // collection or token, and `NFTFlex__Listed` indexes the owner, to find the rentals an owner listed
     event NFTFlex__RentalCreated(
-        uint256 rentalId,
-        address indexed owner,
-        address nftAddress,
-        uint256 tokenId,
+        uint256 indexed rentalId,
+        address owner,
+        address indexed nftAddress,
+        uint256 indexed tokenId,
         uint256 pricePerHour,
-        bool isFractional
+        bool isFractional,
+        address collateralToken,
+        uint256 collateralAmount
     );
+    event NFTFlex__Listed(address indexed owner, uint256 indexed rentalId);
+    event NFTFlex__Delisted(uint256 indexed rentalId);
     event NFTFlex__RentalStarted(
-        uint256 rentalId, address indexed renter, uint256 startTime, uint256 endTime, uint256 collateralAmount
+        uint256 indexed rentalId, address indexed renter, uint256 startTime, uint256 endTime, uint256 collateralAmount
+    );
+    event NFTFlex__RentalEnded(uint256 indexed rentalId, address indexed renter);
+    event NFTFlex__EarningsWithdrawn(uint256 indexed rentalId, address indexed owner, uint256 amount);
+    event NFTFlex__BalanceWithdrawn(address indexed owner, address indexed token, uint256 amount);
+    event NFTFlex__SharesRented(
+        uint256 indexed rentalId,
+        address indexed renter,
+        uint256[] shareIds,
+        uint256 startTime,
+        uint256 endTime,
+        uint256 collateralAmount
     );
-    event NFTFlex__RentalEnded(uint256 rentalId, address indexed renter);
-    event NFTFlex__EarningsWithdrawn(uint256 rentalId, address indexed owner, uint256 amount);
+    event NFTFlex__SharesReleased(uint256 indexed rentalId, uint256[] shareIds);
+    // Collateral put on a renter's balance instead of being refunded (`settleExpired`, `releaseExpiredShares`)
+    event NFTFlex__CollateralCredited(uint256 indexed rentalId, address indexed renter, uint256 amount);
+    event NFTFlex__PriceUpdated(uint256 indexed rentalId, uint256 pricePerHour);
+    event NFTFlex__OrderFilled(uint256 indexed rentalId, address indexed owner, uint256 nonce);
+    event NFTFlex__OrdersCancelled(address indexed owner, uint256[] nonces);
 
     // Errors
     error NFTFlex__PriceMustBeGreaterThanZero();
@@ -55,18 +153,36 @@ contract NFTFlex {
     error NFTFlex__RentalStillActive();
     error NFTFlex__FailedTransferingETHToOwner();
     error NFTFlex__EarningTransferFailed();
-    error NFTFlex__OwnerNeedToWithdrawEarnings();
+    error NFTFlex__EmptyBatch();
+    error NFTFlex__AmountTooLarge();
+    error NFTFlex__DurationTooLong();
+    error NFTFlex__NothingToWithdraw();
+    error NFTFlex__NFTAlreadyListed();
+    error NFTFlex__RentalNotFractional();
+    error NFTFlex__RentalIsFractional();
+    error NFTFlex__InvalidShare();
+    error NFTFlex__InvalidShareCount();
+    error NFTFlex__LengthMismatch();
+    error NFTFlex__OnlyOwnerCanUpdatePrices();
+    error NFTFlex__PermitNeedsERC20Collateral();
+    error NFTFlex__OrderExpired();
+    error NFTFlex__OrderNonceUsed();
+    error NFTFlex__InvalidSignature();
+    error NFTFlex__ListingIsStale();
+    error NFTFlex__OnlyOwnerCanDelist();
 
     string a_new_var = "10";
 
+    constructor() EIP712("NFTFlex", "1") {}
+
     /**
      * @dev Allows the owner of an NFT to list it for rental.
      * @param _nftAddress Address of the NFT contract (ERC721 or ERC1155).
      * @param _tokenId ID of the NFT to rent.
-     * @param _pricePerHour Rental price per hour (in wei).
+     * @param _pricePerHour Rental price per hour (in wei), at most `type(uint96).max`.
      * @param _isFractional Whether fractional renting is allowed.
      * @param _collateralToken Token address for collateral (ERC20), or 0x0 for native ETH.
-     * @param _collateralAmount Amount of collateral required.
+     * @param _collateralAmount Amount of collateral required, at most `type(uint96).max`.
      */
     function createRental(
         address _nftAddress,
@@ -76,32 +192,143 @@ contract NFTFlex {
         address _collateralToken,
         uint256 _collateralAmount
     ) external {
-        if (IERC721(_nftAddress).ownerOf(_tokenId) != msg.sender) {
-            revert NFTFlex__SenderIsNotOwnerOfTheNFT();
+        uint256 rentalId = s_rentalCounter;
+        _createRental(
+            rentalId,
+            msg.sender,
+            _nftAddress,
+            RentalParams(_tokenId, _pricePerHour, _isFractional, _collateralToken, _collateralAmount)
+        );
+        s_rentalCounter = rentalId + 1;
+    }
+
+    /**
+     * @dev Lists many NFTs of one collection for rental in a single transaction.
+     * Rental IDs are assigned contiguously, in the order of `_rentals`.
+     * @param _nftAddress Address of the NFT contract (ERC721).
+     * @param _rentals Listing terms for each NFT, see `createRental`.
+     * @return firstRentalId ID of the first rental created.
+     * @return lastRentalId ID of the last rental created.
+     */
+    function createRentals(address _nftAddress, RentalParams[] calldata _rentals)
+        external
+        returns (uint256 firstRentalId, uint256 lastRentalId)
+    {
+        uint256 count = _rentals.length;
+        if (count == 0) {
+            revert NFTFlex__EmptyBatch();
         }
 
-        if (_pricePerHour == 0) {
-            revert NFTFlex__PriceMustBeGreaterThanZero();
+        firstRentalId = s_rentalCounter;
+        for (uint256 i = 0; i < count; i++) {
+            _createRental(firstRentalId + i, msg.sender, _nftAddress, _rentals[i]);
         }
 
-        uint256 rentalId = s_rentalCounter;
-        s_rentals[rentalId] = Rental({
-            nftAddress: _nftAddress,
-            tokenId: _tokenId,
-            owner: msg.sender,
-            renter: address(0),
-            startTime: 0,
-            endTime: 0,
-            pricePerHour: _pricePerHour,
-            isFractional: _isFractional,
-            collateralToken: _collateralToken,
-            collateralAmount: _collateralAmount,
-            pendingWithdrawal: false
-        });
+        // Write the counter once for the whole batch
+        lastRentalId = firstRentalId + count - 1;
+        s_rentalCounter = lastRentalId + 1;
+    }
+
+    /**
+     * @dev Lists an NFT for fractional rental: up to `_shareCount` renters can rent one or more shares at
+     * the same time, each paying `_pricePerHour` and `_collateralAmount` per share.
+     * `createRental(s)` only record `_isFractional` as a flag: those listings have no shares and are rented whole.
+     * @param _shareCount Number of shares, at most `type(uint16).max`.
+     * @return rentalId ID of the rental created.
+     */
+    function createFractionalRental(
+        address _nftAddress,
+        uint256 _tokenId,
+        uint256 _pricePerHour,
+        address _collateralToken,
+        uint256 _collateralAmount,
+        uint256 _shareCount
+    ) external returns (uint256 rentalId) {
+        if (_shareCount == 0 || _shareCount > type(uint16).max) {
+            revert NFTFlex__InvalidShareCount();
+        }
+
+        rentalId = s_rentalCounter;
+        _createRental(
+            rentalId,
+            msg.sender,
+            _nftAddress,
+            RentalParams(_tokenId, _pricePerHour, true, _collateralToken, _collateralAmount)
+        );
+        s_packedRentals[rentalId].shareCount = uint16(_shareCount);
+        s_rentalCounter = rentalId + 1;
+    }
+
+    /**
+     * @dev Withdraws one of the caller's listings so the NFT can be listed again, e.g. with other terms.
+     * A rented listing can only be withdrawn once its rental is ended (`endRental`, `settleExpired`). Shares of
+     * a fractional rental that are already rented run until they expire and are released as usual.
+     * @param _rentalId ID of the listing, which must be the latest listing of its NFT.
+     */
+    function delistRental(uint256 _rentalId) external {
+        Rental storage rental = s_packedRentals[_rentalId];
+        if (rental.owner == address(0)) {
+            revert NFTFlex__RentalDoesNotExist();
+        }
+        if (rental.owner != msg.sender) {
+            revert NFTFlex__OnlyOwnerCanDelist();
+        }
+        if (rental.renter != address(0)) {
+            revert NFTFlex__NFTAlreadyRented();
+        }
+        if (!_isListed(_rentalId, rental)) {
+            revert NFTFlex__ListingIsStale();
+        }
+
+        delete s_listings[rental.nftAddress][rental.tokenId];
+
+        emit NFTFlex__Delisted(_rentalId);
+    }
 
-        emit NFTFlex__RentalCreated(s_rentalCounter, msg.sender, _nftAddress, _tokenId, _pricePerHour, _isFractional);
+    /**
+     * @dev Changes the price per hour of many of the caller's listings in one transaction.
+     * A whole-NFT rental whose earnings are still pending keeps its price until the owner withdraws them or
+     * the renter ends it, since `withdrawEarnings` computes them from the price; it is skipped, not reverted,
+     * so a rental started after the batch was built does not fail the rest of it. Fractional rentals are
+     * always repriced: their shares are paid up front.
+     * @param _rentalIds IDs of the rentals to reprice, all listed by the caller.
+     * @param _pricesPerHour New price per hour (in wei) of each rental, at most `type(uint96).max`.
+     * @return updated Number of prices changed.
+     */
+    function updatePrices(uint256[] calldata _rentalIds, uint256[] calldata _pricesPerHour)
+        external
+        returns (uint256 updated)
+    {
+        uint256 count = _rentalIds.length;
+        if (count == 0) {
+            revert NFTFlex__EmptyBatch();
+        }
+        if (count != _pricesPerHour.length) {
+            revert NFTFlex__LengthMismatch();
+        }
+
+        for (uint256 i = 0; i < count; i++) {
+            uint256 price = _pricesPerHour[i];
+            if (price == 0) {
+                revert NFTFlex__PriceMustBeGreaterThanZero();
+            }
+            if (price > type(uint96).max) {
+                revert NFTFlex__AmountTooLarge();
+            }
+
+            Rental storage rental = s_packedRentals[_rentalIds[i]];
+            if (rental.owner != msg.sender) {
+                revert NFTFlex__OnlyOwnerCanUpdatePrices();
+            }
+            if (_isPending(rental)) {
+                continue;
+            }
+
+            rental.pricePerHour = uint96(price);
+            updated++;
 
-        s_rentalCounter++;
+            emit NFTFlex__PriceUpdated(_rentalIds[i], price);
+        }
     }
 
     /**
@@ -110,7 +337,107 @@ contract NFTFlex {
      * @param _duration Number of hours to rent the NFT.
      */
     function rentNFT(uint256 _rentalId, uint256 _duration) external payable {
-        Rental storage rental = s_rentals[_rentalId];
+        _rentNFT(_rentalId, _duration);
+    }
+
+    /**
+     * @dev Rents an NFT paid in an EIP-2612 token, approving the payment with the renter's signed permit
+     * instead of a separate `approve` transaction.
+     * @param _rentalId ID of the rental to rent; its collateral token must support `permit`.
+     * @param _duration Number of hours to rent the NFT.
+     * @param _deadline Timestamp after which the permit expires.
+     * @param _v Signature of the permit for `pricePerHour * _duration + collateralAmount`, spender this contract.
+     * @param _r See `_v`.
+     * @param _s See `_v`.
+     */
+    function rentNFTWithPermit(
+        uint256 _rentalId,
+        uint256 _duration,
+        uint256 _deadline,
+        uint8 _v,
+        bytes32 _r,
+        bytes32 _s
+    ) external {
+        Rental storage rental = s_packedRentals[_rentalId];
+        if (rental.owner == address(0)) {
+            revert NFTFlex__RentalDoesNotExist();
+        }
+        address token = rental.collateralToken;
+        if (token == address(0)) {
+            revert NFTFlex__PermitNeedsERC20Collateral();
+        }
+
+        uint256 amount = uint256(rental.pricePerHour) * _duration + rental.collateralAmount;
+        // Anyone can submit a permit seen in the mempool first. The allowance is then already there,
+        // so a failed permit is not fatal: `transferFrom` in `_rentNFT` fails if it really is missing.
+        try IERC20Permit(token).permit(msg.sender, address(this), amount, _deadline, _v, _r, _s) {} catch {}
+
+        _rentNFT(_rentalId, _duration);
+    }
+
+    /**
+     * @dev Lists an NFT from its owner's signed order and rents it to the caller, in one transaction.
+     * The owner pays nothing for the listing; the caller pays price and collateral as with `rentNFT`.
+     * Each order fills once, and its listing is single use: once the rental ends the NFT is no longer listed,
+     * and the owner can sign a new order for it or list it with `createRental`.
+     * Orders for fractional rentals cannot be filled: list those with a transaction.
+     * @param _order The listing order, see `hashListingOrder`.
+     * @param _signature The owner's EIP-712 signature of the order.
+     * @param _duration Number of hours to rent the NFT.
+     * @return rentalId ID of the rental created.
+     */
+    function fillListing(ListingOrder calldata _order, bytes calldata _signature, uint256 _duration)
+        external
+        payable
+        returns (uint256 rentalId)
+    {
+        if (_order.deadline < block.timestamp) {
+            revert NFTFlex__OrderExpired();
+        }
+        if (_order.isFractional) {
+            revert NFTFlex__RentalIsFractional();
+        }
+        if (s_usedOrderNonces[_order.owner][_order.nonce]) {
+            revert NFTFlex__OrderNonceUsed();
+        }
+        (address signer, ECDSA.RecoverError error,) = ECDSA.tryRecover(hashListingOrder(_order), _signature);
+        if (error != ECDSA.RecoverError.NoError || signer != _order.owner) {
+            revert NFTFlex__InvalidSignature();
+        }
+        s_usedOrderNonces[_order.owner][_order.nonce] = true;
+
+        rentalId = s_rentalCounter;
+        _createRental(
+            rentalId,
+            _order.owner,
+            _order.nftAddress,
+            RentalParams(_order.tokenId, _order.pricePerHour, false, _order.collateralToken, _order.collateralAmount)
+        );
+        s_rentalCounter = rentalId + 1;
+        _rentNFT(rentalId, _duration);
+        // Spends the listing; the slot was just written, so setting the flag is cheap
+        s_listings[_order.nftAddress][_order.tokenId] |= SPENT_ORDER_LISTING;
+
+        emit NFTFlex__OrderFilled(rentalId, _order.owner, _order.nonce);
+    }
+
+    /**
+     * @dev Retires the caller's signed listing orders with these nonces, so they can no longer be filled.
+     * @param _nonces Nonces of the orders to cancel.
+     */
+    function cancelListingOrders(uint256[] calldata _nonces) external {
+        if (_nonces.length == 0) {
+            revert NFTFlex__EmptyBatch();
+        }
+        for (uint256 i = 0; i < _nonces.length; i++) {
+            s_usedOrderNonces[msg.sender][_nonces[i]] = true;
+        }
+
+        emit NFTFlex__OrdersCancelled(msg.sender, _nonces);
+    }
+
+    function _rentNFT(uint256 _rentalId, uint256 _duration) internal {
+        Rental storage rental = s_packedRentals[_rentalId];
 
         if (rental.owner == address(0)) {
             revert NFTFlex__RentalDoesNotExist(); // ✅ Fixes rental existence check
@@ -118,47 +445,88 @@ contract NFTFlex {
         if (rental.renter != address(0)) {
             revert NFTFlex__NFTAlreadyRented(); // ✅ Fixes already rented check
         }
-        if (_duration == 0) {
-            revert NFTFlex__DurationMustBeGreaterThanZero(); // ✅ Fixes invalid duration check
+        if (rental.shareCount != 0) {
+            revert NFTFlex__RentalIsFractional(); // Fractional rentals are rented share by share with `rentShares`
         }
+        _requireCurrentListing(_rentalId, rental);
 
+        uint256 endTime = _endTime(_duration);
         uint256 collateral = rental.collateralAmount;
-        uint256 totalPrice = rental.pricePerHour * _duration;
+        uint256 totalPrice = uint256(rental.pricePerHour) * _duration;
+        _collectPayment(rental.collateralToken, totalPrice + collateral);
 
-        if (rental.collateralToken == address(0)) {
-            // If the collateral token is the native currency (e.g., ETH), check if the sender sent the correct amount.
-            if (msg.value != totalPrice + collateral) {
-                revert NFTFlex__IncorrectPaymentAmount(); // Revert if the sent ETH amount is incorrect.
-            }
-        } else {
-            // If a different ERC-20 token is used as collateral
-            IERC20 collateralToken = IERC20(rental.collateralToken);
-
-            // Attempt to transfer the required total price + collateral from the sender to the contract
-            bool success = collateralToken.transferFrom(msg.sender, address(this), totalPrice + collateral);
-
-            // If the transfer fails, revert the transaction
-            if (!success) {
-                revert NFTFlex__CollateralTransferFailed();
-            }
-        }
+        // Credit the owner's earnings right away so they can be withdrawn together with other rentals
+        Balance storage ownerBalance = s_balances[rental.owner][rental.collateralToken];
+        ownerBalance.amount += uint224(totalPrice);
 
         // Assign renter and start rental
         rental.renter = msg.sender;
-        rental.startTime = block.timestamp;
-        rental.endTime = block.timestamp + (_duration * 1 hours); // Permanent hours
+        rental.endTime = uint64(endTime);
+        rental.creditEpoch = ownerBalance.epoch;
+        rental.startTime = uint64(block.timestamp);
         rental.pendingWithdrawal = true;
 
-        emit NFTFlex__RentalStarted(_rentalId, msg.sender, rental.startTime, rental.endTime, collateral);
+        emit NFTFlex__RentalStarted(_rentalId, msg.sender, block.timestamp, endTime, collateral);
+    }
+
+    /**
+     * @dev Rents shares of a fractional rental, paying the price and collateral of each share.
+     * Gas grows with the number of shares rented, not with the share count of the rental.
+     * @param _rentalId ID of the fractional rental.
+     * @param _shareIds Shares to rent, each below the rental's `shareCount` and not rented.
+     * @param _duration Number of hours to rent the shares.
+     */
+    function rentShares(uint256 _rentalId, uint256[] calldata _shareIds, uint256 _duration) external payable {
+        Rental storage rental = s_packedRentals[_rentalId];
+        if (rental.owner == address(0)) {
+            revert NFTFlex__RentalDoesNotExist();
+        }
+        if (rental.shareCount == 0) {
+            revert NFTFlex__RentalNotFractional();
+        }
+        if (_shareIds.length == 0) {
+            revert NFTFlex__EmptyBatch();
+        }
+        _requireCurrentListing(_rentalId, rental);
+
+        uint256 endTime = _endTime(_duration);
+        _occupyShares(_rentalId, _shareIds, rental.shareCount, uint64(endTime));
+
+        uint256 collateral = uint256(rental.collateralAmount) * _shareIds.length;
+        uint256 totalPrice = uint256(rental.pricePerHour) * _duration * _shareIds.length;
+        _collectPayment(rental.collateralToken, totalPrice + collateral);
+        s_balances[rental.owner][rental.collateralToken].amount += uint224(totalPrice);
+
+        emit NFTFlex__SharesRented(_rentalId, msg.sender, _shareIds, block.timestamp, endTime, collateral);
+    }
+
+    /**
+     * @dev Frees expired shares of a fractional rental so they can be rented again. Anyone can call it.
+     * The collateral of each share is credited to its renter's balance, see `withdrawAll`.
+     * Shares that are not rented are skipped.
+     * @param _rentalId ID of the fractional rental.
+     * @param _shareIds Shares to release; their rental period must have ended.
+     */
+    function releaseExpiredShares(uint256 _rentalId, uint256[] calldata _shareIds) external {
+        Rental storage rental = s_packedRentals[_rentalId];
+        if (rental.shareCount == 0) {
+            revert NFTFlex__RentalNotFractional();
+        }
+
+        uint256[] memory released =
+            _releaseShares(_rentalId, _shareIds, rental.collateralToken, rental.collateralAmount);
+
+        emit NFTFlex__SharesReleased(_rentalId, released);
     }
 
     /**
      * @dev Allows ther renter to end the rental and return tyhe NFT.
-     * Collateral is refunded if all conditions are met.
+     * Collateral is refunded if all conditions are met. The owner's earnings are already
+     * on the ledger, so this does not wait for the owner to withdraw them.
      * @param _rentalId ID of rental to end.
      */
     function endRental(uint256 _rentalId) external {
-        Rental storage rental = s_rentals[_rentalId];
+        Rental storage rental = s_packedRentals[_rentalId];
 
         if (msg.sender != rental.renter) {
             revert NFTFlex__OnlyRenterCanEndRental();
@@ -169,15 +537,11 @@ contract NFTFlex {
             revert NFTFlex__RentalPeriodNotEnded();
         }
 
-        if (rental.pendingWithdrawal) {
-            // ✅ Fix pending withdrawal check
-            revert NFTFlex__OwnerNeedToWithdrawEarnings();
-        }
-
-        // Reset rental state
+        // Reset rental state; unclaimed earnings stay on the owner's ledger balance
         rental.renter = address(0);
-        rental.startTime = 0;
         rental.endTime = 0;
+        rental.startTime = 0;
+        rental.pendingWithdrawal = false;
 
         // Refund collateral
         uint256 collateral = rental.collateralAmount;
@@ -198,23 +562,57 @@ contract NFTFlex {
         emit NFTFlex__RentalEnded(_rentalId, msg.sender);
     }
 
+    /**
+     * @dev Ends many expired rentals in one transaction. Anyone can call it, e.g. a keeper.
+     * The collateral of each rental is credited to its renter's balance instead of being sent, so one
+     * renter that cannot receive ETH does not block the batch; see `withdrawAll`. The owners' earnings
+     * are already on their balances since `rentNFT`.
+     * Rentals that are not rented or not expired yet are skipped.
+     * @param _rentalIds IDs of the rentals to settle.
+     * @return settled Number of rentals ended.
+     */
+    function settleExpired(uint256[] calldata _rentalIds) external returns (uint256 settled) {
+        if (_rentalIds.length == 0) {
+            revert NFTFlex__EmptyBatch();
+        }
+
+        for (uint256 i = 0; i < _rentalIds.length; i++) {
+            Rental storage rental = s_packedRentals[_rentalIds[i]];
+            address renter = rental.renter;
+            if (renter == address(0) || block.timestamp < rental.endTime) {
+                continue;
+            }
+
+            rental.renter = address(0);
+            rental.endTime = 0;
+            rental.startTime = 0;
+            rental.pendingWithdrawal = false;
+            _creditCollateral(_rentalIds[i], renter, rental.collateralToken, rental.collateralAmount);
+            settled++;
+
+            emit NFTFlex__RentalEnded(_rentalIds[i], renter);
+        }
+    }
+
     /**
      * @dev Allows the owner to withdraw earnings from the rental.
      * @param _rentalId ID of the rental to withdraw earnings for.
      *
      * @dev Allows the owner of an NFT rental to withdraw earnings after the rental period has ended.
-     * The earnings are calculated based on the rental duration and price per hour.
+     * The earnings are calculated based on the rental duration and price per hour, and debited from
+     * the owner's ledger balance. Use `withdrawAll` to collect the earnings of many rentals at once.
      *
      * Requirements:
      * - Only the owner of the NFT rental can withdraw earnings.
      * - The rental must have been completed (i.e., there must be a renter, and the rental period should have ended).
+     * - The earnings of this rental must not have been claimed yet.
      * - Transfers earnings in either native ETH or ERC-20 tokens based on the collateral type.
      *
      * @param _rentalId ID of the rental for which earnings need to be withdrawn.
      */
     function withdrawEarnings(uint256 _rentalId) external {
         // Fetch the rental details from storage
-        Rental storage rental = s_rentals[_rentalId];
+        Rental storage rental = s_packedRentals[_rentalId];
 
         // Ensure that only the owner of the NFT can withdraw earnings
         if (msg.sender != rental.owner) {
@@ -227,38 +625,505 @@ contract NFTFlex {
         }
 
         // Calculate total earnings: price per hour * number of hours rented
-        uint256 totalEarnings = rental.pricePerHour * ((rental.endTime - rental.startTime) / 1 hours); // Permanent hours
+        uint256 totalEarnings = uint256(rental.pricePerHour) * ((rental.endTime - rental.startTime) / 1 hours); // Permanent hours
 
-        // Ensure there are earnings to withdraw
-        if (totalEarnings == 0) {
+        // Ensure the earnings were not claimed already, here or through a `withdrawAll` since they were credited
+        address token = rental.collateralToken;
+        Balance storage balance = s_balances[msg.sender][token];
+        if (
+            !rental.pendingWithdrawal || rental.creditEpoch != balance.epoch || totalEarnings == 0
+                || balance.amount < totalEarnings
+        ) {
             revert NFTFlex__EarningTransferFailed();
         }
 
-        // Handle payment transfer logic based on the collateral type (ETH or ERC-20)
-        if (rental.collateralToken == address(0)) {
+        // Update state before paying out
+        balance.amount -= uint224(totalEarnings);
+        rental.pendingWithdrawal = false; // Reset the flag
+
+        _payOut(token, msg.sender, totalEarnings);
+
+        emit NFTFlex__EarningsWithdrawn(_rentalId, msg.sender, totalEarnings);
+    }
+
+    /**
+     * @dev Withdraws everything credited to the caller in one payment token: the earnings of every rental and
+     * the collateral of released shares and settled rentals. The earnings of the rentals credited so far are no
+     * longer pending afterwards.
+     * @param _token Payment token to withdraw, or 0x0 for native ETH.
+     */
+    function withdrawAll(address _token) external {
+        Balance storage balance = s_balances[msg.sender][_token];
+        uint256 amount = balance.amount;
+        if (amount == 0) {
+            revert NFTFlex__NothingToWithdraw();
+        }
+
+        // Starting a new epoch settles the pending earnings of every rental credited in this one
+        balance.amount = 0;
+        unchecked {
+            balance.epoch++;
+        }
+        _payOut(_token, msg.sender, amount);
+
+        emit NFTFlex__BalanceWithdrawn(msg.sender, _token, amount);
+    }
+
+    /**
+     * @dev Returns the funds credited to `_owner` in `_token` (0x0 for native ETH) and not withdrawn yet.
+     */
+    function getBalance(address _owner, address _token) external view returns (uint256) {
+        return s_balances[_owner][_token].amount;
+    }
+
+    /**
+     * @dev Returns the ID of the latest listing of an NFT.
+     * @param _nftAddress Address of the NFT contract.
+     * @param _tokenId ID of the NFT.
+     */
+    function getRentalId(address _nftAddress, uint256 _tokenId) external view returns (uint256) {
+        uint256 listing = s_listings[_nftAddress][_tokenId];
+        if (listing == 0) {
+            revert NFTFlex__RentalDoesNotExist();
+        }
+        return (listing & ~SPENT_ORDER_LISTING) - 1;
+    }
+
+    /**
+     * @dev ERC-4907 style: returns the renter of an NFT, or 0x0 if it is not rented or the rental expired.
+     * @param _nftAddress Address of the NFT contract.
+     * @param _tokenId ID of the NFT.
+     */
+    function userOf(address _nftAddress, uint256 _tokenId) external view returns (address) {
+        Rental storage rental = _listingOf(_nftAddress, _tokenId);
+        // `renter` and `endTime` share a storage slot
+        if (block.timestamp >= rental.endTime) {
+            return address(0);
+        }
+        return rental.renter;
+    }
+
+    /**
+     * @dev ERC-4907 style: returns the end time of the current rental of an NFT, or 0 if it is not rented.
+     * @param _nftAddress Address of the NFT contract.
+     * @param _tokenId ID of the NFT.
+     */
+    function userExpires(address _nftAddress, uint256 _tokenId) external view returns (uint256) {
+        return _listingOf(_nftAddress, _tokenId).endTime;
+    }
+
+    /**
+     * @dev Returns the renter and end time of a share of a fractional rental (0x0 and 0 if it is free).
+     */
+    function getShare(uint256 _rentalId, uint256 _shareId) external view returns (address renter, uint256 endTime) {
+        Share storage share = s_shares[_rentalId][_shareId];
+        return (share.renter, share.endTime);
+    }
+
+    /**
+     * @dev Returns the occupancy bits of shares `256 * _wordIndex` to `256 * _wordIndex + 255` of a fractional
+     * rental; bit `i` is set while share `256 * _wordIndex + i` is rented and not released.
+     */
+    function getShareBitmap(uint256 _rentalId, uint256 _wordIndex) external view returns (uint256) {
+        return s_shareBitmaps[_rentalId][_wordIndex];
+    }
+
+    /**
+     * @dev Returns the EIP-712 digest the owner signs for a listing order.
+     */
+    function hashListingOrder(ListingOrder calldata _order) public view returns (bytes32) {
+        return _hashTypedDataV4(keccak256(abi.encode(LISTING_ORDER_TYPEHASH, _order)));
+    }
+
+    function isOrderNonceUsed(address _owner, uint256 _nonce) external view returns (bool) {
+        return s_usedOrderNonces[_owner][_nonce];
+    }
+
+    // Neet to test
+    // Add this function to your contract
+    function getRentalCounter() external view returns (uint256) {
+        return s_rentalCounter;
+    }
+
+    /**
+     * @dev Compatibility view for the packed storage layout.
+     * Returns the same tuple, with the same field order and widths, as the former
+     * public `s_rentals` mapping getter.
+     * @param _rentalId ID of the rental.
+     */
+    function s_rentals(uint256 _rentalId)
+        external
+        view
+        returns (
+            address nftAddress,
+            uint256 tokenId,
+            address owner,
+            address renter,
+            uint256 startTime,
+            uint256 endTime,
+            uint256 pricePerHour,
+            bool isFractional,
+            address collateralToken,
+            uint256 collateralAmount,
+            bool pendingWithdrawal
+        )
+    {
+        Rental storage rental = s_packedRentals[_rentalId];
+        nftAddress = rental.nftAddress;
+        tokenId = rental.tokenId;
+        owner = rental.owner;
+        renter = rental.renter;
+        startTime = rental.startTime;
+        endTime = rental.endTime;
+        pricePerHour = rental.pricePerHour;
+        isFractional = rental.isFractional;
+        collateralToken = rental.collateralToken;
+        collateralAmount = rental.collateralAmount;
+        pendingWithdrawal = _isPending(rental);
+    }
+
+    /**
+     * @dev Returns a page of rentals so that clients do not need one `s_rentals` call per rental.
+     * @param _offset ID of the first rental of the page.
+     * @param _limit Maximum number of rentals to return.
+     * @return rentals Rentals `_offset` up to `_offset + _limit - 1`, fewer at the end of the list.
+     */
+    function getRentals(uint256 _offset, uint256 _limit) external view returns (Rental[] memory rentals) {
+        uint256 counter = s_rentalCounter;
+        if (_offset >= counter) {
+            return new Rental[](0);
+        }
+
+        uint256 count = counter - _offset;
+        if (_limit < count) {
+            count = _limit;
+        }
+
+        rentals = new Rental[](count);
+        for (uint256 i = 0; i < count; i++) {
+            rentals[i] = s_packedRentals[_offset + i];
+            rentals[i].pendingWithdrawal = _isPending(s_packedRentals[_offset + i]);
+        }
+    }
+
+    /**
+     * @dev Returns up to `_limit` rentals in the given status, scanning forward from `_cursor`.
+     * Only the latest listing of an NFT is `Available`: delisted, replaced and spent order listings match no
+     * status.
+     * @param _status Status to filter on.
+     * @param _cursor Rental ID to start scanning from (0 for the first page).
+     * @param _limit Maximum number of rentals to return.
+     * @return rentalIds IDs of the matching rentals.
+     * @return rentals The matching rentals.
+     * @return nextCursor Cursor for the next page, equal to `getRentalCounter()` once the scan is complete.
+     */
+    function getRentalsByStatus(RentalStatus _status, uint256 _cursor, uint256 _limit)
+        external
+        view
+        returns (uint256[] memory rentalIds, Rental[] memory rentals, uint256 nextCursor)
+    {
+        uint256 counter = s_rentalCounter;
+        if (_cursor >= counter) {
+            return (new uint256[](0), new Rental[](0), counter);
+        }
+
+        // Never allocate more than the rentals left to scan, whatever `_limit` is
+        uint256 size = counter - _cursor;
+        if (_limit < size) {
+            size = _limit;
+        }
+        rentalIds = new uint256[](size);
+        rentals = new Rental[](size);
+
+        uint256 found = 0;
+        nextCursor = _cursor;
+        while (nextCursor < counter && found < _limit) {
+            Rental storage rental = s_packedRentals[nextCursor];
+            RentalStatus status = _statusOf(rental);
+            if (status == _status && (status != RentalStatus.Available || _isListed(nextCursor, rental))) {
+                rentalIds[found] = nextCursor;
+                rentals[found] = rental;
+                rentals[found].pendingWithdrawal = _isPending(rental);
+                found++;
+            }
+            nextCursor++;
+        }
+
+        // Shrink the result arrays to the number of matches
+        assembly {
+            mstore(rentalIds, found)
+            mstore(rentals, found)
+        }
+    }
+
+    /**
+     * @dev Returns the end of a rental of `_duration` hours starting now.
+     */
+    function _endTime(uint256 _duration) internal view returns (uint256 endTime) {
+        if (_duration == 0) {
+            revert NFTFlex__DurationMustBeGreaterThanZero(); // ✅ Fixes invalid duration check
+        }
+
+        endTime = block.timestamp + (_duration * 1 hours); // Permanent hours
+        if (endTime > type(uint64).max) {
+            revert NFTFlex__DurationTooLong();
+        }
+    }
+
+    /**
+     * @dev Takes `_amount` of `_token` from the caller: `msg.value` must match for ETH (0x0), ERC-20 tokens
+     * are pulled with `transferFrom`.
+     */
+    function _collectPayment(address _token, uint256 _amount) internal {
+        if (_token == address(0)) {
+            // If the collateral token is the native currency (e.g., ETH), check if the sender sent the correct amount.
+            if (msg.value != _amount) {
+                revert NFTFlex__IncorrectPaymentAmount(); // Revert if the sent ETH amount is incorrect.
+            }
+        } else {
+            // Attempt to transfer the required total price + collateral from the sender to the contract
+            bool success = IERC20(_token).transferFrom(msg.sender, address(this), _amount);
+
+            // If the transfer fails, revert the transaction
+            if (!success) {
+                revert NFTFlex__CollateralTransferFailed();
+            }
+        }
+    }
+
+    /**
+     * @dev Marks shares as rented by the caller until `_endTime`.
+     * Consecutive shares in the same 256-share word share one bitmap read and write.
+     */
+    function _occupyShares(uint256 _rentalId, uint256[] calldata _shareIds, uint256 _shareCount, uint64 _endTime)
+        internal
+    {
+        mapping(uint256 => uint256) storage bitmaps = s_shareBitmaps[_rentalId];
+        uint256 wordIndex = _shareIds[0] >> 8;
+        uint256 word = bitmaps[wordIndex];
+
+        for (uint256 i = 0; i < _shareIds.length; i++) {
+            uint256 shareId = _shareIds[i];
+            if (shareId >= _shareCount) {
+                revert NFTFlex__InvalidShare();
+            }
+            if (shareId >> 8 != wordIndex) {
+                bitmaps[wordIndex] = word;
+                wordIndex = shareId >> 8;
+                word = bitmaps[wordIndex];
+            }
+
+            uint256 bit = 1 << (shareId & 0xff);
+            if (word & bit != 0) {
+                revert NFTFlex__NFTAlreadyRented();
+            }
+            word |= bit;
+            s_shares[_rentalId][shareId] = Share(msg.sender, _endTime);
+        }
+        bitmaps[wordIndex] = word;
+    }
+
+    /**
+     * @dev Frees the expired shares among `_shareIds` and credits their collateral to the renters.
+     * Consecutive shares of the same renter are credited with one balance write.
+     * The bitmap word and the pending refund live in one memory struct (`ShareRelease`), so the loop stays within
+     * the 16 reachable stack slots without via-IR.
+     * @return released IDs of the shares freed.
+     */
+    function _releaseShares(uint256 _rentalId, uint256[] calldata _shareIds, address _token, uint256 _collateral)
+        internal
+        returns (uint256[] memory released)
+    {
+        released = new uint256[](_shareIds.length);
+        uint256 releasedCount;
+        mapping(uint256 => uint256) storage bitmaps = s_shareBitmaps[_rentalId];
+        ShareRelease memory state = ShareRelease(type(uint256).max, 0, address(0), 0);
+
+        for (uint256 i = 0; i < _shareIds.length; i++) {
+            uint256 shareId = _shareIds[i];
+            if (shareId >> 8 != state.wordIndex) {
+                if (state.wordIndex != type(uint256).max) {
+                    bitmaps[state.wordIndex] = state.word;
+                }
+                state.wordIndex = shareId >> 8;
+                state.word = bitmaps[state.wordIndex];
+            }
+
+            uint256 bit = 1 << (shareId & 0xff);
+            if (state.word & bit == 0) {
+                continue;
+            }
+
+            Share memory share = s_shares[_rentalId][shareId];
+            if (block.timestamp < share.endTime) {
+                revert NFTFlex__RentalPeriodNotEnded();
+            }
+            if (share.renter != state.renter) {
+                if (state.refund != 0) {
+                    _creditCollateral(_rentalId, state.renter, _token, state.refund);
+                }
+                state.renter = share.renter;
+                state.refund = 0;
+            }
+
+            state.word &= ~bit;
+            delete s_shares[_rentalId][shareId];
+            state.refund += _collateral;
+            released[releasedCount++] = shareId;
+        }
+
+        if (state.wordIndex != type(uint256).max) {
+            bitmaps[state.wordIndex] = state.word;
+        }
+        if (state.refund != 0) {
+            _creditCollateral(_rentalId, state.renter, _token, state.refund);
+        }
+
+        // Shrink the result array to the shares actually freed
+        assembly {
+            mstore(released, releasedCount)
+        }
+    }
+
+    function _creditCollateral(uint256 _rentalId, address _renter, address _token, uint256 _amount) internal {
+        s_balances[_renter][_token].amount += uint224(_amount);
+
+        emit NFTFlex__CollateralCredited(_rentalId, _renter, _amount);
+    }
+
+    /**
+     * @dev Sends `_amount` of `_token` (or ETH for 0x0) to an account.
+     */
+    function _payOut(address _token, address _to, uint256 _amount) internal {
+        if (_token == address(0)) {
             // Transfer earnings in ETH to the NFT owner
-            (bool success,) = rental.owner.call{value: totalEarnings}("");
+            (bool success,) = _to.call{value: _amount}("");
             if (!success) {
                 revert NFTFlex__FailedTransferingETHToOwner();
             }
         } else {
             // Transfer earnings in ERC-20 token
-            IERC20 collateralToken = IERC20(rental.collateralToken);
-            if (!collateralToken.transfer(rental.owner, totalEarnings)) {
+            if (!IERC20(_token).transfer(_to, _amount)) {
                 revert NFTFlex__EarningTransferFailed();
             }
         }
+    }
 
-        // Reset rental earnings and pendingWithdrawal flag
-        rental.pricePerHour = 0;
-        rental.pendingWithdrawal = false; // Reset the flag
+    /**
+     * @dev Validates and stores a new rental of `_owner` under `_rentalId`.
+     * Callers are responsible for advancing `s_rentalCounter`.
+     * The terms come as one struct so the function stays within the 16 reachable stack slots with the
+     * 8-argument `NFTFlex__RentalCreated` emit.
+     */
+    function _createRental(uint256 _rentalId, address _owner, address _nftAddress, RentalParams memory _params)
+        internal
+    {
+        if (IERC721(_nftAddress).ownerOf(_params.tokenId) != _owner) {
+            revert NFTFlex__SenderIsNotOwnerOfTheNFT();
+        }
 
-        emit NFTFlex__EarningsWithdrawn(_rentalId, msg.sender, totalEarnings);
+        if (_params.pricePerHour == 0) {
+            revert NFTFlex__PriceMustBeGreaterThanZero();
+        }
+
+        if (_params.pricePerHour > type(uint96).max || _params.collateralAmount > type(uint96).max) {
+            revert NFTFlex__AmountTooLarge();
+        }
+
+        // A token can only have one listing per owner until it is delisted (`delistRental`) or, for the
+        // single-use listing of a filled order, rented; once it changes hands the new owner can list it
+        // again. Either way the rental of the previous listing must be ended first (`endRental`,
+        // `settleExpired`): `userOf` and `userExpires` only read the latest listing
+        {
+            uint256 listing = s_listings[_nftAddress][_params.tokenId];
+            if (listing != 0) {
+                Rental storage previous = s_packedRentals[(listing & ~SPENT_ORDER_LISTING) - 1];
+                if (previous.owner == _owner && (listing & SPENT_ORDER_LISTING) == 0) {
+                    revert NFTFlex__NFTAlreadyListed();
+                }
+                if (previous.renter != address(0)) {
+                    revert NFTFlex__NFTAlreadyRented();
+                }
+            }
+        }
+        s_listings[_nftAddress][_params.tokenId] = _rentalId + 1;
+
+        s_packedRentals[_rentalId] = Rental({
+            nftAddress: _nftAddress,
+            startTime: 0,
+            isFractional: _params.isFractional,
+            pendingWithdrawal: false,
+            shareCount: 0,
+            renter: address(0),
+            endTime: 0,
+            creditEpoch: 0,
+            owner: _owner,
+            pricePerHour: uint96(_params.pricePerHour),
+            collateralToken: _params.collateralToken,
+            collateralAmount: uint96(_params.collateralAmount),
+            tokenId: _params.tokenId
+        });
+
+        emit NFTFlex__RentalCreated(
+            _rentalId,
+            _owner,
+            _nftAddress,
+            _params.tokenId,
+            _params.pricePerHour,
+            _params.isFractional,
+            _params.collateralToken,
+            _params.collateralAmount
+        );
+        emit NFTFlex__Listed(_owner, _rentalId);
     }
 
-    // Neet to test
-    // Add this function to your contract
-    function getRentalCounter() external view returns (uint256) {
-        return s_rentalCounter;
+    /**
+     * @dev Reverts unless `_rental` is the latest listing of its NFT and its lister still owns the NFT, so a
+     * listing left behind when the NFT changed hands cannot be rented.
+     */
+    function _requireCurrentListing(uint256 _rentalId, Rental storage _rental) internal view {
+        if (!_isListed(_rentalId, _rental) || IERC721(_rental.nftAddress).ownerOf(_rental.tokenId) != _rental.owner) {
+            revert NFTFlex__ListingIsStale();
+        }
+    }
+
+    /**
+     * @dev Whether `_rental` is the latest listing of its NFT and can be rented, i.e. it was neither delisted
+     * nor replaced, nor is it the spent listing of a filled order (its `SPENT_ORDER_LISTING` flag fails the match).
+     */
+    function _isListed(uint256 _rentalId, Rental storage _rental) internal view returns (bool) {
+        return s_listings[_rental.nftAddress][_rental.tokenId] == _rentalId + 1;
+    }
+
+    /**
+     * @dev Returns the latest listing of an NFT; an empty rental if it was never listed.
+     */
+    function _listingOf(address _nftAddress, uint256 _tokenId) internal view returns (Rental storage) {
+        uint256 listing = s_listings[_nftAddress][_tokenId];
+        if (listing == 0) {
+            // Never written, so every field reads as zero
+            return s_packedRentals[type(uint256).max];
+        }
+        return s_packedRentals[(listing & ~SPENT_ORDER_LISTING) - 1];
+    }
+
+    function _statusOf(Rental storage _rental) internal view returns (RentalStatus) {
+        if (_rental.renter == address(0)) {
+            return RentalStatus.Available;
+        }
+        if (block.timestamp < _rental.endTime) {
+            return RentalStatus.Active;
+        }
+        if (_isPending(_rental)) {
+            return RentalStatus.PendingWithdrawal;
+        }
+        return RentalStatus.Ended;
+    }
+
+    // The earnings of a rental are pending until `withdrawEarnings` claims them or a `withdrawAll` of the
+    // owner's balance in the rental's payment token withdraws them with the rest
+    function _isPending(Rental storage _rental) internal view returns (bool) {
+        return _rental.pendingWithdrawal
+            && _rental.creditEpoch == s_balances[_rental.owner][_rental.collateralToken].epoch;
     }
 }
@@ -15,6 +15,16 @@ contract SimpleNFT is ERC721 {
     // Mapping from token ID to metadata URL
     mapping(uint256 => string) private _tokenMetadataUrls;
 
+    // Compact mints store only the sha2-256 digest of a CIDv0 (one slot instead of three),
+    // the URL is rebuilt as `ipfs://<CIDv0>` on read
+    mapping(uint256 => bytes32) private _tokenCidDigests;
+
+    string private constant CID_URL_PREFIX = "ipfs://";
+    bytes private constant BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz";
+
+    error SimpleNFT__EmptyBatch();
+    error SimpleNFT__EmptyDigest();
+
     /**
      * @dev Constructor that initializes the ERC721 contract.
      * Sets the NFT collection name as "SimpleNFT" and the symbol as "SNFT".
@@ -45,6 +55,88 @@ contract SimpleNFT is ERC721 {
         // Returns the newly minted token ID.
     }
 
+    /**
+     * @notice Mints one NFT per metadata URL and assigns them all to the given address.
+     * @dev Token IDs are contiguous, so callers only need the returned range.
+     * `s_nextTokenId` is written once for the whole batch.
+     * @param to The address that will receive the newly minted NFTs.
+     * @param metadataUrls The IPFS URLs of the metadata, one per NFT.
+     * @return firstTokenId The first minted token ID.
+     * @return lastTokenId The last minted token ID.
+     */
+    function mintBatch(address to, string[] calldata metadataUrls)
+        external
+        returns (uint256 firstTokenId, uint256 lastTokenId)
+    {
+        uint256 count = metadataUrls.length;
+        if (count == 0) {
+            revert SimpleNFT__EmptyBatch();
+        }
+
+        firstTokenId = s_nextTokenId;
+        lastTokenId = firstTokenId + count - 1;
+
+        for (uint256 i = 0; i < count; i++) {
+            uint256 tokenId = firstTokenId + i;
+            _mint(to, tokenId);
+            _tokenMetadataUrls[tokenId] = metadataUrls[i];
+        }
+
+        s_nextTokenId = lastTokenId + 1;
+    }
+
+    /**
+     * @notice Mints a new NFT whose metadata URL is `ipfs://<CIDv0>`, storing only the CID's digest.
+     * @dev `tokenURI` returns the same string as a `mint` with the full URL.
+     * @param to The address that will receive the newly minted NFT.
+     * @param cidDigest The sha2-256 digest of the metadata's CIDv0 (the CID without its 0x1220 prefix).
+     * @return The newly minted token ID.
+     */
+    function mintCompact(address to, bytes32 cidDigest) external returns (uint256) {
+        if (cidDigest == bytes32(0)) {
+            revert SimpleNFT__EmptyDigest();
+        }
+
+        uint256 tokenId = s_nextTokenId;
+        _mint(to, tokenId);
+        _tokenCidDigests[tokenId] = cidDigest;
+        s_nextTokenId = tokenId + 1;
+        return tokenId;
+    }
+
+    /**
+     * @notice Mints one NFT per CIDv0 digest and assigns them all to the given address.
+     * @dev The compact counterpart of `mintBatch`: one storage slot of metadata per token.
+     * @param to The address that will receive the newly minted NFTs.
+     * @param cidDigests The sha2-256 digests of the metadata CIDs, one per NFT.
+     * @return firstTokenId The first minted token ID.
+     * @return lastTokenId The last minted token ID.
+     */
+    function mintBatchCompact(address to, bytes32[] calldata cidDigests)
+        external
+        returns (uint256 firstTokenId, uint256 lastTokenId)
+    {
+        uint256 count = cidDigests.length;
+        if (count == 0) {
+            revert SimpleNFT__EmptyBatch();
+        }
+
+        firstTokenId = s_nextTokenId;
+        lastTokenId = firstTokenId + count - 1;
+
+        for (uint256 i = 0; i < count; i++) {
+            bytes32 cidDigest = cidDigests[i];
+            if (cidDigest == bytes32(0)) {
+                revert SimpleNFT__EmptyDigest();
+            }
+            uint256 tokenId = firstTokenId + i;
+            _mint(to, tokenId);
+            _tokenCidDigests[tokenId] = cidDigest;
+        }
+
+        s_nextTokenId = lastTokenId + 1;
+    }
+
     /**
      * @notice Returns the next token ID that will be minted.
      * @dev This is a read-only function (`view`).
@@ -61,12 +153,48 @@ contract SimpleNFT is ERC721 {
      * @return The metadata URL for the given token ID.
      */
     function tokenMetadataUrl(uint256 tokenId) external view returns (string memory) {
-        return _tokenMetadataUrls[tokenId];
+        return _metadataUrl(tokenId);
     }
 
      // ✅ Corrected: Explicitly mark _exists as external in the ERC721 contract
     function tokenURI(uint256 tokenId) public view override returns (string memory) {
     ownerOf(tokenId); // This will revert if the token does not exist
-    return _tokenMetadataUrls[tokenId];
+    return _metadataUrl(tokenId);
 }
+
+    /**
+     * @dev The stored URL of a token, or `ipfs://<CIDv0>` rebuilt from the digest of a compact mint.
+     */
+    function _metadataUrl(uint256 tokenId) internal view returns (string memory) {
+        bytes32 cidDigest = _tokenCidDigests[tokenId];
+        if (cidDigest == bytes32(0)) {
+            return _tokenMetadataUrls[tokenId];
+        }
+        return string.concat(CID_URL_PREFIX, _toCidV0(cidDigest));
+    }
+
+    /**
+     * @dev Base58 encoding of the multihash `0x1220 ++ digest`. That number always has 46 digits
+     * and starts with "Qm". It is divided by 58 as three limbs that each fit a uint256 with the
+     * carried remainder: the 16-bit multihash prefix and the two 128-bit halves of the digest.
+     */
+    function _toCidV0(bytes32 digest) internal pure returns (string memory) {
+        uint256 high = 0x1220;
+        uint256 middle = uint256(digest) >> 128;
+        uint256 low = uint256(digest) & type(uint128).max;
+        bytes memory cid = new bytes(46);
+
+        for (uint256 i = 46; i > 0; ) {
+            unchecked {
+                --i;
+                uint256 value = ((high % 58) << 128) | middle;
+                high /= 58;
+                middle = value / 58;
+                value = ((value % 58) << 128) | low;
+                low = value / 58;
+                cid[i] = BASE58_ALPHABET[value % 58];
+            }
+        }
+        return string(cid);
+    }
 }
\ No newline at end of file
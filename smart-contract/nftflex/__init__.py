@@ -0,0 +1,3 @@
+"""
+Python helpers for consumers of the NFTFlex and SimpleNFT contracts.
+"""
@@ -0,0 +1,238 @@
+"""
+Helpers around the ABI files exported to ``abis/`` by ``nftflex.artifacts``.
+
+They let off-chain tooling decode NFTFlex logs without a compiled ape project.
+"""
+import json
+import os
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from eth_abi import decode, encode
+from eth_utils import keccak, to_checksum_address
+
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'abis')
+
+
+class DecodedLog(NamedTuple):
+    """A decoded contract event together with its position on chain."""
+    name: str
+    args: Dict[str, Any]
+    address: str
+    block_number: int
+    block_hash: str
+    transaction_hash: str
+    log_index: int
+
+
+def load_abi(contract_name: str, abi_dir: str = ABI_DIR) -> List[Dict[str, Any]]:
+    """
+    Load the ABI exported by ``export_artifacts`` for a contract.
+
+    Args:
+        contract_name (str): Name of the contract, e.g. ``"NFTFlex"``.
+        abi_dir (str): Directory holding the ``<name>_ABI.json`` files.
+
+    Returns:
+        List[Dict[str, Any]]: The contract ABI.
+    """
+    with open(os.path.join(abi_dir, f"{contract_name}_ABI.json"), 'r') as f:
+        return json.load(f)
+
+
+def load_contract_address(contract_name: str, path: str = "contract_addresses.json") -> str:
+    """
+    Read a contract address exported by ``export_artifacts``.
+
+    Args:
+        contract_name (str): Name of the contract, e.g. ``"NFTFlex"``.
+        path (str): The ``contract_addresses.json`` file written by ``deploy.py``.
+
+    Returns:
+        str: The deployed address.
+    """
+    with open(path, 'r') as f:
+        return json.load(f)[contract_name]
+
+
+def canonical_type(abi_input: Dict[str, Any]) -> str:
+    """Return the canonical ABI type of an input, expanding tuples."""
+    abi_type = abi_input["type"]
+    if not abi_type.startswith("tuple"):
+        return abi_type
+
+    components = ",".join(canonical_type(component) for component in abi_input["components"])
+    return f"({components}){abi_type[len('tuple'):]}"
+
+
+def signature(abi_entry: Dict[str, Any]) -> str:
+    """Return the canonical signature of an event, error or function, e.g. ``Transfer(address,address,uint256)``."""
+    types = ",".join(canonical_type(abi_input) for abi_input in abi_entry["inputs"])
+    return f"{abi_entry['name']}({types})"
+
+
+def event_topic(event_abi: Dict[str, Any]) -> str:
+    """Return the topic0 hash of an event as a 0x-prefixed hex string."""
+    return "0x" + keccak(text=signature(event_abi)).hex()
+
+
+def selector(abi_entry: Dict[str, Any]) -> str:
+    """Return the 4-byte selector of a function or custom error as a 0x-prefixed hex string."""
+    return "0x" + keccak(text=signature(abi_entry))[:4].hex()
+
+
+def error_names(*abis: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Map the selectors of the custom errors in ``abis`` to their names.
+
+    The built-in ``Error(string)`` and ``Panic(uint256)`` are always included.
+    """
+    names = {"0x08c379a0": "Error", "0x4e487b71": "Panic"}
+    for abi in abis:
+        for entry in abi:
+            if entry["type"] == "error":
+                names[selector(entry)] = entry["name"]
+    return names
+
+
+def to_bytes(value: Union[str, bytes]) -> bytes:
+    """Normalize hex strings and bytes-like values returned by different providers."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def to_hex(value: Union[str, bytes]) -> str:
+    """Normalize hex strings and bytes-like values to a lowercase 0x-prefixed string."""
+    return "0x" + to_bytes(value).hex()
+
+
+def to_int(value: Union[str, int]) -> int:
+    """Normalize quantities that may come back as hex strings."""
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _normalize(abi_type: str, value: Any) -> Any:
+    # Return addresses as checksummed strings and bytes as hex so decoded logs are JSON friendly
+    if abi_type == "address":
+        return to_checksum_address(value)
+    if abi_type.startswith("bytes"):
+        return "0x" + bytes(value).hex()
+    return value
+
+
+@lru_cache(maxsize=None)
+def _record_type(names: Tuple[str, ...]):
+    return namedtuple("Record", names)
+
+
+def decode_value(abi_output: Dict[str, Any], value: Any) -> Any:
+    """
+    Normalize a value decoded by eth_abi according to its ABI entry.
+
+    Structs become named tuples (so ``rental.tokenId`` works as with ape), arrays
+    become lists, addresses are checksummed and bytes are returned as hex.
+    """
+    abi_type = abi_output["type"]
+    if abi_type.endswith("]"):
+        element = {**abi_output, "type": abi_type[:abi_type.rindex("[")]}
+        return [decode_value(element, item) for item in value]
+    if abi_type == "tuple":
+        components = abi_output["components"]
+        values = [decode_value(component, item) for component, item in zip(components, value)]
+        names = tuple(component["name"] for component in components)
+        return _record_type(names)(*values) if all(names) else tuple(values)
+    return _normalize(abi_type, value)
+
+
+def decode_outputs(abi_entry: Dict[str, Any], data: bytes) -> Any:
+    """
+    Decode the return data of a function call.
+
+    Returns:
+        Any: The single return value, or a named tuple of all of them.
+    """
+    outputs = abi_entry["outputs"]
+    values = decode([canonical_type(output) for output in outputs], data)
+    if len(outputs) == 1:
+        return decode_value(outputs[0], values[0])
+    return decode_value({"type": "tuple", "components": outputs}, values)
+
+
+def encode_call(abi_entry: Dict[str, Any], args: Union[List[Any], Tuple[Any, ...]]) -> bytes:
+    """Return the calldata of a function call: selector followed by the encoded arguments."""
+    types = [canonical_type(abi_input) for abi_input in abi_entry["inputs"]]
+    return keccak(text=signature(abi_entry))[:4] + encode(types, list(args))
+
+
+class EventDecoder:
+    """
+    Decodes raw logs of one contract using its exported ABI.
+
+    Args:
+        abi (List[Dict[str, Any]]): The contract ABI.
+        event_names (Optional[List[str]]): Only decode these events (all events by default).
+    """
+
+    def __init__(self, abi: List[Dict[str, Any]], event_names: Optional[List[str]] = None):
+        self.events: Dict[str, Dict[str, Any]] = {}
+        for entry in abi:
+            if entry["type"] != "event" or entry.get("anonymous"):
+                continue
+            if event_names is not None and entry["name"] not in event_names:
+                continue
+            self.events[event_topic(entry)] = entry
+
+    @classmethod
+    def for_contract(cls, contract_name: str, event_names: Optional[List[str]] = None,
+                     abi_dir: str = ABI_DIR) -> "EventDecoder":
+        """Create a decoder from the ABI file saved for ``contract_name``."""
+        return cls(load_abi(contract_name, abi_dir), event_names)
+
+    @property
+    def topics(self) -> List[str]:
+        """Topic0 hashes of the decoded events, usable as an OR filter in ``eth_getLogs``."""
+        return list(self.events)
+
+    def decode(self, log: Dict[str, Any]) -> Optional[DecodedLog]:
+        """
+        Decode a raw log as returned by ``eth_getLogs`` (hex strings or web3 types).
+
+        Args:
+            log (Dict[str, Any]): The raw log.
+
+        Returns:
+            Optional[DecodedLog]: The decoded log, or None if it is not one of our events.
+        """
+        topics = [to_hex(topic) for topic in log["topics"]]
+        if not topics or topics[0] not in self.events:
+            return None
+
+        event_abi = self.events[topics[0]]
+        indexed = [abi_input for abi_input in event_abi["inputs"] if abi_input.get("indexed")]
+        non_indexed = [abi_input for abi_input in event_abi["inputs"] if not abi_input.get("indexed")]
+
+        args: Dict[str, Any] = {}
+        for abi_input, topic in zip(indexed, topics[1:]):
+            abi_type = canonical_type(abi_input)
+            if abi_type in ("string", "bytes") or abi_type.endswith("]") or abi_type.startswith("("):
+                # Dynamic indexed values are only available as their hash
+                args[abi_input["name"]] = topic
+            else:
+                args[abi_input["name"]] = _normalize(abi_type, decode([abi_type], to_bytes(topic))[0])
+
+        values = decode([canonical_type(abi_input) for abi_input in non_indexed], to_bytes(log["data"]))
+        for abi_input, value in zip(non_indexed, values):
+            args[abi_input["name"]] = _normalize(canonical_type(abi_input), value)
+
+        return DecodedLog(
+            name=event_abi["name"],
+            args=args,
+            address=to_checksum_address(to_hex(log["address"])),
+            block_number=to_int(log["blockNumber"]),
+            block_hash=to_hex(log["blockHash"]),
+            transaction_hash=to_hex(log["transactionHash"]),
+            log_index=to_int(log["logIndex"]),
+        )
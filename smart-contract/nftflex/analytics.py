@@ -0,0 +1,428 @@
+"""
+Rental analytics computed from the NFTFlex event history.
+
+``RentalAnalytics`` keeps the history as columnar NumPy arrays: one row per
+listing, per payment (``rentNFT`` / ``rentShares``), per rental interval and per
+collateral lock or release. Every time-based metric is answered from sorted
+event times and their running sums, so a query over any set of sliding windows
+costs a few ``searchsorted`` calls instead of a loop over the rentals:
+
+- occupancy: rented seconds / listed seconds of all NFTs within each window,
+- revenue per listed hour: rental income within each window / NFT-hours listed,
+- collateral locked at each point in time,
+- top NFTs and owners (with their revenue per listed hour, the owner's ROI) and
+  trending NFTs within a window,
+- the occupancy, idle time and revenue of every listing, the input of the
+  pricing engine (``nftflex.pricing``).
+
+New logs are appended with ``apply`` (or pulled from a ``RentalStore`` with
+``sync``); the sorted arrays are extended in place when the new events come
+after the old ones, which is the normal case when following the chain.
+
+Amounts are float64: sums of wei amounts overflow int64, and analytics do not
+need exact wei. Collateral is summed across collateral tokens because the
+events do not name the token. Whole-NFT rentals count towards occupancy;
+shares of fractional rentals count towards revenue, popularity and collateral,
+their collateral is treated as released at the end of the rental period.
+"""
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nftflex.abi import DecodedLog
+
+
+class _Column:
+    """Append-only NumPy array that grows by doubling."""
+
+    def __init__(self, dtype):
+        self._data = np.empty(1024, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._data.dtype)
+        end = self._size + len(values)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self.values
+            self._data = grown
+        self._data[self._size:end] = values
+        self._size = end
+
+
+class _Series:
+    """
+    Events ordered by time, each with a weight and optional integer keys.
+
+    ``weight_until(t)`` is the sum of the weights of the events at or before ``t``
+    and ``seconds_since(t)`` the sum of ``t - time`` over the same events, which is
+    the time integral of "number of events so far". Both are vectorized over ``t``.
+    """
+
+    def __init__(self, *keys: str):
+        self.times = _Column(np.int64)
+        self.weights = _Column(np.float64)
+        self.keys = {key: _Column(np.int64) for key in keys}
+        self._cum_weights = _Column(np.float64)
+        self._cum_times = _Column(np.float64)
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def extend(self, times: Sequence[int], weights: Sequence[float], **keys: Sequence[int]) -> None:
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) == 0:
+            return
+        weights = np.asarray(weights, dtype=np.float64)
+        order = np.argsort(times, kind="stable")
+        in_order = len(self.times) == 0 or times[order[0]] >= self.times.values[-1]
+        self.times.extend(times[order])
+        self.weights.extend(weights[order])
+        for key, column in self.keys.items():
+            column.extend(np.asarray(keys[key], dtype=np.int64)[order])
+
+        if self._sorted and in_order:
+            # Later than everything so far: extend the running sums instead of rebuilding them
+            offset_weight = self._cum_weights.values[-1] if len(self._cum_weights) else 0.0
+            offset_time = self._cum_times.values[-1] if len(self._cum_times) else 0.0
+            self._cum_weights.extend(offset_weight + np.cumsum(weights[order]))
+            self._cum_times.extend(offset_time + np.cumsum(times[order].astype(np.float64)))
+        else:
+            self._sorted = False
+
+    def _prepare(self) -> None:
+        if self._sorted:
+            return
+        order = np.argsort(self.times.values, kind="stable")
+        for column in (self.times, self.weights, *self.keys.values()):
+            column._data[:len(column)] = column.values[order]
+        self._cum_weights = _Column(np.float64)
+        self._cum_weights.extend(np.cumsum(self.weights.values))
+        self._cum_times = _Column(np.float64)
+        self._cum_times.extend(np.cumsum(self.times.values.astype(np.float64)))
+        self._sorted = True
+
+    def count_until(self, t) -> np.ndarray:
+        self._prepare()
+        return np.searchsorted(self.times.values, t, side="right")
+
+    def weight_until(self, t) -> np.ndarray:
+        count = self.count_until(t)
+        return _prefix(self._cum_weights.values, count)
+
+    def seconds_since(self, t) -> np.ndarray:
+        count = self.count_until(t)
+        return np.asarray(t, dtype=np.float64) * count - _prefix(self._cum_times.values, count)
+
+    def window(self, start: int, end: int) -> slice:
+        """Positions of the events with ``start < time <= end``."""
+        self._prepare()
+        return slice(*np.searchsorted(self.times.values, [start, end], side="right"))
+
+
+def _prefix(cumulative: np.ndarray, count: np.ndarray) -> np.ndarray:
+    # Sum of the first `count` values, 0 for count == 0
+    if len(cumulative) == 0:
+        return np.zeros(np.shape(count))
+    return np.where(count > 0, cumulative[np.maximum(count - 1, 0)], 0.0)
+
+
+class RentalAnalytics:
+    """
+    Columnar store of the NFTFlex history with vectorized metrics over sliding windows.
+
+    Args:
+        timestamp_of (Callable[[int], int]): Timestamp of a block number. Only needed for the
+            events that carry no time of their own (listings and ``RentalEnded``), e.g. a cached
+            ``lambda number: web3.eth.get_block(number)["timestamp"]``.
+    """
+
+    def __init__(self, timestamp_of: Callable[[int], int]):
+        self.timestamp_of = timestamp_of
+        self.owners: List[str] = []
+        self.nfts: List[Tuple[str, int]] = []
+        self._owner_codes: Dict[str, int] = {}
+        self._nft_codes: Dict[Tuple[str, int], int] = {}
+        # One entry per listing, in listing order; `_listings` maps a rental ID to its position
+        self.rental_ids: List[int] = []
+        self.prices: List[int] = []
+        self._listings: Dict[int, int] = {}
+        self._listing_owner: List[int] = []
+        self._listing_nft: List[int] = []
+        self._listed_at: List[int] = []
+        self._fractional: List[bool] = []
+        self._last_end: List[int] = []
+        # Collateral of the active whole-NFT rentals, by rental ID
+        self._open_locks: Dict[int, float] = {}
+
+        self.listings = _Series("owner", "nft")  # weight 1 per listing, at the listing time
+        self.payments = _Series("owner", "nft", "listing")  # weight = price paid, at the rental start
+        self.rental_starts = _Series()  # whole-NFT rentals, for occupancy
+        self.rental_ends = _Series()
+        self.locks = _Series()  # weight = collateral deposited
+        self.releases = _Series()  # weight = collateral released
+        # Whole-NFT rental periods in chain order, for the occupancy of each listing
+        self._rented_listing = _Column(np.int64)
+        self._rented_start = _Column(np.int64)
+        self._rented_end = _Column(np.int64)
+        self.cursor: Optional[Tuple[int, int]] = None  # (block number, log index) of the last applied log
+
+    def apply(self, logs: Iterable[DecodedLog]) -> int:
+        """
+        Append decoded NFTFlex logs, ordered by block number and log index.
+
+        Returns:
+            int: Number of logs applied.
+        """
+        # Plain lists while looping over the logs, converted to arrays once per call
+        listed_at, listed_owner, listed_nft = [], [], []
+        paid_at, paid, paid_owner, paid_nft, paid_listing = [], [], [], [], []
+        started_at, ending_at, rented_listing = [], [], []
+        locked_at, locked, released_at, released = [], [], [], []
+        applied = 0
+
+        for log in logs:
+            name, args = log.name, log.args
+            if name == "NFTFlex__RentalCreated":
+                owner = self._code(self._owner_codes, self.owners, args["owner"])
+                nft = self._code(self._nft_codes, self.nfts, (args["nftAddress"], args["tokenId"]))
+                timestamp = self.timestamp_of(log.block_number)
+                self._listings[args["rentalId"]] = len(self.rental_ids)
+                self.rental_ids.append(args["rentalId"])
+                self.prices.append(args["pricePerHour"])
+                self._listing_owner.append(owner)
+                self._listing_nft.append(nft)
+                self._listed_at.append(timestamp)
+                self._fractional.append(bool(args["isFractional"]))
+                self._last_end.append(0)
+                listed_at.append(timestamp)
+                listed_owner.append(owner)
+                listed_nft.append(nft)
+            elif name == "NFTFlex__RentalStarted" or name == "NFTFlex__SharesRented":
+                listing = self._listings.get(args["rentalId"])
+                if listing is None:
+                    continue
+                start, end, collateral = args["startTime"], args["endTime"], float(args["collateralAmount"])
+                shares = len(args["shareIds"]) if name == "NFTFlex__SharesRented" else 1
+                paid_at.append(start)
+                paid.append(float(self.prices[listing]) * ((end - start) // 3600) * shares)
+                paid_owner.append(self._listing_owner[listing])
+                paid_nft.append(self._listing_nft[listing])
+                paid_listing.append(listing)
+                locked_at.append(start)
+                locked.append(collateral)
+                self._last_end[listing] = max(self._last_end[listing], end)
+                if name == "NFTFlex__RentalStarted":
+                    started_at.append(start)
+                    ending_at.append(end)
+                    rented_listing.append(listing)
+                    self._open_locks[args["rentalId"]] = collateral
+                else:
+                    released_at.append(end)
+                    released.append(collateral)
+            elif name == "NFTFlex__RentalEnded":
+                collateral = self._open_locks.pop(args["rentalId"], None)
+                if collateral is not None:
+                    released_at.append(self.timestamp_of(log.block_number))
+                    released.append(collateral)
+            elif name == "NFTFlex__PriceUpdated":
+                listing = self._listings.get(args["rentalId"])
+                if listing is not None:
+                    self.prices[listing] = args["pricePerHour"]
+            self.cursor = (log.block_number, log.log_index)
+            applied += 1
+
+        self.listings.extend(listed_at, np.ones(len(listed_at)), owner=listed_owner, nft=listed_nft)
+        self.payments.extend(paid_at, paid, owner=paid_owner, nft=paid_nft, listing=paid_listing)
+        self.rental_starts.extend(started_at, np.ones(len(started_at)))
+        self.rental_ends.extend(ending_at, np.ones(len(ending_at)))
+        self.locks.extend(locked_at, locked)
+        self.releases.extend(released_at, released)
+        self._rented_listing.extend(rented_listing)
+        self._rented_start.extend(started_at)
+        self._rented_end.extend(ending_at)
+        return applied
+
+    def sync(self, store) -> int:
+        """
+        Apply the events a ``RentalStore`` holds beyond ``cursor``.
+
+        The analytics are append-only: after the store rolled back a reorg, rebuild them.
+
+        Returns:
+            int: Number of logs applied.
+        """
+        block_number, log_index = self.cursor if self.cursor is not None else (-1, -1)
+        rows = store.connection.execute(
+            "SELECT block_number, log_index, block_hash, transaction_hash, name, args FROM events "
+            "WHERE block_number > ? OR (block_number = ? AND log_index > ?) ORDER BY block_number, log_index",
+            (block_number, block_number, log_index),
+        )
+        return self.apply(
+            DecodedLog(row["name"], json.loads(row["args"]), "", row["block_number"], row["block_hash"],
+                       row["transaction_hash"], row["log_index"])
+            for row in rows
+        )
+
+    # Metrics over sliding windows; `times` are the window ends, `window` the window length in seconds
+
+    def rented_seconds(self, times) -> np.ndarray:
+        """Seconds rented by all whole-NFT rentals up to each time."""
+        return self.rental_starts.seconds_since(times) - self.rental_ends.seconds_since(times)
+
+    def listed_seconds(self, times) -> np.ndarray:
+        """Seconds listed by all NFTs up to each time (listings stay open)."""
+        return self.listings.seconds_since(times)
+
+    def occupancy(self, times, window: int) -> np.ndarray:
+        """Share of the listed NFT-time that was rented within each window (NaN when nothing was listed)."""
+        times = np.asarray(times, dtype=np.int64)
+        rented = self.rented_seconds(times) - self.rented_seconds(times - window)
+        listed = self.listed_seconds(times) - self.listed_seconds(times - window)
+        return _ratio(rented, listed)
+
+    def revenue(self, times, window: int) -> np.ndarray:
+        """Rental income of the rentals started within each window."""
+        times = np.asarray(times, dtype=np.int64)
+        return self.payments.weight_until(times) - self.payments.weight_until(times - window)
+
+    def revenue_per_listed_hour(self, times, window: int) -> np.ndarray:
+        """Rental income within each window per NFT-hour listed in it."""
+        times = np.asarray(times, dtype=np.int64)
+        listed = self.listed_seconds(times) - self.listed_seconds(times - window)
+        return _ratio(self.revenue(times, window), listed / 3600)
+
+    def collateral_locked(self, times) -> np.ndarray:
+        """Collateral held by the contract at each time."""
+        return self.locks.weight_until(times) - self.releases.weight_until(times)
+
+    def summary(self, times, window: int) -> pd.DataFrame:
+        """All time series metrics, one row per window end."""
+        times = np.asarray(times, dtype=np.int64)
+        return pd.DataFrame({
+            "rentals": self.payments.count_until(times) - self.payments.count_until(times - window),
+            "occupancy": self.occupancy(times, window),
+            "revenue": self.revenue(times, window),
+            "revenue_per_listed_hour": self.revenue_per_listed_hour(times, window),
+            "collateral_locked": self.collateral_locked(times),
+        }, index=pd.to_datetime(times, unit="s", utc=True))
+
+    def top_nfts(self, at: int, window: int, k: int = 10, by: str = "revenue") -> pd.DataFrame:
+        """
+        The ``k`` NFTs with the most revenue (or ``by="rentals"``) within the window ending at ``at``.
+        """
+        revenue, rentals = self._per_key("nft", len(self.nfts), at, window)
+        top = _top(revenue if by == "revenue" else rentals, k)
+        return pd.DataFrame({
+            "nft_address": [self.nfts[code][0] for code in top],
+            "token_id": [self.nfts[code][1] for code in top],
+            "revenue": revenue[top],
+            "rentals": rentals[top],
+        })
+
+    def top_owners(self, at: int, window: int, k: int = 10) -> pd.DataFrame:
+        """
+        The ``k`` owners with the most revenue within the window ending at ``at``, with their
+        revenue per NFT-hour listed in that window (their return on listing).
+        """
+        revenue, rentals = self._per_key("owner", len(self.owners), at, window)
+        listed_at = self.listings.times.values
+        listed = np.clip(at - np.maximum(listed_at, at - window), 0, None).astype(np.float64)
+        listed_hours = np.bincount(self.listings.keys["owner"].values, weights=listed,
+                                   minlength=len(self.owners)) / 3600
+        top = _top(revenue, k)
+        return pd.DataFrame({
+            "owner": [self.owners[code] for code in top],
+            "revenue": revenue[top],
+            "rentals": rentals[top],
+            "listed_hours": listed_hours[top],
+            "revenue_per_listed_hour": _ratio(revenue[top], listed_hours[top]),
+        })
+
+    def trending_nfts(self, at: int, window: int, k: int = 10) -> pd.DataFrame:
+        """The ``k`` NFTs whose number of rentals grew the most from the previous window to this one."""
+        _, current = self._per_key("nft", len(self.nfts), at, window)
+        _, previous = self._per_key("nft", len(self.nfts), at - window, window)
+        top = _top(current - previous, k)
+        return pd.DataFrame({
+            "nft_address": [self.nfts[code][0] for code in top],
+            "token_id": [self.nfts[code][1] for code in top],
+            "rentals": current[top],
+            "previous_rentals": previous[top],
+        })
+
+    def listing_stats(self, at: int, window: int) -> pd.DataFrame:
+        """
+        Demand of every listing within the window ending at ``at``, indexed by rental ID.
+
+        ``occupancy`` is the share of the listing's time in the window it was rented (NaN for
+        fractional listings, whose shares do not occupy the NFT), ``idle_seconds`` the time since
+        its last rental ended (or since it was listed), 0 while rented.
+        """
+        size = len(self.rental_ids)
+        listings = self._rented_listing.values
+        window_start = at - window
+        rented = np.clip(np.minimum(self._rented_end.values, at) - np.maximum(self._rented_start.values, window_start),
+                         0, None)
+        rented_seconds = np.bincount(listings, weights=rented, minlength=size)
+
+        listed_at = np.asarray(self._listed_at, dtype=np.int64)
+        listed_seconds = np.clip(at - np.maximum(listed_at, window_start), 0, None).astype(np.float64)
+        fractional = np.asarray(self._fractional, dtype=bool)
+        occupancy = _ratio(rented_seconds, listed_seconds)
+        occupancy[fractional] = np.nan
+
+        positions = self.payments.window(window_start, at)
+        revenue = np.bincount(self.payments.keys["listing"].values[positions],
+                              weights=self.payments.weights.values[positions], minlength=size)
+        last_active = np.maximum(np.asarray(self._last_end, dtype=np.int64), listed_at)
+        return pd.DataFrame({
+            "nft_address": [self.nfts[code][0] for code in self._listing_nft],
+            "token_id": [self.nfts[code][1] for code in self._listing_nft],
+            "owner": [self.owners[code] for code in self._listing_owner],
+            "is_fractional": fractional,
+            "price_per_hour": pd.Series(self.prices, dtype=object),
+            "listed_seconds": listed_seconds,
+            "rented_seconds": rented_seconds,
+            "occupancy": occupancy,
+            "idle_seconds": np.clip(at - last_active, 0, None),
+            "revenue": revenue,
+        }, index=pd.Index(self.rental_ids, name="rental_id"))
+
+    def _per_key(self, key: str, size: int, at: int, window: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Revenue and number of rentals (rentNFT / rentShares calls) per owner/NFT code within the window
+        positions = self.payments.window(at - window, at)
+        codes = self.payments.keys[key].values[positions]
+        revenue = np.bincount(codes, weights=self.payments.weights.values[positions], minlength=size)
+        return revenue, np.bincount(codes, minlength=size)
+
+    @staticmethod
+    def _code(codes: Dict, values: List, value) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _top(values: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the ``k`` largest positive values, largest first."""
+    candidates = np.flatnonzero(values > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(values[candidates], -k)[-k:]]
+    return candidates[np.argsort(-values[candidates], kind="stable")]
@@ -0,0 +1,357 @@
+"""
+Read-only HTTP API over the rental index.
+
+``create_app`` serves the state of a ``RentalStore`` as JSON: paginated and
+filtered listings, the details and events of a rental, owner and renter
+dashboards and the metadata of the listed NFTs.
+
+Responses only change when the index advances, so they are cached in memory
+under the last indexed block (and its hash, in case a reorg replaced it).
+Listings filtered by status also depend on the clock, so those entries expire
+after ``time_ttl`` seconds. The clock is the timestamp of the last indexed block,
+as rental end times are chain time. ETags are digests of the response body: a client
+revalidating with ``If-None-Match`` gets a ``304 Not Modified`` as long as
+its response is unchanged, even after new blocks, so bodies leave the block
+out; it is sent in the ``X-Indexed-Block`` header. Large bodies are gzipped
+once per cache entry.
+
+The store is read on the event loop, so give the API its own ``RentalStore``
+rather than the one a follower writes to from its worker thread.
+"""
+import asyncio
+import gzip
+import hashlib
+import inspect
+import json
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+
+from aiohttp import web
+from eth_utils import is_address, to_checksum_address
+
+from nftflex.indexer import AMOUNT_COLUMNS, RentalStore
+from nftflex.metadata import LRUCache, MetadataService
+from nftflex.rentals import RentalStatus
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MIN_GZIP_SIZE = 1_024  # Smaller bodies gain little, and fit in one packet anyway
+MAX_SAFE_INTEGER = 2 ** 53 - 1  # Larger event values are sent as strings, like rental amounts
+
+STATUSES = {status.name.lower(): status for status in RentalStatus}
+
+
+class CachedResponse:
+    """A response body with its ETag, gzipped the first time a client accepts it."""
+
+    __slots__ = ("body", "etag", "expires_at", "_gzipped")
+
+    def __init__(self, body: bytes, expires_at: Optional[float] = None):
+        self.body = body
+        self.etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.expires_at = expires_at
+        self._gzipped: Optional[bytes] = None
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+
+@lru_cache(maxsize=4_096)
+def _checksum(address: str) -> Optional[str]:
+    return to_checksum_address(address) if is_address(address) else None
+
+
+def _bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def _not_found(message: str) -> web.HTTPNotFound:
+    return web.HTTPNotFound(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an ``Accept-Encoding`` header allows a gzipped response."""
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def matches_etag(if_none_match: str, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (compared weakly, as RFC 9110 requires)."""
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip() == "*" or tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def rental_json(rental: Dict[str, Any]) -> Dict[str, Any]:
+    """A rental of the store with its uint256 amounts as decimal strings, which JavaScript parses exactly."""
+    rental = dict(rental)
+    for column in AMOUNT_COLUMNS:
+        if rental[column] is not None:
+            rental[column] = str(rental[column])
+    return rental
+
+
+def _event_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and abs(value) > MAX_SAFE_INTEGER:
+        return str(value)
+    if isinstance(value, list):
+        return [_event_value(item) for item in value]
+    return value
+
+
+class RentalApi:
+    """
+    Request handlers of the API and the response cache they share.
+
+    Args:
+        store (RentalStore): The index to serve.
+        metadata (Optional[MetadataService]): Resolves token metadata (``/metadata`` is disabled without it).
+        token_uri (Optional[Callable[[str, int], Optional[str]]]): Returns the ``tokenURI`` of an NFT contract
+            and token ID; it is called on a worker thread.
+        cache_size (int): Number of responses kept in memory.
+        time_ttl (float): Seconds a response that depends on the clock stays cached.
+        clock (Optional[Callable[[], float]]): Source of the current time; by default the timestamp of the
+            last indexed block, or the wall clock while the store has none recorded.
+    """
+
+    def __init__(self, store: RentalStore, metadata: Optional[MetadataService] = None,
+                 token_uri: Optional[Callable[[str, int], Optional[str]]] = None, cache_size: int = 4_096,
+                 time_ttl: float = 1.0, clock: Optional[Callable[[], float]] = None):
+        self.store = store
+        self.metadata = metadata
+        self.token_uri = token_uri
+        self.cache = LRUCache(cache_size)
+        self.time_ttl = time_ttl
+        self.clock = clock or self._chain_time
+        self.counters = {"requests": 0, "hits": 0, "misses": 0, "not_modified": 0, "gzipped": 0}
+
+    def routes(self) -> list:
+        return [
+            web.get("/health", self.health),
+            web.get("/rentals", self.rentals),
+            web.get("/rentals/{rental_id}", self.rental),
+            web.get("/rentals/{rental_id}/metadata", self.rental_metadata),
+            web.get("/owners/{address}", self.owner),
+            web.get("/renters/{address}", self.renter),
+        ]
+
+    def _chain_time(self) -> float:
+        # End times are block timestamps: compare them with the chain's clock, not the server's
+        timestamp = self.store.last_block_timestamp
+        return time.time() if timestamp is None else timestamp
+
+    def _state(self, block: Optional[int]) -> str:
+        if block is None:
+            return "empty"
+        return f"{block}:{self.store.block_hash(block) or ''}"
+
+    async def _serve(self, request: web.Request, build: Callable[[], Any], time_dependent: bool = False) -> web.Response:
+        """Answer from the cache, or build the payload, cache it and answer."""
+        self.counters["requests"] += 1
+        query = urlencode(sorted(request.query.items()))
+        block = self.store.last_block
+        key = f"{self._state(block)} {request.path}?{query}"
+        now = time.monotonic()
+
+        entry = self.cache.get(key)
+        if entry is None or (entry.expires_at is not None and entry.expires_at <= now):
+            self.counters["misses"] += 1
+            payload = build()
+            if inspect.isawaitable(payload):
+                payload = await payload
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            entry = CachedResponse(body, now + self.time_ttl if time_dependent else None)
+            self.cache.put(key, entry)
+        else:
+            self.counters["hits"] += 1
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding",
+                   "X-Indexed-Block": "" if block is None else str(block)}
+        if matches_etag(request.headers.get("If-None-Match", ""), entry.etag):
+            self.counters["not_modified"] += 1
+            return web.Response(status=304, headers=headers)
+        if len(entry.body) >= MIN_GZIP_SIZE and accepts_gzip(request.headers.get("Accept-Encoding", "")):
+            self.counters["gzipped"] += 1
+            headers["Content-Encoding"] = "gzip"
+            return web.Response(body=entry.gzipped(), headers=headers, content_type="application/json")
+        return web.Response(body=entry.body, headers=headers, content_type="application/json")
+
+    # Query parameters
+
+    @staticmethod
+    def _int(request: web.Request, name: str, default: Optional[int] = None, maximum: Optional[int] = None) -> Optional[int]:
+        value = request.query.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise _bad_request(f"{name} must be an integer")
+        if number < 0 or (maximum is not None and number > maximum):
+            raise _bad_request(f"{name} must be between 0 and {maximum}" if maximum is not None
+                               else f"{name} must not be negative")
+        return number
+
+    @staticmethod
+    def _address(value: Optional[str], name: str) -> Optional[str]:
+        if value is None:
+            return None
+        address = _checksum(value)
+        if address is None:
+            raise _bad_request(f"{name} is not an address")
+        return address
+
+    @staticmethod
+    def _status(request: web.Request) -> Optional[RentalStatus]:
+        value = request.query.get("status")
+        if value is None:
+            return None
+        status = STATUSES.get(value.lower())
+        if status is None:
+            raise _bad_request(f"status must be one of {', '.join(STATUSES)}")
+        return status
+
+    def _page(self, request: web.Request, **filters) -> Dict[str, Any]:
+        """One page of the rentals matching ``filters``, with their total count."""
+        limit = self._int(request, "limit", DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        offset = self._int(request, "offset", 0)
+        filters = {name: value for name, value in filters.items() if value is not None}
+        if "status" in filters:
+            filters["now"] = int(self.clock())
+        return {
+            "total": self.store.count(**filters),
+            "limit": limit,
+            "offset": offset,
+            "items": [rental_json(rental) for rental in self.store.rentals(limit=limit, offset=offset, **filters)],
+        }
+
+    def _status_counts(self, **filters) -> Dict[str, int]:
+        now = int(self.clock())
+        return {name: self.store.count(status=status, now=now, **filters) for name, status in STATUSES.items()}
+
+    # Handlers
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"block": self.store.last_block, "cached": len(self.cache), **self.counters})
+
+    async def rentals(self, request: web.Request) -> web.Response:
+        """
+        ``GET /rentals``: the listings, filtered by ``status``, ``owner``, ``renter``, ``nft``,
+        ``collateral_token``, ``min_price`` and ``max_price`` and paginated by ``limit`` and ``offset``.
+        """
+        query = request.query
+        filters = {
+            "status": self._status(request),
+            "owner": self._address(query.get("owner"), "owner"),
+            "renter": self._address(query.get("renter"), "renter"),
+            "nft_address": self._address(query.get("nft"), "nft"),
+            "collateral_token": self._address(query.get("collateral_token"), "collateral_token"),
+            "min_price": self._int(request, "min_price"),
+            "max_price": self._int(request, "max_price"),
+        }
+        return await self._serve(request, lambda: self._page(request, **filters),
+                                 time_dependent=filters["status"] is not None)
+
+    def _rental_id(self, request: web.Request) -> int:
+        try:
+            return int(request.match_info["rental_id"])
+        except ValueError:
+            raise _bad_request("rental ID must be an integer")
+
+    async def rental(self, request: web.Request) -> web.Response:
+        """``GET /rentals/{rental_id}``: one rental with its indexed events."""
+        rental_id = self._rental_id(request)
+
+        def build():
+            rental = self.store.rental(rental_id)
+            if rental is None:
+                raise _not_found(f"rental {rental_id} is not indexed")
+            events = [{**event, "args": {name: _event_value(value) for name, value in event["args"].items()}}
+                      for event in self.store.events(rental_id)]
+            return {"rental": rental_json(rental), "events": events}
+
+        return await self._serve(request, build)
+
+    async def rental_metadata(self, request: web.Request) -> web.Response:
+        """``GET /rentals/{rental_id}/metadata``: the metadata document of the rented NFT."""
+        rental_id = self._rental_id(request)
+        if self.metadata is None or self.token_uri is None:
+            raise _not_found("metadata lookups are not enabled")
+
+        async def build():
+            rental = self.store.rental(rental_id)
+            if rental is None:
+                raise _not_found(f"rental {rental_id} is not indexed")
+            loop = asyncio.get_running_loop()
+            uri = await loop.run_in_executor(None, self.token_uri, rental["nft_address"], rental["token_id"])
+            if not uri:
+                raise _not_found(f"token {rental['token_id']} has no tokenURI")
+            try:
+                document = await loop.run_in_executor(None, self.metadata.get, uri)
+            except Exception as e:
+                raise web.HTTPBadGateway(text=json.dumps({"error": f"fetching {uri} failed: {e}"}),
+                                         content_type="application/json")
+            return {"token_uri": uri, "metadata": document}
+
+        return await self._serve(request, build)
+
+    async def owner(self, request: web.Request) -> web.Response:
+        """``GET /owners/{address}``: counts per status, total earnings and a page of the owner's listings."""
+        owner = self._address(request.match_info["address"], "address")
+        status = self._status(request)
+
+        def build():
+            return {
+                "address": owner,
+                "by_status": self._status_counts(owner=owner),
+                "total_earnings": str(self.store.total_earnings(owner)),
+                **self._page(request, owner=owner, status=status),
+            }
+
+        return await self._serve(request, build, time_dependent=True)
+
+    async def renter(self, request: web.Request) -> web.Response:
+        """``GET /renters/{address}``: counts per status and a page of the rentals the renter holds."""
+        renter = self._address(request.match_info["address"], "address")
+        status = self._status(request)
+
+        def build():
+            counts = self._status_counts(renter=renter)
+            del counts["available"]  # A renter only holds rented NFTs
+            return {"address": renter, "by_status": counts, **self._page(request, renter=renter, status=status)}
+
+        return await self._serve(request, build, time_dependent=True)
+
+
+def create_app(store: RentalStore, metadata: Optional[MetadataService] = None,
+               token_uri: Optional[Callable[[str, int], Optional[str]]] = None, **kwargs) -> web.Application:
+    """
+    Build the aiohttp application serving ``store``.
+
+    Args:
+        store (RentalStore): The index to serve.
+        metadata (Optional[MetadataService]): Resolves token metadata for ``/rentals/{rental_id}/metadata``.
+        token_uri (Optional[Callable[[str, int], Optional[str]]]): Returns the ``tokenURI`` of a token.
+        **kwargs: Passed on to ``RentalApi`` (``cache_size``, ``time_ttl``, ``clock``).
+
+    Returns:
+        web.Application: The application; its ``RentalApi`` is ``app[API_KEY]``.
+    """
+    api = RentalApi(store, metadata, token_uri, **kwargs)
+    app = web.Application()
+    app[API_KEY] = api
+    app.add_routes(api.routes())
+    return app
+
+
+API_KEY = web.AppKey("api", RentalApi)
+
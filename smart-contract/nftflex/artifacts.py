@@ -0,0 +1,223 @@
+"""
+Export compiled contract artifacts to the places that consume them.
+
+``export_artifacts`` reads ape's ``.build/__local__.json`` manifest once and
+writes, for every configured ``ExportTarget``:
+
+- the ABI of every contract,
+- the deployed addresses (the latest deployment, plus one entry per chain ID),
+- event-topic and error-selector tables, so consumers can name logs and reverts
+  without hashing signatures themselves.
+
+Large manifests are streamed with ijson instead of being loaded whole. Every
+output is compared by content hash with what was written last time and left
+untouched when it did not change. When neither the manifest nor the addresses
+changed since the last run, the manifest is not even opened.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import ijson
+
+from nftflex.abi import event_topic, selector, signature
+
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MANIFEST_PATH = os.path.join(PROJECT_DIR, '.build', '__local__.json')
+STATE_PATH = os.path.join(PROJECT_DIR, '.build', 'nftflex_export.json')
+
+# Manifests larger than this are streamed contract by contract
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+
+class ExportTarget(NamedTuple):
+    """
+    Where one consumer expects the artifacts. Relative paths are resolved from the ape project directory.
+
+    Attributes:
+        abi_dir (str): Directory receiving one ABI file per contract.
+        abi_filename (str): File name pattern of the ABI files, ``{name}`` is the contract name.
+        addresses_path (Optional[str]): Latest deployment, ``{"network": ..., "<Contract>": address}``.
+        deployments_path (Optional[str]): Deployments by chain ID, merged with the existing file.
+        tables_path (Optional[str]): Event topics and error selectors of every contract.
+    """
+    abi_dir: str
+    abi_filename: str = "{name}_ABI.json"
+    addresses_path: Optional[str] = None
+    deployments_path: Optional[str] = None
+    tables_path: Optional[str] = None
+
+
+DEFAULT_TARGETS = [
+    # Python tooling (nftflex.abi.load_abi, load_contract_address) and the scripts
+    ExportTarget("abis", "{name}_ABI.json", "contract_addresses.json", "deployments.json", "abis/tables.json"),
+    # The Vue client
+    ExportTarget("../client/src/abis", "{name}.json", "../client/src/contract_addresses.json",
+                 "../client/src/deployments.json", "../client/src/abis/tables.json"),
+]
+
+
+class ExportResult(NamedTuple):
+    """Files written and files left untouched by an export."""
+    written: List[str]
+    unchanged: List[str]
+    parsed: bool
+
+
+def iter_contract_abis(manifest_path: str = MANIFEST_PATH,
+                       stream_threshold: int = STREAM_THRESHOLD) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Yield ``(name, abi)`` for every contract type of an ape manifest, in a single pass.
+
+    Args:
+        manifest_path (str): The ``__local__.json`` manifest written by ``ape compile``.
+        stream_threshold (int): Stream manifests of at least this many bytes instead of loading them.
+    """
+    with open(manifest_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < stream_threshold:
+            contract_types = json.load(f).get("contractTypes", {})
+            for name, contract_type in contract_types.items():
+                yield name, contract_type.get("abi", [])
+        else:
+            for name, contract_type in ijson.kvitems(f, "contractTypes", use_float=True):
+                yield name, contract_type.get("abi", [])
+
+
+def abi_tables(abi: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    Lookup tables of one ABI: event topic0 => signature and error selector => signature.
+    """
+    return {
+        "events": {event_topic(entry): signature(entry) for entry in abi
+                   if entry["type"] == "event" and not entry.get("anonymous")},
+        "errors": {selector(entry): signature(entry) for entry in abi if entry["type"] == "error"},
+    }
+
+
+def export_artifacts(addresses: Optional[Dict[str, str]] = None, network: Optional[str] = None,
+                     chain_id: Optional[int] = None, targets: Sequence[ExportTarget] = DEFAULT_TARGETS,
+                     manifest_path: str = MANIFEST_PATH, state_path: str = STATE_PATH,
+                     project_dir: str = PROJECT_DIR, contracts: Optional[Sequence[str]] = None,
+                     stream_threshold: int = STREAM_THRESHOLD) -> ExportResult:
+    """
+    Write the ABIs, addresses and lookup tables of the compiled contracts to every target.
+
+    Args:
+        addresses (Optional[Dict[str, str]]): Deployed addresses by contract name. Address files are
+            left alone when omitted, e.g. when exporting right after ``ape compile``.
+        network (Optional[str]): Name of the network the addresses belong to.
+        chain_id (Optional[int]): Chain ID the addresses belong to, keys the per-chain deployments.
+        targets (Sequence[ExportTarget]): Where to write.
+        manifest_path (str): The ape manifest to read.
+        state_path (str): File remembering the manifest and output hashes of the last export.
+        project_dir (str): Directory relative target paths are resolved from.
+        contracts (Optional[Sequence[str]]): Only export these contracts (all of them by default).
+        stream_threshold (int): Manifest size from which it is streamed, see ``iter_contract_abis``.
+
+    Returns:
+        ExportResult: The files written and the files that were already up to date.
+    """
+    state = _load_json(state_path, {})
+    manifest_stat = os.stat(manifest_path)
+    inputs = {
+        "manifest": [manifest_stat.st_size, manifest_stat.st_mtime_ns],
+        "request": _hash(_dump([addresses, network, chain_id, [list(target) for target in targets],
+                                list(contracts) if contracts is not None else None, project_dir])),
+    }
+    outputs: Dict[str, List[Any]] = state.get("outputs", {})
+
+    if state.get("inputs") == inputs and all(_is_recorded(path, record) for path, record in outputs.items()):
+        return ExportResult([], sorted(outputs), parsed=False)
+
+    files: Dict[str, str] = {}
+    tables: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for name, abi in iter_contract_abis(manifest_path, stream_threshold):
+        if contracts is not None and name not in contracts:
+            continue
+        content = _dump(abi)
+        for target in targets:
+            files[_resolve(project_dir, target.abi_dir, target.abi_filename.format(name=name))] = content
+        tables[name] = abi_tables(abi)
+
+    for target in targets:
+        if target.tables_path:
+            files[_resolve(project_dir, target.tables_path)] = _dump(dict(sorted(tables.items())))
+        if addresses is not None and target.addresses_path:
+            files[_resolve(project_dir, target.addresses_path)] = _dump({"network": network, **addresses})
+        if addresses is not None and chain_id is not None and target.deployments_path:
+            path = _resolve(project_dir, target.deployments_path)
+            deployments = _load_json(path, {})
+            deployments[str(chain_id)] = {"network": network, **addresses}
+            files[path] = _dump(dict(sorted(deployments.items(), key=lambda item: int(item[0]))))
+
+    written, unchanged = [], []
+    new_outputs = {path: record for path, record in outputs.items() if path not in files}
+    for path, content in sorted(files.items()):
+        digest = _hash(content)
+        record = outputs.get(path)
+        if record is not None and record[0] == digest and _is_recorded(path, record):
+            unchanged.append(path)
+            new_outputs[path] = record
+            continue
+        # Not written by us (or touched since): compare with what is on disk before rewriting it
+        if _file_hash(path) == digest:
+            unchanged.append(path)
+        else:
+            _write(path, content)
+            written.append(path)
+        stat = os.stat(path)
+        new_outputs[path] = [digest, stat.st_size, stat.st_mtime_ns]
+
+    _write(state_path, json.dumps({"inputs": inputs, "outputs": new_outputs}))
+    return ExportResult(written, unchanged, parsed=True)
+
+
+def _resolve(project_dir: str, *parts: str) -> str:
+    return os.path.normpath(os.path.join(project_dir, *parts))
+
+
+def _dump(value: Any) -> str:
+    # Same layout as the files saved by hand so far: 4-space indent, no trailing newline
+    return json.dumps(value, indent=4)
+
+
+def _hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return _hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _is_recorded(path: str, record: List[Any]) -> bool:
+    """Whether ``path`` still has the size and modification time recorded when it was written."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return [stat.st_size, stat.st_mtime_ns] == record[1:]
+
+
+def _write(path: str, content: str) -> None:
+    # Write next to the target and rename, so a reader never sees a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _load_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
@@ -0,0 +1,191 @@
+"""
+Streaming mode for the rental indexer.
+
+``RentalFollower`` tails new blocks, folds their NFTFlex logs into a
+``RentalStore`` and pushes one ``RentalDiff`` per changed rental to its
+subscribers. Blocks are only applied once they are ``confirmations`` deep, and
+when the parent hash of a new block does not match the recorded chain, the
+store is rolled back to the common ancestor and the reverted rentals are
+published as diffs too.
+"""
+import asyncio
+import inspect
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional
+
+from nftflex.abi import EventDecoder, to_hex
+from nftflex.indexer import INDEXED_EVENTS, RentalIndexer, RentalStore
+
+
+class RentalDiff(NamedTuple):
+    """
+    Change of one rental caused by a block (or by rolling it back).
+
+    ``before`` is None for a new rental and ``after`` is None for a rental whose
+    creation was rolled back.
+    """
+    rental_id: int
+    before: Optional[Dict[str, Any]]
+    after: Optional[Dict[str, Any]]
+    block_number: int
+    reverted: bool = False
+
+
+class ReorgTooDeep(Exception):
+    """Raised when a reorg goes past the blocks whose hashes are still tracked."""
+
+
+class RentalFollower:
+    """
+    Follows the chain head and keeps a ``RentalStore`` in sync block by block.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        address (str): Address of the NFTFlex contract.
+        store (RentalStore): The store to update.
+        confirmations (int): Only apply blocks at least this many blocks below the head.
+        poll_interval (float): Seconds between polls of the chain head.
+        max_reorg_depth (int): Number of recent block hashes kept for rolling back.
+        start_block (int): First block to index on an empty store.
+        decoder (Optional[EventDecoder]): Decoder for the NFTFlex ABI (loaded from ``abis/`` by default).
+    """
+
+    def __init__(self, web3, address: str, store: RentalStore, confirmations: int = 2,
+                 poll_interval: float = 1.0, max_reorg_depth: int = 128, start_block: int = 0,
+                 decoder: Optional[EventDecoder] = None):
+        self.web3 = web3
+        self.store = store
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.max_reorg_depth = max_reorg_depth
+        self.decoder = decoder or EventDecoder.for_contract("NFTFlex", INDEXED_EVENTS)
+        self.indexer = RentalIndexer(web3, address, store, self.decoder, start_block=start_block)
+        self._subscribers: List[Callable[[RentalDiff], Any]] = []
+        self._stopped = False
+
+    def subscribe(self, callback: Callable[[RentalDiff], Any]) -> Callable[[], None]:
+        """
+        Call ``callback`` (a function or a coroutine function) with every diff.
+
+        Returns:
+            Callable[[], None]: Removes the subscription.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def stop(self) -> None:
+        """Make ``run`` and ``diffs`` return after the current poll."""
+        self._stopped = True
+
+    async def poll(self) -> List[RentalDiff]:
+        """
+        Apply every newly confirmed block and notify the subscribers.
+
+        Returns:
+            List[RentalDiff]: The diffs published by this poll.
+        """
+        diffs = await asyncio.to_thread(self._catch_up)
+        for diff in diffs:
+            for callback in list(self._subscribers):
+                result = callback(diff)
+                if inspect.isawaitable(result):
+                    await result
+        return diffs
+
+    async def run(self) -> None:
+        """Poll until ``stop`` is called."""
+        self._stopped = False
+        while not self._stopped:
+            await self.poll()
+            await asyncio.sleep(self.poll_interval)
+
+    async def diffs(self) -> AsyncIterator[RentalDiff]:
+        """Async iterator over the diffs, polling until ``stop`` is called."""
+        self._stopped = False
+        while not self._stopped:
+            for diff in await self.poll():
+                yield diff
+            await asyncio.sleep(self.poll_interval)
+
+    def __aiter__(self) -> AsyncIterator[RentalDiff]:
+        return self.diffs()
+
+    def _catch_up(self) -> List[RentalDiff]:
+        head = self.web3.eth.block_number
+        target = head - self.confirmations
+        last_block = self.store.last_block
+        if last_block is None:
+            last_block = self.indexer.start_block - 1
+
+        diffs: List[RentalDiff] = []
+        recorded_tip = self.store.block_hash(last_block)
+        if recorded_tip is not None and (
+            last_block > head or recorded_tip != to_hex(self.web3.eth.get_block(last_block)["hash"])
+        ):
+            # The last applied block was replaced, possibly without any new block on top of it yet
+            ancestor = self._find_common_ancestor(min(last_block, head))
+            diffs.extend(self._rollback(ancestor + 1))
+            last_block = ancestor
+
+        # Backfill in large chunks without publishing diffs; subscribers read the initial state from the store
+        backfill_to = target - self.max_reorg_depth
+        if backfill_to > last_block:
+            self.indexer.sync(to_block=backfill_to)
+            backfill_block = self.web3.eth.get_block(backfill_to)
+            self.store.apply([], backfill_to, to_hex(backfill_block["hash"]), backfill_block["timestamp"])
+            last_block = backfill_to
+
+        block_number = last_block + 1
+        while block_number <= target:
+            block = self.web3.eth.get_block(block_number)
+            block_hash, parent_hash = to_hex(block["hash"]), to_hex(block["parentHash"])
+
+            recorded_parent = self.store.block_hash(block_number - 1)
+            if recorded_parent is not None and recorded_parent != parent_hash:
+                ancestor = self._find_common_ancestor(block_number - 1)
+                diffs.extend(self._rollback(ancestor + 1))
+                block_number = ancestor + 1
+                continue
+
+            block_diffs = self._apply_block(block_number, block_hash, block["timestamp"])
+            if block_diffs is None:
+                # The block changed between the two calls, look at it again on the next poll
+                break
+            diffs.extend(block_diffs)
+            block_number += 1
+
+        self.store.prune_blocks(block_number - self.max_reorg_depth)
+        return diffs
+
+    def _find_common_ancestor(self, block_number: int) -> int:
+        while block_number >= 0:
+            recorded = self.store.block_hash(block_number)
+            if recorded is None:
+                raise ReorgTooDeep(f"Reorg deeper than the {self.max_reorg_depth} tracked blocks")
+            if recorded == to_hex(self.web3.eth.get_block(block_number)["hash"]):
+                return block_number
+            block_number -= 1
+        raise ReorgTooDeep("Reorg reached the genesis block")
+
+    def _rollback(self, block_number: int) -> List[RentalDiff]:
+        touched = self.store.touched_since(block_number)
+        before = {rental_id: self.store.rental(rental_id) for rental_id in touched}
+        self.store.rollback(block_number)
+        return [
+            RentalDiff(rental_id, before[rental_id], self.store.rental(rental_id), block_number, reverted=True)
+            for rental_id in touched
+        ]
+
+    def _apply_block(self, block_number: int, block_hash: str, block_timestamp: int) -> Optional[List[RentalDiff]]:
+        raw_logs = self.indexer.get_logs(block_number, block_number)
+        if any(to_hex(raw_log["blockHash"]) != block_hash for raw_log in raw_logs):
+            return None
+
+        logs = [log for log in map(self.decoder.decode, raw_logs) if log is not None]
+        logs.sort(key=lambda log: log.log_index)
+        touched = self.store.touched_by(logs)
+        before = {rental_id: self.store.rental(rental_id) for rental_id in touched}
+        self.store.apply(logs, block_number, block_hash, block_timestamp)
+        return [
+            RentalDiff(rental_id, before[rental_id], self.store.rental(rental_id), block_number)
+            for rental_id in touched
+        ]
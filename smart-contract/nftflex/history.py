@@ -0,0 +1,154 @@
+"""
+Narrow ``eth_getLogs`` queries for the history of a rental, token or collection.
+
+Every NFTFlex event of a rental has ``rentalId`` as its first topic,
+``NFTFlex__RentalCreated`` also indexes ``nftAddress`` and ``tokenId``, and
+``NFTFlex__Listed`` indexes the owner. The node can therefore do the filtering:
+``EventQuery.rental_history`` fetches the logs of one rental instead of every
+NFTFlex log, ``collection_history`` first finds the listings of a collection and
+then fetches the logs of those rentals only, and ``owner_listings`` finds the
+rentals an owner listed.
+
+Queries span the whole block range at once and are split in halves only when the
+provider rejects them as too large, as narrow filters rarely hit its limits.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from eth_abi import encode
+
+from nftflex.abi import DecodedLog, EventDecoder
+from nftflex.indexer import is_range_error, with_backoff
+
+
+# Rental IDs per OR filter; providers cap the size of a filter, not only of its result
+MAX_TOPIC_VALUES = 500
+
+Topic = Union[None, str, List[str]]
+
+
+def encode_topic(abi_type: str, value: Any) -> str:
+    """The topic of an indexed value of a static type, as a 0x-prefixed hex string."""
+    return "0x" + encode([abi_type], [value]).hex()
+
+
+class EventQuery:
+    """
+    Topic-filtered log queries on an NFTFlex contract.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        address (str): Address of the NFTFlex contract.
+        decoder (Optional[EventDecoder]): Decoder for the NFTFlex ABI (loaded from ``abis/`` by default).
+        start_block (int): First block to search (the deployment block).
+        rate_limit_retries (int): Retries of a rate limited ``eth_getLogs`` call, with exponential backoff.
+        rate_limit_delay (float): Seconds to wait before the first retry.
+    """
+
+    def __init__(self, web3, address: str, decoder: Optional[EventDecoder] = None, start_block: int = 0,
+                 rate_limit_retries: int = 5, rate_limit_delay: float = 1.0):
+        self.web3 = web3
+        self.address = address
+        self.decoder = decoder or EventDecoder.for_contract("NFTFlex")
+        self.start_block = start_block
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limit_delay = rate_limit_delay
+        self.requests = 0
+        self.raw_logs = 0
+
+        self._topics_by_name = {event["name"]: topic for topic, event in self.decoder.events.items()}
+        # The events filtered by rental: those whose first topic is the rental ID
+        self.rental_topics = [
+            topic for topic, event in self.decoder.events.items()
+            if event["inputs"] and event["inputs"][0]["name"] == "rentalId" and event["inputs"][0].get("indexed")
+        ]
+
+    def topic(self, event_name: str) -> str:
+        """Topic0 of an NFTFlex event."""
+        return self._topics_by_name[event_name]
+
+    def logs(self, topics: Sequence[Topic], from_block: Optional[int] = None,
+             to_block: Optional[int] = None) -> List[DecodedLog]:
+        """
+        Fetch and decode the NFTFlex logs matching ``topics``, in chain order.
+
+        Args:
+            topics (Sequence[Topic]): The ``eth_getLogs`` topic filter: per position a topic, a
+                list of alternatives or None for any.
+            from_block (Optional[int]): First block to search, ``start_block`` by default.
+            to_block (Optional[int]): Last block to search, the chain head by default.
+
+        Returns:
+            List[DecodedLog]: The decoded logs.
+        """
+        from_block = self.start_block if from_block is None else from_block
+        to_block = self.web3.eth.block_number if to_block is None else to_block
+        raw_logs = self._get_logs(list(topics), from_block, to_block)
+        logs = [log for log in map(self.decoder.decode, raw_logs) if log is not None]
+        logs.sort(key=lambda log: (log.block_number, log.log_index))
+        return logs
+
+    def rental_history(self, rental_ids: Union[int, Iterable[int]], from_block: Optional[int] = None,
+                       to_block: Optional[int] = None) -> List[DecodedLog]:
+        """Every event of one or more rentals, in chain order."""
+        if isinstance(rental_ids, int):
+            rental_ids = [rental_ids]
+        rental_topics = sorted({encode_topic("uint256", rental_id) for rental_id in rental_ids})
+        logs: List[DecodedLog] = []
+        for i in range(0, len(rental_topics), MAX_TOPIC_VALUES):
+            logs.extend(self.logs([self.rental_topics, rental_topics[i:i + MAX_TOPIC_VALUES]], from_block, to_block))
+        logs.sort(key=lambda log: (log.block_number, log.log_index))
+        return logs
+
+    def listings(self, nft_address: str, token_ids: Optional[Iterable[int]] = None, from_block: Optional[int] = None,
+                 to_block: Optional[int] = None) -> List[DecodedLog]:
+        """
+        The ``NFTFlex__RentalCreated`` logs of a collection.
+
+        Args:
+            nft_address (str): The collection.
+            token_ids (Optional[Iterable[int]]): Only these tokens (all of them by default).
+            from_block (Optional[int]): First block to search, ``start_block`` by default.
+            to_block (Optional[int]): Last block to search, the chain head by default.
+
+        Returns:
+            List[DecodedLog]: One log per listing, in chain order.
+        """
+        token_topics: Topic = None
+        if token_ids is not None:
+            token_topics = sorted({encode_topic("uint256", token_id) for token_id in token_ids})
+        return self.logs([self.topic("NFTFlex__RentalCreated"), None, encode_topic("address", nft_address),
+                          token_topics], from_block, to_block)
+
+    def owner_listings(self, owner: str, from_block: Optional[int] = None,
+                       to_block: Optional[int] = None) -> List[DecodedLog]:
+        """The ``NFTFlex__Listed`` logs of the rentals ``owner`` listed, in chain order."""
+        return self.logs([self.topic("NFTFlex__Listed"), encode_topic("address", owner)], from_block, to_block)
+
+    def collection_history(self, nft_address: str, token_ids: Optional[Iterable[int]] = None,
+                           from_block: Optional[int] = None, to_block: Optional[int] = None) -> List[DecodedLog]:
+        """Every event of the rentals of a collection (or of some of its tokens), in chain order."""
+        to_block = self.web3.eth.block_number if to_block is None else to_block
+        listings = self.listings(nft_address, token_ids, from_block, to_block)
+        if not listings:
+            return []
+        first_block = min(log.block_number for log in listings)
+        return self.rental_history([log.args["rentalId"] for log in listings], first_block, to_block)
+
+    def _get_logs(self, topics: List[Topic], from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        if from_block > to_block:
+            return []
+        self.requests += 1
+        try:
+            raw_logs = with_backoff(lambda: self.web3.eth.get_logs({
+                "address": self.address,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": topics,
+            }), self.rate_limit_retries, self.rate_limit_delay)
+        except Exception as e:
+            if from_block == to_block or not is_range_error(e):
+                raise
+            middle = (from_block + to_block) // 2
+            return self._get_logs(topics, from_block, middle) + self._get_logs(topics, middle + 1, to_block)
+        self.raw_logs += len(raw_logs)
+        return list(raw_logs)
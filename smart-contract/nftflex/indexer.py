@@ -0,0 +1,646 @@
+"""
+Off-chain index of NFTFlex rentals built from contract logs.
+
+``RentalIndexer`` pulls the NFTFlex events with ``eth_getLogs`` in large block
+ranges and folds them into a ``RentalStore`` (SQLite). The last indexed block is
+persisted with the data, so restarting the indexer only fetches new blocks.
+"""
+import json
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+from nftflex.abi import DecodedLog, EventDecoder
+from nftflex.rentals import RentalStatus
+
+
+INDEXED_EVENTS = [
+    "NFTFlex__RentalCreated",
+    "NFTFlex__RentalStarted",
+    "NFTFlex__RentalEnded",
+    "NFTFlex__EarningsWithdrawn",
+    "NFTFlex__SharesRented",
+    "NFTFlex__PriceUpdated",
+    "NFTFlex__BalanceWithdrawn",
+    "NFTFlex__Delisted",
+    "NFTFlex__OrderFilled",
+]
+
+# Fragments of the error messages providers return when a getLogs query is too large, e.g. Infura's
+# "query returned more than 10000 results" (-32005), Alchemy's "Log response size exceeded" and the
+# "block range is too large" / "exceed maximum block range" of most others
+RANGE_ERROR_HINTS = ("more than", "block range", "response size", "-32005")
+# Fragments of the errors of rate limited requests (HTTP 429). They are retried as they are: splitting
+# the block range would only send more requests
+RATE_LIMIT_HINTS = ("too many requests", "rate limit", "rate exceeded", "request rate", "compute units per second")
+
+T = TypeVar("T")
+
+# Version of the rentals table and of the way events fold into it. Bump it with any change to either:
+# a store of another version rebuilds the table from its events when it is opened
+SCHEMA_VERSION = 5
+# Stores older than this did not index every event the rentals table is folded from: they are emptied
+# when opened and indexed again from the chain
+MIN_SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    transaction_hash TEXT NOT NULL,
+    rental_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS events_rental_id ON events (rental_id);
+CREATE TABLE IF NOT EXISTS blocks (
+    number INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+-- withdrawAll calls, which belong to an owner and payment token rather than to a rental
+CREATE TABLE IF NOT EXISTS withdrawals (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    token TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS withdrawals_owner_token ON withdrawals (owner, token, block_number, log_index);
+"""
+
+RENTALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rentals (
+    rental_id INTEGER PRIMARY KEY,
+    nft_address TEXT NOT NULL,
+    token_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    renter TEXT,
+    -- available, rented or delisted (withdrawn with delistRental, or a filled order's listing that ended)
+    status TEXT NOT NULL,
+    price_per_hour TEXT NOT NULL,
+    is_fractional INTEGER NOT NULL,
+    collateral_token TEXT,
+    collateral_amount TEXT,
+    start_time INTEGER NOT NULL DEFAULT 0,
+    end_time INTEGER NOT NULL DEFAULT 0,
+    pending_withdrawal INTEGER NOT NULL DEFAULT 0,
+    -- Listed by fillListing: the listing is single use
+    from_order INTEGER NOT NULL DEFAULT 0,
+    -- Position of the RentalStarted log that credited the pending earnings
+    credited_block INTEGER NOT NULL DEFAULT 0,
+    credited_log_index INTEGER NOT NULL DEFAULT 0,
+    times_rented INTEGER NOT NULL DEFAULT 0,
+    total_earnings TEXT NOT NULL,
+    created_block INTEGER NOT NULL,
+    updated_block INTEGER NOT NULL
+);
+-- Per owner and renter by status, so dashboards do not scan every rental of a status
+CREATE INDEX IF NOT EXISTS rentals_owner_status ON rentals (owner, status, end_time);
+CREATE INDEX IF NOT EXISTS rentals_renter_status ON rentals (renter, status, end_time);
+CREATE INDEX IF NOT EXISTS rentals_nft_address ON rentals (nft_address, token_id);
+CREATE INDEX IF NOT EXISTS rentals_status ON rentals (status, end_time);
+CREATE INDEX IF NOT EXISTS rentals_price ON rentals (price_per_hour);
+CREATE INDEX IF NOT EXISTS rentals_collateral_token ON rentals (collateral_token, price_per_hour);
+"""
+
+AMOUNT_COLUMNS = ("token_id", "price_per_hour", "collateral_amount", "total_earnings")
+
+
+def encode_uint(value: int) -> str:
+    """
+    Store a uint256 as fixed-width decimal text.
+
+    SQLite integers are 64-bit, and zero padding keeps ``ORDER BY`` and range
+    comparisons numeric.
+    """
+    return f"{value:078d}"
+
+
+class RentalStore:
+    """
+    SQLite store of decoded NFTFlex events and the rental state folded from them.
+
+    The events are the source of truth: a store written by a version with another
+    ``SCHEMA_VERSION`` rebuilds its rentals table from them when it is opened, and
+    one older than ``MIN_SCHEMA_VERSION`` is emptied so it is indexed again.
+
+    Args:
+        path (str): Database file, or ``":memory:"``.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        # The streaming follower writes from a worker thread; it never uses the store concurrently
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        if self.schema_version is None or self.schema_version < MIN_SCHEMA_VERSION:
+            self._reset()
+        if self.schema_version != SCHEMA_VERSION:
+            self._rebuild_rentals()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def optimize(self) -> None:
+        """
+        Refresh the statistics SQLite plans queries with.
+
+        Without them, queries combining filters may pick the wrong index. Run it
+        after indexing a large range; it samples each index, so it stays fast.
+        """
+        self.connection.execute("PRAGMA analysis_limit = 1000")
+        self.connection.execute("ANALYZE")
+        self.connection.commit()
+
+    @property
+    def schema_version(self) -> Optional[int]:
+        """Version of the rentals table, None for a store written before versions were recorded."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        return int(row["value"]) if row else None
+
+    def _reset(self) -> None:
+        # Also drops the cursor, so the next sync starts from the deployment block
+        self.connection.executescript(
+            "DROP TABLE IF EXISTS rentals; DROP TABLE IF EXISTS events; DROP TABLE IF EXISTS blocks;"
+            "DROP TABLE IF EXISTS withdrawals; DELETE FROM meta;" + SCHEMA
+        )
+
+    def _rebuild_rentals(self) -> None:
+        # The version is written last, so a rebuild cut short starts over on the next open
+        self.connection.executescript("DROP TABLE IF EXISTS rentals;" + RENTALS_SCHEMA)
+        with self.connection:
+            for event in self.connection.execute(
+                "SELECT name, args, block_number, log_index FROM events ORDER BY block_number, log_index"
+            ).fetchall():
+                self._fold(event["name"], json.loads(event["args"]), event["block_number"], event["log_index"])
+            self._settle_withdrawn()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+            )
+
+    @property
+    def last_block(self) -> Optional[int]:
+        """The last block whose logs are fully indexed, or None for an empty store."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        return int(row["value"]) if row else None
+
+    @property
+    def last_block_timestamp(self) -> Optional[int]:
+        """Timestamp of the last indexed block, if it was recorded."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_block_timestamp'").fetchone()
+        return int(row["value"]) if row else None
+
+    def apply(self, logs: Iterable[DecodedLog], last_block: int, block_hash: Optional[str] = None,
+              block_timestamp: Optional[int] = None) -> int:
+        """
+        Fold a chunk of decoded logs into the store and advance the block cursor.
+
+        The chunk is applied in a single transaction, so a crash never leaves the
+        cursor ahead of the data.
+
+        Args:
+            logs (Iterable[DecodedLog]): Logs ordered by block number and log index.
+            last_block (int): Last block covered by the chunk.
+            block_hash (Optional[str]): Hash of ``last_block``, recorded for reorg detection.
+            block_timestamp (Optional[int]): Timestamp of ``last_block``, the chain time the index is current at.
+
+        Returns:
+            int: Number of new logs applied.
+        """
+        applied = 0
+        with self.connection:
+            for log in logs:
+                if log.name == "NFTFlex__BalanceWithdrawn":
+                    applied += self._apply_withdrawal(log)
+                    continue
+                inserted = self.connection.execute(
+                    "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (log.block_number, log.log_index, log.block_hash, log.transaction_hash,
+                     log.args["rentalId"], log.name, json.dumps(log.args)),
+                ).rowcount
+                if inserted:
+                    self._fold(log.name, log.args, log.block_number, log.log_index)
+                    applied += 1
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('last_block', ?)", (str(last_block),)
+            )
+            if block_hash is not None:
+                self.connection.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?)", (last_block, block_hash))
+            if block_timestamp is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('last_block_timestamp', ?)", (str(block_timestamp),)
+                )
+        return applied
+
+    def _apply_withdrawal(self, log: DecodedLog) -> int:
+        inserted = self.connection.execute(
+            "INSERT OR IGNORE INTO withdrawals VALUES (?, ?, ?, ?, ?)",
+            (log.block_number, log.log_index, log.args["owner"], log.args["token"], encode_uint(log.args["amount"])),
+        ).rowcount
+        if inserted:
+            # withdrawAll pays out the earnings of every rental credited so far, see NFTFlex._isPending
+            self.connection.execute(
+                "UPDATE rentals SET pending_withdrawal = 0, updated_block = ? "
+                "WHERE owner = ? AND collateral_token = ? AND pending_withdrawal = 1",
+                (log.block_number, log.args["owner"], log.args["token"]),
+            )
+        return inserted
+
+    def _settle_withdrawn(self) -> None:
+        # Clears the pending earnings a withdrawAll logged after their RentalStarted paid out, as applying it did
+        paid_out_at = (
+            "(SELECT MIN(block_number) FROM withdrawals WHERE withdrawals.owner = rentals.owner "
+            "AND withdrawals.token = rentals.collateral_token "
+            "AND (withdrawals.block_number, withdrawals.log_index) > (rentals.credited_block, rentals.credited_log_index))"
+        )
+        self.connection.execute(
+            f"UPDATE rentals SET pending_withdrawal = 0, updated_block = MAX(updated_block, {paid_out_at}) "
+            f"WHERE pending_withdrawal = 1 AND {paid_out_at} IS NOT NULL"
+        )
+
+    def block_hash(self, block_number: int) -> Optional[str]:
+        """Hash recorded for an applied block, if it is still tracked."""
+        row = self.connection.execute("SELECT hash FROM blocks WHERE number = ?", (block_number,)).fetchone()
+        return row["hash"] if row else None
+
+    def prune_blocks(self, before: int) -> None:
+        """Forget the hashes of blocks below ``before``; they can no longer be rolled back."""
+        with self.connection:
+            self.connection.execute("DELETE FROM blocks WHERE number < ?", (before,))
+
+    def touched_since(self, block_number: int) -> List[int]:
+        """IDs of the rentals with events from ``block_number`` on, or paid out by a ``withdrawAll`` since."""
+        return [row[0] for row in self.connection.execute(
+            "SELECT rental_id FROM events WHERE block_number >= ? "
+            "UNION SELECT rental_id FROM rentals JOIN withdrawals "
+            "ON withdrawals.owner = rentals.owner AND withdrawals.token = rentals.collateral_token "
+            "WHERE withdrawals.block_number >= ? AND rentals.status = 'rented' ORDER BY rental_id",
+            (block_number, block_number),
+        )]
+
+    def touched_by(self, logs: Iterable[DecodedLog]) -> List[int]:
+        """IDs of the rentals applying ``logs`` would change, including those a ``withdrawAll`` pays out."""
+        touched = set()
+        for log in logs:
+            if log.name == "NFTFlex__BalanceWithdrawn":
+                touched.update(row[0] for row in self.connection.execute(
+                    "SELECT rental_id FROM rentals WHERE owner = ? AND collateral_token = ? AND pending_withdrawal = 1",
+                    (log.args["owner"], log.args["token"]),
+                ))
+            else:
+                touched.add(log.args["rentalId"])
+        return sorted(touched)
+
+    def rollback(self, block_number: int) -> List[int]:
+        """
+        Undo everything indexed from ``block_number`` on.
+
+        Events of the dropped blocks are deleted and every rental they touched is
+        rebuilt from its remaining events and withdrawals.
+
+        Args:
+            block_number (int): First block to drop.
+
+        Returns:
+            List[int]: IDs of the rentals whose state was rebuilt (or removed).
+        """
+        with self.connection:
+            rental_ids = self.touched_since(block_number)
+            self.connection.execute("DELETE FROM events WHERE block_number >= ?", (block_number,))
+            self.connection.execute("DELETE FROM withdrawals WHERE block_number >= ?", (block_number,))
+            self.connection.execute("DELETE FROM blocks WHERE number >= ?", (block_number,))
+
+            for rental_id in rental_ids:
+                self.connection.execute("DELETE FROM rentals WHERE rental_id = ?", (rental_id,))
+                events = self.connection.execute(
+                    "SELECT name, args, block_number, log_index FROM events WHERE rental_id = ? "
+                    "ORDER BY block_number, log_index",
+                    (rental_id,),
+                ).fetchall()
+                for event in events:
+                    self._fold(event["name"], json.loads(event["args"]), event["block_number"], event["log_index"])
+            self._settle_withdrawn()
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('last_block', ?)", (str(block_number - 1),)
+            )
+        return rental_ids
+
+    def _fold(self, name: str, args: Dict[str, Any], block_number: int, log_index: int) -> None:
+        # Mirrors the state transitions of the NFTFlex contract for each event
+        rental_id = args["rentalId"]
+        if name == "NFTFlex__RentalCreated":
+            self.connection.execute(
+                "INSERT OR REPLACE INTO rentals (rental_id, nft_address, token_id, owner, status, price_per_hour, "
+                "is_fractional, collateral_token, collateral_amount, total_earnings, created_block, updated_block) "
+                "VALUES (?, ?, ?, ?, 'available', ?, ?, ?, ?, ?, ?, ?)",
+                (rental_id, args["nftAddress"], encode_uint(args["tokenId"]), args["owner"],
+                 encode_uint(args["pricePerHour"]), int(args["isFractional"]), args["collateralToken"],
+                 encode_uint(args["collateralAmount"]), encode_uint(0), block_number, block_number),
+            )
+        elif name == "NFTFlex__RentalStarted":
+            # rentNFT credits the owner's ledger with the full rental price
+            row = self.connection.execute(
+                "SELECT price_per_hour, total_earnings FROM rentals WHERE rental_id = ?", (rental_id,)
+            ).fetchone()
+            earned = int(row["price_per_hour"]) * ((args["endTime"] - args["startTime"]) // 3600) if row else 0
+            total = int(row["total_earnings"]) + earned if row else 0
+            self.connection.execute(
+                "UPDATE rentals SET renter = ?, status = 'rented', start_time = ?, end_time = ?, collateral_amount = ?, "
+                "pending_withdrawal = 1, credited_block = ?, credited_log_index = ?, times_rented = times_rented + 1, "
+                "total_earnings = ?, updated_block = ? WHERE rental_id = ?",
+                (args["renter"], args["startTime"], args["endTime"], encode_uint(args["collateralAmount"]),
+                 block_number, log_index, encode_uint(total), block_number, rental_id),
+            )
+        elif name == "NFTFlex__SharesRented":
+            # Fractional rentals stay available; only the earnings credited by rentShares are tracked
+            row = self.connection.execute(
+                "SELECT price_per_hour, total_earnings FROM rentals WHERE rental_id = ?", (rental_id,)
+            ).fetchone()
+            if row:
+                hours = (args["endTime"] - args["startTime"]) // 3600
+                earned = int(row["price_per_hour"]) * hours * len(args["shareIds"])
+                self.connection.execute(
+                    "UPDATE rentals SET times_rented = times_rented + ?, total_earnings = ?, updated_block = ? "
+                    "WHERE rental_id = ?",
+                    (len(args["shareIds"]), encode_uint(int(row["total_earnings"]) + earned), block_number, rental_id),
+                )
+        elif name == "NFTFlex__EarningsWithdrawn":
+            self.connection.execute(
+                "UPDATE rentals SET pending_withdrawal = 0, updated_block = ? WHERE rental_id = ?",
+                (block_number, rental_id),
+            )
+        elif name == "NFTFlex__RentalEnded":
+            self.connection.execute(
+                "UPDATE rentals SET renter = NULL, status = CASE WHEN from_order THEN 'delisted' ELSE 'available' END, "
+                "start_time = 0, end_time = 0, pending_withdrawal = 0, updated_block = ? WHERE rental_id = ?",
+                (block_number, rental_id),
+            )
+        elif name == "NFTFlex__OrderFilled":
+            self.connection.execute(
+                "UPDATE rentals SET from_order = 1, updated_block = ? WHERE rental_id = ?", (block_number, rental_id)
+            )
+        elif name == "NFTFlex__Delisted":
+            self.connection.execute(
+                "UPDATE rentals SET status = 'delisted', updated_block = ? WHERE rental_id = ?",
+                (block_number, rental_id),
+            )
+        elif name == "NFTFlex__PriceUpdated":
+            self.connection.execute(
+                "UPDATE rentals SET price_per_hour = ?, updated_block = ? WHERE rental_id = ?",
+                (encode_uint(args["pricePerHour"]), block_number, rental_id),
+            )
+
+    @staticmethod
+    def _row_to_rental(row: sqlite3.Row) -> Dict[str, Any]:
+        rental = dict(row)
+        for column in AMOUNT_COLUMNS:
+            if rental[column] is not None:
+                rental[column] = int(rental[column])
+        rental["is_fractional"] = bool(rental["is_fractional"])
+        rental["pending_withdrawal"] = bool(rental["pending_withdrawal"])
+        rental["from_order"] = bool(rental["from_order"])
+        return rental
+
+    def rental(self, rental_id: int) -> Optional[Dict[str, Any]]:
+        """Return one rental, or None if it is not indexed."""
+        row = self.connection.execute("SELECT * FROM rentals WHERE rental_id = ?", (rental_id,)).fetchone()
+        return self._row_to_rental(row) if row else None
+
+    def events(self, rental_id: int) -> List[Dict[str, Any]]:
+        """The indexed events of a rental, in chain order."""
+        return [
+            {"name": row["name"], "args": json.loads(row["args"]), "block_number": row["block_number"],
+             "log_index": row["log_index"], "transaction_hash": row["transaction_hash"]}
+            for row in self.connection.execute(
+                "SELECT * FROM events WHERE rental_id = ? ORDER BY block_number, log_index", (rental_id,)
+            )
+        ]
+
+    def rentals(self, owner: Optional[str] = None, renter: Optional[str] = None,
+                nft_address: Optional[str] = None, status: Optional[RentalStatus] = None,
+                now: Optional[int] = None, limit: Optional[int] = None, offset: int = 0,
+                collateral_token: Optional[str] = None, min_price: Optional[int] = None,
+                max_price: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Query rentals, ordered by rental ID.
+
+        Args:
+            owner (Optional[str]): Only rentals listed by this owner.
+            renter (Optional[str]): Only rentals currently held by this renter.
+            nft_address (Optional[str]): Only rentals of this NFT collection.
+            status (Optional[RentalStatus]): Only rentals in this status, as ``NFTFlex.getRentalsByStatus`` defines it.
+            now (Optional[int]): Timestamp used to tell active rentals from expired ones (defaults to the wall clock).
+            limit (Optional[int]): Maximum number of rentals to return.
+            offset (int): Number of matching rentals to skip.
+            collateral_token (Optional[str]): Only rentals paid in this token (the zero address for ETH).
+            min_price (Optional[int]): Only rentals priced at least this much per hour.
+            max_price (Optional[int]): Only rentals priced at most this much per hour.
+
+        Returns:
+            List[Dict[str, Any]]: The matching rentals.
+        """
+        where, params = self._where(owner, renter, nft_address, status, now, collateral_token, min_price, max_price)
+        # Page over the IDs first: sorting the rows of a filter matched through an index is much slower
+        query = (f"SELECT * FROM rentals WHERE rental_id IN "
+                 f"(SELECT rental_id FROM rentals{where} ORDER BY rental_id LIMIT ? OFFSET ?) ORDER BY rental_id")
+        params.extend([-1 if limit is None else limit, offset])
+
+        return [self._row_to_rental(row) for row in self.connection.execute(query, params)]
+
+    def count(self, owner: Optional[str] = None, renter: Optional[str] = None,
+              nft_address: Optional[str] = None, status: Optional[RentalStatus] = None,
+              now: Optional[int] = None, collateral_token: Optional[str] = None,
+              min_price: Optional[int] = None, max_price: Optional[int] = None) -> int:
+        """Number of indexed rentals, or of those matching the filters of ``rentals``."""
+        where, params = self._where(owner, renter, nft_address, status, now, collateral_token, min_price, max_price)
+        return self.connection.execute(f"SELECT COUNT(*) FROM rentals{where}", params).fetchone()[0]
+
+    def total_earnings(self, owner: Optional[str] = None) -> int:
+        """Rental income credited over the indexed history, to ``owner`` or to every owner."""
+        where, params = self._where(owner, None, None, None, None, None, None, None)
+        return sum(int(row[0]) for row in self.connection.execute(f"SELECT total_earnings FROM rentals{where}", params))
+
+    @staticmethod
+    def _where(owner: Optional[str], renter: Optional[str], nft_address: Optional[str],
+               status: Optional[RentalStatus], now: Optional[int], collateral_token: Optional[str],
+               min_price: Optional[int], max_price: Optional[int]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in (("owner", owner), ("renter", renter), ("nft_address", nft_address),
+                              ("collateral_token", collateral_token)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+
+        # Prices are zero padded, so text comparisons are numeric
+        if min_price is not None:
+            clauses.append("price_per_hour >= ?")
+            params.append(encode_uint(min_price))
+        if max_price is not None:
+            clauses.append("price_per_hour <= ?")
+            params.append(encode_uint(max_price))
+
+        if status is not None:
+            now = int(time.time()) if now is None else now
+            if status == RentalStatus.AVAILABLE:
+                # Only the latest listing of an NFT can be rented, a later one replaces it
+                clauses.append("status = 'available' AND rental_id = (SELECT MAX(rental_id) FROM rentals AS latest "
+                               "WHERE latest.nft_address = rentals.nft_address AND latest.token_id = rentals.token_id)")
+            elif status == RentalStatus.ACTIVE:
+                clauses.append("status = 'rented' AND end_time > ?")
+                params.append(now)
+            else:
+                clauses.append("status = 'rented' AND end_time <= ? AND pending_withdrawal = ?")
+                params.extend([now, int(status == RentalStatus.PENDING_WITHDRAWAL)])
+
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class IndexerStats(NamedTuple):
+    """Summary of one ``RentalIndexer.sync`` run."""
+    from_block: int
+    to_block: int
+    logs: int
+    seconds: float
+
+    @property
+    def blocks(self) -> int:
+        return max(0, self.to_block - self.from_block + 1)
+
+    @property
+    def blocks_per_second(self) -> float:
+        return self.blocks / self.seconds if self.seconds > 0 else float("inf")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether a request failed because the provider rate limits the client."""
+    if getattr(getattr(error, "response", None), "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(hint in message for hint in RATE_LIMIT_HINTS)
+
+
+def is_range_error(error: Exception) -> bool:
+    """Whether a getLogs failure looks like the provider rejecting the size of the query."""
+    if is_rate_limit_error(error):
+        return False
+    message = str(error).lower()
+    return any(hint in message for hint in RANGE_ERROR_HINTS)
+
+
+def with_backoff(request: Callable[[], T], retries: int, delay: float) -> T:
+    """
+    Send ``request``, retrying it after ``delay``, ``2 * delay``, ``4 * delay``... seconds while it is rate limited.
+
+    Args:
+        request (Callable[[], T]): The request to send.
+        retries (int): Retries before the rate limit error is raised.
+        delay (float): Seconds to wait before the first retry.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == retries or not is_rate_limit_error(e):
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+class RentalIndexer:
+    """
+    Incrementally indexes NFTFlex logs into a ``RentalStore``.
+
+    The chunk size adapts to the provider: it halves when a query is rejected as
+    too large and doubles again after ``grow_after`` chunks in a row came back well
+    under the target size.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        address (str): Address of the NFTFlex contract.
+        store (RentalStore): Where to fold the logs.
+        decoder (Optional[EventDecoder]): Decoder for the NFTFlex ABI (loaded from ``abis/`` by default).
+        start_block (int): First block to index on an empty store (the deployment block).
+        chunk_size (int): Initial number of blocks per ``eth_getLogs`` call.
+        max_chunk_size (int): Upper bound for the chunk size.
+        target_logs_per_chunk (int): Chunks returning fewer than half this many logs count towards growing.
+        grow_after (int): Number of consecutive small chunks before the chunk size doubles.
+        rate_limit_retries (int): Retries of a rate limited ``eth_getLogs`` call, with exponential backoff.
+        rate_limit_delay (float): Seconds to wait before the first retry.
+    """
+
+    def __init__(self, web3, address: str, store: RentalStore, decoder: Optional[EventDecoder] = None,
+                 start_block: int = 0, chunk_size: int = 2_000, max_chunk_size: int = 100_000,
+                 target_logs_per_chunk: int = 5_000, grow_after: int = 4, rate_limit_retries: int = 5,
+                 rate_limit_delay: float = 1.0):
+        self.web3 = web3
+        self.address = address
+        self.store = store
+        self.decoder = decoder or EventDecoder.for_contract("NFTFlex", INDEXED_EVENTS)
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_logs_per_chunk = target_logs_per_chunk
+        self.grow_after = grow_after
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limit_delay = rate_limit_delay
+        self._small_chunks = 0
+
+    def get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """Fetch the raw NFTFlex logs of a block range, backing off while the provider rate limits us."""
+        return with_backoff(lambda: self.web3.eth.get_logs({
+            "address": self.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [self.decoder.topics],
+        }), self.rate_limit_retries, self.rate_limit_delay)
+
+    def sync(self, to_block: Optional[int] = None) -> IndexerStats:
+        """
+        Index every block from the stored cursor up to ``to_block``.
+
+        Args:
+            to_block (Optional[int]): Last block to index (the chain head by default).
+
+        Returns:
+            IndexerStats: Blocks and logs ingested and the time it took.
+        """
+        last_block = self.store.last_block
+        from_block = self.start_block if last_block is None else last_block + 1
+        to_block = self.web3.eth.block_number if to_block is None else to_block
+        first_block = from_block
+        total_logs = 0
+        started_at = time.perf_counter()
+
+        while from_block <= to_block:
+            chunk_end = min(from_block + self.chunk_size - 1, to_block)
+            try:
+                raw_logs = self.get_logs(from_block, chunk_end)
+            except Exception as e:
+                if self.chunk_size == 1 or not is_range_error(e):
+                    raise
+                self.chunk_size = max(1, self.chunk_size // 2)
+                self._small_chunks = 0
+                continue
+
+            logs = [log for log in map(self.decoder.decode, raw_logs) if log is not None]
+            logs.sort(key=lambda log: (log.block_number, log.log_index))
+            # The chain time of the last block is the clock readers tell active rentals from expired ones with
+            block_timestamp = self.web3.eth.get_block(chunk_end)["timestamp"] if chunk_end == to_block else None
+            total_logs += self.store.apply(logs, chunk_end, block_timestamp=block_timestamp)
+
+            self._small_chunks = self._small_chunks + 1 if len(raw_logs) < self.target_logs_per_chunk // 2 else 0
+            if self._small_chunks >= self.grow_after:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+                self._small_chunks = 0
+            from_block = chunk_end + 1
+
+        return IndexerStats(first_block, to_block, total_logs, time.perf_counter() - started_at)
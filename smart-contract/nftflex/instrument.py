@@ -0,0 +1,383 @@
+"""
+Opt-in JSON-RPC instrumentation of deploy scripts and test runs.
+
+``RpcRecorder`` wraps the ``make_request`` (and ``make_batch_request``) of a
+web3.py provider and records every JSON-RPC call: its method, latency, the size
+of the request and response payloads, the line of project code that made it and
+the phase it ran in. Phases are named, nestable timers::
+
+    recorder = RpcRecorder().install(networks.provider.web3)
+    with phase("deploy"):
+        deploy_contracts(account)
+    recorder.write_reports(".build/instrument")
+
+The recorder keeps running totals per method, phase and caller, so its cost per
+call is a few dictionary updates and one walk up the stack. Reports are a text
+summary, a Chrome trace (``chrome://tracing`` or https://ui.perfetto.dev) and a
+Prometheus text snapshot.
+
+Set ``NFTFLEX_INSTRUMENT=1`` to turn it on for ``ape run deploy`` and ``ape test``
+(see ``from_env``); ``NFTFLEX_INSTRUMENT_DIR`` sets where the reports go.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ENABLE_ENV = "NFTFLEX_INSTRUMENT"
+DIR_ENV = "NFTFLEX_INSTRUMENT_DIR"
+DEFAULT_DIR = os.path.join(".build", "instrument")
+NO_PHASE = "-"
+
+# The project root: calls are attributed to the first frame in a file below it
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+# Index of the running totals kept per (method, phase, caller)
+_CALLS, _ERRORS, _SECONDS, _MAX_SECONDS, _REQUEST_BYTES, _RESPONSE_BYTES = range(6)
+
+_active: Optional["RpcRecorder"] = None
+
+
+def _payload_size(payload: Any) -> int:
+    try:
+        return len(json.dumps(payload, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class RpcRecorder:
+    """
+    Records the JSON-RPC calls of one web3.py provider.
+
+    Args:
+        root (str): Directory whose files calls are attributed to.
+        max_events (int): Calls kept individually for the trace; totals count every call.
+        measure_payloads (bool): Serialize requests and responses to measure their size.
+    """
+
+    def __init__(self, root: str = PROJECT_ROOT, max_events: int = 100_000, measure_payloads: bool = True):
+        self.root = os.path.join(os.path.abspath(root), "")
+        self.max_events = max_events
+        self.measure_payloads = measure_payloads
+        self.totals: Dict[Tuple[str, str, str], List[float]] = {}
+        self.phases: Dict[str, List[float]] = {}  # name -> [runs, seconds]
+        self.events: List[Tuple[str, str, str, float, float, int, int, Optional[str]]] = []
+        self.dropped = 0
+        self.overhead = 0.0
+        self.started_at = time.perf_counter()
+        self._local = threading.local()  # Each thread has its own stack of open phases
+        self._spans: List[Tuple[str, float, float]] = []
+        self._callers: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._provider = None
+        self._saved: Dict[str, Any] = {}
+
+    # -- installing -- #
+
+    def install(self, web3) -> "RpcRecorder":
+        """
+        Wrap the requests of ``web3.provider`` and make this the recorder ``phase`` reports to.
+
+        Returns:
+            RpcRecorder: ``self``, to chain with the constructor.
+        """
+        global _active
+        provider = web3.provider
+        for name, wrap in (("make_request", self._wrap), ("make_batch_request", self._wrap_batch)):
+            if hasattr(provider, name):
+                self._saved[name] = provider.__dict__.get(name)
+                setattr(provider, name, wrap(getattr(provider, name)))
+        self._provider = provider
+        self._reset_caches()
+        _active = self
+        return self
+
+    def uninstall(self) -> None:
+        """Restore the provider's own request functions."""
+        global _active
+        if self._provider is None:
+            return
+        for name, original in self._saved.items():
+            if original is None:
+                del self._provider.__dict__[name]
+            else:
+                setattr(self._provider, name, original)
+        self._reset_caches()
+        self._provider = None
+        self._saved = {}
+        if _active is self:
+            _active = None
+
+    def _reset_caches(self) -> None:
+        # web3.py caches the middleware chain around the bound request function: rebuild it
+        for cache in ("_request_func_cache", "_batch_request_func_cache"):
+            if hasattr(self._provider, cache):
+                setattr(self._provider, cache, (None, None))
+
+    def _wrap(self, make_request):
+        def make_request_recorded(method, params):
+            started_at = time.perf_counter()
+            error = None
+            response = None
+            try:
+                response = make_request(method, params)
+                if isinstance(response, dict) and "error" in response:
+                    error = str(response["error"].get("message", response["error"])
+                                if isinstance(response["error"], dict) else response["error"])
+                return response
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                ended_at = time.perf_counter()
+                self._record(method, params, response, started_at, ended_at, error, sys._getframe(1))
+        return make_request_recorded
+
+    def _wrap_batch(self, make_batch_request):
+        def make_batch_request_recorded(requests):
+            started_at = time.perf_counter()
+            responses = None
+            error = None
+            try:
+                responses = make_batch_request(requests)
+                return responses
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                ended_at = time.perf_counter()
+                # One round trip: its latency is shared equally by the requests it carried
+                share = (ended_at - started_at) / max(len(requests), 1)
+                frame = sys._getframe(1)
+                results = responses if isinstance(responses, list) else [None] * len(requests)
+                for index, ((method, params), response) in enumerate(zip(requests, results)):
+                    start = started_at + index * share
+                    self._record(method, params, response, start, start + share, error, frame)
+        return make_batch_request_recorded
+
+    # -- recording -- #
+
+    def _caller(self, frame) -> str:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            relative = self._callers.get(filename, False)
+            if relative is False:
+                path = os.path.abspath(filename)
+                inside = (path.startswith(self.root) and "site-packages" not in path and path != _THIS_FILE
+                          and os.path.isfile(path))
+                relative = os.path.relpath(path, self.root) if inside else None
+                self._callers[filename] = relative
+            if relative is not None:
+                return f"{relative}:{frame.f_lineno} ({frame.f_code.co_name})"
+            frame = frame.f_back
+        return "<external>"
+
+    def _record(self, method: str, params: Any, response: Any, started_at: float, ended_at: float,
+                error: Optional[str], frame) -> None:
+        mark = time.perf_counter()
+        method = str(method)
+        caller = self._caller(frame)
+        request_bytes = _payload_size(params) if self.measure_payloads else 0
+        response_bytes = _payload_size(response) if self.measure_payloads and response is not None else 0
+        seconds = ended_at - started_at
+        stack = self._stack()
+        current = stack[-1] if stack else NO_PHASE
+        with self._lock:
+            totals = self.totals.get((method, current, caller))
+            if totals is None:
+                totals = self.totals[(method, current, caller)] = [0, 0, 0.0, 0.0, 0, 0]
+            totals[_CALLS] += 1
+            totals[_ERRORS] += error is not None
+            totals[_SECONDS] += seconds
+            totals[_MAX_SECONDS] = max(totals[_MAX_SECONDS], seconds)
+            totals[_REQUEST_BYTES] += request_bytes
+            totals[_RESPONSE_BYTES] += response_bytes
+            if len(self.events) < self.max_events:
+                self.events.append((method, current, caller, started_at, seconds, request_bytes, response_bytes, error))
+            else:
+                self.dropped += 1
+            self.overhead += time.perf_counter() - mark
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase; RPC calls made inside it on the same thread are attributed to it. Phases nest."""
+        stack = self._stack()
+        stack.append(name)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended_at = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                totals = self.phases.setdefault(name, [0, 0.0])
+                totals[0] += 1
+                totals[1] += ended_at - started_at
+                if len(self._spans) < self.max_events:
+                    self._spans.append((name, started_at, ended_at - started_at))
+
+    # -- reports -- #
+
+    def by_method(self) -> Dict[str, List[float]]:
+        """Totals per method: calls, errors, seconds, max seconds, request bytes and response bytes."""
+        return self._group(lambda key: key[0])
+
+    def by_phase(self) -> Dict[str, List[float]]:
+        """Totals of the RPC calls made in each phase."""
+        return self._group(lambda key: key[1])
+
+    def _group(self, key_of) -> Dict[Any, List[float]]:
+        grouped: Dict[Any, List[float]] = {}
+        with self._lock:
+            for key, totals in self.totals.items():
+                group = grouped.setdefault(key_of(key), [0, 0, 0.0, 0.0, 0, 0])
+                for index, value in enumerate(totals):
+                    group[index] = max(group[index], value) if index == _MAX_SECONDS else group[index] + value
+        return grouped
+
+    def summary(self, top: int = 10) -> str:
+        """Text tables of the phases, the methods and the ``top`` callers by time spent in RPC."""
+        rpc_by_phase = self.by_phase()
+        lines = [f"{'phase':<24}{'runs':>6}{'seconds':>10}{'rpc calls':>11}{'rpc seconds':>13}"]
+        for name, (runs, seconds) in self.phases.items():
+            rpc = rpc_by_phase.get(name, [0, 0, 0.0])
+            lines.append(f"{name:<24}{runs:>6}{seconds:>10.3f}{rpc[_CALLS]:>11}{rpc[_SECONDS]:>13.3f}")
+        if NO_PHASE in rpc_by_phase:
+            rpc = rpc_by_phase[NO_PHASE]
+            lines.append(f"{'(no phase)':<24}{'':>6}{'':>10}{rpc[_CALLS]:>11}{rpc[_SECONDS]:>13.3f}")
+
+        lines.append("")
+        lines.append(f"{'method':<32}{'calls':>8}{'errors':>8}{'total ms':>11}{'mean ms':>9}{'max ms':>9}"
+                     f"{'req KiB':>9}{'resp KiB':>10}")
+        methods = sorted(self.by_method().items(), key=lambda item: item[1][_SECONDS], reverse=True)
+        for method, totals in methods:
+            lines.append(
+                f"{method:<32}{totals[_CALLS]:>8}{totals[_ERRORS]:>8}{totals[_SECONDS] * 1000:>11.1f}"
+                f"{totals[_SECONDS] / totals[_CALLS] * 1000:>9.2f}{totals[_MAX_SECONDS] * 1000:>9.2f}"
+                f"{totals[_REQUEST_BYTES] / 1024:>9.1f}{totals[_RESPONSE_BYTES] / 1024:>10.1f}"
+            )
+
+        lines.append("")
+        lines.append(f"{'caller':<56}{'method':<28}{'calls':>8}{'total ms':>11}")
+        with self._lock:
+            callers = sorted(self.totals.items(), key=lambda item: item[1][_SECONDS], reverse=True)[:top]
+        for (method, _, caller), totals in callers:
+            lines.append(f"{caller:<56}{method:<28}{totals[_CALLS]:>8}{totals[_SECONDS] * 1000:>11.1f}")
+
+        calls = sum(totals[_CALLS] for _, totals in methods)
+        lines.append("")
+        lines.append(f"{calls} RPC calls, {self.overhead * 1000:.1f}ms recording overhead"
+                     + (f", {self.dropped} calls left out of the trace" if self.dropped else ""))
+        return "\n".join(lines)
+
+    def trace(self) -> Dict[str, Any]:
+        """The phases and calls as Chrome trace events, in microseconds since the recorder started."""
+        def micros(seconds: float) -> float:
+            return round(seconds * 1e6, 1)
+
+        events = [{"name": name, "cat": "phase", "ph": "X", "ts": micros(started_at - self.started_at),
+                   "dur": micros(seconds), "pid": 0, "tid": 0} for name, started_at, seconds in self._spans]
+        for method, current, caller, started_at, seconds, request_bytes, response_bytes, error in self.events:
+            events.append({
+                "name": method, "cat": "rpc", "ph": "X", "ts": micros(started_at - self.started_at),
+                "dur": micros(seconds), "pid": 0, "tid": 1,
+                "args": {"phase": current, "caller": caller, "request_bytes": request_bytes,
+                         "response_bytes": response_bytes, "error": error},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def prometheus(self) -> str:
+        """A Prometheus text-format snapshot of the totals per method and phase."""
+        def labels(**values: str) -> str:
+            return ",".join(f'{name}="{_escape(value)}"' for name, value in values.items())
+
+        per_series = self._group(lambda key: key[:2])
+        with self._lock:
+            phases = list(self.phases.items())
+
+        metrics = [
+            ("nftflex_rpc_requests_total", "counter", "JSON-RPC requests.", _CALLS),
+            ("nftflex_rpc_errors_total", "counter", "JSON-RPC requests that failed.", _ERRORS),
+            ("nftflex_rpc_latency_seconds_total", "counter", "Total JSON-RPC latency.", _SECONDS),
+            ("nftflex_rpc_latency_max_seconds", "gauge", "Slowest JSON-RPC request.", _MAX_SECONDS),
+            ("nftflex_rpc_request_bytes_total", "counter", "JSON-RPC request payload bytes.", _REQUEST_BYTES),
+            ("nftflex_rpc_response_bytes_total", "counter", "JSON-RPC response payload bytes.", _RESPONSE_BYTES),
+        ]
+        lines = []
+        for name, kind, help_text, index in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, current), series in sorted(per_series.items()):
+                lines.append(f"{name}{{{labels(method=method, phase=current)}}} {_number(series[index])}")
+        lines.append("# HELP nftflex_phase_seconds_total Time spent in each phase.")
+        lines.append("# TYPE nftflex_phase_seconds_total counter")
+        for name, (_, seconds) in phases:
+            lines.append(f"nftflex_phase_seconds_total{{{labels(phase=name)}}} {_number(seconds)}")
+        lines.append("# HELP nftflex_phase_runs_total Times each phase ran.")
+        lines.append("# TYPE nftflex_phase_runs_total counter")
+        for name, (runs, _) in phases:
+            lines.append(f"nftflex_phase_runs_total{{{labels(phase=name)}}} {runs}")
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, directory: str = DEFAULT_DIR) -> Dict[str, str]:
+        """
+        Write ``summary.txt``, ``trace.json`` and ``metrics.prom`` to ``directory``.
+
+        Returns:
+            Dict[str, str]: The path of each report.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {name: os.path.join(directory, name) for name in ("summary.txt", "trace.json", "metrics.prom")}
+        with open(paths["summary.txt"], "w") as f:
+            f.write(self.summary() + "\n")
+        with open(paths["trace.json"], "w") as f:
+            json.dump(self.trace(), f)
+        with open(paths["metrics.prom"], "w") as f:
+            f.write(self.prometheus())
+        return paths
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase with the installed recorder; does nothing when none is installed."""
+    if _active is None:
+        yield
+        return
+    with _active.phase(name):
+        yield
+
+
+def active() -> Optional[RpcRecorder]:
+    """The installed recorder, if any."""
+    return _active
+
+
+def enabled() -> bool:
+    return os.environ.get(ENABLE_ENV) == "1"
+
+
+def from_env(web3) -> Optional[RpcRecorder]:
+    """Install a recorder on ``web3`` when ``NFTFLEX_INSTRUMENT=1``, otherwise return None."""
+    return RpcRecorder().install(web3) if enabled() else None
+
+
+def report_dir() -> str:
+    return os.environ.get(DIR_ENV, DEFAULT_DIR)
@@ -0,0 +1,290 @@
+"""
+Keeper that settles expired rentals.
+
+``ExpiryQueue`` is a min-heap of the active rentals ordered by ``endTime``,
+built from the ``NFTFlex__RentalStarted`` and ``NFTFlex__RentalEnded`` logs.
+``RentalKeeper`` sleeps until the head of the heap expires, then ends every
+due rental with ``settleExpired`` batches sized to a gas budget. The batches are
+sent concurrently through a ``LoadClient``, which records their latency and gas.
+A rental whose settlement fails on its own is tried again later, backing off,
+unless the contract rejected it with one of its custom errors.
+"""
+import asyncio
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from nftflex.abi import EventDecoder, load_abi
+from nftflex.load import LoadClient, TxResult
+
+
+KEEPER_EVENTS = ["NFTFlex__RentalStarted", "NFTFlex__RentalEnded"]
+
+# Shortest rental `rentNFT` accepts: a rental started after the keeper last looked cannot expire sooner
+MIN_RENTAL_SECONDS = 3600
+
+# Fixed cost of a settleExpired transaction and the first guess of the cost per rental, refined from receipts
+SETTLE_BASE_GAS = 30_000
+SETTLE_GAS_PER_RENTAL = 45_000
+MIN_GAS_PER_RENTAL = 10_000
+
+# Chain seconds before a failed settlement of one rental is tried again, doubled after each failure
+RETRY_DELAY = 15
+MAX_RETRY_DELAY = 3600
+
+
+class ExpiryQueue:
+    """
+    Active rentals ordered by end time.
+
+    Ended rentals are dropped lazily: ``discard`` only forgets the rental and its
+    heap entry is skipped once it reaches the top.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int]] = []
+        self._end_times: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._end_times)
+
+    def push(self, rental_id: int, end_time: int) -> None:
+        self._end_times[rental_id] = end_time
+        heapq.heappush(self._heap, (end_time, rental_id))
+
+    def discard(self, rental_id: int) -> None:
+        self._end_times.pop(rental_id, None)
+        if len(self._heap) > 2 * len(self._end_times) + 64:
+            # Mostly stale entries, rebuild instead of letting the heap grow
+            self._heap = [(end_time, rental_id) for rental_id, end_time in self._end_times.items()]
+            heapq.heapify(self._heap)
+
+    def next_expiry(self) -> Optional[int]:
+        """End time of the rental expiring first, or None when the queue is empty."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: int, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Remove and return up to ``limit`` rentals whose end time is at or before ``now``.
+
+        Returns:
+            List[Tuple[int, int]]: ``(rental_id, end_time)`` pairs, earliest first.
+        """
+        expired = []
+        while limit is None or len(expired) < limit:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            end_time, rental_id = heapq.heappop(self._heap)
+            del self._end_times[rental_id]
+            expired.append((rental_id, end_time))
+        return expired
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._end_times.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+
+class RentalKeeper:
+    """
+    Follows the NFTFlex logs and settles rentals as they expire.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        address (str): Address of the NFTFlex contract.
+        private_key (str): Key of the account paying for the settlements.
+        gas_budget (int): Gas limit of one ``settleExpired`` transaction; batches are sized to fit it.
+        start_block (int): First block to read logs from (the deployment block).
+        chunk_size (int): Number of blocks per ``eth_getLogs`` call.
+        max_in_flight (int): Maximum number of settlement transactions sent at once.
+        max_sleep (Optional[float]): Upper bound of one sleep in seconds, for chains whose clock
+            does not follow the wall clock (e.g. a local chain moved with ``chain.mine``).
+        retry_delay (int): Chain seconds before a rental whose settlement failed on its own is tried again,
+            doubled after each failure up to ``MAX_RETRY_DELAY``.
+    """
+
+    def __init__(self, web3, address: str, private_key: str, gas_budget: int = 5_000_000, start_block: int = 0,
+                 chunk_size: int = 2_000, max_in_flight: int = 4, max_sleep: Optional[float] = None,
+                 retry_delay: int = RETRY_DELAY):
+        self.web3 = web3
+        self.address = address
+        self.private_key = private_key
+        self.gas_budget = gas_budget
+        self.chunk_size = chunk_size
+        self.max_sleep = max_sleep
+        self.retry_delay = retry_delay
+        self.gas_per_rental = SETTLE_GAS_PER_RENTAL
+        self.queue = ExpiryQueue()
+        self.settled = 0
+        self.gas_used = 0
+        self.dropped: Dict[int, str] = {}  # rental ID => error that made its settlement fail for good
+        self._failures: Dict[int, int] = {}  # rental ID => failed settlements of it on its own
+
+        abi = load_abi("NFTFlex")
+        self.settle_abi = next(entry for entry in abi if entry.get("name") == "settleExpired")
+        self.decoder = EventDecoder(abi, KEEPER_EVENTS)
+        self.client = LoadClient(web3, [abi], max_workers=max_in_flight, gas_limit=gas_budget)
+        self._last_block = start_block - 1
+        self._stopped = False
+
+    def close(self) -> None:
+        self.client.close()
+
+    @property
+    def batch_size(self) -> int:
+        """Number of rentals that fit in one transaction at the current gas estimate."""
+        return max(1, (self.gas_budget - SETTLE_BASE_GAS) // self.gas_per_rental)
+
+    def sync(self, to_block: Optional[int] = None) -> int:
+        """
+        Fold the rental logs up to ``to_block`` (the chain head by default) into the queue.
+
+        Returns:
+            int: Number of logs read.
+        """
+        to_block = self.web3.eth.block_number if to_block is None else to_block
+        count = 0
+        while self._last_block < to_block:
+            chunk_end = min(self._last_block + self.chunk_size, to_block)
+            raw_logs = self.web3.eth.get_logs({
+                "address": self.address,
+                "fromBlock": self._last_block + 1,
+                "toBlock": chunk_end,
+                "topics": [self.decoder.topics],
+            })
+            logs = [log for log in map(self.decoder.decode, raw_logs) if log is not None]
+            logs.sort(key=lambda log: (log.block_number, log.log_index))
+            for log in logs:
+                if log.name == "NFTFlex__RentalStarted":
+                    self.queue.push(log.args["rentalId"], log.args["endTime"])
+                else:
+                    self.queue.discard(log.args["rentalId"])
+                    self._failures.pop(log.args["rentalId"], None)
+            count += len(logs)
+            self._last_block = chunk_end
+        return count
+
+    async def settle_due(self) -> List[TxResult]:
+        """
+        Catch up with the chain and settle every rental expired at the latest block.
+
+        Returns:
+            List[TxResult]: One result per ``settleExpired`` transaction sent.
+        """
+        now = await asyncio.to_thread(self._sync_head)
+        batches = []
+        while expired := self.queue.pop_expired(now, self.batch_size):
+            batches.append(expired)
+        if not batches:
+            return []
+
+        results = await self.client.gather(*[
+            self.client.send("settleExpired", self.private_key, self.address, self.settle_abi,
+                             [[rental_id for rental_id, _ in batch]])
+            for batch in batches
+        ])
+        for batch, result in zip(batches, results):
+            self._record(batch, result, now)
+        return results
+
+    def seconds_until_due(self, now: int) -> float:
+        """
+        Time until the head of the queue expires, at chain time ``now``.
+
+        Rentals started while the keeper sleeps last at least ``MIN_RENTAL_SECONDS``,
+        so the keeper never has to wake up sooner than that to catch them.
+        """
+        due = now + MIN_RENTAL_SECONDS
+        head = self.queue.next_expiry()
+        if head is not None:
+            due = min(due, head)
+        seconds = max(0, due - now)
+        return seconds if self.max_sleep is None else min(seconds, self.max_sleep)
+
+    async def run(self) -> None:
+        """Settle rentals as they expire until ``stop`` is called."""
+        self._stopped = False
+        while not self._stopped:
+            await self.settle_due()
+            now = await asyncio.to_thread(self._head_timestamp)
+            await asyncio.sleep(self.seconds_until_due(now))
+
+    def stop(self) -> None:
+        """Make ``run`` return after the current settlement round."""
+        self._stopped = True
+
+    def report(self) -> Dict[str, Any]:
+        """Settlement throughput and gas per rental, next to the transaction statistics."""
+        seconds = self.client.stats.seconds
+        return {
+            "rentals_settled": self.settled,
+            "rentals_per_second": round(self.settled / seconds, 3) if seconds > 0 else 0.0,
+            "gas_per_rental": round(self.gas_used / self.settled) if self.settled else 0,
+            "batch_size": self.batch_size,
+            "pending": len(self.queue),
+            "dropped": len(self.dropped),
+            **self.client.stats.report(),
+        }
+
+    def _head_timestamp(self) -> int:
+        return self.web3.eth.get_block("latest")["timestamp"]
+
+    def _sync_head(self) -> int:
+        # Read the head first: every log up to it is folded, so the due rentals are known at its timestamp
+        head = self.web3.eth.get_block("latest")
+        self.sync(head["number"])
+        return head["timestamp"]
+
+    def _record(self, batch: List[Tuple[int, int]], result: TxResult, now: int) -> None:
+        if result.error is not None:
+            if len(batch) > 1:
+                # settleExpired skips the rentals it cannot end, so a batch only reverts when it runs out of gas;
+                # a batch that was not mined (dropped connection, timeout...) is sent again as it is
+                if self._out_of_gas(result):
+                    # Concurrent batches can all run out in one round: never size a rental above the budget
+                    self.gas_per_rental = min(2 * self.gas_per_rental, self._max_gas_per_rental)
+                for rental_id, end_time in batch:
+                    self.queue.push(rental_id, end_time)
+                return
+
+            (rental_id, _), = batch
+            if result.error in self.client.errors.values():
+                # A custom error of the contract: sending the same settlement again cannot succeed
+                self.dropped[rental_id] = result.error
+                self._failures.pop(rental_id, None)
+                return
+            # Dropped connection, timeout, nonce race...: try again later, backing off
+            failures = self._failures.get(rental_id, 0)
+            self._failures[rental_id] = failures + 1
+            self.queue.push(rental_id, now + min(self.retry_delay * 2 ** failures, MAX_RETRY_DELAY))
+            return
+
+        for rental_id, _ in batch:
+            self._failures.pop(rental_id, None)
+
+        settled = sum(
+            1 for raw_log in result.receipt["logs"]
+            if (log := self.decoder.decode(raw_log)) is not None and log.name == "NFTFlex__RentalEnded"
+        )
+        self.settled += settled
+        self.gas_used += result.gas_used
+        if settled == len(batch):
+            # Size the next batches from what this one actually cost
+            estimate = math.ceil((result.gas_used - SETTLE_BASE_GAS) / settled)
+        elif settled:
+            # Rentals ended by someone else were skipped: the cost per settled rental is an upper bound
+            estimate = min(self.gas_per_rental, math.ceil((result.gas_used - SETTLE_BASE_GAS) / settled))
+        else:
+            # Nothing to measure: decay an estimate raised by out-of-gas batches back to the first guess
+            estimate = min(self.gas_per_rental, max(SETTLE_GAS_PER_RENTAL, self.gas_per_rental // 2))
+        self.gas_per_rental = min(max(MIN_GAS_PER_RENTAL, estimate), self._max_gas_per_rental)
+
+    @property
+    def _max_gas_per_rental(self) -> int:
+        # One rental per batch at the gas budget
+        return max(MIN_GAS_PER_RENTAL, self.gas_budget - SETTLE_BASE_GAS)
+
+    def _out_of_gas(self, result: TxResult) -> bool:
+        # Running out of gas burns the whole gas limit of the mined transaction
+        return result.receipt is not None and result.gas_used >= self.gas_budget
@@ -0,0 +1,234 @@
+"""
+Load generation against a local node.
+
+``LoadClient`` signs and sends contract transactions from many accounts at
+once. Each send runs on a worker thread, nonces come from a shared
+``NonceManager`` so an account can have several transactions in flight, and
+every transaction is recorded in ``LoadStats``: submit-to-receipt latency,
+gas used and, for reverted transactions, the name of the custom error.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, List, NamedTuple, Optional, Sequence
+
+from eth_account import Account
+
+from nftflex.abi import encode_call, error_names, to_bytes, to_hex
+from nftflex.metadata import _percentile
+
+
+class NonceManager:
+    """
+    Hands out consecutive nonces per account without asking the node each time.
+
+    Args:
+        web3: A web3.py ``Web3`` instance.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._nonces: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def next(self, address: str) -> int:
+        with self._lock:
+            if address not in self._nonces:
+                self._nonces[address] = self.web3.eth.get_transaction_count(address, "pending")
+            nonce = self._nonces[address]
+            self._nonces[address] = nonce + 1
+            return nonce
+
+    def resync(self, address: str) -> None:
+        """Forget the local nonce of ``address``, e.g. after a transaction could not be sent."""
+        with self._lock:
+            self._nonces.pop(address, None)
+
+
+class TxResult(NamedTuple):
+    """Outcome of one load transaction."""
+    operation: str
+    latency: float
+    gas_used: int
+    error: Optional[str] = None
+    receipt: Optional[Dict[str, Any]] = None
+
+
+class LoadStats:
+    """Latency, gas and revert statistics per operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.results: List[TxResult] = []
+        self.seconds = 0.0  # time spent with transactions in flight
+
+    def record(self, result: TxResult) -> None:
+        with self._lock:
+            self.results.append(result)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarize the run as a JSON friendly dictionary.
+
+        Returns:
+            Dict[str, Any]: Overall throughput, then per operation the transaction and revert
+            counts, submit-to-receipt percentiles (milliseconds), mean gas of the successful
+            transactions and the reverts by error name.
+        """
+        by_operation: Dict[str, List[TxResult]] = defaultdict(list)
+        for result in self.results:
+            by_operation[result.operation].append(result)
+
+        operations = {}
+        for operation, results in by_operation.items():
+            latencies = [result.latency for result in results]
+            gas = [result.gas_used for result in results if result.error is None]
+            errors = Counter(result.error for result in results if result.error is not None)
+            operations[operation] = {
+                "transactions": len(results),
+                "reverted": sum(errors.values()),
+                "revert_rate": round(sum(errors.values()) / len(results), 4),
+                "latency_p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+                "latency_p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+                "latency_p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+                "gas_mean": round(sum(gas) / len(gas)) if gas else 0,
+                "reverts": dict(errors.most_common()),
+            }
+
+        return {
+            "seconds": round(self.seconds, 3),
+            "transactions": len(self.results),
+            "tx_per_second": round(len(self.results) / self.seconds, 3) if self.seconds > 0 else 0.0,
+            "operations": dict(sorted(operations.items())),
+        }
+
+
+class LoadClient:
+    """
+    Sends contract transactions concurrently and records their outcome.
+
+    Args:
+        web3: A web3.py ``Web3`` instance connected to the node under load.
+        abis (Sequence[List[Dict[str, Any]]]): ABIs whose custom errors are used to name reverts.
+        max_workers (int): Maximum number of transactions in flight.
+        gas_limit (int): Gas limit of every transaction (fixed, so reverting calls are still mined).
+        poll_latency (float): Seconds between receipt polls.
+        timeout (float): Seconds to wait for a receipt.
+    """
+
+    def __init__(self, web3, abis: Sequence[List[Dict[str, Any]]] = (), max_workers: int = 64,
+                 gas_limit: int = 500_000, poll_latency: float = 0.05, timeout: float = 120.0):
+        self.web3 = web3
+        self.gas_limit = gas_limit
+        self.poll_latency = poll_latency
+        self.timeout = timeout
+        self.nonces = NonceManager(web3)
+        self.stats = LoadStats()
+        self.errors = error_names(*abis)
+        self.chain_id = web3.eth.chain_id
+        self.gas_price = web3.eth.gas_price
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nftflex-load")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def send(self, operation: str, private_key: str, to: str, abi_entry: Dict[str, Any],
+                   args: Sequence[Any] = (), value: int = 0) -> TxResult:
+        """
+        Send one transaction and wait for its receipt on a worker thread.
+
+        Args:
+            operation (str): Name the transaction is reported under, e.g. ``"rentNFT"``.
+            private_key (str): Key of the sending account.
+            to (str): The contract address.
+            abi_entry (Dict[str, Any]): ABI of the called function.
+            args (Sequence[Any]): The function arguments.
+            value (int): Wei sent along.
+
+        Returns:
+            TxResult: The outcome, also recorded in ``stats``.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._send, operation, private_key, to, abi_entry, args, value
+        )
+
+    async def gather(self, *sends: Awaitable[TxResult]) -> List[TxResult]:
+        """
+        Run ``send`` coroutines concurrently, adding the time they take to ``stats.seconds``.
+
+        Only time spent in ``gather`` counts towards the reported throughput, so setup work
+        between the measured phases does not dilute it.
+        """
+        started_at = time.perf_counter()
+        try:
+            return list(await asyncio.gather(*sends))
+        finally:
+            self.stats.seconds += time.perf_counter() - started_at
+
+    def _send(self, operation: str, private_key: str, to: str, abi_entry: Dict[str, Any],
+              args: Sequence[Any], value: int) -> TxResult:
+        sender = Account.from_key(private_key).address
+        tx = {
+            "chainId": self.chain_id,
+            "to": to,
+            "data": to_hex(encode_call(abi_entry, args)),
+            "value": value,
+            "gas": self.gas_limit,
+            "gasPrice": self.gas_price,
+            "nonce": self.nonces.next(sender),
+        }
+        signed = Account.sign_transaction(tx, private_key)
+
+        submitted_at = time.perf_counter()
+        try:
+            tx_hash = self.web3.eth.send_raw_transaction(signed.raw_transaction)
+            receipt = self.web3.eth.wait_for_transaction_receipt(
+                tx_hash, timeout=self.timeout, poll_latency=self.poll_latency
+            )
+        except Exception as e:
+            # The nonce may or may not have been used, ask the node again for the next one
+            self.nonces.resync(sender)
+            result = TxResult(operation, time.perf_counter() - submitted_at, 0, type(e).__name__)
+            self.stats.record(result)
+            return result
+
+        latency = time.perf_counter() - submitted_at
+        error = None
+        if receipt["status"] == 0:
+            error = self.revert_reason({"from": sender, **tx}, receipt["blockNumber"])
+        result = TxResult(operation, latency, receipt["gasUsed"], error, receipt)
+        self.stats.record(result)
+        return result
+
+    def revert_reason(self, tx: Dict[str, Any], block_number: int) -> str:
+        """
+        Name the error a mined transaction reverted with by replaying it as a call.
+
+        The call runs against the state at the end of ``block_number``, which is the
+        state that made the transaction fail in all but the most contended cases.
+        """
+        call = {key: tx[key] for key in ("from", "to", "data", "value", "gas")}
+        try:
+            self.web3.eth.call(call, block_number)
+        except Exception as e:
+            error_selector = revert_selector(getattr(e, "data", None))
+            if error_selector is None:
+                return type(e).__name__
+            return self.errors.get(error_selector, error_selector)
+        return "Unknown"
+
+
+def revert_selector(data: Any) -> Optional[str]:
+    """Return the 4-byte selector of the revert data attached to a web3 error, if any."""
+    if isinstance(data, dict):
+        data = data.get("data")
+    if not isinstance(data, (str, bytes)):
+        return None
+    try:
+        raw = to_bytes(data)
+    except ValueError:
+        return None
+    return to_hex(raw[:4]) if len(raw) >= 4 else None
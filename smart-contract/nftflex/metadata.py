@@ -0,0 +1,346 @@
+"""
+Cached lookups of NFT metadata referenced by ``tokenURI``.
+
+IPFS content is immutable, so metadata behind an ``ipfs://`` URI is cached by
+CID: first in an in-memory LRU, then in a directory of JSON files that survives
+restarts. Concurrent requests for the same URI share one gateway fetch, and
+fetches run on a bounded thread pool.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+
+DEFAULT_GATEWAY = "https://ipfs.io/ipfs/"  # Same gateway as httpGateway() in the client
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+SHA2_256_MULTIHASH = b"\x12\x20"  # sha2-256, 32 bytes: the prefix of every CIDv0
+LATENCY_WINDOW = 10_000  # Latest samples kept per latency series for the percentiles
+
+
+def ipfs_path(uri: str) -> Optional[str]:
+    """
+    Return the ``<cid>[/path]`` part of an IPFS URI, or None if the URI is not content addressed.
+
+    Both ``ipfs://<cid>`` and gateway URLs such as ``https://ipfs.io/ipfs/<cid>`` are recognised.
+    """
+    if uri.startswith("ipfs://"):
+        path = uri[len("ipfs://"):]
+        return path[len("ipfs/"):] if path.startswith("ipfs/") else path
+    if "/ipfs/" in uri:
+        return uri.split("/ipfs/", 1)[1]
+    return None
+
+
+def gateway_url(uri: str, gateway: str = DEFAULT_GATEWAY) -> str:
+    """Convert an ``ipfs://`` URI to an HTTP URL on ``gateway``; other URIs are returned as is."""
+    if uri.startswith("ipfs://"):
+        return gateway.rstrip("/") + "/" + ipfs_path(uri)
+    return uri
+
+
+def cid_digest(uri: str) -> Optional[bytes]:
+    """
+    Return the 32-byte digest of an ``ipfs://<CIDv0>`` URI, or None if the URI has any other form.
+
+    ``SimpleNFT.mintCompact`` stores only this digest and rebuilds the exact same URI in ``tokenURI``.
+    """
+    if not uri.startswith("ipfs://Qm") or len(uri) != len("ipfs://") + 46:
+        return None
+    number = 0
+    for char in uri[len("ipfs://"):]:
+        index = BASE58_ALPHABET.find(char)
+        if index < 0:
+            return None
+        number = number * 58 + index
+    multihash = number.to_bytes(34, "big") if number < 1 << 272 else b""
+    return multihash[2:] if multihash[:2] == SHA2_256_MULTIHASH else None
+
+
+def cid_url(digest: bytes) -> str:
+    """The ``ipfs://<CIDv0>`` URI of a sha2-256 digest, as ``SimpleNFT.tokenURI`` returns it."""
+    number = int.from_bytes(SHA2_256_MULTIHASH + digest, "big")
+    chars = []
+    while number:
+        number, index = divmod(number, 58)
+        chars.append(BASE58_ALPHABET[index])
+    return "ipfs://" + "".join(reversed(chars))
+
+
+def _percentile(values: Iterable[float], percentile: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache.
+
+    Args:
+        max_size (int): Number of entries kept before the least recently used one is evicted.
+    """
+
+    def __init__(self, max_size: int = 1_024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Directory of JSON documents keyed by IPFS path.
+
+    Args:
+        directory (str): Where to store the documents (created if missing).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # CIDs are filesystem safe but paths inside a directory CID are not
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+
+class MetadataMetrics:
+    """
+    Counters and latencies of a ``MetadataService``.
+
+    Counters cover the whole life of the service; percentiles cover the latest ``window`` lookups and
+    fetches, so a long running service keeps a bounded amount of samples.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.errors = 0
+        self.lookup_latencies: Deque[float] = deque(maxlen=window)
+        self.fetch_latencies: Deque[float] = deque(maxlen=window)
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def observe(self, latencies: str, seconds: float) -> None:
+        with self._lock:
+            getattr(self, latencies).append(seconds)
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of requests answered without a gateway fetch of their own."""
+        if not self.requests:
+            return 0.0
+        return (self.memory_hits + self.disk_hits + self.coalesced) / self.requests
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the metrics as a JSON friendly dictionary (latencies in milliseconds)."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "coalesced": self.coalesced,
+                "fetches": self.fetches,
+                "errors": self.errors,
+                "hit_rate": round(self.hit_rate, 4),
+                "lookup_p50_ms": round(_percentile(self.lookup_latencies, 0.50) * 1000, 3),
+                "lookup_p95_ms": round(_percentile(self.lookup_latencies, 0.95) * 1000, 3),
+                "fetch_p50_ms": round(_percentile(self.fetch_latencies, 0.50) * 1000, 3),
+                "fetch_p95_ms": round(_percentile(self.fetch_latencies, 0.95) * 1000, 3),
+            }
+
+
+class MetadataService:
+    """
+    Resolves metadata URIs through a memory LRU, a disk cache and an IPFS gateway.
+
+    Only IPFS URIs are cached, since other URLs may change. Failed fetches are
+    not cached.
+
+    Args:
+        cache_dir (Optional[str]): Directory of the disk cache (memory only if None).
+        gateway (str): IPFS HTTP gateway used for ``ipfs://`` URIs.
+        max_workers (int): Maximum number of concurrent fetches.
+        memory_size (int): Number of documents kept in memory.
+        timeout (float): HTTP timeout in seconds.
+        fetch (Optional[Callable[[str], Any]]): Replaces the HTTP fetch of a URL.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, gateway: str = DEFAULT_GATEWAY, max_workers: int = 8,
+                 memory_size: int = 1_024, timeout: float = 10.0, fetch: Optional[Callable[[str], Any]] = None):
+        self.gateway = gateway
+        self.timeout = timeout
+        self.memory = LRUCache(memory_size)
+        self.disk = DiskCache(cache_dir) if cache_dir else None
+        self.metrics = MetadataMetrics()
+        self._fetch = fetch or self._http_fetch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nftflex-metadata")
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "MetadataService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _http_fetch(self, url: str) -> Any:
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def get(self, uri: str) -> Any:
+        """
+        Return the metadata document behind ``uri``.
+
+        Args:
+            uri (str): A ``tokenURI`` value (``ipfs://`` or HTTP).
+
+        Returns:
+            Any: The decoded JSON document.
+        """
+        started_at = time.perf_counter()
+        key = ipfs_path(uri)
+        self.metrics.count("requests")
+
+        if key is not None:
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.metrics.count("memory_hits")
+                self.metrics.observe("lookup_latencies", time.perf_counter() - started_at)
+                return cached
+
+        coalesce_key = key if key is not None else uri
+        with self._lock:
+            future = self._in_flight.get(coalesce_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[coalesce_key] = future
+
+        if not owner:
+            result = future.result()
+            self.metrics.count("coalesced")
+            self.metrics.observe("lookup_latencies", time.perf_counter() - started_at)
+            return result
+
+        try:
+            result = self._load(key, uri)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            self.metrics.count("errors")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[coalesce_key]
+            self.metrics.observe("lookup_latencies", time.perf_counter() - started_at)
+
+    def _load(self, key: Optional[str], uri: str) -> Any:
+        if key is not None and self.disk is not None:
+            cached = self.disk.get(key)
+            if cached is not None:
+                self.metrics.count("disk_hits")
+                self.memory.put(key, cached)
+                return cached
+
+        fetch_started_at = time.perf_counter()
+        document = self._fetch(gateway_url(uri, self.gateway))
+        self.metrics.count("fetches")
+        self.metrics.observe("fetch_latencies", time.perf_counter() - fetch_started_at)
+
+        if key is not None:
+            self.memory.put(key, document)
+            if self.disk is not None:
+                self.disk.put(key, document)
+        return document
+
+    def get_many(self, uris: Iterable[str]) -> List[Optional[Any]]:
+        """
+        Resolve several URIs concurrently on the worker pool.
+
+        Returns:
+            List[Optional[Any]]: Documents in the order of ``uris``; None where the fetch failed.
+        """
+        futures = [self._executor.submit(self.get, uri) for uri in uris]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                results.append(None)
+        return results
+
+    def prefetch(self, nft_contract, token_ids: Iterable[int]) -> Dict[int, Optional[Any]]:
+        """
+        Look up the ``tokenURI`` of every token and warm the cache with its metadata.
+
+        Args:
+            nft_contract: The NFT contract (an ape contract instance or anything with ``tokenURI``).
+            token_ids (Iterable[int]): Tokens to prefetch.
+
+        Returns:
+            Dict[int, Optional[Any]]: Metadata per token ID; None where the token or its metadata is missing.
+        """
+        token_ids = list(token_ids)
+
+        def token_uri(token_id: int) -> Optional[str]:
+            try:
+                return nft_contract.tokenURI(token_id)
+            except Exception:
+                return None
+
+        uris = list(self._executor.map(token_uri, token_ids))
+        found = [(token_id, uri) for token_id, uri in zip(token_ids, uris) if uri]
+        documents = self.get_many(uri for _, uri in found)
+
+        metadata: Dict[int, Optional[Any]] = {token_id: None for token_id in token_ids}
+        metadata.update({token_id: document for (token_id, _), document in zip(found, documents)})
+        return metadata
@@ -0,0 +1,389 @@
+"""
+Gasless listings: EIP-712 listing orders and an in-memory order book.
+
+Instead of sending ``createRental``, an owner signs a ``ListingOrder`` with the
+same terms off-chain. Whoever wants to rent the NFT sends the order and the
+signature to ``fillListing``, which lists and rents it in one transaction.
+
+``OrderBook`` keeps the signed orders waiting for a renter. Orders are indexed by
+collection and payment token in price order, so the cheapest order or every
+order in a price range is found with a binary search. Filled and cancelled
+orders are dropped from the ``NFTFlex__OrderFilled`` and
+``NFTFlex__OrdersCancelled`` logs; ``refresh`` re-checks the rest on chain.
+"""
+import bisect
+import itertools
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from eth_utils import keccak, to_checksum_address
+
+from nftflex.abi import DecodedLog
+from nftflex.reads import ReadError, batch
+
+
+ORDER_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "ListingOrder": [
+        {"name": "owner", "type": "address"},
+        {"name": "nftAddress", "type": "address"},
+        {"name": "tokenId", "type": "uint256"},
+        {"name": "pricePerHour", "type": "uint256"},
+        {"name": "isFractional", "type": "bool"},
+        {"name": "collateralToken", "type": "address"},
+        {"name": "collateralAmount", "type": "uint256"},
+        {"name": "nonce", "type": "uint256"},
+        {"name": "deadline", "type": "uint256"},
+    ],
+}
+
+# NFTFlex's EIP-712 domain, see its constructor
+DOMAIN_NAME = "NFTFlex"
+DOMAIN_VERSION = "1"
+
+ORDER_TYPEHASH = keccak(
+    b"ListingOrder(address owner,address nftAddress,uint256 tokenId,uint256 pricePerHour,bool isFractional,"
+    b"address collateralToken,uint256 collateralAmount,uint256 nonce,uint256 deadline)"
+)
+
+# `_createRental` stores prices and collateral in 96 bits
+MAX_AMOUNT = 2 ** 96 - 1
+
+OWNER_OF_ABI = [
+    {
+        "type": "function", "name": "ownerOf", "stateMutability": "view",
+        "inputs": [{"name": "tokenId", "type": "uint256"}],
+        "outputs": [{"name": "", "type": "address"}],
+    },
+]
+
+
+class OrderError(ValueError):
+    """Raised by ``OrderBook.add`` for an order ``fillListing`` would reject."""
+
+
+class ListingOrder(NamedTuple):
+    """The terms of ``createRental``, plus who lists, a nonce and a deadline."""
+    owner: str
+    nft_address: str
+    token_id: int
+    price_per_hour: int
+    is_fractional: bool
+    collateral_token: str
+    collateral_amount: int
+    nonce: int
+    deadline: int
+
+    def message(self) -> Dict[str, Any]:
+        """The order as an EIP-712 message."""
+        return {
+            "owner": self.owner,
+            "nftAddress": self.nft_address,
+            "tokenId": self.token_id,
+            "pricePerHour": self.price_per_hour,
+            "isFractional": self.is_fractional,
+            "collateralToken": self.collateral_token,
+            "collateralAmount": self.collateral_amount,
+            "nonce": self.nonce,
+            "deadline": self.deadline,
+        }
+
+
+class SignedOrder(NamedTuple):
+    """An order in the book; pass ``order`` and ``signature`` on to ``fillListing``."""
+    order: ListingOrder
+    signature: bytes
+    hash: bytes
+
+
+def order_typed_data(order: ListingOrder, chain_id: int, nft_flex_address: str) -> Dict[str, Any]:
+    """The EIP-712 message of a listing order."""
+    return {
+        "types": ORDER_TYPES,
+        "primaryType": "ListingOrder",
+        "domain": {
+            "name": DOMAIN_NAME,
+            "version": DOMAIN_VERSION,
+            "chainId": chain_id,
+            "verifyingContract": nft_flex_address,
+        },
+        "message": order.message(),
+    }
+
+
+@lru_cache(maxsize=None)
+def domain_separator(chain_id: int, nft_flex_address: str) -> bytes:
+    """NFTFlex's EIP-712 domain separator on ``chain_id``."""
+    nft_flex_address = to_checksum_address(nft_flex_address)
+    signable = encode_typed_data(full_message=order_typed_data(
+        ListingOrder(nft_flex_address, nft_flex_address, 0, 0, False, nft_flex_address, 0, 0, 0),
+        chain_id, nft_flex_address))
+    return signable.header
+
+
+def order_hash(order: ListingOrder, chain_id: int, nft_flex_address: str) -> bytes:
+    """
+    The digest the owner signs, equal to ``hashListingOrder(order)`` on chain.
+
+    Every field of the order is a static type, so its ABI encoding is one
+    32-byte word per field. Packing the words directly is much faster than
+    ``encode_typed_data`` or ``eth_abi``, which matters when loading many orders.
+    """
+    words = [ORDER_TYPEHASH]
+    for value in order:
+        if isinstance(value, str):
+            value = int(value, 16)
+        words.append(int(value).to_bytes(32, "big"))
+    struct_hash = keccak(b"".join(words))
+    return keccak(b"\x19\x01" + domain_separator(chain_id, nft_flex_address) + struct_hash)
+
+
+def sign_order(private_key: str, order: ListingOrder, chain_id: int, nft_flex_address: str) -> bytes:
+    """
+    Sign a listing order with the key of its owner.
+
+    Args:
+        private_key (str): Key of ``order.owner``.
+        order (ListingOrder): The order to sign.
+        chain_id (int): Chain the order is valid on.
+        nft_flex_address (str): The NFTFlex contract that may fill it.
+
+    Returns:
+        bytes: The 65-byte signature ``fillListing`` expects.
+    """
+    signed = Account.sign_typed_data(private_key, full_message=order_typed_data(order, chain_id, nft_flex_address))
+    return bytes(signed.signature)
+
+
+def order_signer(order: ListingOrder, signature: bytes, chain_id: int, nft_flex_address: str) -> str:
+    """The address that signed ``order``."""
+    signable = encode_typed_data(full_message=order_typed_data(order, chain_id, nft_flex_address))
+    return Account.recover_message(signable, signature=signature)
+
+
+class OrderBook:
+    """
+    Signed listing orders waiting to be filled.
+
+    Each (collection, payment token) pair has a list of ``(price, sequence, hash)``
+    kept sorted with ``bisect``, so equal prices are served first come, first
+    served. Expired orders are dropped lazily when a query reaches them.
+    """
+
+    def __init__(self, chain_id: int, nft_flex_address: str):
+        self.chain_id = chain_id
+        self.nft_flex_address = _checksum(nft_flex_address)
+        self._orders: Dict[bytes, Tuple[SignedOrder, Tuple[int, int, bytes]]] = {}
+        self._books: Dict[Tuple[str, str], List[Tuple[int, int, bytes]]] = {}
+        self._by_nonce: Dict[Tuple[str, int], bytes] = {}
+        self._by_owner: Dict[str, Set[bytes]] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_hash: bytes) -> bool:
+        return order_hash in self._orders
+
+    def get(self, order_hash: bytes) -> Optional[SignedOrder]:
+        entry = self._orders.get(order_hash)
+        return entry[0] if entry else None
+
+    def add(self, order: ListingOrder, signature: bytes, now: Optional[int] = None, verify: bool = True) -> SignedOrder:
+        """
+        Validate a signed order and add it to the book.
+
+        Adding an order again is a no-op. A different order reusing an owner's nonce
+        is rejected, as only one of them could ever be filled.
+
+        Args:
+            order (ListingOrder): The order.
+            signature (bytes): Its owner's signature, see ``sign_order``.
+            now (Optional[int]): Current timestamp, the system clock by default.
+            verify (bool): Recover the signer, the slowest step. Only skip it for
+                orders checked before, e.g. reloaded from the service's own storage.
+
+        Returns:
+            SignedOrder: The order as stored.
+
+        Raises:
+            OrderError: If ``fillListing`` would reject the order.
+        """
+        order = order._replace(
+            owner=_checksum(order.owner),
+            nft_address=_checksum(order.nft_address),
+            collateral_token=_checksum(order.collateral_token),
+        )
+        if order.is_fractional:
+            raise OrderError("Fractional rentals cannot be listed with an order")
+        if not 0 < order.price_per_hour <= MAX_AMOUNT:
+            raise OrderError(f"Price per hour must be between 1 and {MAX_AMOUNT}")
+        if not 0 <= order.collateral_amount <= MAX_AMOUNT:
+            raise OrderError(f"Collateral must be between 0 and {MAX_AMOUNT}")
+        if order.deadline <= (int(time.time()) if now is None else now):
+            raise OrderError("Order has expired")
+
+        digest = order_hash(order, self.chain_id, self.nft_flex_address)
+        if digest in self._orders:
+            return self._orders[digest][0]
+        if (order.owner, order.nonce) in self._by_nonce:
+            raise OrderError(f"Nonce {order.nonce} of {order.owner} is already in use")
+        if verify:
+            try:
+                signer = Account._recover_hash(digest, signature=bytes(signature))
+            except Exception as e:
+                raise OrderError(f"Invalid signature ({e})") from e
+            if signer != order.owner:
+                raise OrderError(f"Order is signed by {signer}, not by its owner {order.owner}")
+
+        signed = SignedOrder(order, bytes(signature), digest)
+        entry = (order.price_per_hour, next(self._sequence), digest)
+        self._orders[digest] = (signed, entry)
+        bisect.insort(self._books.setdefault((order.nft_address, order.collateral_token), []), entry)
+        self._by_nonce[(order.owner, order.nonce)] = digest
+        self._by_owner.setdefault(order.owner, set()).add(digest)
+        return signed
+
+    def remove(self, order_hash: bytes) -> Optional[SignedOrder]:
+        """Remove an order; returns it, or None when it was not in the book."""
+        entry = self._orders.pop(order_hash, None)
+        if entry is None:
+            return None
+        signed, key = entry
+        order = signed.order
+        book_key = (order.nft_address, order.collateral_token)
+        book = self._books[book_key]
+        del book[bisect.bisect_left(book, key)]
+        if not book:
+            del self._books[book_key]
+        del self._by_nonce[(order.owner, order.nonce)]
+        _discard(self._by_owner, order.owner, order_hash)
+        return signed
+
+    def best(self, nft_address: str, collateral_token: str, now: Optional[int] = None) -> Optional[SignedOrder]:
+        """The cheapest unexpired order of a collection paid in ``collateral_token``, or None."""
+        orders = self.range(nft_address, collateral_token, now=now, limit=1)
+        return orders[0] if orders else None
+
+    def range(self, nft_address: str, collateral_token: str, min_price: int = 0, max_price: Optional[int] = None,
+              now: Optional[int] = None, limit: Optional[int] = 100) -> List[SignedOrder]:
+        """
+        Unexpired orders of a collection paid in ``collateral_token``, cheapest first.
+
+        Args:
+            nft_address (str): The collection.
+            collateral_token (str): Payment token, the zero address for ETH.
+            min_price (int): Lowest price per hour to return.
+            max_price (Optional[int]): Highest price per hour to return, unbounded by default.
+            now (Optional[int]): Current timestamp, the system clock by default.
+            limit (Optional[int]): Maximum number of orders to return, all of them if None.
+
+        Returns:
+            List[SignedOrder]: Orders priced between ``min_price`` and ``max_price``.
+        """
+        now = int(time.time()) if now is None else now
+        book = self._books.get((_checksum(nft_address), _checksum(collateral_token)))
+        if not book:
+            return []
+        orders: List[SignedOrder] = []
+        expired: List[bytes] = []
+        for price, _, digest in itertools.islice(book, bisect.bisect_left(book, (min_price,)), None):
+            if (max_price is not None and price > max_price) or (limit is not None and len(orders) >= limit):
+                break
+            signed = self._orders[digest][0]
+            if signed.order.deadline <= now:
+                expired.append(digest)
+            else:
+                orders.append(signed)
+        for digest in expired:
+            self.remove(digest)
+        return orders
+
+    def by_owner(self, owner: str) -> List[SignedOrder]:
+        """Orders of ``owner``, cheapest first."""
+        return sorted((self._orders[digest][0] for digest in self._by_owner.get(_checksum(owner), ())),
+                      key=lambda signed: signed.order.price_per_hour)
+
+    def prune(self, now: Optional[int] = None) -> int:
+        """Drop every expired order; returns how many were dropped."""
+        now = int(time.time()) if now is None else now
+        expired = [digest for digest, (signed, _) in self._orders.items() if signed.order.deadline <= now]
+        for digest in expired:
+            self.remove(digest)
+        return len(expired)
+
+    def apply(self, logs: Iterable[DecodedLog]) -> int:
+        """
+        Drop the orders that filled or cancelled logs retire.
+
+        The listing of a filled order is single use, so the other orders for the
+        same token stay: they revert ``NFTFlex__NFTAlreadyRented`` while the NFT
+        is rented, and can be filled again once the rental ends.
+
+        Returns:
+            int: Number of orders dropped.
+        """
+        dropped = 0
+        for log in logs:
+            if log.name == "NFTFlex__OrderFilled":
+                owner = _checksum(log.args["owner"])
+                digest = self._by_nonce.get((owner, log.args["nonce"]))
+                if digest is not None:
+                    dropped += self.remove(digest) is not None
+            elif log.name == "NFTFlex__OrdersCancelled":
+                owner = _checksum(log.args["owner"])
+                for nonce in log.args["nonces"]:
+                    digest = self._by_nonce.get((owner, nonce))
+                    if digest is not None:
+                        dropped += self.remove(digest) is not None
+        return dropped
+
+    def refresh(self, web3) -> int:
+        """
+        Drop the orders that can no longer be filled: their nonce is used or the owner sold the NFT.
+
+        Every order costs two reads, sent in batches through ``nftflex.reads``.
+
+        Returns:
+            int: Number of orders dropped.
+        """
+        signed_orders = [signed for signed, _ in self._orders.values()]
+        with batch(web3) as reader:
+            nft_flex = reader.contract(self.nft_flex_address, "NFTFlex")
+            reads = [
+                (signed,
+                 nft_flex.isOrderNonceUsed(signed.order.owner, signed.order.nonce),
+                 reader.contract(signed.order.nft_address, OWNER_OF_ABI).ownerOf(signed.order.token_id))
+                for signed in signed_orders
+            ]
+
+        dropped = 0
+        for signed, nonce_used, owner_of in reads:
+            try:
+                fillable = not nonce_used.value and owner_of.value == signed.order.owner
+            except ReadError:
+                fillable = False  # e.g. the token was burnt
+            if not fillable:
+                dropped += self.remove(signed.hash) is not None
+        return dropped
+
+
+@lru_cache(maxsize=4096)
+def _checksum(address: str) -> str:
+    # Queries name the same few collections and tokens over and over
+    return to_checksum_address(address)
+
+
+def _discard(index: Dict[Any, Set[bytes]], key: Any, order_hash: bytes) -> None:
+    hashes = index[key]
+    hashes.discard(order_hash)
+    if not hashes:
+        del index[key]
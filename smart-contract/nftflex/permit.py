@@ -0,0 +1,140 @@
+"""
+EIP-2612 permits for renting with ERC-20 payment in a single transaction.
+
+``rentNFTWithPermit`` takes the renter's signature over a permit for the rental's
+price and collateral instead of an ``approve`` transaction sent beforehand.
+``sign_permit`` signs a permit off-chain; ``rental_permit`` first reads what to
+sign (the rental's terms, the token's EIP-712 domain and the renter's permit
+nonce) with two batched requests.
+"""
+from typing import Any, Dict, NamedTuple, Optional
+
+from eth_account import Account
+
+from nftflex.reads import batch
+
+
+# The token functions a permit needs; OpenZeppelin's ERC20Permit publishes its domain with EIP-5267
+PERMIT_TOKEN_ABI = [
+    {
+        "type": "function", "name": "nonces", "stateMutability": "view",
+        "inputs": [{"name": "owner", "type": "address"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "type": "function", "name": "eip712Domain", "stateMutability": "view", "inputs": [],
+        "outputs": [
+            {"name": "fields", "type": "bytes1"},
+            {"name": "name", "type": "string"},
+            {"name": "version", "type": "string"},
+            {"name": "chainId", "type": "uint256"},
+            {"name": "verifyingContract", "type": "address"},
+            {"name": "salt", "type": "bytes32"},
+            {"name": "extensions", "type": "uint256[]"},
+        ],
+    },
+]
+
+PERMIT_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "Permit": [
+        {"name": "owner", "type": "address"},
+        {"name": "spender", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "nonce", "type": "uint256"},
+        {"name": "deadline", "type": "uint256"},
+    ],
+}
+
+DEFAULT_PERMIT_TTL = 3600  # seconds a rental permit stays valid
+
+
+class Permit(NamedTuple):
+    """A signed permit: ``value`` and ``deadline`` as signed, then the signature."""
+    value: int
+    deadline: int
+    v: int
+    r: bytes
+    s: bytes
+
+
+def permit_typed_data(token_name: str, token_version: str, chain_id: int, token_address: str, owner: str,
+                      spender: str, value: int, nonce: int, deadline: int) -> Dict[str, Any]:
+    """The EIP-712 message of an EIP-2612 permit."""
+    return {
+        "types": PERMIT_TYPES,
+        "primaryType": "Permit",
+        "domain": {
+            "name": token_name,
+            "version": token_version,
+            "chainId": chain_id,
+            "verifyingContract": token_address,
+        },
+        "message": {"owner": owner, "spender": spender, "value": value, "nonce": nonce, "deadline": deadline},
+    }
+
+
+def sign_permit(private_key: str, token_name: str, token_version: str, chain_id: int, token_address: str,
+                spender: str, value: int, nonce: int, deadline: int) -> Permit:
+    """
+    Sign a permit letting ``spender`` take ``value`` of the token from the key's account.
+
+    Args:
+        private_key (str): Key of the token holder.
+        token_name (str): The token's EIP-712 domain name (for OpenZeppelin tokens, its ``name()``).
+        token_version (str): The token's EIP-712 domain version, usually ``"1"``.
+        chain_id (int): Chain the permit is valid on.
+        token_address (str): The token contract.
+        spender (str): Who may spend the tokens, e.g. the NFTFlex contract.
+        value (int): Allowance granted, in the token's smallest unit.
+        nonce (int): The holder's current ``nonces(owner)`` on the token.
+        deadline (int): Timestamp after which the permit is rejected.
+
+    Returns:
+        Permit: The signed permit.
+    """
+    owner = Account.from_key(private_key).address
+    typed_data = permit_typed_data(token_name, token_version, chain_id, token_address, owner, spender, value,
+                                   nonce, deadline)
+    signed = Account.sign_typed_data(private_key, full_message=typed_data)
+    return Permit(value, deadline, signed.v, signed.r.to_bytes(32, "big"), signed.s.to_bytes(32, "big"))
+
+
+def rental_permit(web3, nft_flex_address: str, rental_id: int, duration: int, private_key: str,
+                  deadline: Optional[int] = None) -> Permit:
+    """
+    Sign the permit ``rentNFTWithPermit(rental_id, duration, ...)`` expects from the key's account.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        nft_flex_address (str): Address of the NFTFlex contract.
+        rental_id (int): The rental to rent; it must be paid in an EIP-2612 token.
+        duration (int): Hours to rent it for.
+        private_key (str): Key of the renter.
+        deadline (Optional[int]): Expiry of the permit, ``DEFAULT_PERMIT_TTL`` after the latest block by default.
+
+    Returns:
+        Permit: Pass ``deadline``, ``v``, ``r`` and ``s`` on to ``rentNFTWithPermit``.
+    """
+    renter = Account.from_key(private_key).address
+    if deadline is None:
+        deadline = web3.eth.get_block("latest")["timestamp"] + DEFAULT_PERMIT_TTL
+    with batch(web3) as reader:
+        rental = reader.contract(nft_flex_address, "NFTFlex").s_rentals(rental_id)
+    rental = rental.value
+    if int(rental.collateralToken, 16) == 0:
+        raise ValueError(f"Rental {rental_id} is paid in ETH, which needs no permit")
+
+    with batch(web3) as reader:
+        token = reader.contract(rental.collateralToken, PERMIT_TOKEN_ABI)
+        domain, nonce = token.eip712Domain(), token.nonces(renter)
+
+    _, name, version, chain_id, verifying_contract, _, _ = domain.value
+    value = rental.pricePerHour * duration + rental.collateralAmount
+    return sign_permit(private_key, name, version, chain_id, verifying_contract, nft_flex_address, value,
+                       nonce.value, deadline)
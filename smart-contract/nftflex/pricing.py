@@ -0,0 +1,213 @@
+"""
+Demand-based pricing of NFTFlex listings.
+
+``reprice`` computes a new price for every listing in one vectorized pass from
+the listing statistics of ``RentalAnalytics.listing_stats``:
+
+- occupancy: listings rented more than the target occupancy get more expensive,
+  the others cheaper, by the step the demand curve of similar listings predicts,
+- price elasticity: estimated per collection from the listings' prices and
+  occupancies (the slope of log occupancy over log price),
+- time since the last rental: listings idle for longer than a day are discounted.
+
+Changes are bounded per run and rounded to a few significant digits, so prices do
+not churn; only the prices that actually change are returned for sending.
+``PriceUpdater`` sends them with ``updatePrices`` in batches sized to a gas budget.
+"""
+import math
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+from nftflex.abi import EventDecoder, load_abi
+from nftflex.load import LoadClient, TxResult
+
+
+MAX_PRICE = 2 ** 96 - 1  # `pricePerHour` is stored as a uint96
+
+# Fixed cost of an updatePrices transaction and the first guess of the cost per price, refined from receipts
+UPDATE_BASE_GAS = 30_000
+UPDATE_GAS_PER_PRICE = 10_000
+MIN_GAS_PER_PRICE = 5_000
+
+
+class PricingConfig(NamedTuple):
+    """
+    Attributes:
+        target_occupancy (float): Occupancy the prices steer every listing towards.
+        default_elasticity (float): Elasticity of collections with too few listings to estimate it.
+        min_elasticity (float): Most elastic demand assumed: -4 means 1% off the price brings 4% more occupancy.
+        max_elasticity (float): Least elastic demand assumed, below zero; the closer to zero, the larger the steps.
+        min_listings (int): Listings with demand a collection needs for its own elasticity estimate.
+        idle_after (int): Seconds without a rental before the idle discount starts.
+        idle_discount (float): Discount per further idle day.
+        max_change (float): Largest relative change of one run, up or down.
+        min_change (float): Smallest relative change worth a transaction.
+        significant_digits (int): Digits new prices are rounded to.
+        min_price (int): Lowest price per hour in wei.
+    """
+    target_occupancy: float = 0.7
+    default_elasticity: float = -1.0
+    min_elasticity: float = -4.0
+    max_elasticity: float = -0.25
+    min_listings: int = 3
+    idle_after: int = 24 * 3600
+    idle_discount: float = 0.05
+    max_change: float = 0.25
+    min_change: float = 0.02
+    significant_digits: int = 3
+    min_price: int = 1
+
+
+def estimate_elasticity(prices: np.ndarray, occupancy: np.ndarray, groups: np.ndarray,
+                        config: PricingConfig = PricingConfig()) -> np.ndarray:
+    """
+    Price elasticity of demand per group of similar listings, as the least-squares slope of
+    ``log(occupancy)`` over ``log(price)`` across the group's listings that were rented.
+
+    Args:
+        prices (np.ndarray): Price per hour of each listing.
+        occupancy (np.ndarray): Occupancy of each listing, NaN when unknown.
+        groups (np.ndarray): Group code (0 .. n - 1) of each listing.
+
+    Returns:
+        np.ndarray: The elasticity of each group, within the configured bounds.
+    """
+    size = int(groups.max()) + 1 if len(groups) else 0
+    sample = (occupancy > 0) & (prices > 0)  # NaN compares False
+    x, y, codes = np.log(prices[sample]), np.log(occupancy[sample]), groups[sample]
+
+    count = np.bincount(codes, minlength=size)
+    sum_x = np.bincount(codes, weights=x, minlength=size)
+    sum_y = np.bincount(codes, weights=y, minlength=size)
+    sum_xx = np.bincount(codes, weights=x * x, minlength=size)
+    sum_xy = np.bincount(codes, weights=x * y, minlength=size)
+    variance = count * sum_xx - sum_x ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (count * sum_xy - sum_x * sum_y) / variance
+    # Flat prices or too few rented listings say nothing about the demand curve
+    known = (count >= config.min_listings) & (variance > 1e-9 * np.maximum(count, 1) ** 2)
+    elasticity = np.where(known, slope, config.default_elasticity)
+    return np.clip(elasticity, config.min_elasticity, config.max_elasticity)
+
+
+def reprice(stats: pd.DataFrame, config: PricingConfig = PricingConfig()) -> pd.DataFrame:
+    """
+    New prices for every listing. Listings without an occupancy (fractional ones) only get the idle discount.
+
+    Args:
+        stats (pd.DataFrame): ``RentalAnalytics.listing_stats``, or any frame with the
+            ``nft_address``, ``price_per_hour``, ``occupancy`` and ``idle_seconds`` columns.
+        config (PricingConfig): Pricing parameters.
+
+    Returns:
+        pd.DataFrame: ``stats`` with the ``elasticity``, ``new_price`` (exact wei, Python ints)
+        and ``changed`` columns added.
+    """
+    prices = stats["price_per_hour"].to_numpy(dtype=np.float64)
+    occupancy = stats["occupancy"].to_numpy(dtype=np.float64)
+    groups, _ = pd.factorize(stats["nft_address"])
+    elasticity = estimate_elasticity(prices, occupancy, groups, config)[groups] if len(stats) else np.empty(0)
+
+    # Demand ~ price ** elasticity: the price that would move the occupancy to the target
+    current = np.clip(occupancy, 0.01, 0.99)
+    ratio = np.where(np.isnan(occupancy), 1.0, (config.target_occupancy / current) ** (1 / elasticity))
+    idle_days = np.clip(stats["idle_seconds"].to_numpy(dtype=np.float64) - config.idle_after, 0, None) / 86400
+    ratio = ratio * (1 - config.idle_discount) ** idle_days
+    ratio = np.clip(ratio, 1 - config.max_change, 1 + config.max_change)
+
+    new_prices = _round_significant(prices * ratio, config.significant_digits)
+    new_prices = [min(max(price, config.min_price), MAX_PRICE) for price in new_prices]
+    old_prices = [int(price) for price in stats["price_per_hour"]]
+    changed = np.array([abs(new - old) >= config.min_change * old for new, old in zip(new_prices, old_prices)],
+                       dtype=bool)
+    return stats.assign(elasticity=elasticity, new_price=pd.Series(new_prices, index=stats.index, dtype=object),
+                        changed=changed)
+
+
+def _round_significant(values: np.ndarray, digits: int) -> List[int]:
+    # Rounded in floating point, then rebuilt as exact integers: wei prices do not fit in int64
+    exponents = np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) - digits + 1
+    exponents = np.maximum(exponents, 0)
+    mantissas = np.rint(values / 10.0 ** exponents).astype(np.int64)
+    return [int(mantissa) * 10 ** int(exponent) for mantissa, exponent in zip(mantissas, exponents)]
+
+
+class PriceUpdater:
+    """
+    Sends price changes with ``updatePrices`` in batches sized to a gas budget.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        address (str): Address of the NFTFlex contract.
+        private_key (str): Key of the owner of the listings.
+        gas_budget (int): Gas limit of one ``updatePrices`` transaction.
+        max_in_flight (int): Maximum number of transactions sent at once.
+    """
+
+    def __init__(self, web3, address: str, private_key: str, gas_budget: int = 15_000_000, max_in_flight: int = 4):
+        self.address = address
+        self.private_key = private_key
+        self.gas_budget = gas_budget
+        self.gas_per_price = UPDATE_GAS_PER_PRICE
+        self.sent = 0
+        self.updated = 0
+        self.gas_used = 0
+
+        abi = load_abi("NFTFlex")
+        self.update_abi = next(entry for entry in abi if entry.get("name") == "updatePrices")
+        self.decoder = EventDecoder(abi, ["NFTFlex__PriceUpdated"])
+        self.client = LoadClient(web3, [abi], max_workers=max_in_flight, gas_limit=gas_budget)
+
+    def close(self) -> None:
+        self.client.close()
+
+    @property
+    def batch_size(self) -> int:
+        """Number of prices that fit in one transaction at the current gas estimate."""
+        return max(1, (self.gas_budget - UPDATE_BASE_GAS) // self.gas_per_price)
+
+    async def push(self, rental_ids: Sequence[int], prices: Sequence[int]) -> List[TxResult]:
+        """
+        Send the prices, retrying batches that ran out of gas in smaller pieces.
+
+        Returns:
+            List[TxResult]: One result per ``updatePrices`` transaction sent.
+        """
+        pending = list(zip(rental_ids, prices))
+        results: List[TxResult] = []
+        while pending:
+            size = self.batch_size
+            batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+            sent = await self.client.gather(*[
+                self.client.send("updatePrices", self.private_key, self.address, self.update_abi,
+                                 [[rental_id for rental_id, _ in batch], [price for _, price in batch]])
+                for batch in batches
+            ])
+            results.extend(sent)
+            pending = []
+            for batch, result in zip(batches, sent):
+                if result.error is None:
+                    # Rentals whose earnings are pending are skipped by the contract and emit nothing
+                    self.sent += len(batch)
+                    self.updated += sum(1 for raw_log in result.receipt["logs"] if self.decoder.decode(raw_log))
+                    self.gas_used += result.gas_used
+                    # Size the next batches from what this one actually cost
+                    self.gas_per_price = max(MIN_GAS_PER_PRICE,
+                                             math.ceil((result.gas_used - UPDATE_BASE_GAS) / len(batch)))
+                elif len(batch) > 1:
+                    # Most likely out of gas: resend with smaller batches
+                    self.gas_per_price *= 2
+                    pending.extend(batch)
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        """Prices sent and changed and gas per price, next to the transaction statistics."""
+        return {
+            "prices_sent": self.sent,
+            "prices_updated": self.updated,
+            "gas_per_price": round(self.gas_used / self.sent) if self.sent else 0,
+            "batch_size": self.batch_size,
+            **self.client.stats.report(),
+        }
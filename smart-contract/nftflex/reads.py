@@ -0,0 +1,323 @@
+"""
+Batched contract reads.
+
+Queue reads on a ``BatchReader`` and they are sent together when a value is
+first needed (or when the ``batch()`` block ends):
+
+    with batch(networks.provider.web3) as reader:
+        nft_flex = reader.contract(address, "NFTFlex")
+        rentals = [nft_flex.s_rentals(i) for i in range(count)]
+    print(rentals[0].value.pricePerHour)
+
+A batch is one ``aggregate3`` call on a Multicall3 contract when the chain has
+one, otherwise one JSON-RPC batch request over a keep-alive connection.
+Identical reads queued in the same batch are sent once.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from eth_utils import to_checksum_address
+
+from nftflex.abi import decode_outputs, encode_call, load_abi, to_bytes, to_hex, to_int
+
+
+# Deployed at the same address on mainnet, Sepolia and most other chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+AGGREGATE3_ABI = {
+    "type": "function",
+    "name": "aggregate3",
+    "stateMutability": "payable",
+    "inputs": [{
+        "name": "calls",
+        "type": "tuple[]",
+        "components": [
+            {"name": "target", "type": "address"},
+            {"name": "allowFailure", "type": "bool"},
+            {"name": "callData", "type": "bytes"},
+        ],
+    }],
+    "outputs": [{
+        "name": "returnData",
+        "type": "tuple[]",
+        "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"},
+        ],
+    }],
+}
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class ReadError(Exception):
+    """Raised by ``Read.value`` when the call reverted or its result could not be decoded."""
+
+
+class Read:
+    """A queued contract read. ``value`` sends the pending batch if needed."""
+
+    def __init__(self, reader: "BatchReader", target: str, abi_entry: Dict[str, Any], data: bytes):
+        self.target = target
+        self.abi_entry = abi_entry
+        self.data = data
+        self._reader = reader
+        self._done = False
+        self._value: Any = None
+        self._error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def value(self) -> Any:
+        if not self._done:
+            self._reader.flush()
+        if self._error is not None:
+            raise ReadError(f"{self.abi_entry['name']} on {self.target}: {self._error}")
+        return self._value
+
+    def _resolve(self, success: bool, data: bytes) -> None:
+        self._done = True
+        if not success:
+            self._error = f"reverted with {to_hex(data)}"
+            return
+        try:
+            self._value = decode_outputs(self.abi_entry, data)
+        except Exception as e:
+            self._error = f"could not decode {to_hex(data)} ({e})"
+
+    def _fail(self, message: str) -> None:
+        self._done = True
+        self._error = message
+
+
+class ReaderStats:
+    """Counters of a ``BatchReader``."""
+
+    def __init__(self):
+        self.reads = 0  # reads queued
+        self.coalesced = 0  # reads answered by an identical read in the same batch
+        self.calls = 0  # distinct calls sent
+        self.rpc_requests = 0  # HTTP or provider requests made
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class BatchContract:
+    """View functions of one contract, queuing a ``Read`` instead of calling the chain."""
+
+    def __init__(self, reader: "BatchReader", address: str, abi: List[Dict[str, Any]]):
+        self.address = to_checksum_address(address)
+        self._reader = reader
+        self._functions: Dict[str, Dict[str, Any]] = {}
+        for entry in abi:
+            if entry["type"] == "function" and entry.get("stateMutability") in ("view", "pure"):
+                self._functions.setdefault(entry["name"], entry)
+
+    def __getattr__(self, name: str):
+        functions = self.__dict__.get("_functions", {})
+        if name not in functions:
+            raise AttributeError(f"No view function '{name}'")
+        return lambda *args: self._reader.call(self.address, functions[name], *args)
+
+
+class BatchReader:
+    """
+    Collects contract reads and sends them in as few requests as possible.
+
+    Args:
+        web3: A web3.py ``Web3`` instance, e.g. ``networks.provider.web3`` under ape.
+        multicall_address (Optional[str]): Multicall3 deployment to use (the canonical address by default).
+        max_batch_size (int): Maximum number of calls per request.
+        rpc_url (Optional[str]): JSON-RPC endpoint for batch requests when there is no Multicall3
+            (the provider's ``endpoint_uri`` by default).
+        block_identifier (Optional[Union[int, str]]): Block to read at (latest by default). Results
+            read at a block number are kept and reused.
+        timeout (float): HTTP timeout of batch requests in seconds.
+    """
+
+    def __init__(self, web3, multicall_address: Optional[str] = None, max_batch_size: int = DEFAULT_BATCH_SIZE,
+                 rpc_url: Optional[str] = None, block_identifier: Optional[Union[int, str]] = None,
+                 timeout: float = 30.0):
+        self.web3 = web3
+        self.max_batch_size = max_batch_size
+        self.block_identifier = block_identifier
+        self.timeout = timeout
+        self.stats = ReaderStats()
+        self.multicall_address = self._find_multicall(multicall_address or MULTICALL3_ADDRESS)
+        self.rpc_url = rpc_url or getattr(web3.provider, "endpoint_uri", None)
+        self._session: Optional[requests.Session] = None
+        self._pending: Dict[Tuple[str, bytes], Read] = {}
+        self._resolved: Dict[Tuple[str, bytes], Read] = {}
+
+    def _find_multicall(self, address: str) -> Optional[str]:
+        address = to_checksum_address(address)
+        self.stats.rpc_requests += 1
+        return address if self.web3.eth.get_code(address) else None
+
+    @property
+    def mode(self) -> str:
+        """How batches are sent: ``"multicall"``, ``"rpc-batch"`` or ``"sequential"``."""
+        if self.multicall_address:
+            return "multicall"
+        return "rpc-batch" if self.rpc_url else "sequential"
+
+    def contract(self, address: str, abi: Union[str, List[Dict[str, Any]]]) -> BatchContract:
+        """
+        Bind a contract to this reader.
+
+        Args:
+            address (str): The contract address.
+            abi (Union[str, List[Dict[str, Any]]]): The ABI, or a contract name to load it from ``abis/``.
+        """
+        return BatchContract(self, address, load_abi(abi) if isinstance(abi, str) else abi)
+
+    def call(self, target: str, abi_entry: Dict[str, Any], *args) -> Read:
+        """Queue a call of ``abi_entry`` on ``target``, reusing an identical queued read."""
+        data = encode_call(abi_entry, args)
+        key = (target.lower(), data)
+        self.stats.reads += 1
+        read = self._pending.get(key) or self._resolved.get(key)
+        if read is not None:
+            self.stats.coalesced += 1
+            return read
+
+        read = Read(self, target, abi_entry, data)
+        self._pending[key] = read
+        return read
+
+    def flush(self) -> None:
+        """Send every queued read, all at the same block."""
+        pending, self._pending = self._pending, {}
+        reads = list(pending.values())
+        if not reads:
+            return
+        block = self._flush_block(len(reads))
+        for start in range(0, len(reads), self.max_batch_size):
+            chunk = reads[start:start + self.max_batch_size]
+            self.stats.calls += len(chunk)
+            if self.multicall_address:
+                self._send_multicall(chunk, block)
+            elif self.rpc_url:
+                self._send_rpc_batch(chunk, block)
+            else:
+                self._send_sequential(chunk, block)
+
+        # State at a fixed block never changes, so its reads can be answered from memory later
+        if isinstance(self.block_identifier, int):
+            self._resolved.update(pending)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self) -> "BatchReader":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.flush()
+        self.close()
+
+    def _flush_block(self, count: int) -> Union[int, str]:
+        """
+        The block the ``count`` reads of a flush are made at.
+
+        "latest" is resolved to a block number whenever the flush takes more than one call, so that
+        every chunk reads the same state; a node may also answer the calls of one JSON-RPC batch at
+        different heights. A single ``aggregate3`` call is atomic and is sent as it is.
+        """
+        block = "latest" if self.block_identifier is None else self.block_identifier
+        if block != "latest":
+            return block
+        if self.multicall_address and count <= self.max_batch_size:
+            return block
+        if not self.multicall_address and not self.rpc_url and count == 1:
+            return block
+        self.stats.rpc_requests += 1
+        return self.web3.eth.block_number
+
+    def _send_multicall(self, reads: List[Read], block: Union[int, str]) -> None:
+        calldata = encode_call(AGGREGATE3_ABI, [[(read.target, True, read.data) for read in reads]])
+        self.stats.rpc_requests += 1
+        try:
+            raw = self.web3.eth.call(
+                {"to": self.multicall_address, "data": to_hex(calldata)}, block
+            )
+            results = decode_outputs(AGGREGATE3_ABI, to_bytes(raw))
+        except Exception as e:
+            for read in reads:
+                read._fail(f"multicall failed ({e})")
+            return
+
+        for read, result in zip(reads, results):
+            read._resolve(result.success, to_bytes(result.returnData))
+
+    def _send_rpc_batch(self, reads: List[Read], block: Union[int, str]) -> None:
+        block = hex(block) if isinstance(block, int) else block
+
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": "eth_call",
+                "params": [{"to": read.target, "data": to_hex(read.data)}, block],
+            }
+            for request_id, read in enumerate(reads)
+        ]
+        if self._session is None:
+            self._session = requests.Session()
+        self.stats.rpc_requests += 1
+        try:
+            response = self._session.post(self.rpc_url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            responses = {to_int(item["id"]): item for item in response.json()}
+        except Exception as e:
+            for read in reads:
+                read._fail(f"batch request failed ({e})")
+            return
+
+        for request_id, read in enumerate(reads):
+            item = responses.get(request_id)
+            if item is None:
+                read._fail("missing from the batch response")
+            elif "error" in item:
+                error = item["error"]
+                revert_data = error.get("data")
+                if isinstance(revert_data, str) and revert_data.startswith("0x"):
+                    read._resolve(False, to_bytes(revert_data))
+                else:
+                    read._fail(error.get("message", str(error)))
+            else:
+                read._resolve(True, to_bytes(item["result"]))
+
+    def _send_sequential(self, reads: List[Read], block: Union[int, str]) -> None:
+        for read in reads:
+            self.stats.rpc_requests += 1
+            try:
+                raw = self.web3.eth.call({"to": read.target, "data": to_hex(read.data)}, block)
+            except Exception as e:
+                read._fail(str(e))
+                continue
+            read._resolve(True, to_bytes(raw))
+
+
+@contextmanager
+def batch(web3, **kwargs) -> Iterator[BatchReader]:
+    """
+    Open a ``BatchReader`` and send its remaining reads when the block ends.
+
+    Args:
+        web3: A web3.py ``Web3`` instance.
+        **kwargs: Passed on to ``BatchReader``.
+
+    Yields:
+        BatchReader: The reader.
+    """
+    with BatchReader(web3, **kwargs) as reader:
+        yield reader
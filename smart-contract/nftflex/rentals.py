@@ -0,0 +1,79 @@
+"""
+Paged readers for NFTFlex rentals.
+
+Use these instead of calling ``getRentalCounter()`` and then ``s_rentals(i)``
+once per rental: each page is a single ``eth_call``.
+"""
+from enum import IntEnum
+from typing import Any, Iterator, List, Tuple
+
+
+DEFAULT_PAGE_SIZE = 500
+
+
+class RentalStatus(IntEnum):
+    """Mirror of ``NFTFlex.RentalStatus``."""
+    AVAILABLE = 0
+    ACTIVE = 1
+    PENDING_WITHDRAWAL = 2
+    ENDED = 3
+
+
+def iter_rentals(nft_flex, page_size: int = DEFAULT_PAGE_SIZE, start: int = 0) -> Iterator[Tuple[int, Any]]:
+    """
+    Iterate over all rentals using ``getRentals(offset, limit)``.
+
+    Args:
+        nft_flex: The NFTFlex contract instance.
+        page_size (int): Number of rentals fetched per call.
+        start (int): ID of the first rental to return.
+
+    Yields:
+        Tuple[int, Any]: The rental ID and the rental struct.
+    """
+    rental_id = start
+    while True:
+        page = nft_flex.getRentals(rental_id, page_size)
+        for rental in page:
+            yield rental_id, rental
+            rental_id += 1
+
+        if len(page) < page_size:
+            return
+
+
+def iter_rentals_by_status(nft_flex, status: RentalStatus, page_size: int = DEFAULT_PAGE_SIZE,
+                           cursor: int = 0) -> Iterator[Tuple[int, Any]]:
+    """
+    Iterate over the rentals in one status using ``getRentalsByStatus(status, cursor, limit)``.
+
+    Args:
+        nft_flex: The NFTFlex contract instance.
+        status (RentalStatus): Status to filter on.
+        page_size (int): Maximum number of matches fetched per call.
+        cursor (int): Rental ID to start scanning from.
+
+    Yields:
+        Tuple[int, Any]: The rental ID and the rental struct.
+    """
+    while True:
+        rental_ids, rentals, cursor = nft_flex.getRentalsByStatus(int(status), cursor, page_size)
+        yield from zip(rental_ids, rentals)
+
+        # A short page means the contract reached the end of the rental list
+        if len(rental_ids) < page_size:
+            return
+
+
+def load_rentals(nft_flex, page_size: int = DEFAULT_PAGE_SIZE) -> List[Tuple[int, Any]]:
+    """
+    Load every rental, one page per call.
+
+    Args:
+        nft_flex: The NFTFlex contract instance.
+        page_size (int): Number of rentals fetched per call.
+
+    Returns:
+        List[Tuple[int, Any]]: ``(rental_id, rental)`` pairs ordered by rental ID.
+    """
+    return list(iter_rentals(nft_flex, page_size))
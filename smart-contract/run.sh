@@ -86,8 +86,9 @@ ape run deploy --network ethereum:local:test
 # Since Anvil is part of Foundry
 ape run deploy --network ethereum:local:foundry
 
-# Copy essential files to frontend
-cp -r abis/NFTFlex_ABI.json ../client/src/abis/NFTFlex.json && cp -r abis/SimpleNFT_ABI.json ../client/src/abis/SimpleNFT.json && cp -r contract_addresses.json ../client/src/contract_addresses.json
+# Deploying exports the ABIs and addresses to abis/ and ../client/src as well
+# After changing a contract without deploying, export the ABIs only:
+ape compile && ape run export_artifacts
 
 
 
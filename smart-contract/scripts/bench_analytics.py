@@ -0,0 +1,130 @@
+# Benchmark: loading synthetic rental history into RentalAnalytics and querying it over sliding windows
+# Run with: ape run bench_analytics
+#
+# NFTFLEX_ANALYTICS_EVENTS  number of synthetic events (default 1000000)
+# NFTFLEX_ANALYTICS_CHUNK   events applied per call, like blocks arriving from the chain (default 50000)
+#
+# Budget for 1M events: loading within 10s, 1000 sliding windows of every metric within 1s,
+# at most 256 MiB allocated at peak while loading and querying (measured with tracemalloc, the
+# synthetic logs themselves excluded).
+import os
+import random
+import time
+import tracemalloc
+import numpy as np
+from nftflex.abi import DecodedLog
+from nftflex.analytics import RentalAnalytics
+
+
+LOAD_BUDGET_SECONDS = 10.0
+QUERY_BUDGET_SECONDS = 1.0
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+BLOCK_SECONDS = 12
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+renter = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+owners = [f"0x{owner:040x}" for owner in range(1, 1_001)]
+
+
+def synthetic_chunks(count: int, chunk_size: int):
+    """
+    Yield ``count`` events in chain order: every tenth event lists an NFT (one in five is
+    fractional), the others rent a free listing, rent shares of a fractional one or settle a rental.
+    """
+    rng = random.Random(7)
+    rental_count, free, fractional, active, chunk = 0, [], [], [], []
+    for position in range(count):
+        block_number, log_index = divmod(position, 10)
+        now = block_number * BLOCK_SECONDS
+        hours = rng.randint(1, 24)
+        if log_index == 0 or not free:
+            is_fractional = rental_count % 5 == 0
+            (fractional if is_fractional else free).append(rental_count)
+            log = DecodedLog("NFTFlex__RentalCreated", {
+                "rentalId": rental_count, "owner": owners[rental_count % len(owners)], "nftAddress": nft_address,
+                "tokenId": rental_count, "pricePerHour": rng.randint(1, 100) * 10 ** 15, "isFractional": is_fractional,
+            }, nft_address, block_number, "0x", "0x", log_index)
+            rental_count += 1
+        elif active and rng.random() < 0.3:
+            rental_id = active.pop(rng.randrange(len(active)))
+            free.append(rental_id)
+            log = DecodedLog("NFTFlex__RentalEnded", {"rentalId": rental_id, "renter": renter},
+                             nft_address, block_number, "0x", "0x", log_index)
+        elif rng.random() < 0.2:
+            rental_id = fractional[-1 - min(int(rng.expovariate(1 / 10)), len(fractional) - 1)]
+            log = DecodedLog("NFTFlex__SharesRented", {
+                "rentalId": rental_id, "renter": renter, "shareIds": [0, 1], "startTime": now,
+                "endTime": now + hours * 3600, "collateralAmount": 2 * 10 ** 16,
+            }, nft_address, block_number, "0x", "0x", log_index)
+        else:
+            # Popular NFTs: most rentals go to the most recently freed listings
+            position_in_free = len(free) - 1 - min(int(rng.expovariate(1 / 50)), len(free) - 1)
+            free[position_in_free], free[-1] = free[-1], free[position_in_free]
+            rental_id = free.pop()
+            active.append(rental_id)
+            log = DecodedLog("NFTFlex__RentalStarted", {
+                "rentalId": rental_id, "renter": renter, "startTime": now, "endTime": now + hours * 3600,
+                "collateralAmount": 10 ** 16,
+            }, nft_address, block_number, "0x", "0x", log_index)
+        chunk.append(log)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load(chunks) -> RentalAnalytics:
+    analytics = RentalAnalytics(lambda block_number: block_number * BLOCK_SECONDS)
+    for chunk in chunks:
+        analytics.apply(chunk)
+    return analytics
+
+
+def check(label: str, value: float, budget: float, unit: str) -> bool:
+    passed = value <= budget
+    print(f"{label:<32}{value:>10.2f} {unit:<4} budget {budget:>8.2f} {unit:<4} {'ok' if passed else 'OVER'}")
+    return passed
+
+
+def main():
+    count = int(os.environ.get("NFTFLEX_ANALYTICS_EVENTS", "1000000"))
+    chunk_size = int(os.environ.get("NFTFLEX_ANALYTICS_CHUNK", "50000"))
+    print(f"Generating {count} events...")
+    chunks = list(synthetic_chunks(count, chunk_size))
+
+    # Memory is measured in a second pass: tracing every allocation slows the load down several times
+    started_at = time.perf_counter()
+    analytics = load(chunks)
+    load_seconds = time.perf_counter() - started_at
+
+    end = count // 10 * BLOCK_SECONDS
+    times = np.linspace(end // 10, end, 1_000).astype(np.int64)
+    window = 24 * 3600
+    started_at = time.perf_counter()
+    summary = analytics.summary(times, window)
+    top_nfts = analytics.top_nfts(end, window)
+    top_owners = analytics.top_owners(end, window)
+    trending = analytics.trending_nfts(end, window)
+    query_seconds = time.perf_counter() - started_at
+
+    del analytics
+    tracemalloc.start()
+    analytics = load(chunks)
+    analytics.summary(times, window)
+    analytics.top_owners(end, window)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(summary.describe().loc[["mean", "max"]].to_string())
+    print(f"\nTop NFTs of the last day:\n{top_nfts.head(5).to_string()}")
+    print(f"\nTop owners of the last day:\n{top_owners.head(5).to_string()}")
+    print(f"\nTrending NFTs:\n{trending.head(5).to_string()}\n")
+
+    print(f"{count} events, {len(analytics.nfts)} NFTs, {len(analytics.owners)} owners")
+    passed = all([
+        check("load", load_seconds, LOAD_BUDGET_SECONDS * count / 1_000_000, "s"),
+        check("1000 windows + rankings", query_seconds, QUERY_BUDGET_SECONDS, "s"),
+        check("peak memory", peak / 1024 / 1024, MEMORY_BUDGET_BYTES / 1024 / 1024, "MiB"),
+    ])
+    print("Within budget" if passed else "Over budget")
@@ -0,0 +1,183 @@
+# Benchmark: sustained load on the HTTP API (nftflex/api.py) over a synthetic index
+# Run with: ape run bench_api
+#
+# NFTFLEX_API_LISTINGS     listings in the synthetic index (default 10000)
+# NFTFLEX_API_SECONDS      seconds of load per scenario (default 5)
+# NFTFLEX_API_CONCURRENCY  requests in flight (default 32)
+#
+# The server runs in its own process on a temporary SQLite file; this process only sends requests.
+# Clients pick from a fixed set of queries: listing pages filtered by status, owner, token and price,
+# rental details and owner and renter dashboards. Scenarios:
+#   uncached     every request is answered from SQLite (response cache disabled)
+#   cached       the cache is warm
+#   gzip         the cache is warm, clients accept gzip
+#   revalidate   clients send the ETag they hold and get 304 Not Modified
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import urllib.request
+from aiohttp import ClientSession, TCPConnector, web
+from eth_utils import to_checksum_address
+from nftflex.abi import DecodedLog
+from nftflex.api import create_app
+from nftflex.indexer import RentalStore
+
+
+HOST = "127.0.0.1"
+QUERY_COUNT = 1_000
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+eth_collateral = "0x0000000000000000000000000000000000000000"
+token = "0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0"
+owners = [to_checksum_address(f"0x{owner:040x}") for owner in range(1, 101)]
+renters = [to_checksum_address(f"0x{renter:040x}") for renter in range(1_001, 1_051)]
+statuses = ["available", "active", "pending_withdrawal", "ended"]
+
+
+def build_index(path: str, count: int, now: int) -> None:
+    """List ``count`` NFTs, rent a third of them and settle half of those."""
+    rng = random.Random(7)
+    logs = []
+    for rental_id in range(count):
+        logs.append(DecodedLog("NFTFlex__RentalCreated", {
+            "rentalId": rental_id, "owner": owners[rental_id % len(owners)], "nftAddress": nft_address,
+            "tokenId": rental_id, "pricePerHour": rng.randint(1, 100) * 10 ** 15, "isFractional": False,
+            "collateralToken": token if rental_id % 4 == 0 else eth_collateral, "collateralAmount": 10 ** 16,
+        }, nft_address, 1 + rental_id // 100, "0x", "0x", rental_id % 100))
+    block = count // 100 + 2
+    for rental_id in range(0, count, 3):
+        end_time = now + rng.randint(-24, 24) * 3600
+        logs.append(DecodedLog("NFTFlex__RentalStarted", {
+            "rentalId": rental_id, "renter": renters[rental_id % len(renters)], "startTime": end_time - 3600,
+            "endTime": end_time, "collateralAmount": 10 ** 16,
+        }, nft_address, block, "0x", "0x", len(logs)))
+        if rental_id % 2 and end_time < now:
+            logs.append(DecodedLog("NFTFlex__RentalEnded", {
+                "rentalId": rental_id, "renter": renters[rental_id % len(renters)],
+            }, nft_address, block, "0x", "0x", len(logs)))
+
+    store = RentalStore(path)
+    store.apply(logs, block, "0x01", now)
+    store.optimize()
+    store.close()
+
+
+def queries(count: int, listings: int) -> list:
+    """The paths clients request, weighted towards the listing pages a marketplace front page shows."""
+    rng = random.Random(11)
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            params = [f"limit={rng.choice([20, 50])}", f"offset={rng.randrange(0, 1_000, 50)}"]
+            if rng.random() < 0.5:
+                params.append(f"status={rng.choice(statuses)}")
+            if rng.random() < 0.3:
+                low = rng.randint(1, 90)
+                params.append(f"min_price={low * 10 ** 15}&max_price={(low + 10) * 10 ** 15}")
+            if rng.random() < 0.2:
+                params.append(f"collateral_token={rng.choice([token, eth_collateral])}")
+            if rng.random() < 0.2:
+                params.append(f"owner={rng.choice(owners)}")
+            paths.append("/rentals?" + "&".join(params))
+        elif kind < 0.8:
+            paths.append(f"/rentals/{rng.randrange(listings)}")
+        elif kind < 0.9:
+            paths.append(f"/owners/{rng.choice(owners)}")
+        else:
+            paths.append(f"/renters/{rng.choice(renters)}")
+    return paths
+
+
+def serve(path: str, port: int, cache_size: int) -> None:
+    store = RentalStore(path)
+    # A TTL longer than the run keeps status queries cached, as between two blocks on a slow chain
+    app = create_app(store, cache_size=cache_size, time_ttl=3_600)
+    web.run_app(app, host=HOST, port=port, print=None, access_log=None)
+
+
+def start_server(path: str, port: int, cache_size: int) -> multiprocessing.Process:
+    # Forked, since this module is loaded by ape rather than imported by name
+    server = multiprocessing.get_context("fork").Process(target=serve, args=(path, port, cache_size), daemon=True)
+    server.start()
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://{HOST}:{port}/health", timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("the API server did not start")
+
+
+async def load(base_url: str, paths: list, seconds: float, concurrency: int, gzip: bool = False,
+               revalidate: bool = False) -> tuple:
+    """Keep ``concurrency`` requests in flight for ``seconds``. Returns the latencies and status codes."""
+    latencies, codes = [], {}
+    async with ClientSession(connector=TCPConnector(limit=concurrency), auto_decompress=False) as session:
+        base_headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+        headers = {path: base_headers for path in paths}
+        if revalidate:
+            for path in paths:
+                async with session.get(base_url + path, headers=base_headers) as response:
+                    headers[path] = {**base_headers, "If-None-Match": response.headers["ETag"]}
+
+        deadline = time.perf_counter() + seconds
+
+        async def worker(rng: random.Random) -> None:
+            while time.perf_counter() < deadline:
+                path = rng.choice(paths)
+                started_at = time.perf_counter()
+                async with session.get(base_url + path, headers=headers[path]) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started_at)
+                codes[response.status] = codes.get(response.status, 0) + 1
+
+        await asyncio.gather(*[worker(random.Random(i)) for i in range(concurrency)])
+    return latencies, codes
+
+
+async def warm(base_url: str, paths: list) -> None:
+    """Request every path once, so the measured run starts with a full cache."""
+    async with ClientSession() as session:
+        for path in set(paths):
+            async with session.get(base_url + path) as response:
+                await response.read()
+
+
+def report(name: str, latencies: list, codes: dict, seconds: float) -> None:
+    percentiles = statistics.quantiles(latencies, n=100)
+    counts = ", ".join(f"{code}: {count}" for code, count in sorted(codes.items()))
+    print(f"{name:<12}{len(latencies) / seconds:>10,.0f}{percentiles[49] * 1e3:>10.2f}"
+          f"{percentiles[98] * 1e3:>10.2f}   {counts}")
+
+
+def main():
+    listings = int(os.environ.get("NFTFLEX_API_LISTINGS", "10000"))
+    seconds = float(os.environ.get("NFTFLEX_API_SECONDS", "5"))
+    concurrency = int(os.environ.get("NFTFLEX_API_CONCURRENCY", "32"))
+    paths = queries(QUERY_COUNT, listings)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rentals.db")
+        print(f"Indexing {listings} synthetic listings...")
+        build_index(path, listings, int(time.time()))
+
+        print(f"{concurrency} requests in flight, {seconds:.0f}s per scenario, {len(set(paths))} distinct queries\n")
+        print(f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}   status codes")
+        scenarios = [("uncached", 0, {}), ("cached", 4_096, {}), ("gzip", 4_096, {"gzip": True}),
+                     ("revalidate", 4_096, {"revalidate": True})]
+        for port, (name, cache_size, options) in enumerate(scenarios, start=8_100):
+            server = start_server(path, port, cache_size)
+            try:
+                base_url = f"http://{HOST}:{port}"
+                if cache_size:
+                    asyncio.run(warm(base_url, paths))
+                latencies, codes = asyncio.run(load(base_url, paths, seconds, concurrency, **options))
+                report(name, latencies, codes, seconds)
+            finally:
+                server.terminate()
+                server.join()
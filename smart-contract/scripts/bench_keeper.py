@@ -0,0 +1,70 @@
+# Benchmark: ending expired rentals with one endRental per rental vs the keeper's settleExpired batches
+# Run with: ape run bench_keeper --network ethereum:local:anvil
+#
+# NFTFLEX_KEEPER_RENTALS     rentals expiring at once (default 1000)
+# NFTFLEX_KEEPER_GAS_BUDGET  gas limit of one settleExpired transaction (default 5000000)
+import asyncio
+import os
+import time
+from ape import accounts, chain, networks, project
+from nftflex.keeper import RentalKeeper
+
+
+SEED_CHUNK = 200  # NFTs minted and listed per transaction while seeding
+price_per_hour = 10 ** 15
+collateral_amount = 10 ** 15
+eth_collateral = "0x0000000000000000000000000000000000000000"
+duration = 1
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+
+def rent_all(owner, renter, simple_nft, nft_flex, count: int) -> range:
+    """List and rent ``count`` NFTs for ``duration`` hours; returns their rental IDs."""
+    first_rental_id = nft_flex.getRentalCounter()
+    for listed in range(0, count, SEED_CHUNK):
+        receipt = simple_nft.mintBatch(owner, [metadata_url] * min(SEED_CHUNK, count - listed), sender=owner)
+        token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+        nft_flex.createRentals(
+            simple_nft.address,
+            [(token_id, price_per_hour, False, eth_collateral, collateral_amount) for token_id in token_ids],
+            sender=owner,
+        )
+    rental_ids = range(first_rental_id, first_rental_id + count)
+    for rental_id in rental_ids:
+        nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=renter)
+    return rental_ids
+
+
+def main():
+    count = int(os.environ.get("NFTFLEX_KEEPER_RENTALS", "1000"))
+    gas_budget = int(os.environ.get("NFTFLEX_KEEPER_GAS_BUDGET", "5000000"))
+    owner, renter = accounts.test_accounts[0], accounts.test_accounts[1]
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    # Baseline: every renter ends their own rental
+    print(f"Renting {count} NFTs for the endRental baseline...")
+    rental_ids = rent_all(owner, renter, simple_nft, nft_flex, count)
+    chain.mine(timestamp=chain.blocks.head.timestamp + duration * 3600 + 1)
+    started_at = time.perf_counter()
+    end_gas = sum(nft_flex.endRental(rental_id, sender=renter).gas_used for rental_id in rental_ids)
+    end_seconds = time.perf_counter() - started_at
+
+    # Keeper: the same number of rentals expire at once and are settled in batches
+    print(f"Renting {count} NFTs for the keeper...")
+    rent_all(owner, renter, simple_nft, nft_flex, count)
+    keeper = RentalKeeper(networks.provider.web3, nft_flex.address, owner.private_key, gas_budget=gas_budget,
+                          start_block=start_block)
+    chain.mine(timestamp=chain.blocks.head.timestamp + duration * 3600 + 1)
+    # The first round sizes the batches from the initial guess; repeat until everything due is settled
+    while keeper.queue.next_expiry() is not None and asyncio.run(keeper.settle_due()):
+        pass
+    keeper.close()
+    report = keeper.report()
+
+    print(f"\n{'method':<14}{'rentals':>9}{'seconds':>10}{'rentals/s':>12}{'gas/rental':>12}")
+    print(f"{'endRental':<14}{count:>9}{end_seconds:>10.2f}{count / end_seconds:>12.1f}{end_gas // count:>12}")
+    print(f"{'settleExpired':<14}{report['rentals_settled']:>9}{report['seconds']:>10.2f}"
+          f"{report['rentals_per_second']:>12.1f}{report['gas_per_rental']:>12}")
+    print(f"{report['transactions']} settlement transactions, final batch size {report['batch_size']}")
@@ -0,0 +1,79 @@
+# Benchmark: log bytes fetched for the history of one rental, full scan vs topic filter
+# Run with: ape run bench_logs --network ethereum:local:anvil
+#
+# NFTFLEX_LOG_EVENTS  NFTFlex events on chain before querying (default 100000)
+#
+# The full scan is what a client without indexed rental IDs has to do: download every NFTFlex
+# log and keep the ones of the rental. The topic filter lets the node return only those.
+# Bytes are the size of the eth_getLogs responses, measured with nftflex.instrument.
+import os
+import time
+from ape import accounts, chain, networks, project
+from nftflex.history import EventQuery
+from nftflex.instrument import RpcRecorder, phase
+
+
+SEED_CHUNK = 200  # NFTs minted and listed per transaction while seeding
+price_per_hour = 10 ** 15
+collateral_amount = 10 ** 15
+eth_collateral = "0x0000000000000000000000000000000000000000"
+duration = 1
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+
+def list_nfts(owner, simple_nft, nft_flex, count: int) -> None:
+    """Mint and list ``count`` NFTs, one NFTFlex__RentalCreated event each."""
+    for listed in range(0, count, SEED_CHUNK):
+        receipt = simple_nft.mintBatch(owner, [metadata_url] * min(SEED_CHUNK, count - listed), sender=owner)
+        token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+        nft_flex.createRentals(
+            simple_nft.address,
+            [(token_id, price_per_hour, False, eth_collateral, collateral_amount) for token_id in token_ids],
+            sender=owner,
+        )
+
+
+def main():
+    count = int(os.environ.get("NFTFLEX_LOG_EVENTS", "100000"))
+    owner, renter = accounts.test_accounts[0], accounts.test_accounts[1]
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    # The measured rental is listed halfway, then repriced, rented and settled
+    print(f"Emitting {count} NFTFlex events...")
+    list_nfts(owner, simple_nft, nft_flex, count // 2)
+    rental_id = nft_flex.getRentalCounter() - 1
+    nft_flex.updatePrices([rental_id], [2 * price_per_hour], sender=owner)
+    nft_flex.rentNFT(rental_id, duration, value=2 * price_per_hour * duration + collateral_amount, sender=renter)
+    chain.mine(timestamp=chain.blocks.head.timestamp + duration * 3600 + 1)
+    nft_flex.settleExpired([rental_id], sender=renter)
+    list_nfts(owner, simple_nft, nft_flex, count - count // 2 - 4)
+
+    web3 = networks.provider.web3
+    query = EventQuery(web3, nft_flex.address, start_block=start_block)
+    to_block = web3.eth.block_number
+    recorder = RpcRecorder().install(web3)
+    try:
+        started_at = time.perf_counter()
+        with phase("full scan"):
+            logs = query.logs([query.decoder.topics], to_block=to_block)
+            scanned = [log for log in logs if log.args.get("rentalId") == rental_id]
+        scan_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        with phase("topic filter"):
+            filtered = query.rental_history(rental_id, to_block=to_block)
+        filter_seconds = time.perf_counter() - started_at
+    finally:
+        recorder.uninstall()
+
+    phases = recorder.by_phase()
+    assert [log.name for log in scanned] == [log.name for log in filtered], "the two queries disagree"
+    print(f"{len(logs)} NFTFlex logs on chain, {len(filtered)} of rental {rental_id}: "
+          f"{', '.join(log.name for log in filtered)}")
+    print(f"\n{'query':<14}{'requests':>10}{'bytes':>14}{'seconds':>10}")
+    for name, seconds in (("full scan", scan_seconds), ("topic filter", filter_seconds)):
+        requests, _, _, _, _, response_bytes = phases[name]
+        print(f"{name:<14}{requests:>10}{response_bytes:>14,}{seconds:>10.2f}")
+    print(f"The topic filter fetches {phases['full scan'][5] / max(1, phases['topic filter'][5]):,.0f}x fewer bytes")
@@ -0,0 +1,166 @@
+# Benchmark: loading the marketplace with one `s_rentals(i)` call per rental vs paged `getRentals`
+# vs the same per-rental reads batched through Multicall3, and finding a token's renter with
+# `userOf` vs scanning the rentals
+# Run with: ape run bench_rentals --network ethereum:local:test
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from ape import accounts, project, networks
+from nftflex.reads import DEFAULT_BATCH_SIZE, batch
+from nftflex.rentals import DEFAULT_PAGE_SIZE, load_rentals
+
+
+SIZES = [1_000, 5_000, 10_000]
+SEED_CHUNK = 200  # NFTs minted and listed per transaction while seeding
+
+metadata_urls = [
+    "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm", # Bhawal Resort & Spa
+    "ipfs://QmZmPMzHxDKL4zmbBw6M4YhAuAkeUsFnvYV7uupuGoHte8", # The Royena Resort Ltd
+    "ipfs://QmbbLW4nkf3iGkEBPBUL8swMtWJ8PARNTFdJYAkMCDE9Ft", # Chuti Resort Gazipur
+    "ipfs://QmPn55rVcTsse3ZyVMG7vRVvTnRuvUZsxrAnCwFxXzqf4P", # CCULB Resort & Convention Hall
+    "ipfs://Qma9SwWr3JQoVny5E5yhkhu2iPjUDVNeNcBJT1AgE4z6Hn" # Third Terrace Resorts
+]
+
+
+@contextmanager
+def count_rpc_calls() -> Iterator[Dict[str, int]]:
+    """
+    Count the JSON-RPC requests sent through the active provider.
+
+    Yields:
+        Dict[str, int]: Request counts per RPC method, filled in while the block runs.
+    """
+    web3_provider = networks.provider.web3.provider
+    original_make_request = web3_provider.make_request
+    counts: Dict[str, int] = {}
+
+    def counting_make_request(method, params):
+        counts[method] = counts.get(method, 0) + 1
+        return original_make_request(method, params)
+
+    web3_provider.make_request = counting_make_request
+    try:
+        yield counts
+    finally:
+        web3_provider.make_request = original_make_request
+
+
+def seed_rentals(account, simple_nft, nft_flex, target: int) -> None:
+    """
+    Mint and list NFTs until the marketplace holds ``target`` rentals.
+    """
+    while (current := nft_flex.getRentalCounter()) < target:
+        count = min(SEED_CHUNK, target - current)
+        urls = [metadata_urls[i % len(metadata_urls)] for i in range(count)]
+        receipt = simple_nft.mintBatch(account.address, urls, sender=account)
+        token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+        rentals = [
+            (token_id, int(1e18), False, "0x0000000000000000000000000000000000000000", int(2e18))
+            for token_id in token_ids
+        ]
+        nft_flex.createRentals(simple_nft.address, rentals, sender=account)
+
+
+def load_per_rental(simple_nft, nft_flex) -> int:
+    """
+    Today's client flow: counter, then `s_rentals`, `ownerOf` and `tokenURI` per rental.
+    """
+    rental_count = nft_flex.getRentalCounter()
+    for rental_id in range(rental_count):
+        rental = nft_flex.s_rentals(rental_id)
+        simple_nft.ownerOf(rental.tokenId)
+        simple_nft.tokenURI(rental.tokenId)
+    return rental_count
+
+
+def load_paged(simple_nft, nft_flex, with_metadata: bool) -> int:
+    """
+    Paged flow: one `getRentals` call per page, optionally one `tokenURI` per rental.
+    """
+    rentals = load_rentals(nft_flex)
+    if with_metadata:
+        for _, rental in rentals:
+            simple_nft.tokenURI(rental.tokenId)
+    return len(rentals)
+
+
+def load_batched(simple_nft, nft_flex, multicall) -> int:
+    """
+    Today's client flow with every read queued on a Multicall3 batch reader.
+    """
+    web3 = networks.provider.web3
+    with batch(web3, multicall_address=multicall.address) as reader:
+        flex = reader.contract(nft_flex.address, "NFTFlex")
+        nft = reader.contract(simple_nft.address, "SimpleNFT")
+        rental_count = flex.getRentalCounter().value
+        rentals = [flex.s_rentals(rental_id) for rental_id in range(rental_count)]
+        reader.flush()
+        for rental in rentals:
+            nft.ownerOf(rental.value.tokenId)
+            nft.tokenURI(rental.value.tokenId)
+    return rental_count
+
+
+def find_renter_by_scan(simple_nft, nft_flex, token_id: int):
+    """
+    Without the reverse index: page through every rental until the token's listing shows up.
+    """
+    for _, rental in load_rentals(nft_flex):
+        if rental.nftAddress == simple_nft.address and rental.tokenId == token_id:
+            return rental.renter
+    return None
+
+
+def find_renter_by_index(simple_nft, nft_flex, token_id: int):
+    """
+    With the reverse index: one `userOf` call.
+    """
+    return nft_flex.userOf(simple_nft.address, token_id)
+
+
+def measure_lookup(label: str, find, simple_nft, nft_flex, token_id: int) -> None:
+    with count_rpc_calls() as counts:
+        started_at = time.perf_counter()
+        find(simple_nft, nft_flex, token_id)
+        elapsed = time.perf_counter() - started_at
+
+    print(f"  {label:<28} rpc_calls={sum(counts.values()):>6}  wall={elapsed * 1000:8.1f}ms")
+
+
+def measure(label: str, load, *args) -> None:
+    with count_rpc_calls() as counts:
+        started_at = time.perf_counter()
+        loaded = load(*args)
+        elapsed = time.perf_counter() - started_at
+
+    print(f"  {label:<28} rentals={loaded:>6}  rpc_calls={sum(counts.values()):>6}  wall={elapsed:8.2f}s")
+
+
+def main():
+    account = accounts.test_accounts[0]
+    renter = accounts.test_accounts[1]
+    simple_nft = account.deploy(project.SimpleNFT)
+    nft_flex = account.deploy(project.NFTFlex)
+    multicall = account.deploy(project.Multicall3)
+
+    print(f"Benchmarking rental loading on {networks.provider.network.name} "
+          f"(page size {DEFAULT_PAGE_SIZE}, batch size {DEFAULT_BATCH_SIZE})")
+    for size in SIZES:
+        seed_rentals(account, simple_nft, nft_flex, size)
+        print(f"\n{size} rentals:")
+        measure("s_rentals(i) + metadata", load_per_rental, simple_nft, nft_flex)
+        measure("multicall + metadata", load_batched, simple_nft, nft_flex, multicall)
+        measure("getRentals pages", load_paged, simple_nft, nft_flex, False)
+        measure("getRentals pages + tokenURI", load_paged, simple_nft, nft_flex, True)
+
+        # Rent the newest listing and look up its renter by token, the worst case for a scan
+        rental_id = size - 1
+        token_id = nft_flex.s_rentals(rental_id).tokenId
+        nft_flex.rentNFT(rental_id, 1, value=int(1e18) + int(2e18), sender=renter)
+        measure_lookup("renter lookup: scan", find_renter_by_scan, simple_nft, nft_flex, token_id)
+        measure_lookup("renter lookup: userOf", find_renter_by_index, simple_nft, nft_flex, token_id)
+        print(
+            f"  {'gas: userOf vs status scan':<28} "
+            f"{nft_flex.userOf.estimate_gas_cost(simple_nft.address, token_id)} vs "
+            f"{nft_flex.getRentalsByStatus.estimate_gas_cost(1, 0, SIZES.index(size) + 1)}"  # all active rentals
+        )
@@ -1,10 +1,20 @@
 # ApeWorX Deployment Script for Sepolia & Local Anvil Network
 # Docs: https://docs.apeworx.io/ape/latest/userguides/scripts.html
 # Scripts -> https://docs.apeworx.io/ape/stable/userguides/scripts.html
+#
+# NFTFLEX_INSTRUMENT=1       record every JSON-RPC call and time the compile, deploy, mint, list,
+#                            read and export phases (see nftflex/instrument.py)
+# NFTFLEX_INSTRUMENT_DIR     where the summary, trace and Prometheus snapshot go (default .build/instrument)
 import json
 import os
+import time
 from ape import accounts, project, networks
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from nftflex import instrument
+from nftflex.artifacts import export_artifacts
+from nftflex.instrument import phase
+from nftflex.metadata import cid_digest
+from nftflex.reads import MULTICALL3_ADDRESS, batch
 
 
 
@@ -18,74 +28,6 @@ metadata_urls = [
 ]
 
 
-# Define the path to the parent directory and the file
-parent_dir = os.path.dirname(os.path.abspath(__file__))  # Get the current script's directory
-local_json_path = os.path.join(parent_dir, '..', '.build', '__local__.json')  # Path to the parent directory JSON file
-
-def save_abi(contract_name: str) -> None:
-    """
-    Save the ABI of a contract to a JSON file.
-    
-    Args:
-        contract_name (str): The name of the contract to save the ABI for.
-    """
-    # Attempt to get the contract from the project
-    contract = getattr(project, contract_name, None)
-    
-    # Check if the contract is found
-    if not contract:
-        print(f"Contract '{contract_name}' not found in the project!")
-        return
-
-    # Attempt to get the ABI from the contract
-    try:
-        abi = contract.abi  # Assuming the contract object has an 'abi' attribute
-    except AttributeError:
-        print(f"ABI for contract '{contract_name}' not found!")
-        return
-
-
-
-    # Check if the file exists before proceeding
-    if not os.path.exists(local_json_path):
-        print(f"The file '{local_json_path}' does not exist!")
-        return
-
-    # Load the JSON data from the file
-    try:
-        with open(local_json_path, 'r') as f:
-            local_json = json.load(f)
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON from the file '{local_json_path}'!")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred while reading the file: {e}")
-        return
-
-    # Check if the contract name exists in the loaded JSON
-    if contract_name not in local_json['contractTypes']:
-        print(f"Contract name '{contract_name}' not found in the JSON file!")
-        return
-
-    # Extract the ABI for the contract from the JSON
-    try:
-        contract_abi = local_json['contractTypes'][contract_name]['abi']
-    except KeyError:
-        print(f"ABI not found for contract '{contract_name}' in the JSON data!")
-        return
-
-    # Write the ABI to a new JSON file
-    try:
-        with open(f'abis/{contract_name}_ABI.json', 'w') as contract_file:
-            json.dump(contract_abi, contract_file, indent=4)
-        print(f"ABI for contract '{contract_name}' saved successfully!")
-    except IOError:
-        print(f"Error writing the ABI to the file '{contract_name}_ABI.json'!")
-    except Exception as e:
-        print(f"An unexpected error occurred while writing the ABI: {e}")
-
-
-
 def deploy_contracts(account) -> Dict[str, str]:
     """
     Deploy SimpleNFT and NFTFlex contracts.
@@ -106,72 +48,324 @@ def deploy_contracts(account) -> Dict[str, str]:
 
     return {
         "SimpleNFT": simple_nft.address,
-        "NFTFlex": nft_flex.address
+        "NFTFlex": nft_flex.address,
+        "Multicall3": deploy_multicall(account)
     }
 
 
-def list_nfts_for_rental(account, simple_nft, nft_flex, token_id: int, metadata_url: str) -> None:
+def deploy_multicall(account) -> str:
+    """
+    Return the Multicall3 address used for batched reads, deploying one if the chain has none.
+
+    Public networks have Multicall3 at its canonical address, local chains usually do not.
+
+    Args:
+        account: The account used for deploying the contract.
+
+    Returns:
+        str: The Multicall3 address.
     """
-    List the minted NFT for rental on NFTFlex contract.
+    if networks.provider.web3.eth.get_code(MULTICALL3_ADDRESS):
+        print(f"Using Multicall3 at: {MULTICALL3_ADDRESS}")
+        return MULTICALL3_ADDRESS
+
+    print("Deploying Multicall3...")
+    multicall = account.deploy(project.Multicall3)
+    print(f"Multicall3 deployed at: {multicall.address}")
+    return multicall.address
+
+
+def list_nfts_for_rental(account, simple_nft, nft_flex, token_ids: List[int], metadata_urls: List[str]) -> None:
+    """
+    List the minted NFTs for rental on NFTFlex contract in a single transaction.
     
     Args:
         account: The account interacting with the contract.
         simple_nft: The SimpleNFT contract instance.
         nft_flex: The NFTFlex contract instance.
-        token_id (int): The token ID of the minted NFT.
-    """
-    print("Listing NFT for rental...")
-    nft_flex.createRental(
-        simple_nft.address,
-        token_id,
-        int(1e18),  # Price per hour (1 ETH)
-        False,  # Not fractional
-        "0x0000000000000000000000000000000000000000",  # Native ETH as collateral
-        int(2e18),  # Collateral amount (2 ETH)
-        sender=account
-    )
-    print(f"Created rental for token ID {token_id} with metadata {metadata_url}")
+        token_ids (List[int]): The token IDs of the minted NFTs.
+        metadata_urls (List[str]): The metadata URLs of the minted NFTs.
+    """
+    print(f"Listing {len(token_ids)} NFTs for rental...")
+    rentals = [
+        (
+            token_id,
+            int(1e18),  # Price per hour (1 ETH)
+            False,  # Not fractional
+            "0x0000000000000000000000000000000000000000",  # Native ETH as collateral
+            int(2e18),  # Collateral amount (2 ETH)
+        )
+        for token_id in token_ids
+    ]
+    nft_flex.createRentals(simple_nft.address, rentals, sender=account)
+    for token_id, metadata_url in zip(token_ids, metadata_urls):
+        print(f"Created rental for token ID {token_id} with metadata {metadata_url}")
+
+
+def print_rentals(contract_addresses: Dict[str, str]) -> None:
+    """
+    Print every listed rental, reading all of them with one batched request.
 
+    Args:
+        contract_addresses (Dict[str, str]): The deployed contract addresses.
+    """
+    with batch(networks.provider.web3, multicall_address=contract_addresses.get("Multicall3")) as reader:
+        nft_flex = reader.contract(contract_addresses["NFTFlex"], "NFTFlex")
+        rental_count = nft_flex.getRentalCounter().value
+        rentals = [nft_flex.s_rentals(rental_id) for rental_id in range(rental_count)]
+
+    print(f"{rental_count} rentals listed ({reader.stats.rpc_requests} RPC requests, {reader.mode}):")
+    for rental_id, rental in enumerate(rentals):
+        rental = rental.value
+        print(f"- Rental {rental_id}: token {rental.tokenId}, {rental.pricePerHour} wei/hour, owner {rental.owner}")
 
-def mint_nft(account, simple_nft, metadata_url: str) -> int:
+
+def mint_nfts(account, simple_nft, metadata_urls: List[str]) -> List[int]:
     """
-    Mint a new NFT from the SimpleNFT contract with a metadata URL.
+    Mint one NFT per metadata URL from the SimpleNFT contract in a single transaction.
+
+    When every URL is a bare ``ipfs://<CIDv0>``, only the CIDs' digests are stored
+    (``mintBatchCompact``); ``tokenURI`` returns the same URLs either way.
     
     Args:
-        account: The account minting the NFT.
+        account: The account minting the NFTs.
         simple_nft: The SimpleNFT contract instance.
-        metadata_url (str): The IPFS URL of the metadata.
+        metadata_urls (List[str]): The IPFS URLs of the metadata.
     
     Returns:
-        int: The token ID of the minted NFT.
+        List[int]: The token IDs of the minted NFTs, in the order of ``metadata_urls``.
     """
-    print(f"Minting an NFT with metadata at {metadata_url}...")
+    print(f"Minting {len(metadata_urls)} NFTs...")
     
-    # Mint the NFT with the metadata URL
-    tx = simple_nft.mint(account.address, metadata_url, sender=account)
-    token_id = simple_nft.nextTokenId() - 1  # Get the last minted token ID
-    print(f"Minted NFT with token ID: {token_id}")
+    # Mint the NFTs and read their IDs from the Transfer events
+    digests = [cid_digest(metadata_url) for metadata_url in metadata_urls]
+    if all(digests):
+        tx = simple_nft.mintBatchCompact(account.address, digests, sender=account)
+    else:
+        tx = simple_nft.mintBatch(account.address, metadata_urls, sender=account)
+    token_ids = [event["tokenId"] for event in tx.events.filter(simple_nft.Transfer)]
+    print(f"Minted NFTs with token IDs: {token_ids}")
     
-    return token_id
+    return token_ids
 
 
 def save_contract_data(active_network, contract_addresses) -> None:
     """
-    Save the deployed contract addresses to a JSON file.
-    
+    Export the ABIs, the deployed contract addresses and the event/error lookup tables
+    to the smart-contract and client directories in one pass over the build manifest.
+
     Args:
         active_network: The active network in use.
         contract_addresses: A dictionary containing contract addresses.
     """
-    contract_data = {
-        "network": active_network.network.name,
-        **contract_addresses
-    }
+    started_at = time.perf_counter()
+    result = export_artifacts(
+        contract_addresses, network=active_network.network.name, chain_id=active_network.chain_id
+    )
+    print(
+        f"Exported contract data in {(time.perf_counter() - started_at) * 1000:.1f}ms: "
+        f"{len(result.written)} files written, {len(result.unchanged)} unchanged"
+    )
+
+
+# Gas limits for pipelined seeding. Listing transactions are signed before the
+# mint they depend on is mined, so their gas cannot be estimated up front.
+SEED_BASE_GAS_LIMIT = 60_000
+SEED_MINT_GAS_PER_ITEM = 150_000
+SEED_LIST_GAS_PER_ITEM = 200_000
+SEED_DEFAULT_WINDOW = 50
+
+
+def load_seed_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+    """
+    Load a seeding manifest describing the NFTs to mint and list.
+
+    The manifest is a JSON list of objects. Only ``metadataUrl`` is required;
+    the remaining keys default to the terms used by ``list_nfts_for_rental``.
+
+    Args:
+        manifest_path (str): Path to the manifest JSON file.
+
+    Returns:
+        List[Dict[str, Any]]: The normalized manifest entries.
+    """
+    with open(manifest_path, 'r') as f:
+        raw_entries = json.load(f)
+
+    entries = []
+    for index, raw_entry in enumerate(raw_entries):
+        if "metadataUrl" not in raw_entry:
+            raise ValueError(f"Manifest entry {index} is missing 'metadataUrl'!")
+
+        entries.append({
+            "metadataUrl": raw_entry["metadataUrl"],
+            "pricePerHour": int(raw_entry.get("pricePerHour", int(1e18))),
+            "isFractional": bool(raw_entry.get("isFractional", False)),
+            "collateralToken": raw_entry.get("collateralToken", "0x0000000000000000000000000000000000000000"),
+            "collateralAmount": int(raw_entry.get("collateralAmount", int(2e18))),
+        })
+
+    return entries
+
+
+def load_seed_checkpoint(checkpoint_path: str) -> Dict[str, Any]:
+    """
+    Load the seeding checkpoint, or an empty one if it does not exist yet.
+
+    Args:
+        checkpoint_path (str): Path to the checkpoint JSON file.
+
+    Returns:
+        Dict[str, Any]: ``contracts`` holds the seeded contract addresses,
+        ``minted`` maps manifest index to token ID and ``listed`` holds the
+        manifest indexes that are already listed.
+    """
+    if not os.path.exists(checkpoint_path):
+        return {"minted": {}, "listed": []}
+
+    with open(checkpoint_path, 'r') as f:
+        return json.load(f)
+
 
-    with open("contract_addresses.json", "w") as file:
-        json.dump(contract_data, file, indent=4)
+def save_seed_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]) -> None:
+    """
+    Atomically persist the seeding checkpoint.
+
+    Args:
+        checkpoint_path (str): Path to the checkpoint JSON file.
+        checkpoint (Dict[str, Any]): The checkpoint to save.
+    """
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=4)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def send_without_waiting(account, txn) -> str:
+    """
+    Sign a prepared transaction and broadcast it without waiting for the receipt.
+
+    Args:
+        account: The account signing the transaction.
+        txn: The prepared transaction (nonce and gas limit already set).
+
+    Returns:
+        str: The transaction hash.
+    """
+    signed_txn = account.sign_transaction(txn)
+    txn_hash = networks.provider.web3.eth.send_raw_transaction(signed_txn.serialize_transaction())
+    return txn_hash.hex()
+
+
+def seed_from_manifest(account, simple_nft, nft_flex, manifest_path: str, checkpoint_path: str,
+                       window: int = SEED_DEFAULT_WINDOW) -> Dict[str, Any]:
+    """
+    Mint and list every manifest entry using pipelined transaction windows.
+
+    Each window pre-assigns nonces, broadcasts one ``mintBatch`` and one
+    ``createRentals`` transaction without waiting on receipts, and only then
+    collects the receipts. Progress is checkpointed after every window, so
+    rerunning after a partial failure resumes with the entries that did not
+    make it.
+
+    Args:
+        account: The account minting and listing the NFTs.
+        simple_nft: The SimpleNFT contract instance.
+        nft_flex: The NFTFlex contract instance.
+        manifest_path (str): Path to the seeding manifest.
+        checkpoint_path (str): Path to the checkpoint file.
+        window (int): Number of manifest entries per pipelined window.
+
+    Returns:
+        Dict[str, Any]: The final checkpoint.
+    """
+    entries = load_seed_manifest(manifest_path)
+    checkpoint = load_seed_checkpoint(checkpoint_path)
+    listed = set(checkpoint["listed"])
+    pending = [index for index in range(len(entries)) if index not in listed]
+    print(f"Seeding {len(pending)} of {len(entries)} manifest entries in windows of {window}...")
+
+    for window_start in range(0, len(pending), window):
+        window_indexes = pending[window_start:window_start + window]
+        started_at = time.perf_counter()
+        nonce = account.nonce
+        next_token_id = simple_nft.nextTokenId()
+        submit_error: Optional[Exception] = None
+
+        # Broadcast the window's mintBatch first so that the listings land after it.
+        to_mint = [index for index in window_indexes if str(index) not in checkpoint["minted"]]
+        predicted_token_ids = {index: next_token_id + offset for offset, index in enumerate(to_mint)}
+        mint_hash = None
+        if to_mint:
+            urls = [entries[index]["metadataUrl"] for index in to_mint]
+            digests = [cid_digest(url) for url in urls]
+            mint_batch = simple_nft.mintBatchCompact if all(digests) else simple_nft.mintBatch
+            txn = mint_batch.as_transaction(
+                account.address, digests if all(digests) else urls,
+                sender=account, nonce=nonce,
+                gas_limit=SEED_BASE_GAS_LIMIT + SEED_MINT_GAS_PER_ITEM * len(to_mint)
+            )
+            try:
+                mint_hash = send_without_waiting(account, txn)
+                nonce += 1
+            except Exception as e:
+                submit_error = e
+
+        list_hash = None
+        rentals = []
+        for index in window_indexes:
+            token_id = checkpoint["minted"].get(str(index), predicted_token_ids.get(index))
+            entry = entries[index]
+            rentals.append((
+                token_id, entry["pricePerHour"], entry["isFractional"],
+                entry["collateralToken"], entry["collateralAmount"]
+            ))
+        if not submit_error:
+            txn = nft_flex.createRentals.as_transaction(
+                simple_nft.address, rentals,
+                sender=account, nonce=nonce,
+                gas_limit=SEED_BASE_GAS_LIMIT + SEED_LIST_GAS_PER_ITEM * len(rentals)
+            )
+            try:
+                list_hash = send_without_waiting(account, txn)
+            except Exception as e:
+                submit_error = e
+
+        # Collect the receipts at the end of the window. Batches are atomic, so a
+        # failed receipt means none of its entries made it.
+        failed = []
+        if mint_hash:
+            receipt = networks.provider.get_receipt(mint_hash)
+            if receipt.failed:
+                failed.extend(to_mint)
+            else:
+                minted_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+                for index, token_id in zip(to_mint, minted_ids):
+                    checkpoint["minted"][str(index)] = token_id
+
+        listed_count = 0
+        if list_hash:
+            receipt = networks.provider.get_receipt(list_hash)
+            if receipt.failed:
+                failed.extend(window_indexes)
+            else:
+                checkpoint["listed"].extend(window_indexes)
+                listed_count = len(window_indexes)
+
+        save_seed_checkpoint(checkpoint_path, checkpoint)
+
+        elapsed = time.perf_counter() - started_at
+        throughput = listed_count / elapsed if elapsed > 0 else 0.0
+        print(f"Window {window_start // window + 1}: listed {listed_count}/{len(window_indexes)} "
+              f"in {elapsed:.2f}s ({throughput:.1f} listings/sec)")
+
+        if submit_error or failed:
+            print(f"Seeding stopped (failed entries: {sorted(set(failed))}, error: {submit_error}). "
+                  f"Rerun to resume from '{checkpoint_path}'.")
+            break
+
+    return checkpoint
 
-    print("Contract addresses saved to contract_addresses.json")
 
 def list_accounts():
     # List all account aliases
@@ -206,12 +400,29 @@ def main():
     # Determine the network and select the appropriate provider
     active_network = networks.active_provider
     print(f"Deploying on {active_network} network...")
+    recorder = instrument.from_env(networks.provider.web3)
+
+    # Compile up front, so its time is not mistaken for the first deployment's
+    with phase("compile"):
+        project.load_contracts()
 
     # Load an account to deploy the contracts
     account = accounts.test_accounts[-1]
 
-    # Deploy the contracts
-    contract_addresses = deploy_contracts(account)
+    # Batch seeding mode for large marketplaces (see seed_from_manifest)
+    manifest_path = os.environ.get("NFTFLEX_SEED_MANIFEST")
+    checkpoint_path = os.environ.get("NFTFLEX_SEED_CHECKPOINT", f"{manifest_path}.checkpoint")
+    checkpoint = load_seed_checkpoint(checkpoint_path) if manifest_path else {}
+
+    # Deploy the contracts, unless we are resuming a seeding run against existing ones
+    if "contracts" in checkpoint:
+        contract_addresses = checkpoint["contracts"]
+        print(f"Resuming seeding against {contract_addresses}")
+    else:
+        with phase("deploy"):
+            contract_addresses = deploy_contracts(account)
+        if manifest_path:
+            save_seed_checkpoint(checkpoint_path, {"contracts": contract_addresses, "minted": {}, "listed": []})
 
     # Mint and list NFTs for rental
     simple_nft = project.SimpleNFT.at(contract_addresses["SimpleNFT"])
@@ -220,19 +431,32 @@ def main():
     # token_id = mint_nft(account, simple_nft)
     # list_nfts_for_rental(account, simple_nft, nft_flex, token_id)
     # Assuming your images are uploaded to IPFS and you have their URLs
-    # Iterate over metadata_urls to mint NFTs
-    for metadata_url in metadata_urls:
-        token_id = mint_nft(account, simple_nft, metadata_url)
-        list_nfts_for_rental(account, simple_nft, nft_flex, token_id, metadata_url) # Renting price and collateral
+    if manifest_path:
+        window = int(os.environ.get("NFTFLEX_SEED_WINDOW", SEED_DEFAULT_WINDOW))
+        with phase("seed"):
+            seed_from_manifest(account, simple_nft, nft_flex, manifest_path, checkpoint_path, window)
+    else:
+        # Mint and list all metadata_urls with one transaction each
+        with phase("mint"):
+            token_ids = mint_nfts(account, simple_nft, metadata_urls)
+        with phase("list"):
+            list_nfts_for_rental(account, simple_nft, nft_flex, token_ids, metadata_urls) # Renting price and collateral
 
 
-    # Save contract data and ABI files
-    save_contract_data(active_network, contract_addresses)
-    save_abi("SimpleNFT")
-    save_abi("NFTFlex")
+    with phase("read"):
+        print_rentals(contract_addresses)
+
+    # Save contract addresses and ABI files for the scripts and the client
+    with phase("export"):
+        save_contract_data(active_network, contract_addresses)
 
     list_accounts()
 
+    if recorder:
+        recorder.uninstall()
+        print(f"\nRPC instrumentation:\n{recorder.summary()}")
+        print(f"Reports written to {', '.join(recorder.write_reports(instrument.report_dir()).values())}")
+
 
 if __name__ == "__main__":
     main()
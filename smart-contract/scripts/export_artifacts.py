@@ -0,0 +1,17 @@
+# Export the ABIs and event/error lookup tables of the compiled contracts to abis/ and the client,
+# without deploying (deploy.py exports them together with the addresses)
+# Run with: ape compile && ape run export_artifacts
+#
+# Outputs that did not change are left untouched, so running it again is nearly free.
+import time
+from nftflex.artifacts import export_artifacts
+
+
+def main():
+    started_at = time.perf_counter()
+    result = export_artifacts()
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    for path in result.written:
+        print(f"  wrote {path}")
+    state = "parsed the manifest" if result.parsed else "manifest unchanged"
+    print(f"{len(result.written)} files written, {len(result.unchanged)} unchanged ({state}, {elapsed_ms:.1f}ms)")
@@ -0,0 +1,42 @@
+# Follow the chain and print every rental change as it is confirmed
+# Run with: ape run follow_rentals --network ethereum:local:test
+#
+# NFTFLEX_INDEX_DB         SQLite file to keep in sync (default rentals.db, shared with index_rentals)
+# NFTFLEX_CONFIRMATIONS    blocks to wait before applying a block (default 2)
+# NFTFLEX_POLL_INTERVAL    seconds between polls of the chain head (default 1)
+import asyncio
+import os
+from ape import networks
+from nftflex.abi import load_contract_address
+from nftflex.follower import RentalDiff, RentalFollower
+from nftflex.indexer import RentalStore
+
+
+def print_diff(diff: RentalDiff) -> None:
+    if diff.reverted:
+        print(f"[block {diff.block_number}] rental {diff.rental_id} rolled back")
+    elif diff.before is None:
+        print(f"[block {diff.block_number}] rental {diff.rental_id} listed by {diff.after['owner']}")
+    else:
+        changed = {key: value for key, value in diff.after.items() if diff.before.get(key) != value}
+        print(f"[block {diff.block_number}] rental {diff.rental_id} changed: {changed}")
+
+
+def main():
+    store = RentalStore(os.environ.get("NFTFLEX_INDEX_DB", "rentals.db"))
+    follower = RentalFollower(
+        networks.provider.web3,
+        load_contract_address("NFTFlex"),
+        store,
+        confirmations=int(os.environ.get("NFTFLEX_CONFIRMATIONS", "2")),
+        poll_interval=float(os.environ.get("NFTFLEX_POLL_INTERVAL", "1")),
+    )
+    follower.subscribe(print_diff)
+
+    print(f"Following NFTFlex on {networks.provider.network.name} (Ctrl+C to stop)...")
+    try:
+        asyncio.run(follower.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
@@ -0,0 +1,82 @@
+# Gas regression report for the NFTFlex rental lifecycle
+# Run with: ape run gas_report --network ethereum:local:test
+#
+# To compare two versions of the contracts, save a report on the old version and
+# pass it as the baseline when running on the new one:
+#   NFTFLEX_GAS_REPORT=gas_before.json ape run gas_report   # on the old commit
+#   NFTFLEX_GAS_BASELINE=gas_before.json ape run gas_report # on the new commit
+import json
+import os
+from typing import Dict
+from ape import accounts, project, chain
+
+
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+
+def measure_lifecycle(owner, renter) -> Dict[str, int]:
+    """
+    Run create -> rent -> withdraw -> end on fresh contracts and record gas per call.
+
+    Every function is measured twice: the first rental touches cold, zero storage
+    (contract counter included) while the second one runs against warm contract state.
+    """
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    report: Dict[str, int] = {}
+
+    for label in ("first", "second"):
+        mint_tx = simple_nft.mint(owner, metadata_url, sender=owner)
+        token_id = list(mint_tx.events.filter(simple_nft.Transfer))[0]["tokenId"]
+        rental_id = nft_flex.getRentalCounter()
+
+        create_tx = nft_flex.createRental(
+            simple_nft.address, token_id, price_per_hour, False, collateral_token, collateral_amount, sender=owner
+        )
+        rent_tx = nft_flex.rentNFT(
+            rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=renter
+        )
+        chain.mine(timestamp=nft_flex.s_rentals(rental_id).endTime + 1)
+        withdraw_tx = nft_flex.withdrawEarnings(rental_id, sender=owner)
+        end_tx = nft_flex.endRental(rental_id, sender=renter)
+
+        report[f"createRental ({label})"] = create_tx.gas_used
+        report[f"rentNFT ({label})"] = rent_tx.gas_used
+        report[f"withdrawEarnings ({label})"] = withdraw_tx.gas_used
+        report[f"endRental ({label})"] = end_tx.gas_used
+
+    return report
+
+
+def print_report(report: Dict[str, int], baseline: Dict[str, int]) -> None:
+    print(f"{'function':<28}{'before':>10}{'after':>10}{'delta':>10}")
+    for name, gas in report.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>10}{gas:>10}{'-':>10}")
+        else:
+            delta = (gas - before) / before * 100
+            print(f"{name:<28}{before:>10}{gas:>10}{delta:>9.1f}%")
+
+
+def main():
+    owner = accounts.test_accounts[0]
+    renter = accounts.test_accounts[1]
+
+    report = measure_lifecycle(owner, renter)
+
+    baseline: Dict[str, int] = {}
+    baseline_path = os.environ.get("NFTFLEX_GAS_BASELINE")
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    report_path = os.environ.get("NFTFLEX_GAS_REPORT", "gas_report.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Gas report saved to {report_path}")
@@ -0,0 +1,31 @@
+# Build (or update) the local rental database from NFTFlex logs
+# Run with: ape run index_rentals --network ethereum:local:test
+#
+# NFTFLEX_INDEX_DB       SQLite file to write (default rentals.db)
+# NFTFLEX_INDEX_START    first block to scan on an empty database (default 0, the deployment block is faster)
+# NFTFLEX_INDEX_CHUNK    initial number of blocks per eth_getLogs call (default 2000)
+import os
+from ape import networks
+from nftflex.abi import load_contract_address
+from nftflex.indexer import RentalIndexer, RentalStore
+
+
+def main():
+    store = RentalStore(os.environ.get("NFTFLEX_INDEX_DB", "rentals.db"))
+    indexer = RentalIndexer(
+        networks.provider.web3,
+        load_contract_address("NFTFlex"),
+        store,
+        start_block=int(os.environ.get("NFTFLEX_INDEX_START", "0")),
+        chunk_size=int(os.environ.get("NFTFLEX_INDEX_CHUNK", "2000")),
+    )
+
+    print(f"Indexing NFTFlex logs from block {store.last_block if store.last_block is not None else indexer.start_block}...")
+    stats = indexer.sync()
+    store.optimize()
+    print(
+        f"Indexed blocks {stats.from_block}-{stats.to_block}: {stats.logs} events in {stats.seconds:.2f}s "
+        f"({stats.blocks_per_second:,.0f} blocks/s, final chunk size {indexer.chunk_size})"
+    )
+    print(f"{store.count()} rentals in {store.path}")
+    store.close()
@@ -0,0 +1,152 @@
+# Load test of the rent/end/withdraw cycle with many concurrent accounts
+# Run with: ape run load_rentals --network ethereum:local:anvil
+#
+# Every round the owners list one rental per renter, all renters rent at the same time (some of
+# them race for the same rental), the chain is warped past the rental period, then the renters
+# end their rentals while the owners withdraw. The report is written as JSON so runs can be compared.
+#
+# NFTFLEX_LOAD_OWNERS        accounts listing NFTs (default 4)
+# NFTFLEX_LOAD_RENTERS       accounts renting NFTs concurrently (default 32)
+# NFTFLEX_LOAD_ROUNDS        number of rent/end/withdraw cycles (default 3)
+# NFTFLEX_LOAD_ERC20_SHARE   share of rentals with MockERC20 collateral (default 0.5)
+# NFTFLEX_LOAD_CONTENTION    share of renters racing for an already targeted rental (default 0.1)
+# NFTFLEX_LOAD_OUTPUT        report file (default load_report.json)
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from ape import accounts, chain, project, networks
+from nftflex.abi import EventDecoder, load_abi
+from nftflex.load import LoadClient
+
+
+price_per_hour = 10 ** 15
+collateral_amount = 10 ** 15
+eth_collateral = "0x0000000000000000000000000000000000000000"
+duration = 1
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+nft_flex_abi = load_abi("NFTFlex")
+functions = {entry["name"]: entry for entry in nft_flex_abi if entry["type"] == "function"}
+created_decoder = EventDecoder(nft_flex_abi, ["NFTFlex__RentalCreated"])
+
+
+def setup_accounts(funder, mock_erc20, nft_flex, owner_count: int, renter_count: int):
+    """Generate and fund the owner and renter accounts; renters pre-approve NFTFlex for MockERC20."""
+    owners = [accounts.test_accounts.generate_test_account() for _ in range(owner_count)]
+    renters = [accounts.test_accounts.generate_test_account() for _ in range(renter_count)]
+    for account in owners + renters:
+        funder.transfer(account, 10 ** 19)
+    for renter in renters:
+        mock_erc20.transfer(renter, 10 ** 21, sender=funder)
+        mock_erc20.approve(nft_flex.address, 2 ** 256 - 1, sender=renter)
+    return owners, renters
+
+
+async def run_round(client, rng, simple_nft, nft_flex, mock_erc20, owners, renters, erc20_share, contention):
+    # Owners mint up front (not measured), then list one rental per renter concurrently
+    per_owner = math.ceil(len(renters) / len(owners))
+    listings = []
+    for owner in owners:
+        receipt = simple_nft.mintBatch(owner, [metadata_url] * per_owner, sender=owner)
+        for event in receipt.events.filter(simple_nft.Transfer):
+            token = mock_erc20.address if rng.random() < erc20_share else eth_collateral
+            listings.append((owner, event["tokenId"], token))
+
+    results = await client.gather(*[
+        client.send("createRental", owner.private_key, nft_flex.address, functions["createRental"],
+                    [simple_nft.address, token_id, price_per_hour, False, token, collateral_amount])
+        for owner, token_id, token in listings
+    ])
+    rentals = []
+    for (owner, _, token), result in zip(listings, results):
+        if result.error is None:
+            for log in result.receipt["logs"]:
+                decoded = created_decoder.decode(log)
+                if decoded is not None:
+                    rentals.append((decoded.args["rentalId"], owner, token))
+
+    if not rentals:
+        return
+
+    # Renters race: a share of them target a rental another renter already picked
+    targets = []
+    for index in range(len(renters)):
+        if targets and rng.random() < contention:
+            targets.append(rng.choice(targets))
+        else:
+            targets.append(rentals[index % len(rentals)])
+
+    results = await client.gather(*[
+        client.send("rentNFT", renter.private_key, nft_flex.address, functions["rentNFT"], [rental_id, duration],
+                    value=price_per_hour * duration + collateral_amount if token == eth_collateral else 0)
+        for renter, (rental_id, _, token) in zip(renters, targets)
+    ])
+    rented = [(renter, target) for renter, target, result in zip(renters, targets, results) if result.error is None]
+
+    # Warp past the rental period, then settle from both sides at once
+    chain.mine(timestamp=chain.blocks.head.timestamp + duration * 3600 + 1)
+    await client.gather(*[
+        call
+        for renter, (rental_id, owner, _) in rented
+        for call in (
+            client.send("endRental", renter.private_key, nft_flex.address, functions["endRental"], [rental_id]),
+            client.send("withdrawEarnings", owner.private_key, nft_flex.address, functions["withdrawEarnings"],
+                        [rental_id]),
+        )
+    ])
+
+
+def print_report(report) -> None:
+    print(f"\n{report['transactions']} transactions in {report['seconds']:.2f}s ({report['tx_per_second']:.1f} tx/s)")
+    for operation, stats in report["operations"].items():
+        print(
+            f"  {operation:<18} n={stats['transactions']:>5}  p50={stats['latency_p50_ms']:>8.1f}ms  "
+            f"p95={stats['latency_p95_ms']:>8.1f}ms  p99={stats['latency_p99_ms']:>8.1f}ms  "
+            f"gas={stats['gas_mean']:>7}  reverts={stats['revert_rate']:.1%} {stats['reverts'] or ''}"
+        )
+
+
+def main():
+    config = {
+        "owners": int(os.environ.get("NFTFLEX_LOAD_OWNERS", "4")),
+        "renters": int(os.environ.get("NFTFLEX_LOAD_RENTERS", "32")),
+        "rounds": int(os.environ.get("NFTFLEX_LOAD_ROUNDS", "3")),
+        "erc20_share": float(os.environ.get("NFTFLEX_LOAD_ERC20_SHARE", "0.5")),
+        "contention": float(os.environ.get("NFTFLEX_LOAD_CONTENTION", "0.1")),
+    }
+    output_path = os.environ.get("NFTFLEX_LOAD_OUTPUT", "load_report.json")
+
+    funder = accounts.test_accounts[0]
+    simple_nft = funder.deploy(project.SimpleNFT)
+    nft_flex = funder.deploy(project.NFTFlex)
+    mock_erc20 = funder.deploy(project.MockERC20, "MockToken", "MKT", 18, 10 ** 9 * 10 ** 18)
+
+    print(f"Setting up {config['owners']} owners and {config['renters']} renters...")
+    owners, renters = setup_accounts(funder, mock_erc20, nft_flex, config["owners"], config["renters"])
+
+    web3 = networks.provider.web3
+    client = LoadClient(
+        web3, [nft_flex_abi, load_abi("SimpleNFT")], max_workers=2 * (config["owners"] + config["renters"])
+    )
+    rng = random.Random(0)
+    for round_number in range(config["rounds"]):
+        started_at = time.perf_counter()
+        asyncio.run(run_round(
+            client, rng, simple_nft, nft_flex, mock_erc20, owners, renters, config["erc20_share"], config["contention"]
+        ))
+        print(f"Round {round_number + 1}/{config['rounds']} done in {time.perf_counter() - started_at:.2f}s")
+    client.close()
+
+    report = {
+        "network": networks.provider.network.name,
+        "timestamp": int(time.time()),
+        "config": config,
+        **client.stats.report(),
+    }
+    print_report(report)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nReport saved to {output_path}")
@@ -0,0 +1,54 @@
+# Reprice the listings of one owner from their demand and send the changed prices with updatePrices
+# Run with: ape run reprice --network ethereum:local:anvil
+#
+# NFTFLEX_PRICING_KEY         private key of the listings' owner (default: the first test account)
+# NFTFLEX_PRICING_DB          rental database kept up to date with the logs first (default rentals.db)
+# NFTFLEX_PRICING_WINDOW      hours of history the occupancy is measured over (default 168)
+# NFTFLEX_PRICING_TARGET      target occupancy (default 0.7)
+# NFTFLEX_PRICING_GAS_BUDGET  gas limit of one updatePrices transaction (default 15000000)
+# NFTFLEX_PRICING_DRY_RUN     set to 1 to print the new prices without sending them
+import asyncio
+import functools
+import os
+import time
+from ape import accounts, networks
+from eth_account import Account
+from nftflex.abi import load_contract_address
+from nftflex.analytics import RentalAnalytics
+from nftflex.indexer import RentalIndexer, RentalStore
+from nftflex.pricing import PriceUpdater, PricingConfig, reprice
+
+
+def main():
+    private_key = os.environ.get("NFTFLEX_PRICING_KEY") or accounts.test_accounts[0].private_key
+    owner = Account.from_key(private_key).address
+    window = int(os.environ.get("NFTFLEX_PRICING_WINDOW", "168")) * 3600
+    config = PricingConfig(target_occupancy=float(os.environ.get("NFTFLEX_PRICING_TARGET", "0.7")))
+    web3 = networks.provider.web3
+    address = load_contract_address("NFTFlex")
+
+    store = RentalStore(os.environ.get("NFTFLEX_PRICING_DB", "rentals.db"))
+    RentalIndexer(web3, address, store).sync()
+    analytics = RentalAnalytics(functools.lru_cache(maxsize=None)(lambda number: web3.eth.get_block(number)["timestamp"]))
+    analytics.sync(store)
+    store.close()
+
+    started_at = time.perf_counter()
+    stats = analytics.listing_stats(web3.eth.get_block("latest")["timestamp"], window)
+    repriced = reprice(stats[stats["owner"] == owner], config)
+    changes = repriced[repriced["changed"]]
+    print(f"Repriced {len(repriced)} listings of {owner} in {(time.perf_counter() - started_at) * 1000:.1f}ms, "
+          f"{len(changes)} changed")
+    print(changes[["occupancy", "idle_seconds", "elasticity", "price_per_hour", "new_price"]].head(20).to_string())
+
+    if os.environ.get("NFTFLEX_PRICING_DRY_RUN") == "1" or changes.empty:
+        return
+    updater = PriceUpdater(web3, address, private_key,
+                           gas_budget=int(os.environ.get("NFTFLEX_PRICING_GAS_BUDGET", "15000000")))
+    try:
+        asyncio.run(updater.push(changes.index.tolist(), changes["new_price"].tolist()))
+    finally:
+        updater.close()
+    report = updater.report()
+    print(f"Updated {report['prices_updated']} of {report['prices_sent']} prices in {report['transactions']} "
+          f"transactions, {report['gas_per_price']} gas per price")
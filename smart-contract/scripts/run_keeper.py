@@ -0,0 +1,35 @@
+# Settle expired rentals as they expire, so renters get their collateral back without calling endRental
+# Run with: ape run run_keeper --network ethereum:local:anvil
+#
+# NFTFLEX_KEEPER_KEY         private key paying for the settlements (default: the first test account)
+# NFTFLEX_KEEPER_GAS_BUDGET  gas limit of one settleExpired transaction (default 5000000)
+# NFTFLEX_KEEPER_START       first block to read rentals from (default 0, the deployment block is faster)
+# NFTFLEX_KEEPER_MAX_SLEEP   longest sleep in seconds, for chains whose clock jumps (default: until the next expiry)
+import asyncio
+import os
+from ape import accounts, networks
+from nftflex.abi import load_contract_address
+from nftflex.keeper import RentalKeeper
+
+
+def main():
+    max_sleep = os.environ.get("NFTFLEX_KEEPER_MAX_SLEEP")
+    keeper = RentalKeeper(
+        networks.provider.web3,
+        load_contract_address("NFTFlex"),
+        os.environ.get("NFTFLEX_KEEPER_KEY") or accounts.test_accounts[0].private_key,
+        gas_budget=int(os.environ.get("NFTFLEX_KEEPER_GAS_BUDGET", "5000000")),
+        start_block=int(os.environ.get("NFTFLEX_KEEPER_START", "0")),
+        max_sleep=float(max_sleep) if max_sleep else None,
+    )
+
+    print(f"Settling expired NFTFlex rentals on {networks.provider.network.name} (Ctrl+C to stop)...")
+    try:
+        asyncio.run(keeper.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        keeper.close()
+        report = keeper.report()
+        print(f"Settled {report['rentals_settled']} rentals, {report['gas_per_rental']} gas per rental, "
+              f"{report['pending']} still active")
@@ -0,0 +1,65 @@
+# Serve the rental index over HTTP while following the chain
+# Run with: ape run serve_api --network ethereum:local:test
+#
+# NFTFLEX_INDEX_DB         SQLite file to keep in sync and serve (default rentals.db, shared with index_rentals)
+# NFTFLEX_API_HOST         interface to listen on (default 127.0.0.1)
+# NFTFLEX_API_PORT         port to listen on (default 8080)
+# NFTFLEX_METADATA_CACHE   directory of the metadata disk cache (default metadata-cache)
+# NFTFLEX_CONFIRMATIONS    blocks to wait before applying a block (default 2)
+# NFTFLEX_POLL_INTERVAL    seconds between polls of the chain head (default 1)
+#
+# The follower writes through its own connection from a worker thread and the API reads through
+# another one on the event loop. The database is switched to WAL mode so reads never wait for a write.
+import asyncio
+import os
+from aiohttp import web
+from ape import networks
+from nftflex.abi import load_abi, load_contract_address
+from nftflex.api import create_app
+from nftflex.follower import RentalFollower
+from nftflex.indexer import RentalStore
+from nftflex.metadata import MetadataService
+
+
+def main():
+    path = os.environ.get("NFTFLEX_INDEX_DB", "rentals.db")
+    host = os.environ.get("NFTFLEX_API_HOST", "127.0.0.1")
+    port = int(os.environ.get("NFTFLEX_API_PORT", "8080"))
+    web3 = networks.provider.web3
+
+    writer = RentalStore(path)
+    writer.connection.execute("PRAGMA journal_mode=WAL")
+    writer.optimize()
+    reader = RentalStore(path)
+    follower = RentalFollower(
+        web3,
+        load_contract_address("NFTFlex"),
+        writer,
+        confirmations=int(os.environ.get("NFTFLEX_CONFIRMATIONS", "2")),
+        poll_interval=float(os.environ.get("NFTFLEX_POLL_INTERVAL", "1")),
+    )
+    metadata = MetadataService(cache_dir=os.environ.get("NFTFLEX_METADATA_CACHE", "metadata-cache"))
+    token_uri_abi = [entry for entry in load_abi("SimpleNFT") if entry.get("name") == "tokenURI"]
+
+    def token_uri(nft_address: str, token_id: int):
+        try:
+            return web3.eth.contract(address=nft_address, abi=token_uri_abi).functions.tokenURI(token_id).call()
+        except Exception:
+            return None
+
+    async def follow(app):
+        task = asyncio.create_task(follower.run())
+        yield
+        follower.stop()
+        await task
+
+    app = create_app(reader, metadata, token_uri)
+    app.cleanup_ctx.append(follow)
+
+    print(f"Serving the NFTFlex index of {networks.provider.network.name} on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        web.run_app(app, host=host, port=port, print=None)
+    finally:
+        metadata.close()
+        reader.close()
+        writer.close()
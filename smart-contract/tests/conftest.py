@@ -0,0 +1,221 @@
+# Shared fixtures for the ape test suite
+# Docs -> https://docs.apeworx.io/ape/stable/userguides/testing.html#test-isolation
+#
+# Contracts are deployed once per session. Ape snapshots the chain when a fixture
+# scope starts and reverts to it when the scope ends, so every test still starts
+# from freshly deployed contracts while paying for the deployments only once.
+# The "listed" and "rented" world states are module scoped: use them from modules
+# where every test needs that state, otherwise it would leak into later tests.
+#
+# NFTFLEX_INSTRUMENT=1 ape test records every JSON-RPC call of the run per setup, call
+# and teardown phase and writes the reports to NFTFLEX_INSTRUMENT_DIR (nftflex/instrument.py).
+#
+# `ape test -n auto` runs the suite on one pytest-xdist worker per core. Each worker is its
+# own process with its own chain (the in-process test provider, or anvil on port
+# NFTFLEX_XDIST_BASE_PORT + worker index with `--network ethereum:local:foundry`) and its own
+# copy of the compiled manifest, so time warps with `chain.mine(timestamp=...)` stay local to
+# one worker. Test files are kept whole on one worker for the module-scoped world states.
+from collections import defaultdict
+import os
+import shutil
+import pytest
+from ape import accounts, networks, project
+from nftflex import instrument
+from constants import collateral_amount, collateral_token, duration, metadata_url, price_per_hour
+
+
+
+
+
+"""
+Session: accounts and deployments
+"""
+@pytest.fixture(scope="session")
+def owner():
+    """Load an existing test account from Ape."""
+    return accounts.test_accounts[0]  # Uses the first test account
+
+@pytest.fixture(scope="session")
+def user():
+    """Returns a secondary test account (not the owner)."""
+    return accounts.test_accounts[1]  # Uses a different test account
+
+@pytest.fixture(scope="session")
+def mock_erc20(owner):
+    """Deploys a mock ERC-20 token contract and returns it."""
+    return owner.deploy(project.MockERC20, "MockToken", "MKT", 18, 1_000_000 * 10**18)  # 1M tokens
+
+@pytest.fixture(scope="session")
+def funded_user(user, mock_erc20, owner):
+    amount = 10**20  # Give user 100 MKT tokens
+    mock_erc20.transfer(user, amount, sender=owner)
+    return user
+
+@pytest.fixture(scope="session")
+def nft_flex_contract(owner):
+    """Deploys the NFTFlex contract once per session."""
+    return owner.deploy(project.NFTFlex)
+
+@pytest.fixture(scope="session")
+def simple_nft(owner):
+    """Deploys the SimpleNFT contract once per session."""
+    return owner.deploy(project.SimpleNFT)
+
+@pytest.fixture(scope="session")
+def nft_contract(simple_nft):
+    return simple_nft
+
+@pytest.fixture(scope="session")
+def nft_address(nft_contract):
+    "Display address of the NFT"
+    return nft_contract.address
+
+
+"""
+Module: world states
+"""
+@pytest.fixture(scope="module")
+def listed_rental(nft_flex_contract, nft_contract, owner):
+    """Mints a token and lists it for ETH. Returns the rental ID."""
+    receipt = nft_contract.mint(owner, metadata_url, sender=owner)
+    token_id = list(receipt.events.filter(nft_contract.Transfer))[0]["tokenId"]
+    rental_id = nft_flex_contract.getRentalCounter()
+    nft_flex_contract.createRental(
+        nft_contract.address, token_id, price_per_hour, False, collateral_token, collateral_amount, sender=owner
+    )
+    return rental_id
+
+@pytest.fixture(scope="module")
+def rented_rental(nft_flex_contract, listed_rental, user):
+    """The ``listed_rental``, rented by ``user`` for ``duration`` hours. Returns the rental ID."""
+    nft_flex_contract.rentNFT(
+        listed_rental, duration, value=price_per_hour * duration + collateral_amount, sender=user
+    )
+    return listed_rental
+
+
+"""
+Parallel runs (pytest-xdist)
+"""
+WORKER = os.environ.get("PYTEST_XDIST_WORKER")  # "gw0", "gw1", ... on workers, None otherwise
+BASE_PORT = int(os.environ.get("NFTFLEX_XDIST_BASE_PORT", "8546"))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    if WORKER:
+        # Compile into a private copy of the manifest, seeded from the one compiled before the workers started
+        shared_manifest = project.manifest_path
+        project.manifest_path = shared_manifest.parent / "xdist" / WORKER / shared_manifest.name
+        project.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        if shared_manifest.is_file():
+            shutil.copyfile(shared_manifest, project.manifest_path)
+
+        network = config.getoption("network") or ""
+        if "foundry" in network:
+            project.reconfigure(foundry={"host": f"http://127.0.0.1:{BASE_PORT + int(WORKER[2:])}"})
+    elif getattr(config.option, "numprocesses", None):
+        # Module-scoped fixtures (and the gas baseline file) need a test file to stay on one worker
+        if "--dist" not in " ".join(config.invocation_params.args) and config.option.dist == "load":
+            config.option.dist = "loadfile"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionstart(session):
+    # Compile once, before xdist starts the workers, instead of once per worker
+    if not WORKER and getattr(session.config.option, "numprocesses", None):
+        project.load_contracts()
+
+
+"""
+Opt-in RPC instrumentation
+"""
+_recorder = None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def rpc_recorder():
+    global _recorder
+    if instrument.enabled():
+        _recorder = instrument.RpcRecorder().install(networks.provider.web3)
+    yield _recorder
+    if _recorder:
+        _recorder.uninstall()
+        _recorder.write_reports(os.path.join(instrument.report_dir(), WORKER or ""))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    with instrument.phase("setup"):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    with instrument.phase("call"):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item):
+    with instrument.phase("teardown"):
+        yield
+
+
+"""
+Timing of the setup and test phases
+"""
+_phase_durations = defaultdict(float)
+_setup_durations = {}
+_worker_timings = {}  # worker -> [tests, busy seconds, first start, last stop]
+
+
+def pytest_runtest_logreport(report):
+    _phase_durations[report.when] += report.duration
+    if report.when == "setup":
+        _setup_durations[report.nodeid] = report.duration
+
+    # Under xdist the controller gets the reports of every worker
+    node = getattr(report, "node", None)
+    if node is not None:
+        timing = _worker_timings.setdefault(node.gateway.id, [0, 0.0, report.start, report.stop])
+        timing[0] += report.when == "call"
+        timing[1] += report.duration
+        timing[2] = min(timing[2], report.start)
+        timing[3] = max(timing[3], report.stop)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _phase_durations:
+        return
+
+    terminalreporter.section("setup vs test timing")
+    total = sum(_phase_durations.values())
+    for phase in ("setup", "call", "teardown"):
+        seconds = _phase_durations.get(phase, 0.0)
+        share = seconds / total * 100 if total else 0.0
+        terminalreporter.write_line(f"{phase:<10}{seconds:>10.2f}s{share:>8.1f}%")
+
+    slowest = sorted(_setup_durations.items(), key=lambda item: item[1], reverse=True)[:5]
+    terminalreporter.write_line("slowest setups:")
+    for nodeid, seconds in slowest:
+        terminalreporter.write_line(f"  {seconds:>8.2f}s  {nodeid}")
+
+    if _worker_timings:
+        terminalreporter.section("per-worker timing")
+        terminalreporter.write_line(f"{'worker':<10}{'tests':>8}{'busy':>10}{'span':>10}")
+        for worker, (tests, busy, started, stopped) in sorted(_worker_timings.items(),
+                                                               key=lambda item: int(item[0][2:])):
+            terminalreporter.write_line(f"{worker:<10}{tests:>8}{busy:>9.2f}s{stopped - started:>9.2f}s")
+        wall = max(timing[3] for timing in _worker_timings.values()) - \
+            min(timing[2] for timing in _worker_timings.values())
+        busy = sum(timing[1] for timing in _worker_timings.values())
+        speedup = busy / wall if wall else 0.0
+        terminalreporter.write_line(f"{busy:.2f}s of tests in {wall:.2f}s: {speedup:.1f}x on "
+                                    f"{len(_worker_timings)} workers ({speedup / len(_worker_timings):.0%} efficiency)")
+
+    if _recorder:
+        terminalreporter.section("rpc instrumentation")
+        for line in _recorder.summary().splitlines():
+            terminalreporter.write_line(line)
+        terminalreporter.write_line(f"reports written to {instrument.report_dir()}")
@@ -0,0 +1,15 @@
+# Rental terms shared by conftest.py and the NFTFlex contract tests (test_NFTFlex*.py)
+# Importable as `constants`: pytest puts this directory on sys.path for conftest.py
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+collateral_amount = 10**18
+zero_address = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
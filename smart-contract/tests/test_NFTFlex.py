@@ -3,6 +3,8 @@ import pytest
 import time
 from ape import accounts, project, chain, exceptions
 from eth_tester.exceptions import TransactionFailed
+from nftflex.rentals import RentalStatus, iter_rentals_by_status, load_rentals
+from constants import collateral_amount, collateral_token, duration, price_per_hour, zero_address
 
 
 
@@ -10,12 +12,8 @@ from eth_tester.exceptions import TransactionFailed
 """
 Variables
 """
-price_per_hour = 10 ** 18
 is_fractional = False
-collateral_token = "0x0000000000000000000000000000000000000000"
-collateral_amount = 10**18
 rental_id = 0  # Assuming first rental ID is 0
-duration = 2
 
 metadata_urls = [
     "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm", # Bhawal Resort & Spa
@@ -29,51 +27,8 @@ metadata_urls = [
 """
 Setup for testing
 """
-@pytest.fixture
-def owner():
-    """Load an existing test account from Ape."""
-    return accounts.test_accounts[0]  # Uses the first test account
-
-@pytest.fixture
-def user():
-    """Returns a secondary test account (not the owner)."""
-    new_user = accounts.test_accounts[1]  # Uses a different test account
-    # mock_erc20.mint(new_user, metadata_urls[0], sender=owner)
-    return new_user
-
-
-@pytest.fixture
-def mock_erc20(owner):
-    """Deploys a mock ERC-20 token contract and returns it."""
-    return owner.deploy(project.MockERC20, "MockToken", "MKT", 18, 1_000_000 * 10**18)  # 1M tokens
-
-@pytest.fixture
-def funded_user(user, mock_erc20, owner):
-    amount = 10**20  # Give user 100 MKT tokens
-    mock_erc20.transfer(user, amount, sender=owner)
-    return user
-
-
-
-@pytest.fixture
-def nft_flex_contract(owner):
-    """Deploys NFTFlex contract before each test."""
-    contract = owner.deploy(project.NFTFlex)
-    return contract  # ✅ Return the actual deployed contract
-
-@pytest.fixture
-def nft_contract(owner):
-    """Deploys SimpleNFT contract before each test."""
-    contract = owner.deploy(project.SimpleNFT)
-    return contract  # ✅ Return the actual deployed contract
-
-@pytest.fixture
-def nft_address(nft_contract):
-    "Display address of the NFT"
-    return nft_contract.address
-
-
-
+# Accounts and the session-wide deployments come from conftest.py. Tests that start
+# from a listed or rented NFT live in test_NFTFlex_listed.py and test_NFTFlex_rented.py.
 @pytest.fixture 
 def minted_nft(nft_contract, owner):
     """Mints an NFT for the owner and returns the token ID."""
@@ -137,6 +92,20 @@ def test_price_must_be_greater_than_zero(nft_flex_contract, nft_address, minted_
 
     
 
+def test_amounts_must_fit_packed_storage(nft_flex_contract, nft_address, minted_nft, owner):
+    """Prices and collateral are stored as uint96, larger amounts are rejected."""
+    too_large = 2 ** 96
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createRental(nft_address, minted_nft, too_large, is_fractional, collateral_token, collateral_amount, sender=owner)
+    assert "NFTFlex__AmountTooLarge" == exc_info.type.__name__
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, too_large, sender=owner)
+    assert "NFTFlex__AmountTooLarge" == exc_info.type.__name__
+
+
+
 # 🚀 STEP 2: Rental Creation & Validation
 def test_create_rental(nft_flex_contract, nft_contract, nft_address, owner, minted_nft):
     """Owner should successfully create a rental"""
@@ -145,85 +114,77 @@ def test_create_rental(nft_flex_contract, nft_contract, nft_address, owner, mint
     event = tx.events.filter(nft_flex_contract.NFTFlex__RentalCreated)[0]
     assert event.owner == owner.address 
     assert event.tokenId == minted_nft
+    # The owner is only indexed in NFTFlex__Listed, so owners' listings are found with a topic filter
+    listed = tx.events.filter(nft_flex_contract.NFTFlex__Listed)[0]
+    assert listed.owner == owner.address and listed.rentalId == event.rentalId
     assert nft_contract.nextTokenId() == 2
 
 
-# 🚀 STEP 3: Error checking in rentNFT
-def test_rental_must_exist(nft_flex_contract, owner):
-    """Test that renting a non-existent rental fails."""
-    non_existent_rental_id = 999  # A rental ID that does not exist
-
-
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.rentNFT(non_existent_rental_id, duration, sender=owner)
-
-    print("Error name: ",exc_info.type.__name__)
-    # Assert correct revert message
-    assert "NFTFlex__RentalDoesNotExist" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalDoesNotExist)
-
-
-def test_nft_already_rented(nft_flex_contract, owner, nft_address, minted_nft):
-    """Test that trying to rent an already rented NFT fails."""
-
-    # Step 1: Create a rental
-    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, False, collateral_token, collateral_amount, sender=owner) #Calling createRentalfunction 
-
-    # Step 2: Rent the NFT (send correct ETH amount)
-    total_price = price_per_hour * duration
-    nft_flex_contract.rentNFT(rental_id, duration, sender=owner, value=total_price + collateral_amount)
-
-    # Step 3: Try renting again and expect failure (no need to send ETH)
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.rentNFT(rental_id, duration, sender=owner)
+def test_create_rentals_batch(nft_flex_contract, nft_contract, nft_address, owner):
+    """Owner should list many NFTs in one transaction with contiguous rental IDs"""
+    nft_contract.mintBatch(owner, metadata_urls, sender=owner)
+    token_ids = list(range(1, len(metadata_urls) + 1))
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in token_ids]
 
-    # Assert correct revert message
-    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__NFTAlreadyRented)
+    tx = nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
 
+    events = list(tx.events.filter(nft_flex_contract.NFTFlex__RentalCreated))
+    assert [event.rentalId for event in events] == list(range(len(token_ids)))
+    assert [event.tokenId for event in events] == token_ids
+    assert nft_flex_contract.getRentalCounter() == len(token_ids)
 
-def test_duration_must_be_greater_than_zero(nft_flex_contract, owner, nft_address, minted_nft):
-    """Test that renting with a duration of 0 fails."""
-    token_id = minted_nft
+    rental = nft_flex_contract.s_rentals(len(token_ids) - 1)
+    assert rental.tokenId == token_ids[-1]
+    assert rental.owner == owner
 
-    # Step 1: Create a rental
-    nft_flex_contract.createRental(nft_address, token_id, price_per_hour, False, collateral_token, collateral_amount, sender=owner)
 
-    invalid_duration = 0  # Invalid duration
+def test_create_rentals_rejects_foreign_nft(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """A batch containing an NFT the sender does not own reverts as a whole"""
+    nft_contract.mintBatch(owner, metadata_urls[:2], sender=owner)
+    nft_contract.mint(user, metadata_urls[2], sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in (1, 2, 3)]
 
     with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.rentNFT(rental_id, invalid_duration, sender=owner)
+        nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
 
-    # Assert correct revert message
-    assert "NFTFlex__DurationMustBeGreaterThanZero" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__DurationMustBeGreaterThanZero)
+    assert "NFTFlex__SenderIsNotOwnerOfTheNFT" == exc_info.type.__name__
+    assert nft_flex_contract.getRentalCounter() == 0
 
 
-def test_incorrect_payment_amount(nft_flex_contract, owner, nft_address, minted_nft):
-    """Test that renting an NFT with incorrect ETH amount fails."""
+def test_create_rentals_cheaper_per_listing(nft_flex_contract, nft_contract, nft_address, owner):
+    """Listing in a batch should cost less gas per listing than the single-item path"""
+    count = len(metadata_urls)
+    nft_contract.mintBatch(owner, metadata_urls + metadata_urls, sender=owner)
 
-    # Create rental with native currency (ETH) as collateral
-    nft_flex_contract.createRental(
-        nft_address, minted_nft, price_per_hour, False, 
-        collateral_token, collateral_amount, sender=owner
+    single_gas = sum(
+        nft_flex_contract.createRental(
+            nft_address, token_id, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner
+        ).gas_used
+        for token_id in range(1, count + 1)
     )
+    rentals = [
+        (token_id, price_per_hour, is_fractional, collateral_token, collateral_amount)
+        for token_id in range(count + 1, 2 * count + 1)
+    ]
+    batch_gas = nft_flex_contract.createRentals(nft_address, rentals, sender=owner).gas_used
 
-    total_price = price_per_hour * duration
+    print(f"Gas per listing: single={single_gas // count}, batch={batch_gas // count}")
+    assert batch_gas < single_gas
 
-    # Try to rent with insufficient ETH (less than totalPrice + collateral)
-    with pytest.raises(exceptions.ContractLogicError) as exc_info1:
-        nft_flex_contract.rentNFT(rental_id, duration, sender=owner, value=total_price)  # Missing collateral
-    
-    assert "NFTFlex__IncorrectPaymentAmount" == exc_info1.type.__name__
-    assert isinstance(exc_info1.value, nft_flex_contract.NFTFlex__IncorrectPaymentAmount)
 
+# 🚀 STEP 3: Error checking in rentNFT
+def test_rental_must_exist(nft_flex_contract, owner):
+    """Test that renting a non-existent rental fails."""
+    non_existent_rental_id = 999  # A rental ID that does not exist
 
-    # Try to rent with too much ETH (if strict check applies)
-    with pytest.raises(exceptions.ContractLogicError) as exc_info2:
-        nft_flex_contract.rentNFT(rental_id, duration, sender=owner, value=total_price + collateral_amount + 10**17)  # Excess amount
 
-    assert "NFTFlex__IncorrectPaymentAmount" == exc_info2.type.__name__
-    assert isinstance(exc_info2.value, nft_flex_contract.NFTFlex__IncorrectPaymentAmount)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(non_existent_rental_id, duration, sender=owner)
+
+    print("Error name: ",exc_info.type.__name__)
+    # Assert correct revert message
+    assert "NFTFlex__RentalDoesNotExist" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalDoesNotExist)
 
 
 # 🚀 STEP 4: rentNFT creation & Validation
@@ -289,50 +250,6 @@ def test_rent_nft_successfully(nft_flex_contract, nft_contract, nft_address, own
 
 
 
-# 🚀 STEP 5: Error checking in endRental
-def test_only_renter_can_end_rental(nft_flex_contract, owner, user, minted_nft, nft_address):
-    """
-    Ensures that only the renter can call endRental.
-    """
-
-    # Create a rental
-    nft_flex_contract.createRental(
-        nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner
-    )
-
-    # Rent the NFT
-    nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
-
-    # Different user (not renter) tries to end rental
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.endRental(rental_id, sender=owner)  # ❌ Owner tries to end rental
-
-    assert "NFTFlex__OnlyRenterCanEndRental" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__OnlyRenterCanEndRental)
-
-
-
-def test_cannot_end_rental_early(nft_flex_contract, owner, user, minted_nft, nft_address):
-    """
-    Ensures the renter cannot end the rental before the rental period expires.
-    """
-
-    # Create rental
-    nft_flex_contract.createRental(
-        nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner
-    )
-
-    # Rent the NFT
-    nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
-
-    # Attempt to end rental early
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.endRental(rental_id, sender=user)  # ❌ Ending too early
-
-    assert "NFTFlex__RentalPeriodNotEnded" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalPeriodNotEnded)
-
-
 # 🚀 STEP 6: rentNFT creation & Validation
 def test_renter_can_end_rental_after_expiry(nft_flex_contract, owner, user, minted_nft, nft_address):
     """
@@ -376,214 +293,465 @@ def test_renter_can_end_rental_after_expiry(nft_flex_contract, owner, user, mint
 
 
 
-# 🚀 STEP 7: Error checking and Test that only the owner can withdraw earnings
-def test_only_owner_can_withdraw(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+# 🚀 STEP 5: Test successful ERC-20 withdrawal
+def test_successful_erc20_withdrawal(nft_flex_contract, nft_contract, nft_address, owner, funded_user, minted_nft, mock_erc20):
     """
-    Ensures that only the owner of the rental can withdraw earnings.
+    Ensures that the owner successfully withdraws ERC-20 earnings after rental completion.
     """
-    
-    # Step 1: Owner lists NFT for rental
+
+    # Step 1: Transfer ERC-20 tokens to contract
+    mock_erc20.transfer(nft_flex_contract.address, collateral_amount * duration, sender=funded_user)
+
+    # Step 2: Owner lists NFT for rental
     nft_flex_contract.createRental(
         nft_address,
         minted_nft,
         price_per_hour,
         is_fractional,
-        collateral_token,
+        mock_erc20.address,  # Using ERC-20
         collateral_amount,
         sender=owner
     )
 
-    # Step 2: User rents the NFT
-    nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    total_price = price_per_hour * duration
+    total_payment = total_price + collateral_amount  # Must include collateral
 
-    # Step 3: Try withdrawing as a non-owner
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.withdrawEarnings(rental_id, sender=user)  # ❌ User is not the owner
+    # Approve the contract to spend user's ERC-20 tokens
+    mock_erc20.approve(nft_flex_contract.address, total_payment, sender=funded_user)
+
+    # Step 3: User starts rental with ERC-20 tokens
+    nft_flex_contract.rentNFT(rental_id, duration, sender=funded_user)
 
-    assert "NFTFlex__OnlyOwnerCanWithdrawEarnings" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__OnlyOwnerCanWithdrawEarnings)
+    # Step 4: Fast-forward time to after rental ends
+    rental = nft_flex_contract.s_rentals(rental_id)
+    rental_end_time = rental["endTime"]
+
+    # Move blockchain time forward to just after the rental end time
+    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
+    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
+
+    # Step 5: Check owner's initial ERC-20 balance
+    initial_balance = mock_erc20.balanceOf(owner)
+
+    # Step 6: Owner withdraws earnings
+    tx = nft_flex_contract.withdrawEarnings(rental_id, sender=owner)
+
+    # Step 7: Validate ERC-20 balance increase
+    expected_earnings = price_per_hour * duration
+
+    # Verify the event NFTFlex__EarningsWithdrawn was emitted
+    event = tx.events.filter(nft_flex_contract.NFTFlex__EarningsWithdrawn)[0]
+
+    assert event.rentalId == rental_id 
+    assert event.owner == owner
+    assert event.amount == expected_earnings
 
+    assert mock_erc20.balanceOf(owner) == initial_balance + expected_earnings
 
-def test_cannot_withdraw_before_rental_ends(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+
+
+# 🚀 STEP 9: Paged rental reads
+def test_get_rentals_pages(nft_flex_contract, nft_contract, nft_address, owner):
     """
-    Ensures that the owner cannot withdraw earnings before the rental period ends.
+    getRentals should return rentals in ID order, one page at a time.
     """
-    
-    # Step 1: Owner lists NFT for rental
-    nft_flex_contract.createRental(
-        nft_address,
-        minted_nft,
-        price_per_hour,
-        is_fractional,
-        collateral_token,
-        collateral_amount,
-        sender=owner
-    )
+    nft_contract.mintBatch(owner, metadata_urls, sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in range(1, 6)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
 
-    # Step 2: User starts rental
-    nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    first_page = nft_flex_contract.getRentals(0, 2)
+    last_page = nft_flex_contract.getRentals(4, 2)
 
-    # Step 3: Owner tries to withdraw earnings too early
-    with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.withdrawEarnings(rental_id, sender=owner)
+    assert [rental.tokenId for rental in first_page] == [1, 2]
+    assert [rental.tokenId for rental in last_page] == [5]
+    assert len(nft_flex_contract.getRentals(5, 2)) == 0
 
-    assert "NFTFlex__RentalStillActive" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalStillActive)
+    # The Python helper pages through every rental
+    loaded = load_rentals(nft_flex_contract, page_size=2)
+    assert [rental_id for rental_id, _ in loaded] == [0, 1, 2, 3, 4]
+    assert [rental.tokenId for _, rental in loaded] == [1, 2, 3, 4, 5]
 
 
-def test_cannot_withdraw_zero_earnings(nft_flex_contract, minted_nft, nft_address, owner, user):
+def test_get_rentals_by_status(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """
+    getRentalsByStatus should only return rentals in the requested status.
+    """
+    nft_contract.mintBatch(owner, metadata_urls, sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in range(1, 6)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
+
+    # Rent rentals 1 and 3
+    for rented_id in (1, 3):
+        nft_flex_contract.rentNFT(rented_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+
+    rental_ids, active, next_cursor = nft_flex_contract.getRentalsByStatus(RentalStatus.ACTIVE, 0, 10)
+    assert list(rental_ids) == [1, 3]
+    assert all(rental.renter == user for rental in active)
+    assert next_cursor == 5
+
+    # Cursor paging stops after `limit` matches
+    rental_ids, _, next_cursor = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, 0, 2)
+    assert list(rental_ids) == [0, 2]
+    assert next_cursor == 3
+
+    # The result arrays are sized to the rentals left, so any limit works; a cursor past the end is an empty page
+    rental_ids, _, next_cursor = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, 3, 2 ** 256 - 1)
+    assert list(rental_ids) == [4] and next_cursor == 5
+    rental_ids, rentals, next_cursor = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, 7, 10)
+    assert list(rental_ids) == [] and list(rentals) == [] and next_cursor == 5
+
+    available = [rental_id for rental_id, _ in iter_rentals_by_status(nft_flex_contract, RentalStatus.AVAILABLE, page_size=2)]
+    assert available == [0, 2, 4]
+
+    # Once the rental period is over the owner still has to withdraw
+    rental = nft_flex_contract.s_rentals(3)
+    chain.mine(timestamp=rental.endTime + 1)
+    pending = [rental_id for rental_id, _ in iter_rentals_by_status(nft_flex_contract, RentalStatus.PENDING_WITHDRAWAL)]
+    assert pending == [1, 3]
+
+
+# 🚀 STEP 10: Earnings ledger
+def test_withdraw_all_collects_many_rentals(nft_flex_contract, nft_contract, nft_address, owner, funded_user, mock_erc20):
     """
-    Ensures that attempting to withdraw when there are no earnings fails.
+    withdrawAll pays out the ERC-20 earnings of every rental in one transaction.
     """
+    nft_contract.mintBatch(owner, metadata_urls, sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, mock_erc20.address, collateral_amount) for token_id in range(1, 6)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
 
-    # Step 1: Owner lists NFT for rental
-    nft_flex_contract.createRental(
-        nft_address,
-        minted_nft,
-        price_per_hour,
-        is_fractional,
-        collateral_token,
-        collateral_amount,
-        sender=owner
-    )
+    total_payment = (price_per_hour * duration + collateral_amount) * len(rentals)
+    mock_erc20.approve(nft_flex_contract.address, total_payment, sender=funded_user)
+    for rented_id in range(len(rentals)):
+        nft_flex_contract.rentNFT(rented_id, duration, sender=funded_user)
 
-    # Calculate the total payment required (price_per_hour * duration + collateral_amount)
-    total_payment = price_per_hour * duration + collateral_amount
+    expected_earnings = price_per_hour * duration * len(rentals)
+    assert nft_flex_contract.getBalance(owner, mock_erc20.address) == expected_earnings
+    assert nft_flex_contract.getBalance(owner, collateral_token) == 0
 
-    # Start the rental with duration = 0
-    nft_flex_contract.rentNFT(rental_id, duration, value=total_payment, sender=user)
+    initial_balance = mock_erc20.balanceOf(owner)
+    tx = nft_flex_contract.withdrawAll(mock_erc20.address, sender=owner)
 
-    # Step 3: Fast forward time to ensure rental has ended
-    # Get the rental end time
-    rental = nft_flex_contract.s_rentals(rental_id)
-    rental_end_time = rental["endTime"]
+    event = tx.events.filter(nft_flex_contract.NFTFlex__BalanceWithdrawn)[0]
+    assert event.token == mock_erc20.address
+    assert event.amount == expected_earnings
+    assert mock_erc20.balanceOf(owner) == initial_balance + expected_earnings
+    # Collateral stays in the contract until the renters end their rentals
+    assert mock_erc20.balanceOf(nft_flex_contract.address) == collateral_amount * len(rentals)
 
-    # Explicitly increase blockchain time to just after the rental end time
-    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
-    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
 
-    # Withdraw all earnings from here then balance to withdraw will be zero
-    nft_flex_contract.withdrawEarnings(rental_id, sender=owner)
+def test_withdraw_all_settles_pending_earnings(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """
+    Earnings collected by withdrawAll are no longer pending: the rentals are ended, can be repriced and
+    withdrawEarnings cannot pay them out again from the earnings of later rentals.
+    """
+    nft_contract.mintBatch(owner, metadata_urls[:2], sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in range(1, 3)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
+    nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    nft_flex_contract.withdrawAll(collateral_token, sender=owner)
+
+    nft_flex_contract.rentNFT(1, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex_contract.s_rentals(1).endTime + 1)
+    assert not nft_flex_contract.s_rentals(0).pendingWithdrawal
+    rental_ids, rentals, _ = nft_flex_contract.getRentalsByStatus(RentalStatus.ENDED, 0, 10)
+    assert list(rental_ids) == [0] and not rentals[0].pendingWithdrawal
+    rental_ids, _, _ = nft_flex_contract.getRentalsByStatus(RentalStatus.PENDING_WITHDRAWAL, 0, 10)
+    assert list(rental_ids) == [1]
 
-    # Step 4: Owner attempts to withdraw with zero earnings
     with pytest.raises(exceptions.ContractLogicError) as exc_info:
-        nft_flex_contract.withdrawEarnings(rental_id, sender=owner)  # Owner attempts to withdraw
-
-    # Ensure the correct error is raised
+        nft_flex_contract.withdrawEarnings(0, sender=owner)
     assert "NFTFlex__EarningTransferFailed" == exc_info.type.__name__
-    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__EarningTransferFailed)
+    assert nft_flex_contract.getBalance(owner, collateral_token) == price_per_hour * duration
 
+    tx = nft_flex_contract.updatePrices([0, 1], [2 * price_per_hour, 2 * price_per_hour], sender=owner)
+    assert [event.rentalId for event in tx.events.filter(nft_flex_contract.NFTFlex__PriceUpdated)] == [0]
+    nft_flex_contract.withdrawEarnings(1, sender=owner)
+    assert nft_flex_contract.getBalance(owner, collateral_token) == 0
 
-# NFTFlex__EarningsWithdrawn
 
-# 🚀 STEP 8: Test successful ETH withdrawal
-def test_successful_eth_withdrawal(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+# 🚀 STEP 11: Reverse index from NFT to rental
+def test_duplicate_listing_rejected(nft_flex_contract, nft_contract, nft_address, owner, minted_nft):
     """
-    Ensures that the owner successfully withdraws ETH earnings after rental completion.
+    An owner cannot list the same NFT twice, neither in two transactions nor within one batch.
     """
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    assert nft_flex_contract.getRentalId(nft_address, minted_nft) == 0
 
-    # Step 1: Owner lists NFT for rental
-    nft_flex_contract.createRental(
-        nft_address,
-        minted_nft,
-        price_per_hour,
-        is_fractional,
-        collateral_token,
-        collateral_amount,
-        sender=owner
-    )
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    assert "NFTFlex__NFTAlreadyListed" == exc_info.type.__name__
 
-    total_price = price_per_hour * duration
-    total_payment = total_price + collateral_amount  # Must include collateral
+    receipt = nft_contract.mint(owner, metadata_urls[1], sender=owner)
+    token_id = list(receipt.events.filter(nft_contract.Transfer))[0]["tokenId"]
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount)] * 2
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
+    assert "NFTFlex__NFTAlreadyListed" == exc_info.type.__name__
+    assert nft_flex_contract.getRentalCounter() == 1
 
-    # Step 2: User starts rental
-    nft_flex_contract.rentNFT(rental_id, duration, value=total_payment, sender=user)
 
-    # Step 3: Fast-forward time to after rental ends
-    rental = nft_flex_contract.s_rentals(rental_id)
-    rental_end_time = rental["endTime"]
+def test_new_owner_can_list_again(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+    """
+    Once the NFT changes hands, the new owner's listing replaces the old one in the index.
+    """
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    nft_contract.transferFrom(owner, user, minted_nft, sender=owner)
 
-    # Move blockchain time forward to just after the rental end time
-    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
-    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=user)
+    assert nft_flex_contract.getRentalId(nft_address, minted_nft) == 1
 
-    # Step 4: Owner withdraws earnings
-    initial_balance = owner.balance
-    tx = nft_flex_contract.withdrawEarnings(rental_id, sender=owner)
-    # receipt = 
-    
-    # Step 5: Validate balance change
-    expected_earnings = price_per_hour * duration
-    gas_cost = tx.gas_used * tx.gas_price  # Calculate gas cost
+    # The previous owner's listing is stale and can no longer be rented
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=owner)
+    assert "NFTFlex__ListingIsStale" == exc_info.type.__name__
+    nft_flex_contract.rentNFT(1, duration, value=price_per_hour * duration + collateral_amount, sender=owner)
+    assert nft_flex_contract.userOf(nft_address, minted_nft) == owner
 
-    # Verify the event NFTFlex__EarningsWithdrawn was emitted
-    event = tx.events.filter(nft_flex_contract.NFTFlex__EarningsWithdrawn)[0]
 
-    assert event.rentalId == rental_id 
-    assert event.owner == owner
-    assert event.amount == expected_earnings
+def test_rented_nft_cannot_be_listed_again(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+    """
+    While the rental of its latest listing is not ended, an NFT that changed hands cannot be listed again.
+    """
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    nft_contract.transferFrom(owner, user, minted_nft, sender=owner)
 
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=user)
+    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
+    assert nft_flex_contract.userOf(nft_address, minted_nft) == user
 
-    print(f"Initial balance: {initial_balance}")
-    print(f"Expected earnings: {expected_earnings}")
-    print(f"Gas cost: {gas_cost}")
-    print(f"Final balance: {owner.balance}")
-    assert owner.balance == initial_balance + expected_earnings - gas_cost
+    chain.mine(timestamp=nft_flex_contract.s_rentals(0).endTime + 1)
+    nft_flex_contract.settleExpired([0], sender=owner)
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=user)
+    assert nft_flex_contract.getRentalId(nft_address, minted_nft) == 1
 
 
+def test_owner_can_relist_after_delisting(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+    """
+    Once its rental is ended, an owner withdraws a listing with delistRental and lists the NFT again.
+    """
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
 
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.delistRental(0, sender=owner)
+    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
 
-# 🚀 STEP 5: Test successful ERC-20 withdrawal
-def test_successful_erc20_withdrawal(nft_flex_contract, nft_contract, nft_address, owner, funded_user, minted_nft, mock_erc20):
+    chain.mine(timestamp=nft_flex_contract.s_rentals(0).endTime + 1)
+    nft_flex_contract.endRental(0, sender=user)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.delistRental(0, sender=user)
+    assert "NFTFlex__OnlyOwnerCanDelist" == exc_info.type.__name__
+
+    tx = nft_flex_contract.delistRental(0, sender=owner)
+    assert tx.events.filter(nft_flex_contract.NFTFlex__Delisted)[0].rentalId == 0
+    rental_ids, _, _ = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, 0, 10)
+    assert list(rental_ids) == []
+
+    nft_flex_contract.createRental(nft_address, minted_nft, 2 * price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+    assert nft_flex_contract.getRentalId(nft_address, minted_nft) == 1
+    rental_ids, _, _ = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, 0, 10)
+    assert list(rental_ids) == [1]
+
+    # The withdrawn listing can no longer be rented, nor delisted again
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__ListingIsStale" == exc_info.type.__name__
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.delistRental(0, sender=owner)
+    assert "NFTFlex__ListingIsStale" == exc_info.type.__name__
+    nft_flex_contract.rentNFT(1, duration, value=2 * price_per_hour * duration + collateral_amount, sender=user)
+
+
+def test_user_of_unlisted_nft(nft_flex_contract, nft_address, minted_nft):
     """
-    Ensures that the owner successfully withdraws ERC-20 earnings after rental completion.
+    NFTs that were never listed have no user and no expiry.
     """
+    assert nft_flex_contract.userOf(nft_address, minted_nft) == zero_address
+    assert nft_flex_contract.userExpires(nft_address, minted_nft) == 0
 
-    # Step 1: Transfer ERC-20 tokens to contract
-    mock_erc20.transfer(nft_flex_contract.address, collateral_amount * duration, sender=funded_user)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.getRentalId(nft_address, minted_nft)
+    assert "NFTFlex__RentalDoesNotExist" == exc_info.type.__name__
 
-    # Step 2: Owner lists NFT for rental
-    nft_flex_contract.createRental(
-        nft_address,
-        minted_nft,
-        price_per_hour,
-        is_fractional,
-        mock_erc20.address,  # Using ERC-20
-        collateral_amount,
-        sender=owner
-    )
 
-    total_price = price_per_hour * duration
-    total_payment = total_price + collateral_amount  # Must include collateral
+# 🚀 STEP 12: Fractional rentals
+def test_rent_shares(nft_flex_contract, nft_address, owner, user, minted_nft):
+    """
+    Renters take shares of a fractional rental; each share is paid and tracked on its own.
+    """
+    tx = nft_flex_contract.createFractionalRental(nft_address, minted_nft, price_per_hour, collateral_token, collateral_amount, 8, sender=owner)
+    assert nft_flex_contract.getRentalCounter() == 1
+    assert nft_flex_contract.s_rentals(0).isFractional
 
-    # Approve the contract to spend user's ERC-20 tokens
-    mock_erc20.approve(nft_flex_contract.address, total_payment, sender=funded_user)
+    share_payment = price_per_hour * duration + collateral_amount
+    tx = nft_flex_contract.rentShares(0, [0, 1, 2], duration, value=3 * share_payment, sender=user)
+    event = tx.events.filter(nft_flex_contract.NFTFlex__SharesRented)[0]
+    assert list(event.shareIds) == [0, 1, 2]
+    assert event.collateralAmount == 3 * collateral_amount
 
-    # Step 3: User starts rental with ERC-20 tokens
-    nft_flex_contract.rentNFT(rental_id, duration, sender=funded_user)
+    assert nft_flex_contract.getShareBitmap(0, 0) == 0b111
+    renter, end_time = nft_flex_contract.getShare(0, 1)
+    assert renter == user and end_time == event.endTime
+    assert nft_flex_contract.getBalance(owner, collateral_token) == 3 * price_per_hour * duration
 
-    # Step 4: Fast-forward time to after rental ends
-    rental = nft_flex_contract.s_rentals(rental_id)
-    rental_end_time = rental["endTime"]
+    # A second renter can take the remaining shares, but not the rented ones
+    nft_flex_contract.rentShares(0, [7], duration, value=share_payment, sender=owner)
+    assert nft_flex_contract.getShareBitmap(0, 0) == 0b10000111
 
-    # Move blockchain time forward to just after the rental end time
-    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
-    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentShares(0, [3, 1], duration, value=2 * share_payment, sender=user)
+    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
 
-    # Step 5: Check owner's initial ERC-20 balance
-    initial_balance = mock_erc20.balanceOf(owner)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentShares(0, [8], duration, value=share_payment, sender=user)
+    assert "NFTFlex__InvalidShare" == exc_info.type.__name__
 
-    # Step 6: Owner withdraws earnings
-    tx = nft_flex_contract.withdrawEarnings(rental_id, sender=owner)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(0, duration, value=share_payment, sender=user)
+    assert "NFTFlex__RentalIsFractional" == exc_info.type.__name__
 
-    # Step 7: Validate ERC-20 balance increase
-    expected_earnings = price_per_hour * duration
 
-    # Verify the event NFTFlex__EarningsWithdrawn was emitted
-    event = tx.events.filter(nft_flex_contract.NFTFlex__EarningsWithdrawn)[0]
+def test_release_expired_shares(nft_flex_contract, nft_address, owner, user, minted_nft):
+    """
+    Anyone can release expired shares; their collateral is credited to the renter.
+    """
+    nft_flex_contract.createFractionalRental(nft_address, minted_nft, price_per_hour, collateral_token, collateral_amount, 300, sender=owner)
+    share_ids = [0, 1, 299]  # spread over two bitmap words
+    tx = nft_flex_contract.rentShares(0, share_ids, duration, value=3 * (price_per_hour * duration + collateral_amount), sender=user)
+    end_time = tx.events.filter(nft_flex_contract.NFTFlex__SharesRented)[0].endTime
 
-    assert event.rentalId == rental_id 
-    assert event.owner == owner
-    assert event.amount == expected_earnings
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.releaseExpiredShares(0, share_ids, sender=owner)
+    assert "NFTFlex__RentalPeriodNotEnded" == exc_info.type.__name__
+
+    chain.mine(timestamp=end_time + 1)
+    tx = nft_flex_contract.releaseExpiredShares(0, share_ids + [5], sender=owner)  # share 5 is free and skipped
+    assert tx.events.filter(nft_flex_contract.NFTFlex__SharesReleased)[0].shareIds == share_ids
+    credited = tx.events.filter(nft_flex_contract.NFTFlex__CollateralCredited)
+    assert [(event.renter, event.amount) for event in credited] == [(user, 3 * collateral_amount)]
+
+    assert nft_flex_contract.getShareBitmap(0, 0) == 0
+    assert nft_flex_contract.getShareBitmap(0, 1) == 0
+    assert nft_flex_contract.getShare(0, 299)[0] == zero_address
+    assert nft_flex_contract.getBalance(user, collateral_token) == 3 * collateral_amount
 
-    assert mock_erc20.balanceOf(owner) == initial_balance + expected_earnings
\ No newline at end of file
+    # Released shares can be rented again
+    nft_flex_contract.rentShares(0, [299], duration, value=price_per_hour * duration + collateral_amount, sender=user)
+
+    initial_balance = user.balance
+    tx = nft_flex_contract.withdrawAll(collateral_token, sender=user)
+    assert user.balance == initial_balance + 3 * collateral_amount - tx.gas_used * tx.gas_price
+
+
+def test_shares_need_a_fractional_rental(nft_flex_contract, nft_address, owner, user, minted_nft):
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.createFractionalRental(nft_address, minted_nft, price_per_hour, collateral_token, collateral_amount, 0, sender=owner)
+    assert "NFTFlex__InvalidShareCount" == exc_info.type.__name__
+
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, False, collateral_token, collateral_amount, sender=owner)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentShares(0, [0], duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__RentalNotFractional" == exc_info.type.__name__
+
+
+def test_fractional_flag_does_not_create_shares(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """
+    `isFractional` of createRental(s) is only a flag: the listing has no shares and is rented whole with rentNFT.
+    """
+    nft_contract.mintBatch(owner, metadata_urls[:2], sender=owner)
+    nft_flex_contract.createRental(nft_address, 1, price_per_hour, True, collateral_token, collateral_amount, sender=owner)
+    nft_flex_contract.createRentals(nft_address, [(2, price_per_hour, True, collateral_token, collateral_amount)], sender=owner)
+
+    for rental_id in range(2):
+        assert nft_flex_contract.s_rentals(rental_id).isFractional
+        with pytest.raises(exceptions.ContractLogicError) as exc_info:
+            nft_flex_contract.rentShares(rental_id, [0], duration, value=price_per_hour * duration + collateral_amount, sender=user)
+        assert "NFTFlex__RentalNotFractional" == exc_info.type.__name__
+
+        nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+        assert nft_flex_contract.s_rentals(rental_id).renter == user
+
+
+# 🚀 STEP 13: Batch settlement of expired rentals
+def test_settle_expired(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """
+    Anyone can settle expired rentals; rentals not rented or still active are skipped.
+    """
+    nft_contract.mintBatch(owner, metadata_urls, sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in range(1, 6)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
+    for rented_id, hours in ((0, duration), (1, duration), (2, 2 * duration)):
+        nft_flex_contract.rentNFT(rented_id, hours, value=price_per_hour * hours + collateral_amount, sender=user)
+
+    chain.mine(timestamp=nft_flex_contract.s_rentals(1).endTime + 1)
+    tx = nft_flex_contract.settleExpired([0, 1, 2, 3], sender=owner)  # 2 is still active, 3 was never rented
+
+    ended = tx.events.filter(nft_flex_contract.NFTFlex__RentalEnded)
+    assert [event.rentalId for event in ended] == [0, 1]
+    assert all(event.renter == user.address for event in ended)
+    credited = tx.events.filter(nft_flex_contract.NFTFlex__CollateralCredited)
+    assert [(event.rentalId, event.amount) for event in credited] == [(0, collateral_amount), (1, collateral_amount)]
+    assert nft_flex_contract.s_rentals(0).renter == zero_address
+    assert nft_flex_contract.s_rentals(2).renter == user.address
+    assert nft_flex_contract.getBalance(user, collateral_token) == 2 * collateral_amount
+    assert nft_flex_contract.getBalance(owner, collateral_token) == price_per_hour * 4 * duration
+
+    # Settled rentals can be rented again, settling them twice does nothing
+    nft_flex_contract.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    tx = nft_flex_contract.settleExpired([1], sender=user)
+    assert len(tx.events.filter(nft_flex_contract.NFTFlex__RentalEnded)) == 0
+
+    initial_balance = user.balance
+    tx = nft_flex_contract.withdrawAll(collateral_token, sender=user)
+    assert user.balance == initial_balance + 2 * collateral_amount - tx.gas_used * tx.gas_price
+
+
+def test_settle_expired_needs_rentals(nft_flex_contract, owner):
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.settleExpired([], sender=owner)
+    assert "NFTFlex__EmptyBatch" == exc_info.type.__name__
+
+
+# 🚀 STEP 14: Repricing listings
+def test_update_prices(nft_flex_contract, nft_contract, nft_address, owner, user):
+    """
+    Owners reprice many listings at once; rentals with pending earnings keep their price.
+    """
+    nft_contract.mintBatch(owner, metadata_urls[:3], sender=owner)
+    rentals = [(token_id, price_per_hour, is_fractional, collateral_token, collateral_amount) for token_id in range(1, 4)]
+    nft_flex_contract.createRentals(nft_address, rentals, sender=owner)
+    nft_flex_contract.rentNFT(1, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+
+    tx = nft_flex_contract.updatePrices([0, 1, 2], [2 * price_per_hour, 3 * price_per_hour, price_per_hour // 2],
+                                        sender=owner)
+    updated = tx.events.filter(nft_flex_contract.NFTFlex__PriceUpdated)
+    assert [(event.rentalId, event.pricePerHour) for event in updated] == [(0, 2 * price_per_hour),
+                                                                         (2, price_per_hour // 2)]
+    assert nft_flex_contract.s_rentals(0).pricePerHour == 2 * price_per_hour
+    assert nft_flex_contract.s_rentals(1).pricePerHour == price_per_hour
+    assert nft_flex_contract.s_rentals(2).pricePerHour == price_per_hour // 2
+
+    # The new price applies to the next renter; the rented listing can be repriced once its earnings are collected
+    nft_flex_contract.rentNFT(0, duration, value=2 * price_per_hour * duration + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex_contract.s_rentals(1).endTime + 1)
+    nft_flex_contract.withdrawEarnings(1, sender=owner)
+    nft_flex_contract.updatePrices([1], [3 * price_per_hour], sender=owner)
+    assert nft_flex_contract.s_rentals(1).pricePerHour == 3 * price_per_hour
+
+
+def test_update_prices_checks_every_price(nft_flex_contract, nft_contract, nft_address, owner, user, minted_nft):
+    nft_flex_contract.createRental(nft_address, minted_nft, price_per_hour, is_fractional, collateral_token, collateral_amount, sender=owner)
+
+    for rental_ids, prices, sender, error in (
+        ([], [], owner, "NFTFlex__EmptyBatch"),
+        ([0], [], owner, "NFTFlex__LengthMismatch"),
+        ([0], [0], owner, "NFTFlex__PriceMustBeGreaterThanZero"),
+        ([0], [2 ** 96], owner, "NFTFlex__AmountTooLarge"),
+        ([0], [price_per_hour], user, "NFTFlex__OnlyOwnerCanUpdatePrices"),
+        ([1], [price_per_hour], owner, "NFTFlex__OnlyOwnerCanUpdatePrices"),  # not listed
+    ):
+        with pytest.raises(exceptions.ContractLogicError) as exc_info:
+            nft_flex_contract.updatePrices(rental_ids, prices, sender=sender)
+        assert error == exc_info.type.__name__
@@ -0,0 +1,202 @@
+# Tests that start from an NFT rented by `user` for 2 hours (rental 0, see `rented_rental` in conftest.py)
+# Docs -> https://docs.apeworx.io/ape/latest/userguides/testing.html
+import pytest
+from ape import chain, exceptions
+from constants import collateral_amount, collateral_token, duration, price_per_hour, zero_address
+
+
+
+
+
+"""
+Testing begins
+"""
+
+# 🚀 STEP 3: Error checking in rentNFT
+def test_nft_already_rented(nft_flex_contract, owner, rented_rental):
+    """Test that trying to rent an already rented NFT fails."""
+
+    # Try renting again and expect failure (no need to send ETH)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(rented_rental, duration, sender=owner)
+
+    # Assert correct revert message
+    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__NFTAlreadyRented)
+
+
+
+# 🚀 STEP 5: Error checking in endRental
+def test_only_renter_can_end_rental(nft_flex_contract, owner, rented_rental):
+    """
+    Ensures that only the renter can call endRental.
+    """
+
+    # Different user (not renter) tries to end rental
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.endRental(rented_rental, sender=owner)  # ❌ Owner tries to end rental
+
+    assert "NFTFlex__OnlyRenterCanEndRental" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__OnlyRenterCanEndRental)
+
+
+
+def test_cannot_end_rental_early(nft_flex_contract, user, rented_rental):
+    """
+    Ensures the renter cannot end the rental before the rental period expires.
+    """
+
+    # Attempt to end rental early
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.endRental(rented_rental, sender=user)  # ❌ Ending too early
+
+    assert "NFTFlex__RentalPeriodNotEnded" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalPeriodNotEnded)
+
+
+
+# 🚀 STEP 7: Error checking and Test that only the owner can withdraw earnings
+def test_only_owner_can_withdraw(nft_flex_contract, user, rented_rental):
+    """
+    Ensures that only the owner of the rental can withdraw earnings.
+    """
+
+    # Try withdrawing as a non-owner
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.withdrawEarnings(rented_rental, sender=user)  # ❌ User is not the owner
+
+    assert "NFTFlex__OnlyOwnerCanWithdrawEarnings" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__OnlyOwnerCanWithdrawEarnings)
+
+
+def test_cannot_withdraw_before_rental_ends(nft_flex_contract, owner, rented_rental):
+    """
+    Ensures that the owner cannot withdraw earnings before the rental period ends.
+    """
+
+    # Owner tries to withdraw earnings too early
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.withdrawEarnings(rented_rental, sender=owner)
+
+    assert "NFTFlex__RentalStillActive" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__RentalStillActive)
+
+
+def test_cannot_withdraw_zero_earnings(nft_flex_contract, owner, rented_rental):
+    """
+    Ensures that attempting to withdraw when there are no earnings fails.
+    """
+
+    # Fast forward time to ensure rental has ended
+    rental = nft_flex_contract.s_rentals(rented_rental)
+    rental_end_time = rental["endTime"]
+
+    # Explicitly increase blockchain time to just after the rental end time
+    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
+    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
+
+    # Withdraw all earnings from here then balance to withdraw will be zero
+    nft_flex_contract.withdrawEarnings(rented_rental, sender=owner)
+
+    # Owner attempts to withdraw with zero earnings
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.withdrawEarnings(rented_rental, sender=owner)  # Owner attempts to withdraw
+
+    # Ensure the correct error is raised
+    assert "NFTFlex__EarningTransferFailed" == exc_info.type.__name__
+    assert isinstance(exc_info.value, nft_flex_contract.NFTFlex__EarningTransferFailed)
+
+
+# 🚀 STEP 8: Test successful ETH withdrawal
+def test_successful_eth_withdrawal(nft_flex_contract, owner, rented_rental):
+    """
+    Ensures that the owner successfully withdraws ETH earnings after rental completion.
+    """
+
+    # Fast-forward time to after rental ends
+    rental = nft_flex_contract.s_rentals(rented_rental)
+    rental_end_time = rental["endTime"]
+
+    # Move blockchain time forward to just after the rental end time
+    new_time = rental_end_time + 1  # Move time forward by 1 second after the rental end time
+    chain.mine(timestamp=new_time)  # Mine a block with updated timestamp
+
+    # Owner withdraws earnings
+    initial_balance = owner.balance
+    tx = nft_flex_contract.withdrawEarnings(rented_rental, sender=owner)
+    
+    # Validate balance change
+    expected_earnings = price_per_hour * duration
+    gas_cost = tx.gas_used * tx.gas_price  # Calculate gas cost
+
+    # Verify the event NFTFlex__EarningsWithdrawn was emitted
+    event = tx.events.filter(nft_flex_contract.NFTFlex__EarningsWithdrawn)[0]
+
+    assert event.rentalId == rented_rental 
+    assert event.owner == owner
+    assert event.amount == expected_earnings
+
+
+    print(f"Initial balance: {initial_balance}")
+    print(f"Expected earnings: {expected_earnings}")
+    print(f"Gas cost: {gas_cost}")
+    print(f"Final balance: {owner.balance}")
+    assert owner.balance == initial_balance + expected_earnings - gas_cost
+
+
+# 🚀 STEP 10: Earnings ledger
+def test_renter_can_end_before_owner_withdraws(nft_flex_contract, owner, user, rented_rental):
+    """
+    Earnings are credited when the rental is paid, so the renter does not wait for the owner.
+    """
+    assert nft_flex_contract.getBalance(owner, collateral_token) == price_per_hour * duration
+
+    rental = nft_flex_contract.s_rentals(rented_rental)
+    chain.mine(timestamp=rental["endTime"] + 1)
+
+    initial_balance = user.balance
+    tx = nft_flex_contract.endRental(rented_rental, sender=user)
+    assert user.balance == initial_balance + collateral_amount - tx.gas_used * tx.gas_price
+
+    # The earnings are still on the owner's ledger
+    initial_balance = owner.balance
+    tx = nft_flex_contract.withdrawAll(collateral_token, sender=owner)
+    event = tx.events.filter(nft_flex_contract.NFTFlex__BalanceWithdrawn)[0]
+    assert event.owner == owner
+    assert event.amount == price_per_hour * duration
+    assert owner.balance == initial_balance + price_per_hour * duration - tx.gas_used * tx.gas_price
+    assert nft_flex_contract.getBalance(owner, collateral_token) == 0
+
+
+def test_withdraw_earnings_after_withdraw_all(nft_flex_contract, owner, rented_rental):
+    """
+    Earnings collected with withdrawAll cannot be withdrawn again per rental.
+    """
+    rental = nft_flex_contract.s_rentals(rented_rental)
+    chain.mine(timestamp=rental["endTime"] + 1)
+    nft_flex_contract.withdrawAll(collateral_token, sender=owner)
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.withdrawEarnings(rented_rental, sender=owner)
+    assert "NFTFlex__EarningTransferFailed" == exc_info.type.__name__
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.withdrawAll(collateral_token, sender=owner)
+    assert "NFTFlex__NothingToWithdraw" == exc_info.type.__name__
+
+
+# 🚀 STEP 11: Reverse index from NFT to rental
+def test_user_of_rented_nft(nft_flex_contract, nft_address, user, rented_rental):
+    """
+    userOf returns the renter until the rental period ends, userExpires its end time.
+    """
+    rental = nft_flex_contract.s_rentals(rented_rental)
+    assert nft_flex_contract.getRentalId(nft_address, rental["tokenId"]) == rented_rental
+    assert nft_flex_contract.userOf(nft_address, rental["tokenId"]) == user
+    assert nft_flex_contract.userExpires(nft_address, rental["tokenId"]) == rental["endTime"]
+
+    chain.mine(timestamp=rental["endTime"] + 1)
+    assert nft_flex_contract.userOf(nft_address, rental["tokenId"]) == zero_address
+
+    nft_flex_contract.endRental(rented_rental, sender=user)
+    assert nft_flex_contract.userExpires(nft_address, rental["tokenId"]) == 0
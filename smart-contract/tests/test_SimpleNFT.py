@@ -1,5 +1,6 @@
 import pytest
-from ape import accounts, project
+from ape import accounts, project, exceptions
+from nftflex.metadata import cid_digest
 
 
 metadata_urls = [
@@ -11,19 +12,12 @@ metadata_urls = [
 """
 Setup for testing
 """
-
-@pytest.fixture
-def owner():
-    return accounts.test_accounts[0]
+# `owner` and the session-wide `simple_nft` deployment come from conftest.py
 
 @pytest.fixture
 def recipient():
     return accounts.test_accounts[1]
 
-@pytest.fixture
-def simple_nft(owner):
-    return owner.deploy(project.SimpleNFT)
-
 
 """
 Testing begins
@@ -80,4 +74,67 @@ def test_multiple_mints(simple_nft, owner, recipient):
 # def test_token_metadata_url_nonexistent_token(simple_nft):
 #     """Test retrieving metadata URL for a nonexistent token."""
 #     with pytest.raises(Exception, match="ERC721: invalid token ID"):
-#         simple_nft.tokenMetadataUrl(999)  # Token ID 999 does not exist
\ No newline at end of file
+#         simple_nft.tokenMetadataUrl(999)  # Token ID 999 does not exist
+
+def test_mint_batch(simple_nft, owner, recipient):
+    """Test minting several NFTs in one transaction returns a contiguous ID range."""
+    receipt = simple_nft.mintBatch(recipient, metadata_urls, sender=owner)
+
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    assert token_ids == [1, 2]
+    assert simple_nft.balanceOf(recipient) == 2
+    assert simple_nft.nextTokenId() == 3
+
+    for token_id, metadata_url in zip(token_ids, metadata_urls):
+        assert simple_nft.ownerOf(token_id) == recipient
+        assert simple_nft.tokenMetadataUrl(token_id) == metadata_url
+
+
+def test_mint_batch_cheaper_per_token(simple_nft, owner, recipient):
+    """Minting in a batch should cost less gas per token than minting one by one."""
+    single_gas = sum(
+        simple_nft.mint(recipient, metadata_url, sender=owner).gas_used
+        for metadata_url in metadata_urls
+    )
+    batch_gas = simple_nft.mintBatch(recipient, metadata_urls, sender=owner).gas_used
+
+    print(f"Gas per mint: single={single_gas // len(metadata_urls)}, batch={batch_gas // len(metadata_urls)}")
+    assert batch_gas < single_gas
+
+
+def test_mint_batch_empty(simple_nft, owner, recipient):
+    """Minting an empty batch should revert."""
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        simple_nft.mintBatch(recipient, [], sender=owner)
+
+    assert "SimpleNFT__EmptyBatch" == exc_info.type.__name__
+
+
+def test_mint_compact_token_uri_matches_full_url(simple_nft, owner, recipient):
+    """A compact mint returns byte for byte the tokenURI of a mint with the full URL."""
+    full = list(simple_nft.mint(recipient, metadata_urls[0], sender=owner).events.filter(simple_nft.Transfer))[0]
+    compact = list(simple_nft.mintCompact(recipient, cid_digest(metadata_urls[0]), sender=owner)
+                   .events.filter(simple_nft.Transfer))[0]
+
+    assert compact["tokenId"] == full["tokenId"] + 1
+    assert simple_nft.ownerOf(compact["tokenId"]) == recipient
+    assert simple_nft.tokenURI(compact["tokenId"]) == simple_nft.tokenURI(full["tokenId"]) == metadata_urls[0]
+    assert simple_nft.tokenMetadataUrl(compact["tokenId"]) == metadata_urls[0]
+
+
+def test_mint_batch_compact(simple_nft, owner, recipient):
+    """Compact batches mint contiguous IDs and rebuild every URL."""
+    receipt = simple_nft.mintBatchCompact(recipient, [cid_digest(url) for url in metadata_urls], sender=owner)
+
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    assert token_ids == [1, 2]
+    assert simple_nft.nextTokenId() == 3
+    assert [simple_nft.tokenURI(token_id) for token_id in token_ids] == metadata_urls
+
+
+def test_mint_compact_empty_digest(simple_nft, owner, recipient):
+    """The zero digest marks tokens minted with a full URL and cannot be minted compactly."""
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        simple_nft.mintBatchCompact(recipient, [cid_digest(metadata_urls[0]), bytes(32)], sender=owner)
+
+    assert "SimpleNFT__EmptyDigest" == exc_info.type.__name__
@@ -0,0 +1,154 @@
+# Tests for the rental analytics (nftflex/analytics.py)
+import numpy as np
+import pytest
+from nftflex.abi import DecodedLog
+from nftflex.analytics import RentalAnalytics
+from nftflex.indexer import RentalStore
+
+
+
+
+"""
+Variables
+"""
+hour = 3600
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+owners = ["0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"]
+renter = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+eth_collateral = "0x0000000000000000000000000000000000000000"
+# One block per hour
+block_timestamps = {block_number: block_number * hour for block_number in range(10)}
+
+
+def make_log(name, block_number, log_index, **args):
+    return DecodedLog(name, args, nft_address, block_number, f"0x{block_number:064x}", f"0x{block_number:064x}", log_index)
+
+
+def history():
+    """
+    Two listings: token 1 at 10 wei/hour from hour 0, fractional token 2 at 20 wei/hour from hour 1.
+
+    Token 1 is rented from hour 1 to 3 and settled at hour 4, two shares of token 2 from hour 2 to 3.
+    """
+    return [
+        make_log("NFTFlex__RentalCreated", 0, 0, rentalId=0, owner=owners[0], nftAddress=nft_address,
+                 tokenId=1, pricePerHour=10, isFractional=False, collateralToken=eth_collateral, collateralAmount=100),
+        make_log("NFTFlex__RentalCreated", 1, 0, rentalId=1, owner=owners[1], nftAddress=nft_address,
+                 tokenId=2, pricePerHour=20, isFractional=True, collateralToken=eth_collateral, collateralAmount=25),
+        make_log("NFTFlex__RentalStarted", 1, 1, rentalId=0, renter=renter, startTime=hour, endTime=3 * hour,
+                 collateralAmount=100),
+        make_log("NFTFlex__SharesRented", 2, 0, rentalId=1, renter=renter, shareIds=[0, 1], startTime=2 * hour,
+                 endTime=3 * hour, collateralAmount=50),
+        make_log("NFTFlex__BalanceWithdrawn", 3, 0, owner=owners[0], token=nft_address, amount=20),
+        make_log("NFTFlex__RentalEnded", 4, 0, rentalId=0, renter=renter),
+    ]
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def analytics():
+    analytics = RentalAnalytics(block_timestamps.__getitem__)
+    assert analytics.apply(history()) == 6
+    return analytics
+
+
+
+
+# 🚀 STEP 1: Time series
+def test_occupancy_and_revenue_per_listed_hour(analytics):
+    times = [4 * hour, 3 * hour, hour]
+    windows = 4 * hour
+
+    # Listed: 4h + 3h, rented: the 2 hours of token 1 (shares do not occupy the whole NFT)
+    assert analytics.occupancy(times, windows)[0] == pytest.approx(2 / 7)
+    assert analytics.revenue(times, windows).tolist() == [60, 60, 20]
+    assert analytics.revenue_per_listed_hour(times, windows)[0] == pytest.approx(60 / 7)
+    # The last hour: listed twice, rented by nobody
+    assert analytics.occupancy([4 * hour], hour).tolist() == [0.0]
+    # Nothing listed yet
+    assert np.isnan(analytics.occupancy([0], hour)[0])
+
+
+def test_collateral_locked_until_released(analytics):
+    times = [0, hour, 2 * hour, 3 * hour, 4 * hour - 1, 4 * hour]
+    # The shares' collateral counts until their end time, the rental's until it was settled
+    assert analytics.collateral_locked(times).tolist() == [0, 100, 150, 100, 100, 0]
+
+    summary = analytics.summary(times, hour)
+    assert list(summary.columns) == ["rentals", "occupancy", "revenue", "revenue_per_listed_hour", "collateral_locked"]
+    assert summary["rentals"].tolist() == [0, 1, 1, 0, 0, 0]
+
+
+# 🚀 STEP 2: Rankings
+def test_top_nfts_and_owners(analytics):
+    top_nfts = analytics.top_nfts(4 * hour, 4 * hour)
+    assert top_nfts["token_id"].tolist() == [2, 1]
+    assert top_nfts["revenue"].tolist() == [40, 20]
+    assert analytics.top_nfts(4 * hour, 4 * hour, by="rentals")["rentals"].tolist() == [1, 1]
+    assert analytics.top_nfts(4 * hour, hour).empty
+
+    top_owners = analytics.top_owners(4 * hour, 4 * hour)
+    assert top_owners["owner"].tolist() == [owners[1], owners[0]]
+    assert top_owners["listed_hours"].tolist() == [3, 4]
+    assert top_owners["revenue_per_listed_hour"].tolist() == pytest.approx([40 / 3, 20 / 4])
+
+    trending = analytics.trending_nfts(2 * hour, hour)
+    assert trending["token_id"].tolist() == [2]
+    assert trending["previous_rentals"].tolist() == [0]
+
+
+# 🚀 STEP 3: Incremental updates
+def test_incremental_updates_match_a_single_load(analytics):
+    times = np.arange(0, 6 * hour, 600)
+    expected = analytics.summary(times, 2 * hour)
+
+    incremental = RentalAnalytics(block_timestamps.__getitem__)
+    for log in history():
+        incremental.apply([log])
+    assert incremental.summary(times, 2 * hour).equals(expected)
+
+    # Shares released before rentals started earlier: the sorted arrays are rebuilt
+    reordered = RentalAnalytics(block_timestamps.__getitem__)
+    logs = history()
+    reordered.apply(logs[:2] + logs[3:4])
+    reordered.apply(logs[2:3] + logs[4:])
+    assert reordered.summary(times, 2 * hour).equals(expected)
+
+
+def test_sync_from_rental_store(analytics):
+    store = RentalStore()
+    logs = [log for log in history() if "rentalId" in log.args]
+    store.apply(logs[:3], last_block=1)
+
+    synced = RentalAnalytics(block_timestamps.__getitem__)
+    assert synced.sync(store) == 3
+    store.apply(logs[3:], last_block=4)
+    assert synced.sync(store) == 2
+    assert synced.sync(store) == 0
+
+    times = np.arange(0, 6 * hour, 600)
+    assert synced.summary(times, hour).equals(analytics.summary(times, hour))
+    store.close()
+
+
+# 🚀 STEP 4: Listings
+def test_listing_stats(analytics):
+    analytics.apply([make_log("NFTFlex__PriceUpdated", 5, 0, rentalId=1, pricePerHour=30)])
+    stats = analytics.listing_stats(4 * hour, 4 * hour)
+
+    assert stats.index.tolist() == [0, 1]
+    assert stats["price_per_hour"].tolist() == [10, 30]
+    assert stats["listed_seconds"].tolist() == [4 * hour, 3 * hour]
+    assert stats["rented_seconds"].tolist() == [2 * hour, 0]
+    assert stats["occupancy"][0] == 0.5
+    assert np.isnan(stats["occupancy"][1])  # fractional
+    assert stats["idle_seconds"].tolist() == [hour, hour]
+    assert stats["revenue"].tolist() == [20, 40]
+
+    # Later rentals pay the new price
+    analytics.apply([make_log("NFTFlex__SharesRented", 6, 0, rentalId=1, renter=renter, shareIds=[3],
+                              startTime=6 * hour, endTime=7 * hour, collateralAmount=25)])
+    assert analytics.revenue([6 * hour], hour).tolist() == [30]
+    assert analytics.listing_stats(6 * hour, hour)["idle_seconds"].tolist() == [3 * hour, 0]
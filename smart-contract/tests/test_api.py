@@ -0,0 +1,269 @@
+# Tests for the read-only HTTP API over the rental index (nftflex/api.py)
+import asyncio
+import gzip
+import time
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from nftflex.abi import DecodedLog
+from nftflex.api import API_KEY, accepts_gzip, create_app, matches_etag
+from nftflex.indexer import RentalStore
+from nftflex.metadata import MetadataService
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 15
+collateral_amount = 10 ** 18
+eth_collateral = "0x0000000000000000000000000000000000000000"
+token = "0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0"
+duration = 2
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+owners = ["0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"]
+renter = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+now = 1_700_000_000
+listing_count = 2_000
+identity = {"Accept-Encoding": "identity"}
+
+
+def make_log(name, block_number, log_index, **args):
+    return DecodedLog(name, args, nft_address, block_number, f"0x{block_number:064x}", f"0x{block_number:064x}", log_index)
+
+
+def listings(count: int):
+    """
+    List ``count`` NFTs priced 1 to 100 finney an hour, every fourth one paid in ``token``, and rent
+    every tenth one: those rentals end after ``now`` when their ID is a multiple of 20.
+    """
+    logs = [
+        make_log("NFTFlex__RentalCreated", 1 + rental_id // 100, rental_id % 100, rentalId=rental_id,
+                 owner=owners[rental_id % 2], nftAddress=nft_address, tokenId=rental_id,
+                 pricePerHour=(1 + rental_id % 100) * price_per_hour, isFractional=False,
+                 collateralToken=token if rental_id % 4 == 0 else eth_collateral, collateralAmount=collateral_amount)
+        for rental_id in range(count)
+    ]
+    block = count // 100 + 1
+    for rental_id in range(0, count, 10):
+        end_time = now + 3600 if rental_id % 20 == 0 else now - 3600
+        logs.append(make_log("NFTFlex__RentalStarted", block, rental_id // 10, rentalId=rental_id, renter=renter,
+                             startTime=end_time - duration * 3600, endTime=end_time, collateralAmount=collateral_amount))
+    return logs
+
+
+def run(app, scenario, **client_args):
+    """Run ``scenario(client)`` against ``app`` on a local test server."""
+    async def main():
+        async with TestClient(TestServer(app), **client_args) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def store():
+    store = RentalStore()
+    logs = listings(listing_count)
+    store.apply(logs, logs[-1].block_number, block_hash="0x01")
+    yield store
+    store.close()
+
+@pytest.fixture
+def app(store):
+    return create_app(store, clock=lambda: now)
+
+
+
+
+# 🚀 STEP 1: Queries
+def test_listings_filters_and_pages(app):
+    async def scenario(client):
+        response = await client.get("/rentals", params={"limit": 3, "offset": 4}, headers=identity)
+        assert response.status == 200 and response.headers["X-Indexed-Block"] == "21"
+        page = await response.json()
+        assert page["total"] == listing_count and page["limit"] == 3
+        assert [rental["rental_id"] for rental in page["items"]] == [4, 5, 6]
+        # uint256 amounts are strings
+        assert page["items"][0]["price_per_hour"] == str(5 * price_per_hour)
+
+        response = await client.get("/rentals", params={
+            "collateral_token": token.lower(), "min_price": 10 * price_per_hour, "max_price": 20 * price_per_hour,
+            "owner": owners[0], "limit": 500})
+        page = await response.json()
+        assert page["total"] == len(page["items"]) > 0
+        assert all(rental["rental_id"] % 4 == 0 and 10 <= 1 + rental["rental_id"] % 100 <= 20
+                   for rental in page["items"])
+
+        active = await (await client.get("/rentals", params={"status": "active"})).json()
+        pending = await (await client.get("/rentals", params={"status": "PENDING_WITHDRAWAL"})).json()
+        assert active["total"] == pending["total"] == listing_count // 20
+        assert {rental["renter"] for rental in active["items"]} == {renter}
+
+        for params in ({"status": "lost"}, {"limit": 501}, {"offset": -1}, {"min_price": "cheap"}, {"owner": "0x12"}):
+            response = await client.get("/rentals", params=params)
+            assert response.status == 400, params
+            assert "error" in await response.json()
+
+    run(app, scenario)
+
+
+def test_rental_details_and_dashboards(app):
+    async def scenario(client):
+        details = await (await client.get("/rentals/20")).json()
+        assert details["rental"]["renter"] == renter
+        assert details["rental"]["collateral_token"] == token
+        assert [event["name"] for event in details["events"]] == ["NFTFlex__RentalCreated", "NFTFlex__RentalStarted"]
+        # Values beyond JavaScript's safe integers are strings
+        assert details["events"][0]["args"]["collateralAmount"] == str(collateral_amount)
+        assert details["events"][1]["args"]["endTime"] == now + 3600
+        assert (await client.get(f"/rentals/{listing_count}")).status == 404
+        assert (await client.get("/rentals/first")).status == 400
+
+        owner = await (await client.get(f"/owners/{owners[0].lower()}", params={"status": "active", "limit": 5})).json()
+        assert owner["address"] == owners[0]
+        # Every rented NFT is listed by the first owner
+        assert owner["by_status"] == {"available": 800, "active": 100, "pending_withdrawal": 100, "ended": 0}
+        assert owner["total"] == 100 and len(owner["items"]) == 5
+        assert int(owner["total_earnings"]) == sum(
+            (1 + rental_id % 100) * price_per_hour * duration for rental_id in range(0, listing_count, 10))
+
+        held = await (await client.get(f"/renters/{renter}")).json()
+        assert held["by_status"] == {"active": 100, "pending_withdrawal": 100, "ended": 0}
+        assert held["total"] == 200 and len(held["items"]) == 50
+
+    run(app, scenario)
+
+
+def test_metadata(store):
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return {"name": url.rsplit("/", 1)[1]}
+
+    token_uri = lambda address, token_id: metadata_url if token_id < 10 else None
+    with MetadataService(fetch=fetch) as metadata:
+        app = create_app(store, metadata, token_uri)
+
+        async def scenario(client):
+            for _ in range(3):
+                response = await client.get("/rentals/3/metadata")
+                assert (await response.json())["metadata"] == {"name": metadata_url[len("ipfs://"):]}
+            assert (await client.get("/rentals/30/metadata")).status == 404
+
+        run(app, scenario)
+    assert len(fetched) == 1
+
+
+# 🚀 STEP 2: Caching
+def test_responses_are_cached_per_block(app, store):
+    api = app[API_KEY]
+
+    async def scenario(client):
+        first = await client.get("/rentals", params={"owner": owners[1], "limit": 10})
+        etag = first.headers["ETag"]
+        # Query parameters in another order share the entry
+        second = await client.get("/rentals", params={"limit": 10, "owner": owners[1]})
+        assert second.headers["ETag"] == etag and await second.read() == await first.read()
+        assert api.counters["misses"] == 1 and api.counters["hits"] == 1
+
+        revalidated = await client.get("/rentals", params={"owner": owners[1], "limit": 10},
+                                       headers={"If-None-Match": etag})
+        assert revalidated.status == 304 and await revalidated.read() == b""
+
+        # A new block misses the cache, but a response it does not change keeps its ETag
+        store.apply([make_log("NFTFlex__PriceUpdated", 30, 0, rentalId=0, pricePerHour=price_per_hour)], 30, "0x30")
+        unchanged = await client.get("/rentals", params={"owner": owners[1], "limit": 10},
+                                     headers={"If-None-Match": etag})
+        assert unchanged.status == 304 and unchanged.headers["X-Indexed-Block"] == "30"
+        assert api.counters["misses"] == 2
+
+        store.apply([make_log("NFTFlex__PriceUpdated", 31, 0, rentalId=1, pricePerHour=price_per_hour)], 31, "0x31")
+        changed = await client.get("/rentals", params={"owner": owners[1], "limit": 10},
+                                   headers={"If-None-Match": etag})
+        assert changed.status == 200 and changed.headers["ETag"] != etag
+        assert (await changed.json())["items"][0]["price_per_hour"] == str(price_per_hour)
+
+        # A reorg replacing block 31 is a new state even at the same height
+        store.rollback(31)
+        store.apply([], 31, "0x31bis")
+        replaced = await client.get("/rentals", params={"owner": owners[1], "limit": 10})
+        assert replaced.headers["ETag"] == etag
+
+    run(app, scenario)
+
+
+def test_status_filters_expire(store):
+    clock = [now]
+    app = create_app(store, clock=lambda: clock[0], time_ttl=0.05)
+    api = app[API_KEY]
+
+    async def scenario(client):
+        assert (await (await client.get("/rentals", params={"status": "active"})).json())["total"] == 100
+        clock[0] = now + 7200
+        # Still cached
+        assert (await (await client.get("/rentals", params={"status": "active"})).json())["total"] == 100
+        await asyncio.sleep(0.06)
+        assert (await (await client.get("/rentals", params={"status": "active"})).json())["total"] == 0
+        assert api.counters["misses"] == 2
+
+    run(app, scenario)
+
+
+def test_status_filters_use_chain_time():
+    store = RentalStore()
+    logs = listings(listing_count)
+    store.apply(logs, logs[-1].block_number, "0x01", block_timestamp=now)
+    app = create_app(store)
+
+    async def scenario(client):
+        assert (await (await client.get("/rentals", params={"status": "active"})).json())["total"] == 100
+        # Rentals expire when a block past their end time is indexed, whatever the server's clock says
+        store.apply([], 30, "0x30", block_timestamp=now + 7200)
+        assert (await (await client.get("/rentals", params={"status": "active"})).json())["total"] == 0
+        owner = await (await client.get(f"/owners/{owners[0]}")).json()
+        assert owner["by_status"] == {"available": 800, "active": 0, "pending_withdrawal": 200, "ended": 0}
+
+    run(app, scenario)
+    store.close()
+
+
+def test_gzip(app):
+    async def scenario(client):
+        plain = await client.get("/rentals", params={"limit": 100}, headers=identity)
+        zipped = await client.get("/rentals", params={"limit": 100}, headers={"Accept-Encoding": "br, gzip"})
+        assert "Content-Encoding" not in plain.headers
+        assert zipped.headers["Content-Encoding"] == "gzip" and zipped.headers["Vary"] == "Accept-Encoding"
+        body = await plain.read()
+        compressed = await zipped.read()
+        assert gzip.decompress(compressed) == body
+        assert len(compressed) * 4 < len(body)
+        # Small bodies are sent as they are
+        small = await client.get("/rentals", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in small.headers
+
+    run(app, scenario, auto_decompress=False)
+
+    assert accepts_gzip("deflate, gzip;q=0.5") and accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0") and not accepts_gzip("identity")
+    assert matches_etag('"abc", W/"def"', 'W/"def"') and not matches_etag('"abc"', 'W/"def"')
+
+
+def test_cached_throughput(app):
+    requests = 2_000
+
+    async def scenario(client):
+        await client.get("/rentals", params={"status": "available", "limit": 50})
+        started_at = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/rentals", params={"status": "available", "limit": 50})
+            await response.read()
+        return (time.perf_counter() - started_at) / requests
+
+    seconds = run(app, scenario)
+    print(f"{seconds * 1e3:.2f}ms per cached request ({1 / seconds:,.0f} req/s over one connection)")
+    assert seconds < 0.005
@@ -0,0 +1,167 @@
+# Tests for the artifact exporter (nftflex/artifacts.py)
+import json
+import os
+import time
+import pytest
+from ape import project
+from nftflex.abi import EventDecoder, canonical_type, error_names, load_abi, signature
+from nftflex.artifacts import ExportTarget, export_artifacts, iter_contract_abis
+
+
+
+
+"""
+Variables
+"""
+abis = {"NFTFlex": load_abi("NFTFlex"), "SimpleNFT": load_abi("SimpleNFT")}
+targets = [
+    ExportTarget("abis", "{name}_ABI.json", "contract_addresses.json", "deployments.json", "abis/tables.json"),
+    ExportTarget("client/abis", "{name}.json", "client/contract_addresses.json", None, "client/abis/tables.json"),
+]
+local_addresses = {"SimpleNFT": "0x700b6A60ce7EaaEA56F065753d8dcB9653dbAD35",
+                   "NFTFlex": "0xA15BB66138824a1c7167f5E85b957d04Dd34E468"}
+sepolia_addresses = {"SimpleNFT": "0x5FbDB2315678afecb367f032d93F642f64180aa3",
+                     "NFTFlex": "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"}
+
+
+def write_manifest(path, contract_abis, bytecode_size=1_000):
+    """Write an ape-style manifest; the bytecode padding makes it as large as a real one."""
+    manifest = {
+        "contractTypes": {
+            name: {"abi": abi, "contractName": name, "deploymentBytecode": {"bytecode": "0x" + "60" * bytecode_size}}
+            for name, abi in contract_abis.items()
+        },
+        "sources": {},
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+
+
+def read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def project_dir(tmp_path):
+    os.makedirs(tmp_path / ".build")
+    write_manifest(tmp_path / ".build" / "__local__.json", abis)
+    return tmp_path
+
+
+def export(project_dir, **kwargs):
+    return export_artifacts(targets=targets, manifest_path=str(project_dir / ".build" / "__local__.json"),
+                            state_path=str(project_dir / ".build" / "export.json"), project_dir=str(project_dir),
+                            **kwargs)
+
+
+
+
+# 🚀 STEP 1: Exporting
+def test_export_writes_every_target(project_dir):
+    result = export(project_dir, addresses=local_addresses, network="local", chain_id=31337)
+
+    assert result.parsed
+    assert len(result.written) == 9  # 2 ABIs, tables and addresses per target, deployments once
+    assert read_json(project_dir / "abis" / "NFTFlex_ABI.json") == abis["NFTFlex"]
+    assert read_json(project_dir / "client" / "abis" / "SimpleNFT.json") == abis["SimpleNFT"]
+    assert read_json(project_dir / "client" / "contract_addresses.json") == {"network": "local", **local_addresses}
+
+    tables = read_json(project_dir / "client" / "abis" / "tables.json")
+    decoder = EventDecoder(abis["NFTFlex"])
+    assert {topic: signature.split("(")[0] for topic, signature in tables["NFTFlex"]["events"].items()} == {
+        topic: event["name"] for topic, event in decoder.events.items()
+    }
+    names = error_names(abis["NFTFlex"])
+    for error_selector, error_signature in tables["NFTFlex"]["errors"].items():
+        assert names[error_selector] == error_signature.split("(")[0]
+    assert "Transfer(address,address,uint256)" in tables["SimpleNFT"]["events"].values()
+
+
+def test_streamed_manifest_gives_the_same_abis(project_dir):
+    loaded = dict(iter_contract_abis(str(project_dir / ".build" / "__local__.json")))
+    streamed = dict(iter_contract_abis(str(project_dir / ".build" / "__local__.json"), stream_threshold=0))
+    assert streamed == loaded == abis
+
+
+# 🚀 STEP 2: Incremental reruns
+def test_rerun_without_changes_skips_everything(project_dir):
+    export(project_dir, addresses=local_addresses, network="local", chain_id=31337)
+    abi_path = project_dir / "abis" / "NFTFlex_ABI.json"
+    mtime = os.stat(abi_path).st_mtime_ns
+
+    started_at = time.perf_counter()
+    result = export(project_dir, addresses=local_addresses, network="local", chain_id=31337)
+    print(f"No-op export took {(time.perf_counter() - started_at) * 1000:.2f}ms")
+
+    assert not result.parsed
+    assert result.written == []
+    assert len(result.unchanged) == 9
+    assert os.stat(abi_path).st_mtime_ns == mtime
+
+
+def test_only_changed_outputs_are_rewritten(project_dir):
+    export(project_dir)
+    changed = {**abis, "SimpleNFT": [entry for entry in abis["SimpleNFT"] if entry.get("name") != "Approval"]}
+    write_manifest(project_dir / ".build" / "__local__.json", changed, bytecode_size=2_000)
+
+    result = export(project_dir)
+
+    assert result.parsed
+    assert sorted(os.path.relpath(path, project_dir) for path in result.written) == [
+        "abis/SimpleNFT_ABI.json", "abis/tables.json", "client/abis/SimpleNFT.json", "client/abis/tables.json"
+    ]
+    assert read_json(project_dir / "abis" / "SimpleNFT_ABI.json") == changed["SimpleNFT"]
+
+
+def test_identical_files_are_kept_without_state(project_dir):
+    export(project_dir)
+    os.remove(project_dir / ".build" / "export.json")
+    # A file edited by hand is restored, the others keep their modification time
+    with open(project_dir / "client" / "abis" / "NFTFlex.json", 'w') as f:
+        f.write("[]")
+
+    result = export(project_dir)
+    assert [os.path.relpath(path, project_dir) for path in result.written] == ["client/abis/NFTFlex.json"]
+    assert read_json(project_dir / "client" / "abis" / "NFTFlex.json") == abis["NFTFlex"]
+
+
+# 🚀 STEP 3: Addresses per chain
+def test_deployments_are_kept_per_chain(project_dir):
+    export(project_dir, addresses=local_addresses, network="local", chain_id=31337)
+    export(project_dir, addresses=sepolia_addresses, network="sepolia", chain_id=11155111)
+
+    assert read_json(project_dir / "deployments.json") == {
+        "31337": {"network": "local", **local_addresses},
+        "11155111": {"network": "sepolia", **sepolia_addresses},
+    }
+    # The flat file always holds the latest deployment
+    assert read_json(project_dir / "contract_addresses.json") == {"network": "sepolia", **sepolia_addresses}
+    assert not os.path.exists(project_dir / "client" / "deployments.json")
+
+
+# 🚀 STEP 4: The checked-in ABIs are the compiler's
+def interface(abi):
+    """The externally visible shape of an ABI: signatures, return types, mutability and indexed event inputs."""
+    shape = set()
+    for entry in abi:
+        if entry["type"] in ("function", "event", "error"):
+            outputs = ",".join(canonical_type(output) for output in entry.get("outputs", []))
+            indexed = tuple(abi_input.get("indexed", False) for abi_input in entry["inputs"])
+            shape.add((entry["type"], signature(entry), outputs, entry.get("stateMutability"), indexed))
+        else:
+            shape.add((entry["type"], ",".join(canonical_type(abi_input) for abi_input in entry.get("inputs", [])),
+                       "", entry.get("stateMutability"), ()))
+    return shape
+
+
+@pytest.mark.parametrize("name", ["NFTFlex", "SimpleNFT"])
+def test_exported_abis_matches_contract(name):
+    """abis/ and the client copy must be regenerated (`ape run export_artifacts`) after every contract change."""
+    compiled = [json.loads(entry.model_dump_json(by_alias=True)) for entry in getattr(project, name).contract_type.abi]
+    client_abi = read_json(os.path.join(os.path.dirname(__file__), "..", "..", "client", "src", "abis", f"{name}.json"))
+    assert interface(load_abi(name)) == interface(compiled)
+    assert interface(client_abi) == interface(compiled)
@@ -0,0 +1,268 @@
+# Tests for the streaming, reorg-aware follower (nftflex/follower.py)
+import asyncio
+import pytest
+from ape import accounts, project, chain, networks
+from eth_abi import encode
+from nftflex.abi import EventDecoder, canonical_type
+from nftflex.follower import RentalFollower, ReorgTooDeep
+from nftflex.indexer import INDEXED_EVENTS, RentalStore
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 2 * 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+owner_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+renter_address = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+decoder = EventDecoder.for_contract("NFTFlex", INDEXED_EVENTS)
+events_by_name = {event["name"]: (topic, event) for topic, event in decoder.events.items()}
+
+
+def event(name, **args):
+    """Encode an NFTFlex event as the (topics, data) pair of a raw log."""
+    topic, event_abi = events_by_name[name]
+    topics = [topic]
+    types, values = [], []
+    for abi_input in event_abi["inputs"]:
+        if abi_input["indexed"]:
+            topics.append("0x" + encode([canonical_type(abi_input)], [args[abi_input["name"]]]).hex())
+        else:
+            types.append(canonical_type(abi_input))
+            values.append(args[abi_input["name"]])
+    return topics, "0x" + encode(types, values).hex()
+
+
+def created(rental_id):
+    return event("NFTFlex__RentalCreated", rentalId=rental_id, owner=owner_address, nftAddress=nft_address,
+                 tokenId=rental_id, pricePerHour=price_per_hour, isFractional=False,
+                 collateralToken=collateral_token, collateralAmount=collateral_amount)
+
+
+def started(rental_id, end_time=10_000):
+    return event("NFTFlex__RentalStarted", rentalId=rental_id, renter=renter_address, startTime=end_time - 7200,
+                 endTime=end_time, collateralAmount=collateral_amount)
+
+
+class FakeChain:
+    """
+    Minimal in-memory chain serving the calls the follower makes.
+
+    Every block has a list of (topics, data) events; forking replaces the blocks
+    from a height on, which changes their hashes.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.fork_id = 0
+        self.mine([])  # genesis
+
+    @property
+    def block_number(self):
+        return len(self.blocks) - 1
+
+    def mine(self, events):
+        number = len(self.blocks)
+        parent = self.blocks[-1]["hash"] if self.blocks else "0x" + "00" * 32
+        block_hash = "0x" + f"{self.fork_id:032x}{number:032x}"
+        self.blocks.append({"number": number, "hash": block_hash, "parentHash": parent, "timestamp": 12 * number,
+                            "events": events})
+
+    def fork(self, from_block):
+        self.fork_id += 1
+        del self.blocks[from_block:]
+
+    def get_block(self, number):
+        return self.blocks[number]
+
+    def get_logs(self, params):
+        logs = []
+        for block in self.blocks[params["fromBlock"]:params["toBlock"] + 1]:
+            for log_index, (topics, data) in enumerate(block["events"]):
+                logs.append({"address": nft_address, "topics": topics, "data": data, "blockNumber": block["number"],
+                             "blockHash": block["hash"], "transactionHash": block["hash"], "logIndex": log_index})
+        return logs
+
+
+class FakeWeb3:
+    def __init__(self, fake_chain):
+        self.eth = fake_chain
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def fake_chain():
+    return FakeChain()
+
+@pytest.fixture
+def store():
+    store = RentalStore()
+    yield store
+    store.close()
+
+@pytest.fixture
+def owner():
+    return accounts.test_accounts[0]
+
+@pytest.fixture
+def user():
+    return accounts.test_accounts[1]
+
+
+
+
+# 🚀 STEP 1: Following new blocks
+def test_follower_publishes_diffs(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=0, decoder=decoder)
+    received = []
+    follower.subscribe(received.append)
+
+    fake_chain.mine([created(0), created(1)])
+    diffs = asyncio.run(follower.poll())
+    assert [(diff.rental_id, diff.before) for diff in diffs] == [(0, None), (1, None)]
+    assert received == diffs
+
+    fake_chain.mine([started(1)])
+    (diff,) = asyncio.run(follower.poll())
+    assert diff.rental_id == 1 and diff.block_number == 2
+    assert diff.before["renter"] is None and diff.after["renter"] == renter_address
+
+    # Nothing new, nothing published
+    assert asyncio.run(follower.poll()) == []
+
+
+def test_follower_waits_for_confirmations(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=2, decoder=decoder)
+
+    fake_chain.mine([created(0)])
+    fake_chain.mine([])
+    assert asyncio.run(follower.poll()) == []
+    assert store.count() == 0
+
+    fake_chain.mine([])
+    (diff,) = asyncio.run(follower.poll())
+    assert diff.rental_id == 0
+    assert store.last_block == 1
+
+
+def test_follower_async_subscribers_and_iterator(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=0, poll_interval=0,
+                              decoder=decoder)
+    received = []
+
+    async def on_diff(diff):
+        received.append(diff.rental_id)
+
+    follower.subscribe(on_diff)
+
+    async def consume():
+        collected = []
+        async for diff in follower:
+            collected.append(diff.rental_id)
+            if diff.rental_id == 2:
+                follower.stop()
+            fake_chain.mine([created(len(collected))])
+        return collected
+
+    fake_chain.mine([created(0)])
+    assert asyncio.run(consume()) == [0, 1, 2]
+    assert received == [0, 1, 2]
+
+
+# 🚀 STEP 2: Reorgs
+def test_follower_rolls_back_replaced_blocks(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=0, decoder=decoder)
+    fake_chain.mine([created(0), created(1)])
+    fake_chain.mine([started(0)])
+    fake_chain.mine([created(2)])
+    asyncio.run(follower.poll())
+    assert store.count() == 3
+
+    # Replace blocks 2 and 3: rental 1 gets rented instead of rental 0 and rental 2 is never created
+    fake_chain.fork(2)
+    fake_chain.mine([started(1)])
+    diffs = asyncio.run(follower.poll())
+
+    reverted = {diff.rental_id: diff for diff in diffs if diff.reverted}
+    assert set(reverted) == {0, 2}
+    assert reverted[0].before["renter"] == renter_address and reverted[0].after["renter"] is None
+    assert reverted[2].after is None
+    applied = [diff for diff in diffs if not diff.reverted]
+    assert [(diff.rental_id, diff.after["renter"]) for diff in applied] == [(1, renter_address)]
+
+    assert store.count() == 2
+    assert store.rental(0)["renter"] is None
+    assert store.rental(1)["renter"] == renter_address
+    assert store.last_block == 2
+
+
+def test_follower_detects_replaced_tip(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=0, decoder=decoder)
+    fake_chain.mine([created(0)])
+    fake_chain.mine([started(0)])
+    asyncio.run(follower.poll())
+
+    # Same height, different block: no new block to expose a parent hash mismatch
+    fake_chain.fork(2)
+    fake_chain.mine([])
+    diffs = asyncio.run(follower.poll())
+    assert [(diff.rental_id, diff.reverted) for diff in diffs] == [(0, True)]
+    assert store.rental(0)["renter"] is None
+    assert store.block_hash(2) == fake_chain.blocks[2]["hash"]
+
+
+def test_follower_refuses_reorgs_past_tracked_blocks(fake_chain, store):
+    follower = RentalFollower(FakeWeb3(fake_chain), nft_address, store, confirmations=0, max_reorg_depth=2,
+                              decoder=decoder)
+    for rental_id in range(6):
+        fake_chain.mine([created(rental_id)])
+    asyncio.run(follower.poll())
+
+    fake_chain.fork(1)
+    for _ in range(7):
+        fake_chain.mine([])
+    with pytest.raises(ReorgTooDeep):
+        asyncio.run(follower.poll())
+
+
+# 🚀 STEP 3: Following the ape test chain
+def test_follower_on_test_chain_with_revert(owner, user, store):
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    receipt = simple_nft.mintBatch(owner, [metadata_url] * 3, sender=owner)
+    token_ids = [log["tokenId"] for log in receipt.events.filter(simple_nft.Transfer)]
+    nft_flex.createRentals(
+        simple_nft.address,
+        [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+        sender=owner,
+    )
+
+    follower = RentalFollower(networks.provider.web3, nft_flex.address, store, confirmations=0,
+                              start_block=start_block)
+    diffs = asyncio.run(follower.poll())
+    assert sorted(diff.rental_id for diff in diffs) == [0, 1, 2]
+
+    snapshot = chain.snapshot()
+    nft_flex.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    (diff,) = asyncio.run(follower.poll())
+    assert diff.after["renter"] == user.address
+
+    # Force a reorg: drop the rental block and mine a competing one at the same height
+    chain.restore(snapshot)
+    nft_flex.rentNFT(1, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    diffs = asyncio.run(follower.poll())
+
+    assert [(diff.rental_id, diff.reverted) for diff in diffs] == [(0, True), (1, False)]
+    assert store.rental(0)["renter"] is None
+    assert store.rental(1)["renter"] == user.address == nft_flex.s_rentals(1).renter
@@ -0,0 +1,384 @@
+# Gas benchmarks for the NFTFlex and SimpleNFT lifecycle
+#
+# Every measurement is compared with tests/gas_baseline.json and the test fails when
+# a function costs more than the baseline plus NFTFLEX_GAS_TOLERANCE (default 2%), or
+# when the baseline has no entry for it. The file is only written in update mode:
+# after an intended gas change or a new measurement, refresh it with
+#   ape compile && NFTFLEX_UPDATE_GAS_BASELINE=1 ape test tests/test_gas.py
+# Without the file the gas tests are skipped. Comparisons between cases (cost vs number of
+# rentals or shares) measure both sides in the same test, so they hold under -k and xdist.
+import json
+import os
+import time
+import pytest
+from ape import accounts, project, chain, networks
+from nftflex.metadata import cid_digest
+from nftflex.orders import ListingOrder, sign_order
+from nftflex.permit import rental_permit
+
+
+
+
+"""
+Variables
+"""
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "gas_baseline.json")
+TOLERANCE = float(os.environ.get("NFTFLEX_GAS_TOLERANCE", "0.02"))
+UPDATE_BASELINE = os.environ.get("NFTFLEX_UPDATE_GAS_BASELINE") == "1"
+
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+eth_collateral = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+seed_chunk = 200  # rentals listed per createRentals call while seeding
+mint_chunk = 200  # NFTs minted per mintBatch call when comparing storage layouts
+
+
+class GasBaseline:
+    """Compares gas measurements with the stored baseline, and records them in update mode."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.baseline = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.baseline = json.load(f)
+        self.measured = {}
+
+    def check(self, name: str, gas_used: int) -> None:
+        self.measured[name] = gas_used
+        if UPDATE_BASELINE:
+            return
+        before = self.baseline.get(name)
+        assert before is not None, (
+            f"{name} has no gas baseline ({gas_used} gas measured); record it with "
+            f"NFTFLEX_UPDATE_GAS_BASELINE=1 ape test tests/test_gas.py"
+        )
+        assert gas_used <= before * (1 + TOLERANCE), (
+            f"{name} regressed: {gas_used} gas vs baseline {before} "
+            f"(+{(gas_used - before) / before:.1%}, tolerance {TOLERANCE:.0%})"
+        )
+
+    def save(self) -> None:
+        # Entries of the cases a -k run deselected are kept
+        results = {**self.baseline, **self.measured}
+        if not UPDATE_BASELINE or results == self.baseline:
+            return
+        with open(self.path, 'w') as f:
+            json.dump(dict(sorted(results.items())), f, indent=4)
+            f.write("\n")
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture(scope="module")
+def gas():
+    if not UPDATE_BASELINE and not os.path.exists(BASELINE_PATH):
+        pytest.skip(f"no gas baseline at {BASELINE_PATH}; record it with "
+                    f"NFTFLEX_UPDATE_GAS_BASELINE=1 ape test tests/test_gas.py")
+    baseline = GasBaseline(BASELINE_PATH)
+    yield baseline
+    baseline.save()
+
+@pytest.fixture
+def owner():
+    return accounts.test_accounts[0]
+
+@pytest.fixture
+def user():
+    return accounts.test_accounts[1]
+
+@pytest.fixture
+def simple_nft(owner):
+    return owner.deploy(project.SimpleNFT)
+
+@pytest.fixture
+def nft_flex(owner):
+    return owner.deploy(project.NFTFlex)
+
+@pytest.fixture
+def mock_erc20(owner, user):
+    token = owner.deploy(project.MockERC20, "MockToken", "MKT", 18, 1_000_000 * 10**18)
+    token.transfer(user, 10**21, sender=owner)
+    return token
+
+
+def mint(simple_nft, owner) -> int:
+    receipt = simple_nft.mint(owner, metadata_url, sender=owner)
+    return list(receipt.events.filter(simple_nft.Transfer))[0]["tokenId"]
+
+
+def seed_rentals(simple_nft, nft_flex, owner, count: int, collateral_token: str = eth_collateral) -> None:
+    """List ``count`` rentals in bulk so the measured calls run against a populated contract."""
+    while count > 0:
+        size = min(seed_chunk, count)
+        receipt = simple_nft.mintBatch(owner, [metadata_url] * size, sender=owner)
+        token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+        nft_flex.createRentals(
+            simple_nft.address,
+            [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+            sender=owner,
+        )
+        count -= size
+
+
+def run_lifecycle(simple_nft, nft_flex, owner, user, token=None):
+    """
+    Create, rent, withdraw and end one rental, returning the receipt of every step.
+
+    Collateral and price are paid in ``token`` when given, in ETH otherwise.
+    """
+    token_id = mint(simple_nft, owner)
+    rental_id = nft_flex.getRentalCounter()
+    collateral_token = token.address if token else eth_collateral
+    total_payment = price_per_hour * duration + collateral_amount
+
+    receipts = {}
+    receipts["createRental"] = nft_flex.createRental(
+        simple_nft.address, token_id, price_per_hour, False, collateral_token, collateral_amount, sender=owner
+    )
+    if token:
+        token.approve(nft_flex.address, total_payment, sender=user)
+        receipts["rentNFT"] = nft_flex.rentNFT(rental_id, duration, sender=user)
+    else:
+        receipts["rentNFT"] = nft_flex.rentNFT(rental_id, duration, value=total_payment, sender=user)
+
+    chain.mine(timestamp=nft_flex.s_rentals(rental_id).endTime + 1)
+    receipts["withdrawEarnings"] = nft_flex.withdrawEarnings(rental_id, sender=owner)
+    receipts["endRental"] = nft_flex.endRental(rental_id, sender=user)
+    return receipts
+
+
+def rent_and_release(nft_flex, owner, user, rental_id: int, share_ids: list):
+    """Rent shares of a fractional rental, let them expire and release them, returning both receipts."""
+    rent = nft_flex.rentShares(
+        rental_id, share_ids, duration, value=(price_per_hour * duration + collateral_amount) * len(share_ids),
+        sender=user
+    )
+    chain.mine(timestamp=nft_flex.getShare(rental_id, share_ids[0])[1] + 1)
+    release = nft_flex.releaseExpiredShares(rental_id, share_ids, sender=owner)
+    return rent, release
+
+
+
+
+# 🚀 STEP 1: SimpleNFT
+def test_gas_mint(simple_nft, owner, gas):
+    """
+    The first mint writes the token counter from zero (cold), later mints only update it (warm).
+    """
+    cold = simple_nft.mint(owner, metadata_url, sender=owner)
+    warm = simple_nft.mint(owner, metadata_url, sender=owner)
+
+    gas.check("SimpleNFT.mint (cold)", cold.gas_used)
+    gas.check("SimpleNFT.mint (warm)", warm.gas_used)
+    assert warm.gas_used < cold.gas_used
+
+
+@pytest.mark.parametrize("count", [1, 1000])
+def test_gas_mint_compact(simple_nft, owner, gas, count):
+    """
+    Minting with only the CID digest stored (one slot) vs the full ``ipfs://`` URL (three slots).
+    """
+    full_gas = compact_gas = 0
+    for start in range(0, count, mint_chunk):
+        size = min(mint_chunk, count - start)
+        full_gas += simple_nft.mintBatch(owner, [metadata_url] * size, sender=owner).gas_used
+        compact_gas += simple_nft.mintBatchCompact(owner, [cid_digest(metadata_url)] * size, sender=owner).gas_used
+
+    gas.check(f"SimpleNFT.mintBatch x{count}", full_gas)
+    gas.check(f"SimpleNFT.mintBatchCompact x{count}", compact_gas)
+    print(f"{count} mints: full URL {full_gas // count} gas each, compact {compact_gas // count} gas each "
+          f"({1 - compact_gas / full_gas:.0%} less)")
+    assert compact_gas < full_gas
+
+
+# 🚀 STEP 2: Rental lifecycle, cold vs warm storage
+@pytest.mark.parametrize("collateral", ["eth", "erc20"])
+def test_gas_lifecycle(simple_nft, nft_flex, owner, user, mock_erc20, collateral, gas):
+    """
+    The first rental initialises the rental counter and (for ERC-20) the contract's token balance;
+    the second one runs against warm contract state.
+    """
+    token = mock_erc20 if collateral == "erc20" else None
+
+    for label in ("cold", "warm"):
+        receipts = run_lifecycle(simple_nft, nft_flex, owner, user, token)
+        for function, receipt in receipts.items():
+            gas.check(f"NFTFlex.{function} ({collateral}, {label})", receipt.gas_used)
+
+
+# 🚀 STEP 3: Gas must not grow with the number of rentals
+@pytest.mark.parametrize("rental_count", [1, 100, 1000])
+def test_gas_with_existing_rentals(simple_nft, nft_flex, owner, user, rental_count, gas):
+    # The same lifecycle next to a single listing, before the others are seeded
+    seed_rentals(simple_nft, nft_flex, owner, 1)
+    reference = run_lifecycle(simple_nft, nft_flex, owner, user)
+    seed_rentals(simple_nft, nft_flex, owner, rental_count - 1)
+
+    receipts = run_lifecycle(simple_nft, nft_flex, owner, user)
+    for function, receipt in receipts.items():
+        gas.check(f"NFTFlex.{function} (eth, {rental_count} rentals)", receipt.gas_used)
+        # Only the calldata cost of the larger rental and token IDs may differ
+        assert receipt.gas_used <= reference[function].gas_used + 100
+
+
+# 🚀 STEP 4: Settling many rentals, per rental vs withdrawAll
+@pytest.mark.parametrize("rental_count", [10, 100])
+def test_gas_settle_many(simple_nft, nft_flex, owner, user, rental_count, gas):
+    """
+    Settle ``rental_count`` rentals with one withdrawEarnings per rental, and another
+    ``rental_count`` with a single withdrawAll.
+    """
+    seed_rentals(simple_nft, nft_flex, owner, 2 * rental_count)
+    for rental_id in range(2 * rental_count):
+        nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex.s_rentals(2 * rental_count - 1).endTime + 1)
+
+    per_rental = sum(
+        nft_flex.withdrawEarnings(rental_id, sender=owner).gas_used for rental_id in range(rental_count)
+    )
+    withdraw_all = nft_flex.withdrawAll(eth_collateral, sender=owner)
+
+    gas.check(f"NFTFlex.withdrawEarnings x{rental_count} (sum)", per_rental)
+    gas.check(f"NFTFlex.withdrawAll ({rental_count} rentals)", withdraw_all.gas_used)
+    print(f"Settling {rental_count} rentals: per rental={per_rental}, withdrawAll={withdraw_all.gas_used}")
+    assert withdraw_all.gas_used * rental_count < per_rental
+
+
+# 🚀 STEP 5: Who rents a token, reverse index vs linear scan
+@pytest.mark.parametrize("rental_count", [1, 1000])
+def test_gas_user_of(simple_nft, nft_flex, owner, user, rental_count, gas):
+    """
+    ``userOf`` reads the reverse index, so its cost does not depend on the number of rentals.
+    Finding the same rental with ``getRentalsByStatus`` scans every rental before it.
+    """
+    # The reference: the renter of the only rental, before the others are listed
+    seed_rentals(simple_nft, nft_flex, owner, 1)
+    nft_flex.rentNFT(0, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    only_rental = nft_flex.userOf.estimate_gas_cost(simple_nft.address, nft_flex.s_rentals(0).tokenId)
+
+    seed_rentals(simple_nft, nft_flex, owner, rental_count)
+    rental_id = rental_count
+    token_id = nft_flex.s_rentals(rental_id).tokenId
+    nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+
+    user_of = nft_flex.userOf.estimate_gas_cost(simple_nft.address, token_id)
+    scan = nft_flex.getRentalsByStatus.estimate_gas_cost(1, 1, 1)  # RentalStatus.Active, past the reference
+    assert nft_flex.userOf(simple_nft.address, token_id) == user.address
+
+    gas.check(f"NFTFlex.userOf ({rental_count} rentals)", user_of)
+    gas.check(f"NFTFlex.getRentalsByStatus scan ({rental_count} rentals)", scan)
+    print(f"Finding the renter among {rental_count} rentals: userOf={user_of}, scan={scan}")
+    assert user_of <= only_rental + 100
+    if rental_count > 1:
+        assert user_of < scan
+
+
+# 🚀 STEP 6: Fractional rentals, gas per share must not grow with the share count
+@pytest.mark.parametrize("share_count", [8, 64, 256])
+def test_gas_shares(simple_nft, nft_flex, owner, user, share_count, gas):
+    """
+    Rent and release the 4 highest shares of a rental with ``share_count`` shares, and of one with 8 shares.
+    """
+    rental_ids = []
+    for count in (8, share_count):
+        rental_ids.append(nft_flex.getRentalCounter())
+        nft_flex.createFractionalRental(
+            simple_nft.address, mint(simple_nft, owner), price_per_hour, eth_collateral, collateral_amount, count,
+            sender=owner
+        )
+    # Warms up the balances of owner and renter, which both measured runs credit
+    rent_and_release(nft_flex, owner, user, rental_ids[0], [0])
+
+    reference_rent, reference_release = rent_and_release(nft_flex, owner, user, rental_ids[0], [4, 5, 6, 7])
+    rent, release = rent_and_release(nft_flex, owner, user, rental_ids[1], list(range(share_count - 4, share_count)))
+
+    gas.check(f"NFTFlex.rentShares x4 ({share_count} shares)", rent.gas_used)
+    gas.check(f"NFTFlex.releaseExpiredShares x4 ({share_count} shares)", release.gas_used)
+    assert rent.gas_used <= reference_rent.gas_used + 100
+    assert release.gas_used <= reference_release.gas_used + 100
+
+
+# 🚀 STEP 7: Ending expired rentals, endRental per rental vs one settleExpired batch
+@pytest.mark.parametrize("rental_count", [1, 10, 100])
+def test_gas_settle_expired(simple_nft, nft_flex, owner, user, rental_count, gas):
+    seed_rentals(simple_nft, nft_flex, owner, 2 * rental_count)
+    for rental_id in range(2 * rental_count):
+        nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex.s_rentals(2 * rental_count - 1).endTime + 1)
+
+    per_rental = sum(nft_flex.endRental(rental_id, sender=user).gas_used for rental_id in range(rental_count))
+    settle = nft_flex.settleExpired(list(range(rental_count, 2 * rental_count)), sender=owner)
+
+    gas.check(f"NFTFlex.endRental x{rental_count} (sum)", per_rental)
+    gas.check(f"NFTFlex.settleExpired ({rental_count} rentals)", settle.gas_used)
+    print(f"Ending {rental_count} rentals: endRental={per_rental}, settleExpired={settle.gas_used} "
+          f"({settle.gas_used // rental_count} per rental)")
+    if rental_count > 1:
+        assert settle.gas_used < per_rental
+
+
+# 🚀 STEP 8: Repricing listings, one updatePrices batch
+@pytest.mark.parametrize("rental_count", [1, 10, 100])
+def test_gas_update_prices(simple_nft, nft_flex, owner, rental_count, gas):
+    seed_rentals(simple_nft, nft_flex, owner, rental_count)
+
+    tx = nft_flex.updatePrices(list(range(rental_count)), [2 * price_per_hour] * rental_count, sender=owner)
+
+    gas.check(f"NFTFlex.updatePrices ({rental_count} rentals)", tx.gas_used)
+    print(f"Repricing {rental_count} rentals: updatePrices={tx.gas_used} ({tx.gas_used // rental_count} per rental)")
+
+
+# 🚀 STEP 9: ERC-20 rentals, approve then rentNFT vs one rentNFTWithPermit
+def test_gas_rent_with_permit(simple_nft, nft_flex, owner, user, mock_erc20, gas):
+    seed_rentals(simple_nft, nft_flex, owner, 3, collateral_token=mock_erc20.address)
+    total_payment = price_per_hour * duration + collateral_amount
+    # Rental 0 warms up the contract's token balance, so both flows run against the same state
+    mock_erc20.approve(nft_flex.address, total_payment, sender=user)
+    nft_flex.rentNFT(0, duration, sender=user)
+
+    started_at = time.perf_counter()
+    approve = mock_erc20.approve(nft_flex.address, total_payment, sender=user)
+    rent = nft_flex.rentNFT(1, duration, sender=user)
+    approve_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    permit = rental_permit(networks.provider.web3, nft_flex.address, 2, duration, user.private_key)
+    rent_with_permit = nft_flex.rentNFTWithPermit(2, duration, permit.deadline, permit.v, permit.r, permit.s,
+                                                  sender=user)
+    permit_seconds = time.perf_counter() - started_at
+
+    approve_gas = approve.gas_used + rent.gas_used
+    gas.check("MockERC20.approve + NFTFlex.rentNFT (erc20)", approve_gas)
+    gas.check("NFTFlex.rentNFTWithPermit (erc20)", rent_with_permit.gas_used)
+    print(f"approve + rentNFT: 2 transactions, {approve_gas} gas, {approve_seconds * 1000:.0f}ms; "
+          f"rentNFTWithPermit: 1 transaction, {rent_with_permit.gas_used} gas, {permit_seconds * 1000:.0f}ms")
+    assert nft_flex.s_rentals(2).renter == user
+    assert rent_with_permit.gas_used < approve_gas
+
+
+# 🚀 STEP 10: Listing and renting, createRental + rentNFT vs one fillListing
+def test_gas_fill_listing(simple_nft, nft_flex, owner, user, gas):
+    seed_rentals(simple_nft, nft_flex, owner, 1)
+    total_payment = price_per_hour * duration + collateral_amount
+    token_ids = [mint(simple_nft, owner), mint(simple_nft, owner)]
+
+    create = nft_flex.createRental(simple_nft.address, token_ids[0], price_per_hour, False, eth_collateral,
+                                   collateral_amount, sender=owner)
+    rent = nft_flex.rentNFT(1, duration, value=total_payment, sender=user)
+
+    order = ListingOrder(owner.address, simple_nft.address, token_ids[1], price_per_hour, False, eth_collateral,
+                         collateral_amount, 0, chain.pending_timestamp + 3600)
+    signature = sign_order(owner.private_key, order, networks.provider.chain_id, nft_flex.address)
+    fill = nft_flex.fillListing(tuple(order), signature, duration, value=total_payment, sender=user)
+
+    two_step_gas = create.gas_used + rent.gas_used
+    gas.check("NFTFlex.createRental + NFTFlex.rentNFT", two_step_gas)
+    gas.check("NFTFlex.fillListing", fill.gas_used)
+    print(f"createRental + rentNFT: {two_step_gas} gas in 2 transactions from 2 accounts; "
+          f"fillListing: {fill.gas_used} gas in 1 transaction, none paid by the owner")
+    assert nft_flex.s_rentals(2).renter == user
+    assert fill.gas_used < two_step_gas
@@ -0,0 +1,187 @@
+# Tests for topic-filtered history queries (nftflex/history.py)
+import json
+import pytest
+from ape import accounts, project, chain, networks
+from eth_abi import encode
+from nftflex.abi import EventDecoder, canonical_type
+from nftflex.history import EventQuery, encode_topic
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+nft_flex_address = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+collections = ["0x5FbDB2315678afecb367f032d93F642f64180aa3", "0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0"]
+owner_address = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+renter_address = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+rental_count = 2_500
+
+decoder = EventDecoder.for_contract("NFTFlex")
+events_by_name = {event["name"]: (topic, event) for topic, event in decoder.events.items()}
+
+
+def event(name, **args):
+    """Encode an NFTFlex event as the (topics, data) pair of a raw log."""
+    topic, event_abi = events_by_name[name]
+    topics = [topic]
+    types, values = [], []
+    for abi_input in event_abi["inputs"]:
+        if abi_input["indexed"]:
+            topics.append("0x" + encode([canonical_type(abi_input)], [args[abi_input["name"]]]).hex())
+        else:
+            types.append(canonical_type(abi_input))
+            values.append(args[abi_input["name"]])
+    return topics, "0x" + encode(types, values).hex()
+
+
+def synthetic_logs(count: int):
+    """List ``count`` rentals over two collections, then rent, reprice and end each one: five events per rental."""
+    events = []
+    for rental_id in range(count):
+        events.append(event("NFTFlex__RentalCreated", rentalId=rental_id, owner=owner_address,
+                            nftAddress=collections[rental_id % 2], tokenId=rental_id // 2,
+                            pricePerHour=price_per_hour, isFractional=False, collateralToken=collateral_token,
+                            collateralAmount=collateral_amount))
+        events.append(event("NFTFlex__Listed", owner=owner_address, rentalId=rental_id))
+    for rental_id in range(count):
+        events.append(event("NFTFlex__RentalStarted", rentalId=rental_id, renter=renter_address, startTime=0,
+                            endTime=duration * 3600, collateralAmount=collateral_amount))
+        events.append(event("NFTFlex__PriceUpdated", rentalId=rental_id, pricePerHour=2 * price_per_hour))
+        events.append(event("NFTFlex__RentalEnded", rentalId=rental_id, renter=renter_address))
+    events.append(event("NFTFlex__BalanceWithdrawn", owner=owner_address, token=collateral_token, amount=1))
+    return [
+        {"address": nft_flex_address, "topics": topics, "data": data, "blockNumber": position // 100,
+         "blockHash": f"0x{position // 100:064x}", "transactionHash": f"0x{position:064x}", "logIndex": position % 100}
+        for position, (topics, data) in enumerate(events)
+    ]
+
+
+class FakeEth:
+    """Serves raw logs with the topic filtering of ``eth_getLogs`` and counts the response bytes."""
+
+    def __init__(self, raw_logs, max_results=None):
+        self.raw_logs = raw_logs
+        self.block_number = raw_logs[-1]["blockNumber"]
+        self.max_results = max_results
+        self.response_bytes = 0
+
+    def get_logs(self, params):
+        wanted_topics = [None if wanted is None else set(wanted if isinstance(wanted, list) else [wanted])
+                         for wanted in params.get("topics", [])]
+
+        def matches(log):
+            if not params["fromBlock"] <= log["blockNumber"] <= params["toBlock"]:
+                return False
+            if any(wanted is not None for wanted in wanted_topics[len(log["topics"]):]):
+                return False
+            return all(wanted is None or topic in wanted for wanted, topic in zip(wanted_topics, log["topics"]))
+
+        logs = [log for log in self.raw_logs if matches(log)]
+        if self.max_results is not None and len(logs) > self.max_results:
+            raise ValueError({"code": -32005, "message": "query returned more than 10000 results"})
+        self.response_bytes += len(json.dumps(logs))
+        return logs
+
+
+class FakeWeb3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture(scope="module")
+def raw_logs():
+    return synthetic_logs(rental_count)
+
+
+
+
+# 🚀 STEP 1: Narrow queries
+def test_rental_history_fetches_one_rental(raw_logs):
+    eth = FakeEth(raw_logs)
+    query = EventQuery(FakeWeb3(eth), nft_flex_address)
+
+    query.logs([query.decoder.topics])
+    scan_bytes = eth.response_bytes
+    eth.response_bytes = 0
+    history = query.rental_history(1_234)
+
+    assert [log.name for log in history] == ["NFTFlex__RentalCreated", "NFTFlex__RentalStarted",
+                                             "NFTFlex__PriceUpdated", "NFTFlex__RentalEnded"]
+    assert all(log.args["rentalId"] == 1_234 for log in history)
+    assert history[0].args["owner"] == owner_address and history[0].args["tokenId"] == 617
+    print(f"{len(raw_logs):,} logs: full scan {scan_bytes:,} bytes, one rental {eth.response_bytes:,} bytes")
+    assert eth.response_bytes * 1_000 < scan_bytes
+
+
+def test_listings_and_collection_history(raw_logs):
+    query = EventQuery(FakeWeb3(FakeEth(raw_logs)), nft_flex_address)
+
+    listings = query.listings(collections[1], token_ids=[3, 4, 10_000])
+    assert [log.args["rentalId"] for log in listings] == [7, 9]
+    assert len(query.listings(collections[0])) == rental_count // 2
+
+    history = query.collection_history(collections[1], token_ids=[3, 4])
+    assert {log.args["rentalId"] for log in history} == {7, 9}
+    assert len(history) == 8
+    assert history == sorted(history, key=lambda log: (log.block_number, log.log_index))
+
+    # Many rentals are fetched in several OR filters
+    assert len(query.rental_history(range(0, rental_count, 3))) == 4 * len(range(0, rental_count, 3))
+
+
+def test_owner_listings(raw_logs):
+    query = EventQuery(FakeWeb3(FakeEth(raw_logs)), nft_flex_address)
+
+    listings = query.owner_listings(owner_address)
+    assert [log.args["rentalId"] for log in listings] == list(range(rental_count))
+    assert query.owner_listings(renter_address) == []
+
+
+def test_query_splits_rejected_ranges(raw_logs):
+    eth = FakeEth(raw_logs, max_results=1_000)
+    query = EventQuery(FakeWeb3(eth), nft_flex_address)
+
+    assert len(query.listings(collections[0])) == rental_count // 2
+    assert query.requests > 3
+    assert encode_topic("uint256", 1) == "0x" + "0" * 63 + "1"
+
+
+# 🚀 STEP 2: Querying a real chain
+def test_history_on_test_chain():
+    owner, user = accounts.test_accounts[0], accounts.test_accounts[1]
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    receipt = simple_nft.mintBatch(owner, [metadata_url] * 20, sender=owner)
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    nft_flex.createRentals(
+        simple_nft.address,
+        [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+        sender=owner,
+    )
+    for rental_id in (3, 5):
+        nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    nft_flex.updatePrices([4], [2 * price_per_hour], sender=owner)
+    chain.mine(timestamp=nft_flex.s_rentals(5).endTime + 1)
+    nft_flex.settleExpired([3, 5], sender=user)
+
+    query = EventQuery(networks.provider.web3, nft_flex.address, start_block=start_block)
+    assert [log.name for log in query.rental_history(3)] == [
+        "NFTFlex__RentalCreated", "NFTFlex__RentalStarted", "NFTFlex__CollateralCredited", "NFTFlex__RentalEnded"]
+    assert [log.name for log in query.rental_history(4)] == ["NFTFlex__RentalCreated", "NFTFlex__PriceUpdated"]
+
+    listing = query.listings(simple_nft.address, token_ids=[token_ids[5]])
+    assert [log.args["rentalId"] for log in listing] == [5]
+    assert listing[0].args["owner"] == owner.address
+    assert len(query.collection_history(simple_nft.address)) == 20 + 3 * 2 + 1
@@ -0,0 +1,458 @@
+# Tests for the off-chain rental indexer (nftflex/indexer.py)
+import sqlite3
+import time
+import pytest
+from ape import accounts, project, chain, networks
+from nftflex.abi import DecodedLog
+from nftflex import indexer
+from nftflex.indexer import SCHEMA_VERSION, RentalIndexer, RentalStore, is_range_error, is_rate_limit_error
+from nftflex.rentals import RentalStatus
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 2 * 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+owners = ["0x70997970C51812dc3A010C7d01b50e0d17dc79C8", "0x3C44CdDdB6a900fa2b585dd299e03d12FA4293BC"]
+renter = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+
+
+def make_log(name, block_number, log_index, **args):
+    return DecodedLog(name, args, nft_address, block_number, f"0x{block_number:064x}", f"0x{block_number:064x}", log_index)
+
+
+def synthetic_logs(rental_count: int, now: int):
+    """
+    Create ``rental_count`` listings, rent half of them, then withdraw and end some of those.
+
+    Rentals end in the past unless their ID is a multiple of 4, so all four statuses are present.
+    """
+    logs = []
+    for rental_id in range(rental_count):
+        logs.append(make_log("NFTFlex__RentalCreated", 1 + rental_id // 100, rental_id % 100,
+                             rentalId=rental_id, owner=owners[rental_id % 2], nftAddress=nft_address,
+                             tokenId=rental_id, pricePerHour=price_per_hour, isFractional=False,
+                             collateralToken=collateral_token, collateralAmount=collateral_amount))
+
+    block = rental_count // 100 + 10
+    for rental_id in range(0, rental_count, 2):
+        end_time = now + 3600 if rental_id % 4 == 0 else now - 3600
+        logs.append(make_log("NFTFlex__RentalStarted", block, rental_id, rentalId=rental_id, renter=renter,
+                             startTime=end_time - duration * 3600, endTime=end_time, collateralAmount=collateral_amount))
+
+    block += 1
+    for rental_id in range(2, rental_count, 4):
+        if rental_id % 3 == 0:
+            continue
+        logs.append(make_log("NFTFlex__EarningsWithdrawn", block, rental_id, rentalId=rental_id,
+                             owner=owners[0], amount=price_per_hour * duration))
+        if rental_id % 5 == 0:
+            logs.append(make_log("NFTFlex__RentalEnded", block, rental_id + 1, rentalId=rental_id, renter=renter))
+    return logs
+
+
+class FakeEth:
+    """Serves a fixed list of raw logs and rejects queries over ``max_range`` blocks."""
+
+    def __init__(self, raw_logs, block_number, max_range):
+        self.raw_logs = raw_logs
+        self.block_number = block_number
+        self.max_range = max_range
+        self.queries = []
+
+    def get_block(self, number):
+        return {"number": number, "timestamp": 1_700_000_000 + 12 * number}
+
+    def get_logs(self, params):
+        from_block, to_block = params["fromBlock"], params["toBlock"]
+        self.queries.append((from_block, to_block))
+        if to_block - from_block + 1 > self.max_range:
+            raise ValueError({"code": -32005, "message": "query returned more than 10000 results"})
+        return [log for log in self.raw_logs if from_block <= log["blockNumber"] <= to_block]
+
+
+class FakeWeb3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def owner():
+    return accounts.test_accounts[0]
+
+@pytest.fixture
+def user():
+    return accounts.test_accounts[1]
+
+@pytest.fixture
+def store():
+    store = RentalStore()
+    yield store
+    store.close()
+
+
+
+
+# 🚀 STEP 1: Folding events into rental state
+def test_store_folds_synthetic_events(store):
+    now = int(time.time())
+    rental_count = 4_000
+    logs = synthetic_logs(rental_count, now)
+
+    # Apply in chunks, as the indexer does
+    for i in range(0, len(logs), 1_000):
+        chunk = logs[i:i + 1_000]
+        store.apply(chunk, chunk[-1].block_number)
+
+    assert store.count() == rental_count
+    assert store.last_block == logs[-1].block_number
+
+    by_status = {status: store.rentals(status=status, now=now) for status in RentalStatus}
+    assert sum(len(rentals) for rentals in by_status.values()) == rental_count
+    assert len(by_status[RentalStatus.ACTIVE]) == rental_count // 4
+    assert all(rental["end_time"] > now for rental in by_status[RentalStatus.ACTIVE])
+    assert all(rental["pending_withdrawal"] for rental in by_status[RentalStatus.PENDING_WITHDRAWAL])
+    assert all(not rental["pending_withdrawal"] for rental in by_status[RentalStatus.ENDED])
+    assert all(rental["price_per_hour"] == price_per_hour for rental in store.rentals())
+
+    ended = store.rental(10)  # rented, withdrawn, then ended
+    assert ended["renter"] is None and ended["times_rented"] == 1
+    assert ended["total_earnings"] == price_per_hour * duration
+
+    assert len(store.rentals(owner=owners[1])) == rental_count // 2
+    assert len(store.rentals(renter=renter)) == len(store.rentals()) - len(by_status[RentalStatus.AVAILABLE])
+    assert [r["rental_id"] for r in store.rentals(nft_address=nft_address, limit=3, offset=5)] == [5, 6, 7]
+
+
+def test_store_ignores_replayed_logs(store):
+    logs = synthetic_logs(100, int(time.time()))
+    store.apply(logs, logs[-1].block_number)
+    snapshot = store.rentals()
+
+    # Re-applying an overlapping range must not double count anything
+    assert store.apply(logs, logs[-1].block_number) == 0
+    assert store.rentals() == snapshot
+
+
+def test_store_folds_share_rentals(store):
+    now = int(time.time())
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 1, 0, rentalId=0, owner=owners[0], nftAddress=nft_address,
+                 tokenId=1, pricePerHour=price_per_hour, isFractional=True, collateralToken=collateral_token,
+                 collateralAmount=collateral_amount),
+        make_log("NFTFlex__SharesRented", 2, 0, rentalId=0, renter=renter, shareIds=(0, 1, 2),
+                 startTime=now, endTime=now + duration * 3600, collateralAmount=3 * collateral_amount),
+        make_log("NFTFlex__SharesRented", 2, 1, rentalId=0, renter=owners[1], shareIds=(7,),
+                 startTime=now, endTime=now + 3600, collateralAmount=collateral_amount),
+    ], 2)
+
+    rental = store.rental(0)
+    assert rental["is_fractional"] and rental["renter"] is None
+    assert rental["times_rented"] == 4
+    assert rental["total_earnings"] == price_per_hour * (3 * duration + 1)
+
+
+def test_store_folds_price_updates(store):
+    now = int(time.time())
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 1, 0, rentalId=0, owner=owners[0], nftAddress=nft_address,
+                 tokenId=1, pricePerHour=price_per_hour, isFractional=False, collateralToken=collateral_token,
+                 collateralAmount=collateral_amount),
+        make_log("NFTFlex__PriceUpdated", 2, 0, rentalId=0, pricePerHour=3 * price_per_hour),
+        make_log("NFTFlex__RentalStarted", 3, 0, rentalId=0, renter=renter, startTime=now,
+                 endTime=now + duration * 3600, collateralAmount=collateral_amount),
+    ], 3)
+
+    rental = store.rental(0)
+    assert rental["price_per_hour"] == 3 * price_per_hour
+    assert rental["total_earnings"] == 3 * price_per_hour * duration
+    assert [event["name"] for event in store.events(0)] == [
+        "NFTFlex__RentalCreated", "NFTFlex__PriceUpdated", "NFTFlex__RentalStarted"]
+
+
+def test_store_folds_delisted_and_replaced_listings(store):
+    listing = dict(owner=owners[0], nftAddress=nft_address, pricePerHour=price_per_hour, isFractional=False,
+                   collateralToken=collateral_token, collateralAmount=collateral_amount)
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 1, 0, rentalId=0, tokenId=1, **listing),
+        make_log("NFTFlex__RentalCreated", 1, 1, rentalId=1, tokenId=2, **listing),
+        make_log("NFTFlex__Delisted", 2, 0, rentalId=0),
+        # Relisted with other terms after delisting
+        make_log("NFTFlex__RentalCreated", 2, 1, rentalId=2, tokenId=1, **listing),
+    ], 2)
+    assert store.rental(0)["status"] == "delisted"
+    assert [rental["rental_id"] for rental in store.rentals(status=RentalStatus.AVAILABLE)] == [1, 2]
+
+    # A listing replaced by a later one (the NFT changed hands) is no longer available either
+    store.apply([make_log("NFTFlex__RentalCreated", 3, 0, rentalId=3, tokenId=2, **{**listing, "owner": owners[1]})], 3)
+    assert [rental["rental_id"] for rental in store.rentals(status=RentalStatus.AVAILABLE)] == [2, 3]
+    store.rollback(3)
+    assert store.count(status=RentalStatus.AVAILABLE) == 2 and store.rental(1)["status"] == "available"
+
+
+def test_store_folds_filled_orders(store):
+    listing = dict(owner=owners[0], nftAddress=nft_address, tokenId=1, pricePerHour=price_per_hour, isFractional=False,
+                   collateralToken=collateral_token, collateralAmount=collateral_amount)
+    started = dict(renter=renter, startTime=0, endTime=duration * 3600, collateralAmount=collateral_amount)
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 1, 0, rentalId=0, **listing),
+        make_log("NFTFlex__RentalStarted", 1, 1, rentalId=0, **started),
+        make_log("NFTFlex__OrderFilled", 1, 2, rentalId=0, owner=owners[0], nonce=0),
+        make_log("NFTFlex__RentalEnded", 2, 0, rentalId=0, renter=renter),
+    ], 2)
+    # The listing of a filled order is single use
+    assert store.rental(0)["from_order"] and store.rental(0)["status"] == "delisted"
+    assert store.count(status=RentalStatus.AVAILABLE) == 0
+
+    # A new order for the token replaces it
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 3, 0, rentalId=1, **listing),
+        make_log("NFTFlex__RentalStarted", 3, 1, rentalId=1, **started),
+        make_log("NFTFlex__OrderFilled", 3, 2, rentalId=1, owner=owners[0], nonce=1),
+    ], 3)
+    assert [rental["rental_id"] for rental in store.rentals(status=RentalStatus.ACTIVE, now=0)] == [1]
+    assert store.rental(0)["status"] == "delisted"
+
+
+def test_store_filters_by_price_and_token(store):
+    token = "0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0"
+    store.apply([
+        make_log("NFTFlex__RentalCreated", 1, rental_id, rentalId=rental_id, owner=owners[rental_id % 2],
+                 nftAddress=nft_address, tokenId=rental_id, pricePerHour=(rental_id + 1) * 10 ** 17,
+                 isFractional=False, collateralToken=token if rental_id % 3 == 0 else collateral_token,
+                 collateralAmount=collateral_amount)
+        for rental_id in range(30)
+    ], 1)
+
+    assert store.rental(3)["collateral_token"] == token
+    assert store.rental(3)["collateral_amount"] == collateral_amount
+    cheap = store.rentals(min_price=10 ** 17, max_price=price_per_hour)
+    assert [rental["rental_id"] for rental in cheap] == list(range(10))
+    # 10 ** 18 and 2 * 10 ** 18 differ in length as plain text, not once padded
+    assert store.count(min_price=2 * 10 ** 18) == 11
+    assert [rental["rental_id"] for rental in store.rentals(collateral_token=token, owner=owners[0])] == [0, 6, 12, 18, 24]
+    assert store.count(collateral_token=token, max_price=price_per_hour) == 4
+    assert store.count() == 30
+
+
+def test_store_persists_cursor(tmp_path):
+    path = str(tmp_path / "rentals.db")
+    logs = synthetic_logs(50, int(time.time()))
+
+    store = RentalStore(path)
+    store.apply(logs, 1_234)
+    store.close()
+
+    reopened = RentalStore(path)
+    assert reopened.last_block == 1_234
+    assert reopened.count() == 50
+    reopened.close()
+
+
+def test_store_rebuilds_rentals_of_an_older_schema(tmp_path, monkeypatch):
+    path = str(tmp_path / "rentals.db")
+    logs = synthetic_logs(50, int(time.time()))
+    store = RentalStore(path)
+    store.apply(logs + [make_log("NFTFlex__BalanceWithdrawn", 20, 0, owner=owners[1], token=collateral_token,
+                                 amount=price_per_hour)], 1_234)
+    expected = store.rentals()
+    store.close()
+
+    # An older rentals table, in a store of the previous version
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        DROP TABLE rentals;
+        CREATE TABLE rentals (rental_id INTEGER PRIMARY KEY, nft_address TEXT NOT NULL, owner TEXT NOT NULL);
+        CREATE INDEX rentals_owner ON rentals (owner);
+    """)
+    connection.close()
+    monkeypatch.setattr(indexer, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+
+    reopened = RentalStore(path)
+    assert reopened.schema_version == SCHEMA_VERSION + 1
+    assert reopened.last_block == 1_234
+    assert reopened.rentals() == expected
+    assert reopened.count(collateral_token=collateral_token) == 50
+    reopened.close()
+
+
+def test_store_reindexes_stores_missing_events(tmp_path):
+    path = str(tmp_path / "rentals.db")
+    store = RentalStore(path)
+    store.apply(synthetic_logs(50, int(time.time())), 1_234)
+    store.close()
+
+    # Stores that recorded no version, or an older one, never indexed withdrawAll
+    connection = sqlite3.connect(path)
+    connection.execute("UPDATE meta SET value = '2' WHERE key = 'schema_version'")
+    connection.commit()
+    connection.close()
+
+    reopened = RentalStore(path)
+    assert reopened.schema_version == SCHEMA_VERSION
+    assert reopened.last_block is None
+    assert reopened.count() == 0
+    reopened.close()
+
+
+def test_store_folds_balance_withdrawals(store):
+    now = int(time.time())
+    store.apply(synthetic_logs(50, now), 20)
+    pending = store.count(owner=owners[0], status=RentalStatus.PENDING_WITHDRAWAL, now=now)
+    assert pending > 0
+
+    # withdrawAll pays out every rental credited before it, only in its payment token
+    withdrawal = make_log("NFTFlex__BalanceWithdrawn", 21, 0, owner=owners[0], token=collateral_token,
+                          amount=price_per_hour)
+    other_token = make_log("NFTFlex__BalanceWithdrawn", 21, 1, owner=owners[0],
+                           token="0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0", amount=price_per_hour)
+    assert store.touched_by([other_token]) == []
+    touched = store.touched_by([withdrawal, other_token])
+    assert touched == [rental["rental_id"] for rental in store.rentals(owner=owners[0]) if rental["pending_withdrawal"]]
+    assert store.apply([withdrawal, other_token], 21) == 2
+    assert store.count(owner=owners[0], status=RentalStatus.PENDING_WITHDRAWAL, now=now) == 0
+    assert all(not store.rental(rental_id)["pending_withdrawal"] for rental_id in touched)
+
+    # Rentals started after the withdrawal are pending again
+    store.apply([make_log("NFTFlex__RentalStarted", 22, 0, rentalId=1, renter=renter, startTime=now - 7200,
+                          endTime=now - 3600, collateralAmount=collateral_amount)], 22)
+    assert store.rental(1)["pending_withdrawal"]
+
+    assert set(touched) | {1} <= set(store.touched_since(21))
+    store.rollback(21)
+    assert store.count(owner=owners[0], status=RentalStatus.PENDING_WITHDRAWAL, now=now) == pending
+    assert not store.rental(1)["pending_withdrawal"]
+
+
+# 🚀 STEP 2: Adaptive getLogs chunking
+def test_indexer_shrinks_chunk_on_range_errors(store):
+    decoder = RentalIndexer(None, nft_address, store).decoder
+    topic = next(topic for topic, event in decoder.events.items() if event["name"] == "NFTFlex__RentalCreated")
+    raw_logs = [
+        {
+            "address": nft_address,
+            # rentalId, nftAddress, tokenId
+            "topics": [topic] + ["0x" + value.rjust(64, "0") for value in (
+                f"{block:x}", nft_address[2:].lower(), f"{block:x}")],
+            # owner, pricePerHour, isFractional, collateralToken, collateralAmount
+            "data": "0x" + "".join(value.rjust(64, "0") for value in (
+                owners[0][2:].lower(), f"{price_per_hour:x}", "0", collateral_token[2:], f"{collateral_amount:x}")),
+            "blockNumber": block,
+            "blockHash": f"0x{block:064x}",
+            "transactionHash": f"0x{block:064x}",
+            "logIndex": 0,
+        }
+        for block in range(0, 1_000, 7)
+    ]
+    eth = FakeEth(raw_logs, block_number=999, max_range=64)
+    indexer = RentalIndexer(FakeWeb3(eth), nft_address, store, chunk_size=500, max_chunk_size=10_000)
+
+    stats = indexer.sync()
+
+    assert stats.logs == len(raw_logs)
+    assert store.count() == len(raw_logs)
+    assert store.last_block == 999 and store.last_block_timestamp == 1_700_000_000 + 12 * 999
+    rejected = [(start, to) for start, to in eth.queries if to - start + 1 > 64]
+    assert indexer.chunk_size <= 128
+    assert len(rejected) <= 3 + (len(eth.queries) - len(rejected)) // indexer.grow_after
+
+    # Nothing new to fetch on the next run
+    assert indexer.sync().logs == 0
+
+
+def test_indexer_raises_other_errors(store):
+    class BrokenEth:
+        block_number = 10
+
+        def get_logs(self, params):
+            raise ConnectionError("connection refused")
+
+    with pytest.raises(ConnectionError):
+        RentalIndexer(FakeWeb3(BrokenEth()), nft_address, store).sync()
+    assert store.last_block is None
+
+
+def test_range_and_rate_limit_errors_are_told_apart():
+    for message in ({"code": -32005, "message": "query returned more than 10000 results"},
+                    "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range",
+                    {"code": -32000, "message": "exceed maximum block range: 5000"}):
+        assert is_range_error(ValueError(message)) and not is_rate_limit_error(ValueError(message))
+    for message in ("429 Client Error: Too Many Requests for url: https://rpc.example",
+                    {"code": -32005, "message": "project ID request rate exceeded"},
+                    {"code": 429, "message": "Your app has exceeded its compute units per second capacity"}):
+        assert is_rate_limit_error(ValueError(message)) and not is_range_error(ValueError(message))
+    assert not is_range_error(TimeoutError("read timeout")) and not is_range_error(ValueError("gas limit reached"))
+
+
+def test_indexer_backs_off_when_rate_limited(store):
+    class RateLimitedEth(FakeEth):
+        def get_logs(self, params):
+            if len(self.queries) % 3 < 2:
+                self.queries.append((params["fromBlock"], params["toBlock"]))
+                raise ValueError("429 Client Error: Too Many Requests")
+            return super().get_logs(params)
+
+    eth = RateLimitedEth([], block_number=999, max_range=1_000)
+    indexer = RentalIndexer(FakeWeb3(eth), nft_address, store, chunk_size=500, rate_limit_delay=0)
+    indexer.sync()
+
+    # Each chunk was retried as it was, not split
+    assert eth.queries == [(0, 499)] * 3 + [(500, 999)] * 3
+    assert indexer.chunk_size == 500 and store.last_block == 999
+
+    gone = RentalIndexer(FakeWeb3(RateLimitedEth([], 999, 1_000)), nft_address, store, rate_limit_retries=1,
+                         rate_limit_delay=0)
+    with pytest.raises(ValueError):
+        gone.get_logs(0, 10)
+
+
+# 🚀 STEP 3: Indexing a real chain
+def test_indexer_matches_contract_state(owner, user, store):
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    for _ in range(5):
+        receipt = simple_nft.mintBatch(owner, [metadata_url] * 40, sender=owner)
+        token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+        nft_flex.createRentals(
+            simple_nft.address,
+            [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+            sender=owner,
+        )
+
+    for rental_id in range(0, 10, 2):
+        nft_flex.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex.s_rentals(8).endTime + 1)
+    nft_flex.withdrawEarnings(0, sender=owner)
+    nft_flex.endRental(0, sender=user)
+
+    indexer = RentalIndexer(networks.provider.web3, nft_flex.address, store, start_block=start_block, chunk_size=4)
+    stats = indexer.sync()
+    print(f"Indexed {stats.blocks} blocks at {stats.blocks_per_second:,.0f} blocks/s")
+
+    assert store.count() == nft_flex.getRentalCounter() == 200
+    now = chain.pending_timestamp
+    for status in RentalStatus:
+        expected, _, _ = nft_flex.getRentalsByStatus(status, 0, 1_000)
+        indexed = [rental["rental_id"] for rental in store.rentals(status=status, now=now)]
+        assert indexed == list(expected)
+
+    for rental_id in (0, 2, 3):
+        rental = nft_flex.s_rentals(rental_id)
+        indexed = store.rental(rental_id)
+        assert indexed["owner"] == rental.owner
+        assert indexed["price_per_hour"] == rental.pricePerHour
+        assert indexed["end_time"] == rental.endTime
+        assert indexed["collateral_token"] == rental.collateralToken
+        assert (indexed["renter"] or collateral_token) == rental.renter
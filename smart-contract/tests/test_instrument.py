@@ -0,0 +1,171 @@
+# Tests for the JSON-RPC instrumentation (nftflex/instrument.py)
+import json
+import threading
+import time
+import pytest
+from web3 import Web3, EthereumTesterProvider
+from nftflex import instrument
+from nftflex.instrument import RpcRecorder, phase
+
+
+
+
+"""
+Variables
+"""
+calls = 2_000
+
+
+class FakeBatchProvider:
+    """Answers every request with a fixed block number, one by one or in batches."""
+
+    def __init__(self):
+        self.batches = 0
+
+    def make_request(self, method, params):
+        if method == "eth_fail":
+            raise ConnectionError("connection refused")
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x10"}
+
+    def make_batch_request(self, requests):
+        self.batches += 1
+        return [{"jsonrpc": "2.0", "id": index, "result": "0x10"} for index, _ in enumerate(requests)]
+
+
+class FakeWeb3:
+    def __init__(self, provider):
+        self.provider = provider
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def web3():
+    return Web3(EthereumTesterProvider())
+
+@pytest.fixture
+def recorder():
+    recorder = RpcRecorder()
+    yield recorder
+    recorder.uninstall()
+
+
+
+
+# 🚀 STEP 1: Recording calls through web3.py
+def test_records_methods_phases_and_callers(web3, recorder):
+    account = web3.eth.accounts[0]
+    recorder.install(web3)
+    with phase("deploy"):
+        web3.eth.block_number
+        with phase("mint"):
+            web3.eth.get_balance(account)
+    web3.eth.chain_id
+
+    methods = recorder.by_method()
+    assert methods["eth_getBalance"][0] == 1
+    assert methods["eth_blockNumber"][0] == 1
+    assert all(totals[4] > 0 and totals[5] > 0 for totals in methods.values())  # payload bytes
+
+    phases = recorder.by_phase()
+    assert phases["mint"][0] == 1  # the innermost phase gets the call
+    assert phases[instrument.NO_PHASE][0] >= 1  # eth_chainId
+    assert set(recorder.phases) == {"deploy", "mint"}
+    assert recorder.phases["deploy"][1] >= recorder.phases["mint"][1]
+
+    # Calls are attributed to the test, not to web3.py or the recorder
+    callers = {caller for (method, _, caller) in recorder.totals if method == "eth_getBalance"}
+    assert len(callers) == 1
+    caller = callers.pop()
+    assert caller.startswith("tests/test_instrument.py:") and caller.endswith("(test_records_methods_phases_and_callers)")
+
+    # Uninstalling restores the provider, later calls are not recorded
+    recorder.uninstall()
+    web3.eth.block_number
+    assert recorder.by_method()["eth_blockNumber"][0] == 1
+    assert "make_request" not in vars(web3.provider)
+
+
+def test_records_errors_and_batches(recorder):
+    provider = FakeBatchProvider()
+    recorder.install(FakeWeb3(provider))
+
+    with pytest.raises(ConnectionError):
+        provider.make_request("eth_fail", [])
+    provider.make_batch_request([("eth_blockNumber", []), ("eth_call", [{"to": "0x0"}, "latest"])])
+
+    methods = recorder.by_method()
+    assert methods["eth_fail"][:2] == [1, 1]
+    assert methods["eth_call"][0] == 1 and methods["eth_blockNumber"][0] == 1
+    assert provider.batches == 1
+
+
+def test_phases_are_per_thread(recorder):
+    provider = FakeBatchProvider()
+    recorder.install(FakeWeb3(provider))
+    entered = threading.Barrier(2)
+    left = threading.Event()
+
+    def worker():
+        with phase("sync"):
+            with phase("page"):
+                entered.wait()
+                left.wait()
+                provider.make_request("eth_getLogs", [])
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    with phase("sync"):
+        entered.wait()
+    # The worker's phases are still open: this thread is back to no phase
+    provider.make_request("eth_blockNumber", [])
+    left.set()
+    thread.join()
+
+    phases = recorder.by_phase()
+    assert phases["page"][0] == 1 and phases[instrument.NO_PHASE][0] == 1
+    assert recorder.phases["sync"][0] == 2
+
+
+# 🚀 STEP 2: Reports
+def test_reports(web3, recorder, tmp_path):
+    recorder.install(web3)
+    with phase("deploy"):
+        web3.eth.block_number
+
+    summary = recorder.summary()
+    assert "deploy" in summary and "eth_blockNumber" in summary and "test_reports" in summary
+
+    metrics = recorder.prometheus()
+    assert 'nftflex_rpc_requests_total{method="eth_blockNumber",phase="deploy"} 1' in metrics
+    assert 'nftflex_phase_runs_total{phase="deploy"} 1' in metrics
+    assert "# TYPE nftflex_rpc_latency_seconds_total counter" in metrics
+
+    paths = recorder.write_reports(str(tmp_path))
+    with open(paths["trace.json"]) as f:
+        events = json.load(f)["traceEvents"]
+    assert [event["cat"] for event in events] == ["phase", "rpc"]
+    assert events[1]["args"]["phase"] == "deploy"
+    assert events[0]["ts"] <= events[1]["ts"] and events[0]["dur"] >= events[1]["dur"]
+
+
+def test_phase_without_recorder():
+    assert instrument.active() is None
+    with phase("deploy"):
+        pass
+
+
+# 🚀 STEP 3: Overhead
+def test_overhead_per_call(recorder):
+    provider = FakeBatchProvider()
+    recorder.install(FakeWeb3(provider))
+
+    started_at = time.perf_counter()
+    for _ in range(calls):
+        provider.make_request("eth_blockNumber", [])
+    seconds = time.perf_counter() - started_at
+    print(f"{seconds / calls * 1e6:.1f}us per recorded call, {recorder.overhead / calls * 1e6:.1f}us of it recording")
+
+    assert recorder.by_method()["eth_blockNumber"][0] == calls
+    assert seconds / calls < 0.001
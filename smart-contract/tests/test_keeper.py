@@ -0,0 +1,369 @@
+# Tests for the settlement keeper (nftflex/keeper.py)
+import asyncio
+import threading
+import pytest
+import rlp
+from ape import accounts, project, chain, networks
+from eth_abi import decode, encode
+from nftflex.abi import EventDecoder, canonical_type, load_abi, selector
+from nftflex.keeper import KEEPER_EVENTS, MIN_RENTAL_SECONDS, SETTLE_BASE_GAS, ExpiryQueue, RentalKeeper
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+nft_flex_address = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+renter_address = "0x90F79bf6EB2c4f870365E785982E1f101E93b906"
+keeper_key = "0x7c852118294e51e653712a81e05800f419141751be58f605c371e15141b007a6"
+
+decoder = EventDecoder.for_contract("NFTFlex", KEEPER_EVENTS)
+events_by_name = {event["name"]: (topic, event) for topic, event in decoder.events.items()}
+
+
+def event(name, **args):
+    """Encode an NFTFlex event as the (topics, data) pair of a raw log."""
+    topic, event_abi = events_by_name[name]
+    topics = [topic]
+    types, values = [], []
+    for abi_input in event_abi["inputs"]:
+        if abi_input["indexed"]:
+            topics.append("0x" + encode([canonical_type(abi_input)], [args[abi_input["name"]]]).hex())
+        else:
+            types.append(canonical_type(abi_input))
+            values.append(args[abi_input["name"]])
+    return topics, "0x" + encode(types, values).hex()
+
+
+def started(rental_id, end_time):
+    return event("NFTFlex__RentalStarted", rentalId=rental_id, renter=renter_address,
+                 startTime=max(0, end_time - 3600), endTime=end_time, collateralAmount=collateral_amount)
+
+
+def ended(rental_id):
+    return event("NFTFlex__RentalEnded", rentalId=rental_id, renter=renter_address)
+
+
+class FakeEth:
+    """
+    In-memory chain that mines one block per transaction.
+
+    ``settleExpired`` ends the active rentals of the batch whose end time has passed and
+    costs ``gas_per_rental`` per rental ended; it fails when that exceeds the gas limit.
+    """
+
+    chain_id = 31337
+    gas_price = 10 ** 9
+
+    def __init__(self, gas_per_rental=25_000):
+        self.gas_per_rental = gas_per_rental
+        self.blocks = []
+        self.active = {}
+        self.receipts = {}
+        self.batches = []
+        self._lock = threading.Lock()
+        self.mine([], timestamp=0)
+
+    @property
+    def block_number(self):
+        return len(self.blocks) - 1
+
+    def mine(self, events, timestamp=None):
+        if timestamp is None:
+            timestamp = self.blocks[-1]["timestamp"]
+        for topics, data in events:
+            log = decoder.decode({"topics": topics, "data": data, "address": nft_flex_address, "blockNumber": 0,
+                                  "blockHash": "0x00", "transactionHash": "0x00", "logIndex": 0})
+            if log.name == "NFTFlex__RentalStarted":
+                self.active[log.args["rentalId"]] = log.args["endTime"]
+            else:
+                self.active.pop(log.args["rentalId"], None)
+        self.blocks.append({"number": len(self.blocks), "timestamp": timestamp, "events": events})
+
+    def get_block(self, number):
+        return self.blocks[-1] if number == "latest" else self.blocks[number]
+
+    def get_logs(self, params):
+        logs = []
+        for block in self.blocks[params["fromBlock"]:params["toBlock"] + 1]:
+            logs.extend(self._raw_logs(block))
+        return logs
+
+    def get_transaction_count(self, address, block_identifier):
+        return 0
+
+    def send_raw_transaction(self, raw_transaction):
+        fields = rlp.decode(bytes(raw_transaction))
+        gas_limit = int.from_bytes(fields[2], "big")
+        (rental_ids,) = decode(["uint256[]"], bytes(fields[5])[4:])
+        with self._lock:
+            now = self.blocks[-1]["timestamp"]
+            due = [rental_id for rental_id in rental_ids if self.active.get(rental_id, now + 1) <= now]
+            gas_used = SETTLE_BASE_GAS + self.gas_per_rental * len(due)
+            tx_hash = f"0x{len(self.receipts):064x}"
+            if gas_used > gas_limit:
+                self.mine([])
+                receipt = {"status": 0, "gasUsed": gas_limit, "logs": []}
+            else:
+                self.mine([ended(rental_id) for rental_id in due])
+                self.batches.append(list(rental_ids))
+                receipt = {"status": 1, "gasUsed": gas_used, "logs": self._raw_logs(self.blocks[-1])}
+            self.receipts[tx_hash] = {**receipt, "blockNumber": self.block_number}
+        return tx_hash
+
+    def wait_for_transaction_receipt(self, tx_hash, timeout, poll_latency):
+        return self.receipts[tx_hash]
+
+    def call(self, tx, block_identifier):
+        raise ValueError("out of gas")
+
+    def _raw_logs(self, block):
+        return [
+            {"address": nft_flex_address, "topics": topics, "data": data, "blockNumber": block["number"],
+             "blockHash": f"0x{block['number']:064x}", "transactionHash": f"0x{block['number']:064x}",
+             "logIndex": log_index}
+            for log_index, (topics, data) in enumerate(block["events"])
+        ]
+
+
+class FakeWeb3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def owner():
+    return accounts.test_accounts[0]
+
+@pytest.fixture
+def user():
+    return accounts.test_accounts[1]
+
+
+def make_keeper(eth, **kwargs):
+    return RentalKeeper(FakeWeb3(eth), nft_flex_address, keeper_key, **kwargs)
+
+
+
+
+# 🚀 STEP 1: Expiry queue
+def test_queue_pops_in_end_time_order():
+    queue = ExpiryQueue()
+    queue.push(1, 300)
+    queue.push(2, 100)
+    queue.push(3, 200)
+    queue.discard(3)
+
+    assert len(queue) == 2
+    assert queue.pop_expired(250) == [(2, 100)]
+    assert queue.next_expiry() == 300
+
+    # Rented again after it ended: only the new end time counts
+    queue.push(2, 400)
+    queue.push(4, 300)
+    assert queue.pop_expired(1_000, limit=2) == [(1, 300), (4, 300)]
+    assert queue.pop_expired(1_000) == [(2, 400)]
+    assert queue.next_expiry() is None
+
+
+def test_queue_discards_many_rentals():
+    queue = ExpiryQueue()
+    for rental_id in range(1_000):
+        queue.push(rental_id, rental_id)
+    for rental_id in range(0, 1_000, 2):
+        queue.discard(rental_id)
+
+    assert [rental_id for rental_id, _ in queue.pop_expired(10)] == [1, 3, 5, 7, 9]
+    assert len(queue) == 495
+
+
+# 🚀 STEP 2: Settling
+def test_keeper_settles_due_rentals_in_gas_sized_batches():
+    eth = FakeEth(gas_per_rental=25_000)
+    eth.mine([started(rental_id, 100 * (rental_id + 1)) for rental_id in range(10)])
+    eth.mine([ended(0)])  # the renter of rental 0 ended it themselves
+    eth.mine([], timestamp=650)
+
+    keeper = make_keeper(eth, gas_budget=SETTLE_BASE_GAS + 2 * 45_000)
+    assert keeper.batch_size == 2
+    results = asyncio.run(keeper.settle_due())
+
+    assert [result.error for result in results] == [None, None, None]
+    assert sorted(rental_id for batch in eth.batches for rental_id in batch) == [1, 2, 3, 4, 5]
+    assert keeper.settled == 5
+    assert keeper.gas_per_rental == 25_000
+    assert keeper.batch_size == 3
+    assert keeper.queue.next_expiry() == 700
+
+    # Nothing due until the next rental expires
+    assert asyncio.run(keeper.settle_due()) == []
+    report = keeper.report()
+    assert report["rentals_settled"] == 5
+    assert report["gas_per_rental"] == round((3 * SETTLE_BASE_GAS + 5 * 25_000) / 5)
+    assert report["pending"] == 4
+    keeper.close()
+
+
+def test_keeper_shrinks_batches_that_run_out_of_gas():
+    eth = FakeEth(gas_per_rental=70_000)
+    eth.mine([started(rental_id, 100) for rental_id in range(2)], timestamp=200)
+
+    keeper = make_keeper(eth, gas_budget=SETTLE_BASE_GAS + 2 * 45_000)
+    (result,) = asyncio.run(keeper.settle_due())
+    assert result.error is not None
+    assert keeper.settled == 0
+    assert len(keeper.queue) == 2
+    assert keeper.batch_size == 1
+
+    results = asyncio.run(keeper.settle_due())
+    assert [result.error for result in results] == [None, None]
+    assert keeper.settled == 2
+    keeper.close()
+
+
+def test_keeper_bounds_its_gas_estimate():
+    class DroppingEth(FakeEth):
+        """Drops the first transaction before it is mined."""
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.dropped = False
+
+        def send_raw_transaction(self, raw_transaction):
+            if not self.dropped:
+                self.dropped = True
+                raise ConnectionError("connection reset by peer")
+            return super().send_raw_transaction(raw_transaction)
+
+    # Four concurrent batches run out of gas in one round: the estimate doubles at most up to the budget
+    eth = FakeEth(gas_per_rental=100_000)
+    eth.mine([started(rental_id, 100) for rental_id in range(8)], timestamp=200)
+    keeper = make_keeper(eth, gas_budget=SETTLE_BASE_GAS + 2 * 45_000)
+    results = asyncio.run(keeper.settle_due())
+    assert len(results) == 4 and all(result.error is not None for result in results)
+    assert keeper.gas_per_rental == 2 * 45_000 and keeper.batch_size == 1
+    keeper.close()
+
+    # A batch that was never mined is sent again without shrinking
+    eth = DroppingEth(gas_per_rental=25_000)
+    eth.mine([started(rental_id, 100) for rental_id in range(4)], timestamp=200)
+    keeper = make_keeper(eth, gas_budget=SETTLE_BASE_GAS + 4 * 45_000)
+    (result,) = asyncio.run(keeper.settle_due())
+    assert result.error == "ConnectionError" and keeper.batch_size == 4 and len(keeper.queue) == 4
+
+    # A raised estimate comes down again after a successful batch, even when other rentals were skipped
+    keeper.gas_per_rental = 90_000
+    eth.active.pop(3)  # ended in a way the keeper has not seen yet
+    results = asyncio.run(keeper.settle_due())
+    assert [result.error for result in results] == [None, None]
+    assert keeper.settled == 3 and keeper.gas_per_rental == 25_000
+    keeper.close()
+
+
+def test_keeper_retries_failed_settlements_with_backoff():
+    class FlakyEth(FakeEth):
+        """Drops the first ``failures`` transactions; later ones revert with ``revert_data`` if it is set."""
+
+        def __init__(self, failures, revert_data=None):
+            super().__init__()
+            self.failures = failures
+            self.revert_data = revert_data
+
+        def send_raw_transaction(self, raw_transaction):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("connection reset by peer")
+            if self.revert_data is None:
+                return super().send_raw_transaction(raw_transaction)
+            tx_hash = f"0x{len(self.receipts):064x}"
+            self.mine([])
+            self.receipts[tx_hash] = {"status": 0, "gasUsed": 21_000, "logs": [], "blockNumber": self.block_number}
+            return tx_hash
+
+        def call(self, tx, block_identifier):
+            error = ValueError("execution reverted")
+            error.data = self.revert_data
+            raise error
+
+    eth = FlakyEth(failures=2)
+    eth.mine([started(0, 100)], timestamp=200)
+    keeper = make_keeper(eth, retry_delay=10)
+
+    (result,) = asyncio.run(keeper.settle_due())
+    assert result.error == "ConnectionError"
+    assert keeper.queue.next_expiry() == 210
+    assert asyncio.run(keeper.settle_due()) == []
+
+    eth.mine([], timestamp=210)
+    asyncio.run(keeper.settle_due())
+    assert keeper.queue.next_expiry() == 230  # backed off twice as long
+
+    eth.mine([], timestamp=230)
+    (result,) = asyncio.run(keeper.settle_due())
+    assert result.error is None and keeper.settled == 1 and len(keeper.queue) == 0
+    keeper.close()
+
+    # A custom error of the contract is permanent
+    error = next(entry for entry in load_abi("NFTFlex") if entry.get("name") == "NFTFlex__EmptyBatch")
+    eth = FlakyEth(failures=0, revert_data=selector(error))
+    eth.mine([started(0, 100)], timestamp=200)
+    keeper = make_keeper(eth)
+    (result,) = asyncio.run(keeper.settle_due())
+    assert result.error == "NFTFlex__EmptyBatch"
+    assert len(keeper.queue) == 0 and keeper.dropped == {0: "NFTFlex__EmptyBatch"}
+    assert keeper.report()["dropped"] == 1
+    keeper.close()
+
+
+def test_keeper_sleeps_until_the_head_expires():
+    eth = FakeEth()
+    keeper = make_keeper(eth)
+    # Nothing active: a rental started now cannot end before the shortest rental period
+    assert keeper.seconds_until_due(1_000) == MIN_RENTAL_SECONDS
+
+    eth.mine([started(0, 1_500), started(1, 1_200)])
+    keeper.sync()
+    assert keeper.seconds_until_due(1_000) == 200
+    assert keeper.seconds_until_due(1_300) == 0
+    assert make_keeper(eth, max_sleep=5).seconds_until_due(0) == 5
+    keeper.close()
+
+
+# 🚀 STEP 3: Settling on the ape test chain
+def test_keeper_on_test_chain(owner, user):
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    receipt = simple_nft.mintBatch(owner, [metadata_url] * 6, sender=owner)
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    nft_flex.createRentals(
+        simple_nft.address,
+        [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+        sender=owner,
+    )
+    # Odd rentals last an hour longer and are still active when the keeper runs
+    for rental_id in range(6):
+        hours = duration + rental_id % 2
+        nft_flex.rentNFT(rental_id, hours, value=price_per_hour * hours + collateral_amount, sender=user)
+    chain.mine(timestamp=nft_flex.s_rentals(0).endTime + 1)
+
+    keeper = RentalKeeper(networks.provider.web3, nft_flex.address, owner.private_key, start_block=start_block)
+    results = asyncio.run(keeper.settle_due())
+    keeper.close()
+
+    assert [result.error for result in results] == [None]
+    assert keeper.settled == 3
+    active, _, _ = nft_flex.getRentalsByStatus(1, 0, 10)  # RentalStatus.Active
+    assert list(active) == [1, 3, 5]
+    assert nft_flex.getBalance(user, collateral_token) == 3 * collateral_amount
+    print(f"settleExpired: {keeper.report()['gas_per_rental']} gas per rental")
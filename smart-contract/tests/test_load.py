@@ -0,0 +1,142 @@
+# Tests for the load generation helpers (nftflex/load.py) against an in-memory node
+import asyncio
+import threading
+import pytest
+import rlp
+from eth_account import Account
+from web3.exceptions import ContractCustomError
+from nftflex.abi import error_names, load_abi, selector
+from nftflex.load import LoadClient, LoadStats, NonceManager, TxResult, revert_selector
+
+
+
+
+"""
+Variables
+"""
+nft_flex_abi = load_abi("NFTFlex")
+functions = {entry["name"]: entry for entry in nft_flex_abi if entry["type"] == "function"}
+errors = {entry["name"]: selector(entry) for entry in nft_flex_abi if entry["type"] == "error"}
+nft_flex_address = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+renter_key = "0x7c852118294e51e653712a81e05800f419141751be58f605c371e15141b007a6"
+
+
+class FakeEth:
+    """
+    Accepts every raw transaction and mines it right away.
+
+    A ``rentNFT`` of an already rented rental reverts with ``NFTFlex__NFTAlreadyRented``.
+    """
+
+    chain_id = 31337
+    gas_price = 10 ** 9
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nonces = []
+        self.rented = set()
+        self.receipts = {}
+
+    def get_transaction_count(self, address, block_identifier):
+        return 7
+
+    def send_raw_transaction(self, raw_transaction):
+        assert Account.recover_transaction(raw_transaction)
+        decoded = decode_rent(raw_transaction)
+        with self._lock:
+            self.nonces.append(decoded["nonce"])
+            rental_id = int.from_bytes(decoded["data"][4:36], "big")
+            status = 0 if rental_id in self.rented else 1
+            self.rented.add(rental_id)
+            tx_hash = f"0x{len(self.receipts):064x}"
+            self.receipts[tx_hash] = {"status": status, "gasUsed": 50_000 + status * 100_000, "blockNumber": 1}
+        return tx_hash
+
+    def wait_for_transaction_receipt(self, tx_hash, timeout, poll_latency):
+        return self.receipts[tx_hash]
+
+    def call(self, tx, block_identifier):
+        raise ContractCustomError(errors["NFTFlex__NFTAlreadyRented"], data=errors["NFTFlex__NFTAlreadyRented"])
+
+
+def decode_rent(raw_transaction):
+    """Read the nonce and calldata of a signed legacy transaction."""
+    fields = rlp.decode(bytes(raw_transaction))
+    return {"nonce": int.from_bytes(fields[0], "big"), "data": bytes(fields[5])}
+
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def client():
+    client = LoadClient(FakeWeb3(), [nft_flex_abi], max_workers=16)
+    yield client
+    client.close()
+
+
+
+
+# 🚀 STEP 1: Nonces and errors
+def test_nonce_manager_hands_out_consecutive_nonces():
+    nonces = NonceManager(FakeWeb3())
+    assert [nonces.next("0xabc") for _ in range(3)] == [7, 8, 9]
+    assert nonces.next("0xdef") == 7
+
+    nonces.resync("0xabc")
+    assert nonces.next("0xabc") == 7
+
+
+def test_revert_selector_and_error_names():
+    names = error_names(nft_flex_abi)
+    already_rented = errors["NFTFlex__NFTAlreadyRented"]
+    assert names[already_rented] == "NFTFlex__NFTAlreadyRented"
+    assert names["0x08c379a0"] == "Error"
+    assert revert_selector(already_rented + "00" * 32) == already_rented
+    assert revert_selector({"data": already_rented}) == already_rented
+    assert revert_selector(None) is None
+    assert revert_selector("0x12") is None
+
+
+# 🚀 STEP 2: Statistics
+def test_report_percentiles_and_revert_rates():
+    stats = LoadStats()
+    for latency in range(1, 101):
+        stats.record(TxResult("rentNFT", latency / 1000, 100_000))
+    stats.record(TxResult("rentNFT", 0.5, 30_000, "NFTFlex__NFTAlreadyRented"))
+    stats.record(TxResult("endRental", 0.01, 40_000))
+    stats.seconds = 2.0
+
+    report = stats.report()
+
+    assert report["transactions"] == 102
+    assert report["tx_per_second"] == 51.0
+    rent = report["operations"]["rentNFT"]
+    assert rent["latency_p50_ms"] == 51.0
+    assert rent["latency_p99_ms"] == 100.0
+    assert rent["gas_mean"] == 100_000  # reverted transactions are left out
+    assert rent["reverts"] == {"NFTFlex__NFTAlreadyRented": 1}
+    assert rent["revert_rate"] == round(1 / 101, 4)
+    assert list(report["operations"]) == ["endRental", "rentNFT"]
+
+
+# 🚀 STEP 3: Concurrent sends
+def test_concurrent_sends_use_distinct_nonces_and_name_reverts(client):
+    async def run():
+        return await client.gather(*[
+            client.send("rentNFT", renter_key, nft_flex_address, functions["rentNFT"], [rental_id % 15, 1])
+            for rental_id in range(20)
+        ])
+
+    results = asyncio.run(run())
+
+    assert sorted(client.web3.eth.nonces) == list(range(7, 27))
+    assert sum(result.error is None for result in results) == 15
+    assert {result.error for result in results if result.error} == {"NFTFlex__NFTAlreadyRented"}
+    assert client.stats.seconds > 0
+    assert client.stats.report()["operations"]["rentNFT"]["reverted"] == 5
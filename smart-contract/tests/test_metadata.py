@@ -0,0 +1,187 @@
+# Tests for the metadata cache (nftflex/metadata.py) against a local stand-in for the IPFS gateway
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ape import accounts, project
+from nftflex.metadata import LRUCache, MetadataMetrics, MetadataService, cid_digest, cid_url, gateway_url, ipfs_path
+
+
+
+
+"""
+Variables
+"""
+metadata_urls = [
+    "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm", # Bhawal Resort & Spa
+    "ipfs://QmZmPMzHxDKL4zmbBw6M4YhAuAkeUsFnvYV7uupuGoHte8", # The Royena Resort Ltd
+    "ipfs://QmbbLW4nkf3iGkEBPBUL8swMtWJ8PARNTFdJYAkMCDE9Ft", # Chuti Resort Gazipur
+    "ipfs://QmPn55rVcTsse3ZyVMG7vRVvTnRuvUZsxrAnCwFxXzqf4P", # CCULB Resort & Convention Hall
+    "ipfs://Qma9SwWr3JQoVny5E5yhkhu2iPjUDVNeNcBJT1AgE4z6Hn" # Third Terrace Resorts
+]
+gateway_delay = 0.05  # seconds the stand-in gateway takes per request
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Serves ``/ipfs/<cid>`` as a small metadata document and counts requests per path."""
+
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        time.sleep(gateway_delay)
+        if not self.path.startswith("/ipfs/Qm"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({"name": self.path.rsplit("/", 1)[1], "image": "ipfs://image"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeNFT:
+    """Stands in for SimpleNFT: token ``i`` points at ``metadata_urls[i]``."""
+
+    def tokenURI(self, token_id):
+        if token_id >= len(metadata_urls):
+            raise ValueError("ERC721NonexistentToken")
+        return metadata_urls[token_id]
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def gateway():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GatewayHandler)
+    server.hits = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def gateway_address(gateway):
+    return f"http://127.0.0.1:{gateway.server_address[1]}/ipfs/"
+
+@pytest.fixture
+def service(gateway_address, tmp_path):
+    with MetadataService(cache_dir=str(tmp_path / "metadata"), gateway=gateway_address, max_workers=8) as service:
+        yield service
+
+
+
+
+# 🚀 STEP 1: URIs
+def test_ipfs_paths():
+    assert ipfs_path("ipfs://QmCid") == "QmCid"
+    assert ipfs_path("ipfs://ipfs/QmCid/1.json") == "QmCid/1.json"
+    assert ipfs_path("https://ipfs.io/ipfs/QmCid") == "QmCid"
+    assert ipfs_path("https://example.com/metadata/1.json") is None
+    assert gateway_url("ipfs://QmCid", "http://localhost:8080/ipfs/") == "http://localhost:8080/ipfs/QmCid"
+
+
+def test_cid_digests_round_trip():
+    for metadata_url in metadata_urls:
+        digest = cid_digest(metadata_url)
+        assert len(digest) == 32
+        assert cid_url(digest) == metadata_url
+    assert cid_url(bytes(31) + b"\x01").startswith("ipfs://Qm")
+    assert cid_url(b"\xff" * 32).startswith("ipfs://Qm")
+
+    # Only bare CIDv0 URIs can be minted compactly
+    for uri in ("ipfs://QmCid", metadata_urls[0] + "/1.json", "https://ipfs.io/ipfs/" + metadata_urls[0][7:],
+                "ipfs://bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi", metadata_urls[0][:-1] + "0"):
+        assert cid_digest(uri) is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+# 🚀 STEP 2: Caching
+def test_memory_then_disk_then_gateway(service, gateway, gateway_address, tmp_path):
+    first = service.get(metadata_urls[0])
+    assert first["name"] == metadata_urls[0][len("ipfs://"):]
+    assert service.get(metadata_urls[0]) == first
+    assert service.metrics.memory_hits == 1
+    assert sum(gateway.hits.values()) == 1
+
+    # A new service (fresh memory) reads the document back from disk
+    with MetadataService(cache_dir=str(tmp_path / "metadata"), gateway=gateway_address) as restarted:
+        assert restarted.get(metadata_urls[0]) == first
+        assert restarted.metrics.disk_hits == 1
+    assert sum(gateway.hits.values()) == 1
+
+
+def test_concurrent_requests_coalesce(service, gateway):
+    results = service.get_many([metadata_urls[1]] * 20)
+
+    assert all(result == results[0] for result in results)
+    assert gateway.hits == {"/ipfs/" + metadata_urls[1][len("ipfs://"):]: 1}
+    assert service.metrics.fetches == 1
+    assert service.metrics.hit_rate == pytest.approx(19 / 20)
+
+
+def test_failures_are_not_cached(service, gateway, gateway_address):
+    missing = gateway_address + "not-a-cid"
+    assert service.get_many([missing]) == [None]
+    assert service.get_many([missing]) == [None]
+    assert service.metrics.errors == 2
+    assert sum(gateway.hits.values()) == 2
+
+
+def test_latency_samples_are_bounded():
+    metrics = MetadataMetrics(window=100)
+    for sample in range(1_000):
+        metrics.observe("lookup_latencies", sample / 1000)
+
+    assert len(metrics.lookup_latencies) == 100
+    # Percentiles cover the latest samples only
+    assert metrics.snapshot()["lookup_p50_ms"] == 950.0
+
+
+# 🚀 STEP 3: Prefetching
+def test_prefetch_fetches_concurrently(service, gateway):
+    token_ids = list(range(len(metadata_urls))) + [99]
+
+    started_at = time.perf_counter()
+    metadata = service.prefetch(FakeNFT(), token_ids)
+    elapsed = time.perf_counter() - started_at
+
+    assert metadata[99] is None
+    assert all(metadata[token_id] is not None for token_id in token_ids[:-1])
+    assert elapsed < gateway_delay * len(metadata_urls)  # sequential fetches would take at least this long
+
+    # Everything is cached now
+    service.prefetch(FakeNFT(), token_ids)
+    assert sum(gateway.hits.values()) == len(metadata_urls)
+
+    stats = service.metrics.snapshot()
+    print(stats)
+    assert stats["hit_rate"] == 0.5
+    assert stats["fetch_p50_ms"] >= gateway_delay * 1000
+
+
+def test_prefetch_from_simple_nft(service, gateway):
+    owner = accounts.test_accounts[0]
+    simple_nft = owner.deploy(project.SimpleNFT)
+    receipt = simple_nft.mintBatch(owner, metadata_urls + metadata_urls, sender=owner)
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+
+    metadata = service.prefetch(simple_nft, token_ids)
+
+    assert len(metadata) == 2 * len(metadata_urls)
+    assert sum(gateway.hits.values()) == len(metadata_urls)  # duplicated CIDs are fetched once
@@ -0,0 +1,260 @@
+# Tests for gasless signed listings (fillListing and nftflex/orders.py)
+import time
+import pytest
+from ape import chain, exceptions, networks
+from eth_account import Account
+from nftflex.abi import DecodedLog
+from nftflex.orders import ListingOrder, OrderBook, OrderError, order_hash, order_signer, sign_order
+from nftflex.rentals import RentalStatus
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+private_key = "0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d"
+other_key = "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a"
+owner_address = Account.from_key(private_key).address
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+nft_flex_address = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+chain_id = 31337
+now = 1_700_000_000
+book_size = 50_000
+lookups = 2_000
+
+
+def make_order(token_id=1, price=price_per_hour, nonce=0, deadline=now + 3600, token=collateral_token):
+    return ListingOrder(owner_address, nft_address, token_id, price, False, token,
+                        collateral_amount, nonce, deadline)
+
+
+def make_log(name, **args):
+    return DecodedLog(name, args, nft_flex_address, 1, "0x" + "00" * 32, "0x" + "00" * 32, 0)
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def book():
+    return OrderBook(chain_id, nft_flex_address)
+
+@pytest.fixture
+def sign_listing(nft_flex_contract, simple_nft, owner):
+    """Mints a token to ``owner`` and signs an order listing it. Returns the order and its signature."""
+    def sign_listing(nonce=0, deadline=None, token=collateral_token):
+        receipt = simple_nft.mint(owner, metadata_url, sender=owner)
+        token_id = list(receipt.events.filter(simple_nft.Transfer))[0]["tokenId"]
+        if deadline is None:
+            deadline = chain.pending_timestamp + 3600
+        order = ListingOrder(owner.address, simple_nft.address, token_id, price_per_hour, False, token,
+                             collateral_amount, nonce, deadline)
+        return order, sign_order(owner.private_key, order, networks.provider.chain_id, nft_flex_contract.address)
+    return sign_listing
+
+
+
+
+# 🚀 STEP 1: Signing off-chain
+def test_sign_order_recovers_the_owner():
+    order = make_order()
+    signature = sign_order(private_key, order, chain_id, nft_flex_address)
+
+    assert len(signature) == 65
+    assert order_signer(order, signature, chain_id, nft_flex_address) == order.owner
+    assert Account._recover_hash(order_hash(order, chain_id, nft_flex_address), signature=signature) == order.owner
+    # The signature is bound to the contract and the chain
+    assert order_hash(order, chain_id, nft_address) != order_hash(order, chain_id, nft_flex_address)
+    assert order_hash(order, 1, nft_flex_address) != order_hash(order, chain_id, nft_flex_address)
+
+
+# 🚀 STEP 2: The order book
+def test_book_rejects_invalid_orders(book):
+    order = make_order()
+    with pytest.raises(OrderError, match="signed by"):
+        book.add(order, sign_order(other_key, order, chain_id, nft_flex_address), now=now)
+    with pytest.raises(OrderError, match="expired"):
+        expired = make_order(deadline=now)
+        book.add(expired, sign_order(private_key, expired, chain_id, nft_flex_address), now=now)
+    with pytest.raises(OrderError, match="Fractional"):
+        fractional = order._replace(is_fractional=True)
+        book.add(fractional, sign_order(private_key, fractional, chain_id, nft_flex_address), now=now)
+    with pytest.raises(OrderError, match="Price"):
+        free = make_order(price=0)
+        book.add(free, sign_order(private_key, free, chain_id, nft_flex_address), now=now)
+
+    signed = book.add(order, sign_order(private_key, order, chain_id, nft_flex_address), now=now)
+    assert book.add(order, signed.signature, now=now) == signed
+    with pytest.raises(OrderError, match="already in use"):
+        other = make_order(price=2 * price_per_hour)
+        book.add(other, sign_order(private_key, other, chain_id, nft_flex_address), now=now)
+    assert len(book) == 1
+
+
+def test_book_queries(book):
+    token = "0x9fE46736679d2D9a65F0992F2272dE9f3c7fa6e0"
+    for nonce, price in enumerate([5, 3, 8, 3, 1]):
+        order = make_order(token_id=nonce, price=price, nonce=nonce, deadline=now + 100 * (nonce + 1))
+        book.add(order, sign_order(private_key, order, chain_id, nft_flex_address), now=now)
+    paid_in_token = make_order(token_id=9, price=1, nonce=9, token=token)
+    book.add(paid_in_token, sign_order(private_key, paid_in_token, chain_id, nft_flex_address), now=now)
+
+    assert [signed.order.price_per_hour for signed in book.range(nft_address, collateral_token, now=now)] == [1, 3, 3, 5, 8]
+    # Equal prices in arrival order
+    assert [signed.order.nonce for signed in book.range(nft_address, collateral_token, 3, 3, now=now)] == [1, 3]
+    assert [signed.order.price_per_hour for signed in book.range(nft_address, collateral_token, 2, 6, now=now)] == [3, 3, 5]
+    assert book.best(nft_address, token, now=now).order == paid_in_token
+    assert book.best(nft_flex_address, token, now=now) is None
+    assert len(book.by_owner(owner_address)) == 6
+
+    # The cheapest order (nonce 4) expires last, the one at 3 with nonce 1 first
+    assert book.best(nft_address, collateral_token, now=now + 450).order.nonce == 4
+    assert [signed.order.nonce for signed in book.range(nft_address, collateral_token, now=now + 250)] == [4, 3, 2]
+    assert len(book) == 4  # the expired orders a query reached are gone
+
+
+def test_book_applies_fills_and_cancels(book):
+    orders = [make_order(token_id=1, nonce=0), make_order(token_id=1, price=2 * price_per_hour, nonce=1),
+              make_order(token_id=2, nonce=2), make_order(token_id=3, nonce=3)]
+    for order in orders:
+        book.add(order, sign_order(private_key, order, chain_id, nft_flex_address), now=now)
+
+    # The listing of a filled order is single use: the other order for token 1 can be filled once the rental ends
+    assert book.apply([make_log("NFTFlex__OrderFilled", rentalId=0, owner=owner_address, nonce=0)]) == 1
+    assert book.apply([make_log("NFTFlex__OrdersCancelled", owner=owner_address, nonces=(2, 7))]) == 1
+    assert [signed.order.nonce for signed in book.range(nft_address, collateral_token, now=now)] == [3, 1]
+    assert book.prune(now=now + 3600) == 2
+    assert len(book) == 0
+
+
+def test_book_best_price_lookups():
+    book = OrderBook(chain_id, nft_flex_address)
+    signature = bytes(65)
+    started_at = time.perf_counter()
+    for nonce in range(book_size):
+        collection = nft_address if nonce % 2 else nft_flex_address
+        order = make_order(token_id=nonce, price=price_per_hour + (nonce * 7919) % book_size, nonce=nonce)
+        book.add(order._replace(nft_address=collection), signature, now=now, verify=False)
+    load_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for i in range(lookups):
+        best = book.best(nft_address, collateral_token, now=now)
+        cheap = book.range(nft_address, collateral_token, price_per_hour + i, price_per_hour + i + 50, now=now)
+    seconds = (time.perf_counter() - started_at) / lookups
+    print(f"Loaded {book_size:,} orders in {load_seconds:.2f}s, {seconds * 1e6:.1f}us per best + range lookup")
+
+    assert best.order.price_per_hour == price_per_hour + 1
+    assert all(price_per_hour + lookups - 1 <= signed.order.price_per_hour <= price_per_hour + lookups + 49
+               for signed in cheap)
+    assert seconds < 0.001
+
+
+# 🚀 STEP 3: Filling orders on chain
+def test_order_hash_matches_contract(nft_flex_contract, sign_listing):
+    order, _ = sign_listing()
+    assert nft_flex_contract.hashListingOrder(tuple(order)) == order_hash(order, networks.provider.chain_id,
+                                                                  nft_flex_contract.address)
+
+
+def test_fill_listing(nft_flex_contract, owner, user, sign_listing):
+    order, signature = sign_listing(nonce=1)
+    rental_id = nft_flex_contract.getRentalCounter()
+    book = OrderBook(networks.provider.chain_id, nft_flex_contract.address)
+    signed = book.add(order, signature, now=chain.pending_timestamp)
+    assert book.refresh(networks.provider.web3) == 0
+
+    receipt = nft_flex_contract.fillListing(tuple(signed.order), signed.signature, duration,
+                                            value=price_per_hour * duration + collateral_amount, sender=user)
+
+    rental = nft_flex_contract.s_rentals(rental_id)
+    assert rental.owner == owner and rental.renter == user
+    assert rental.tokenId == order.token_id and rental.pricePerHour == price_per_hour
+    assert nft_flex_contract.getRentalCounter() == rental_id + 1
+    assert nft_flex_contract.isOrderNonceUsed(owner, 1)
+    filled = list(receipt.events.filter(nft_flex_contract.NFTFlex__OrderFilled))[0]
+    assert filled["rentalId"] == rental_id and filled["nonce"] == 1
+
+    assert book.refresh(networks.provider.web3) == 1
+    assert len(book) == 0
+
+    # An order fills once
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(order), signature, duration,
+                                      value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__OrderNonceUsed" == exc_info.type.__name__
+
+
+def test_fill_listing_is_single_use(nft_flex_contract, owner, user, sign_listing):
+    order, signature = sign_listing(nonce=6, deadline=chain.pending_timestamp + 2 * duration * 3600)
+    rental_id = nft_flex_contract.getRentalCounter()
+    nft_flex_contract.fillListing(tuple(order), signature, duration,
+                                  value=price_per_hour * duration + collateral_amount, sender=user)
+    assert nft_flex_contract.getRentalId(order.nft_address, order.token_id) == rental_id
+
+    # A second order for the token waits for the rental to end
+    second = order._replace(price_per_hour=2 * price_per_hour, nonce=7)
+    second_signature = sign_order(owner.private_key, second, networks.provider.chain_id, nft_flex_contract.address)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(second), second_signature, duration,
+                                      value=2 * price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__NFTAlreadyRented" == exc_info.type.__name__
+
+    chain.mine(timestamp=nft_flex_contract.s_rentals(rental_id).endTime + 1)
+    nft_flex_contract.endRental(rental_id, sender=user)
+
+    # The ended order listing cannot be rented again at its old terms, nor is it available
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFT(rental_id, duration, value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__ListingIsStale" == exc_info.type.__name__
+    rental_ids, _, _ = nft_flex_contract.getRentalsByStatus(RentalStatus.AVAILABLE, rental_id, 10)
+    assert list(rental_ids) == []
+
+    # ... but a new order replaces it
+    nft_flex_contract.fillListing(tuple(second), second_signature, duration,
+                                  value=2 * price_per_hour * duration + collateral_amount, sender=user)
+    assert nft_flex_contract.getRentalId(order.nft_address, order.token_id) == rental_id + 1
+    assert nft_flex_contract.userOf(order.nft_address, order.token_id) == user
+
+
+def test_fill_cancelled_listing(nft_flex_contract, owner, user, sign_listing):
+    order, signature = sign_listing(nonce=2)
+    nft_flex_contract.cancelListingOrders([2, 3], sender=owner)
+    assert nft_flex_contract.isOrderNonceUsed(owner, 3)
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(order), signature, duration,
+                                      value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__OrderNonceUsed" == exc_info.type.__name__
+
+
+def test_fill_listing_checks_signature(nft_flex_contract, user, sign_listing):
+    order, signature = sign_listing(nonce=4)
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(order._replace(price_per_hour=1)), signature, duration,
+                                      value=duration + collateral_amount, sender=user)
+    assert "NFTFlex__InvalidSignature" == exc_info.type.__name__
+
+    # Signed by someone who does not own the NFT
+    forged = order._replace(owner=user.address)
+    forged_signature = sign_order(user.private_key, forged, networks.provider.chain_id, nft_flex_contract.address)
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(forged), forged_signature, duration,
+                                      value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__SenderIsNotOwnerOfTheNFT" == exc_info.type.__name__
+
+
+def test_fill_expired_listing(nft_flex_contract, user, sign_listing):
+    order, signature = sign_listing(nonce=5, deadline=chain.pending_timestamp - 1)
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.fillListing(tuple(order), signature, duration,
+                                      value=price_per_hour * duration + collateral_amount, sender=user)
+    assert "NFTFlex__OrderExpired" == exc_info.type.__name__
@@ -0,0 +1,105 @@
+# Tests for renting with EIP-2612 permits (rentNFTWithPermit and nftflex/permit.py)
+import pytest
+from ape import exceptions, networks
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from nftflex.permit import permit_typed_data, rental_permit, sign_permit
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+duration = 2
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+private_key = "0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d"
+token_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+spender = "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def list_rental(nft_flex_contract, simple_nft, owner):
+    """Mints a token and lists it paid in ``token``. Returns the rental ID."""
+    def list_rental(token):
+        receipt = simple_nft.mint(owner, metadata_url, sender=owner)
+        token_id = list(receipt.events.filter(simple_nft.Transfer))[0]["tokenId"]
+        rental_id = nft_flex_contract.getRentalCounter()
+        nft_flex_contract.createRental(simple_nft.address, token_id, price_per_hour, False, token,
+                                       collateral_amount, sender=owner)
+        return rental_id
+    return list_rental
+
+
+
+
+# 🚀 STEP 1: Signing off-chain
+def test_sign_permit_recovers_the_holder():
+    permit = sign_permit(private_key, "MockToken", "1", 31337, token_address, spender, 3 * 10 ** 18, 0, 2 ** 40)
+
+    message = encode_typed_data(full_message=permit_typed_data(
+        "MockToken", "1", 31337, token_address, Account.from_key(private_key).address, spender,
+        permit.value, 0, permit.deadline))
+    assert Account.recover_message(message, vrs=(permit.v, permit.r, permit.s)) == Account.from_key(private_key).address
+    assert len(permit.r) == len(permit.s) == 32
+
+
+# 🚀 STEP 2: Renting in one transaction
+def test_rent_with_permit(nft_flex_contract, funded_user, mock_erc20, list_rental):
+    rental_id = list_rental(mock_erc20.address)
+    balance = mock_erc20.balanceOf(funded_user)
+    assert mock_erc20.allowance(funded_user, nft_flex_contract.address) == 0
+
+    permit = rental_permit(networks.provider.web3, nft_flex_contract.address, rental_id, duration,
+                           funded_user.private_key)
+    nft_flex_contract.rentNFTWithPermit(rental_id, duration, permit.deadline, permit.v, permit.r, permit.s,
+                                        sender=funded_user)
+
+    assert nft_flex_contract.s_rentals(rental_id).renter == funded_user
+    assert permit.value == price_per_hour * duration + collateral_amount
+    assert mock_erc20.balanceOf(funded_user) == balance - permit.value
+    assert mock_erc20.allowance(funded_user, nft_flex_contract.address) == 0
+    assert mock_erc20.nonces(funded_user) == 1
+
+
+def test_rent_with_used_permit_keeps_the_allowance(nft_flex_contract, funded_user, mock_erc20, list_rental):
+    """A permit submitted by someone else first still lets the renter rent with it."""
+    rental_id = list_rental(mock_erc20.address)
+    permit = rental_permit(networks.provider.web3, nft_flex_contract.address, rental_id, duration,
+                           funded_user.private_key)
+    mock_erc20.permit(funded_user, nft_flex_contract.address, permit.value, permit.deadline,
+                      permit.v, permit.r, permit.s, sender=funded_user)
+
+    nft_flex_contract.rentNFTWithPermit(rental_id, duration, permit.deadline, permit.v, permit.r, permit.s,
+                                        sender=funded_user)
+    assert nft_flex_contract.s_rentals(rental_id).renter == funded_user
+
+
+def test_rent_with_expired_permit(nft_flex_contract, funded_user, mock_erc20, list_rental):
+    rental_id = list_rental(mock_erc20.address)
+    latest = networks.provider.web3.eth.get_block("latest")["timestamp"]
+    permit = rental_permit(networks.provider.web3, nft_flex_contract.address, rental_id, duration,
+                           funded_user.private_key, deadline=latest - 1)
+
+    # Without the permit there is no allowance, so the payment cannot be taken
+    with pytest.raises(exceptions.ContractLogicError):
+        nft_flex_contract.rentNFTWithPermit(rental_id, duration, permit.deadline, permit.v, permit.r, permit.s,
+                                            sender=funded_user)
+    assert nft_flex_contract.s_rentals(rental_id).renter == collateral_token
+
+
+def test_rent_with_permit_needs_erc20(nft_flex_contract, user, list_rental):
+    rental_id = list_rental(collateral_token)
+    with pytest.raises(ValueError):
+        rental_permit(networks.provider.web3, nft_flex_contract.address, rental_id, duration, user.private_key)
+
+    with pytest.raises(exceptions.ContractLogicError) as exc_info:
+        nft_flex_contract.rentNFTWithPermit(rental_id, duration, 0, 27, bytes(32), bytes(32), sender=user)
+
+    assert "NFTFlex__PermitNeedsERC20Collateral" == exc_info.type.__name__
@@ -0,0 +1,147 @@
+# Tests for the pricing engine (nftflex/pricing.py)
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from ape import accounts, project, chain, networks
+from nftflex.abi import EventDecoder
+from nftflex.analytics import RentalAnalytics
+from nftflex.pricing import MAX_PRICE, PriceUpdater, PricingConfig, estimate_elasticity, reprice
+
+
+
+
+"""
+Variables
+"""
+price_per_hour = 10 ** 18
+collateral_amount = 10 ** 18
+collateral_token = "0x0000000000000000000000000000000000000000"
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+collections = ["0x5FbDB2315678afecb367f032d93F642f64180aa3", "0xe7f1725E7734CE288F8367e1Bb143E90bb3F0512"]
+day = 24 * 3600
+
+
+def listings(prices, occupancy, idle_seconds=0, nft_address=collections[0]):
+    count = len(prices)
+    return pd.DataFrame({
+        "nft_address": [nft_address] * count,
+        "price_per_hour": pd.Series([int(price) for price in prices], dtype=object),
+        "occupancy": np.asarray(occupancy, dtype=np.float64),
+        "idle_seconds": np.broadcast_to(idle_seconds, count),
+    })
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def owner():
+    return accounts.test_accounts[0]
+
+@pytest.fixture
+def user():
+    return accounts.test_accounts[1]
+
+
+
+
+# 🚀 STEP 1: Elasticity of similar listings
+def test_elasticity_per_collection():
+    prices = np.array([1.0, 2.0, 4.0, 1.0, 2.0, 4.0, 5.0])
+    # Collection 0: doubling the price halves the occupancy; collection 1 has too few rented listings
+    occupancy = np.array([0.8, 0.4, 0.2, 0.5, np.nan, 0.0, 0.3])
+    groups = np.array([0, 0, 0, 1, 1, 1, 1])
+
+    elasticity = estimate_elasticity(prices, occupancy, groups)
+    assert elasticity == pytest.approx([-1.0, PricingConfig().default_elasticity])
+    steep = estimate_elasticity(prices[:3], np.array([0.8, 0.04, 0.002]), groups[:3])
+    assert steep == pytest.approx([PricingConfig().min_elasticity])
+
+
+# 🚀 STEP 2: Repricing
+def test_reprice_moves_towards_target_occupancy():
+    stats = listings([price_per_hour] * 5, [0.84, 0.7, 0.5, 0.05, np.nan], idle_seconds=[0, 0, 0, 3 * day, 3 * day])
+    config = PricingConfig(target_occupancy=0.7, default_elasticity=-1.0, max_change=0.3, idle_discount=0.05)
+
+    repriced = reprice(stats, config)
+
+    # Elasticity -1: the price moves by occupancy / target, bounded to +-30% and rounded to 3 digits;
+    # without an occupancy (fractional listing) only the idle discount applies
+    assert repriced["new_price"].tolist() == [
+        1_200_000_000_000_000_000, price_per_hour, 714_000_000_000_000_000, 700_000_000_000_000_000, 902_000_000_000_000_000
+    ]
+    assert repriced["changed"].tolist() == [True, False, True, True, True]
+    assert all(type(price) is int for price in repriced["new_price"])
+
+
+def test_reprice_keeps_prices_in_range():
+    stats = listings([1, 1_000, MAX_PRICE], [0.01, 0.05, 1.0])
+    repriced = reprice(stats, PricingConfig(min_price=1))
+    assert repriced["new_price"].tolist() == [1, 750, MAX_PRICE]
+    assert repriced["changed"].tolist() == [False, True, False]
+
+
+def test_reprice_ten_thousand_listings():
+    rng = np.random.default_rng(7)
+    count = 10_000
+    prices = rng.integers(1, 1_000, count) * 10 ** 15
+    occupancy = np.clip(0.9 - prices / 10 ** 18 + rng.normal(0, 0.05, count), 0, 1)
+    stats = pd.concat([
+        listings(prices[:count // 2], occupancy[:count // 2], rng.integers(0, 5 * day, count // 2), collections[0]),
+        listings(prices[count // 2:], occupancy[count // 2:], rng.integers(0, 5 * day, count // 2), collections[1]),
+    ], ignore_index=True)
+
+    started_at = time.perf_counter()
+    repriced = reprice(stats)
+    seconds = time.perf_counter() - started_at
+    print(f"Repriced {count} listings in {seconds * 1000:.1f}ms, {repriced['changed'].sum()} changed")
+
+    assert seconds < 1
+    assert repriced["elasticity"].between(PricingConfig().min_elasticity, PricingConfig().max_elasticity).all()
+    # Busy listings get more expensive, idle ones cheaper
+    busy = repriced["occupancy"] > 0.8
+    assert (repriced.loc[busy, "new_price"] >= repriced.loc[busy, "price_per_hour"]).all()
+    assert (repriced.loc[repriced["occupancy"] < 0.3, "new_price"] < repriced.loc[repriced["occupancy"] < 0.3,
+                                                                                   "price_per_hour"]).all()
+
+
+# 🚀 STEP 3: Pushing prices on the ape test chain
+def test_price_updater_on_test_chain(owner, user):
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    start_block = chain.blocks.head.number
+
+    receipt = simple_nft.mintBatch(owner, [metadata_url] * 40, sender=owner)
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    nft_flex.createRentals(
+        simple_nft.address,
+        [(token_id, price_per_hour, False, collateral_token, collateral_amount) for token_id in token_ids],
+        sender=owner,
+    )
+    # The first ten listings are rented for most of the day, the others not at all
+    for rental_id in range(10):
+        nft_flex.rentNFT(rental_id, 20, value=price_per_hour * 20 + collateral_amount, sender=user)
+    chain.mine(timestamp=chain.blocks.head.timestamp + day)
+    for rental_id in range(10):
+        nft_flex.withdrawEarnings(rental_id, sender=owner)
+
+    web3 = networks.provider.web3
+    decoder = EventDecoder.for_contract("NFTFlex")
+    analytics = RentalAnalytics(lambda block_number: web3.eth.get_block(block_number)["timestamp"])
+    raw_logs = web3.eth.get_logs({"address": nft_flex.address, "fromBlock": start_block, "toBlock": "latest"})
+    analytics.apply(log for log in map(decoder.decode, raw_logs) if log is not None)
+
+    repriced = reprice(analytics.listing_stats(chain.blocks.head.timestamp, day))
+    changes = repriced[repriced["changed"]]
+    assert len(changes) == 40
+
+    updater = PriceUpdater(web3, nft_flex.address, owner.private_key, gas_budget=1_000_000)
+    results = asyncio.run(updater.push(changes.index.tolist(), changes["new_price"].tolist()))
+    updater.close()
+
+    assert all(result.error is None for result in results)
+    assert updater.report()["prices_updated"] == 40
+    assert nft_flex.s_rentals(0).pricePerHour > price_per_hour > nft_flex.s_rentals(39).pricePerHour
+    print(f"updatePrices: {updater.report()['gas_per_price']} gas per price")
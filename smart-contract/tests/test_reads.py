@@ -0,0 +1,257 @@
+# Tests for batched contract reads (nftflex/reads.py)
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ape import accounts, project, networks
+from eth_abi import decode, encode
+from nftflex.abi import load_abi, selector
+from nftflex.reads import BatchReader, ReadError, batch
+
+
+
+
+"""
+Variables
+"""
+nft_address = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+token_owner = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+token_count = 20
+metadata_url = "ipfs://QmQth5R8PWcM3GVrmeSrfmDrBXFk646x8Er4iU46zAD5Tm"
+simple_nft_abi = load_abi("SimpleNFT")
+selectors = {
+    selector(entry): entry["name"] for entry in simple_nft_abi if entry["type"] == "function"
+}
+nonexistent_token = "0x7e273289" + "00" * 31 + "ff"  # ERC721NonexistentToken(255)
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    """
+    JSON-RPC node stand-in serving a SimpleNFT with ``token_count`` tokens at ``nft_address``.
+
+    Records the number of HTTP requests and of ``eth_call``s it answered.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.http_requests += 1
+        calls = body if isinstance(body, list) else [body]
+        responses = [self.answer(request) for request in calls]
+        payload = json.dumps(responses if isinstance(body, list) else responses[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def answer(self, request):
+        response = {"jsonrpc": "2.0", "id": request["id"]}
+        if request["method"] == "eth_blockNumber":
+            response["result"] = "0x10"
+        elif request["method"] == "eth_getCode":
+            response["result"] = "0x"
+        elif request["method"] == "eth_call":
+            self.server.eth_calls += 1
+            call, block = request["params"]
+            assert block == "0x10"
+            data = bytes.fromhex(call["data"][2:])
+            function = selectors["0x" + data[:4].hex()]
+            if function == "nextTokenId":
+                response["result"] = "0x" + encode(["uint256"], [token_count]).hex()
+            elif function == "ownerOf":
+                token_id = decode(["uint256"], data[4:])[0]
+                if token_id >= token_count:
+                    response["error"] = {"code": 3, "message": "execution reverted", "data": nonexistent_token}
+                else:
+                    response["result"] = "0x" + encode(["address"], [token_owner]).hex()
+        else:
+            response["error"] = {"code": -32601, "message": "method not found"}
+        return response
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProvider:
+    def __init__(self, endpoint_uri):
+        self.endpoint_uri = endpoint_uri
+
+
+class FakeEth:
+    """Answers the reader's direct requests; contract calls must go through the batch endpoint."""
+
+    def __init__(self):
+        self.block_number_lookups = 0
+
+    @property
+    def block_number(self):
+        self.block_number_lookups += 1
+        return 0x10
+
+    def get_code(self, address):
+        return b""
+
+
+class FakeMulticallEth(FakeEth):
+    """A chain with Multicall3: every call of an ``aggregate3`` returns ``token_count``."""
+
+    def __init__(self):
+        super().__init__()
+        self.blocks = []
+
+    def get_code(self, address):
+        return b"\x01"
+
+    def call(self, transaction, block_identifier):
+        self.blocks.append(block_identifier)
+        calls = decode(["(address,bool,bytes)[]"], bytes.fromhex(transaction["data"][2 + 8:]))[0]
+        result = encode(["uint256"], [token_count])
+        return encode(["(bool,bytes)[]"], [[(True, result)] * len(calls)])
+
+
+class FakeWeb3:
+    def __init__(self, endpoint_uri):
+        self.provider = FakeProvider(endpoint_uri)
+        self.eth = FakeEth()
+
+
+"""
+Setup for testing
+"""
+@pytest.fixture
+def node():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RpcHandler)
+    server.http_requests = 0
+    server.eth_calls = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def web3(node):
+    return FakeWeb3(f"http://127.0.0.1:{node.server_address[1]}")
+
+
+
+
+# 🚀 STEP 1: JSON-RPC batches
+def test_rpc_batch_sends_one_request(node, web3):
+    with batch(web3) as reader:
+        assert reader.mode == "rpc-batch"
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        next_token_id = simple_nft.nextTokenId()
+        owners = [simple_nft.ownerOf(token_id) for token_id in range(token_count)]
+
+    assert next_token_id.value == token_count
+    assert all(read.value == token_owner for read in owners)
+    assert node.http_requests == 1
+    assert node.eth_calls == token_count + 1
+
+
+def test_identical_reads_are_coalesced(node, web3):
+    with batch(web3) as reader:
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        reads = [simple_nft.ownerOf(token_id % 5) for token_id in range(token_count)]
+
+    assert [read.value for read in reads] == [token_owner] * token_count
+    assert node.eth_calls == 5
+    assert reader.stats.coalesced == token_count - 5
+
+
+def test_batches_are_split_by_size(node, web3):
+    with batch(web3, max_batch_size=8) as reader:
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        reads = [simple_nft.ownerOf(token_id) for token_id in range(token_count)]
+
+    assert all(read.done for read in reads)
+    assert node.http_requests == 3  # 8 + 8 + 4 calls
+
+
+def test_value_sends_the_pending_batch(node, web3):
+    reader = BatchReader(web3)
+    simple_nft = reader.contract(nft_address, simple_nft_abi)
+    first, second = simple_nft.ownerOf(1), simple_nft.ownerOf(2)
+    assert node.http_requests == 0
+
+    assert first.value == token_owner
+    assert second.done and node.http_requests == 1
+    reader.close()
+
+
+def test_reverted_read_raises(node, web3):
+    with batch(web3) as reader:
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        missing = simple_nft.ownerOf(255)
+        found = simple_nft.ownerOf(0)
+
+    assert found.value == token_owner
+    with pytest.raises(ReadError) as exc_info:
+        missing.value
+    assert nonexistent_token in str(exc_info.value)
+
+
+def test_reads_at_a_fixed_block_are_reused(node, web3):
+    with batch(web3, block_identifier=0x10) as reader:
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        assert simple_nft.nextTokenId().value == token_count
+        assert simple_nft.nextTokenId().value == token_count
+
+    assert node.eth_calls == 1
+
+
+def test_chunks_of_a_flush_read_the_same_block(node, web3):
+    with batch(web3, max_batch_size=8) as reader:
+        simple_nft = reader.contract(nft_address, simple_nft_abi)
+        [simple_nft.ownerOf(token_id) for token_id in range(token_count)]
+
+    assert node.http_requests == 3
+    assert web3.eth.block_number_lookups == 1
+
+    web3.eth = FakeMulticallEth()
+    reader = BatchReader(web3, max_batch_size=8)
+    simple_nft = reader.contract(nft_address, simple_nft_abi)
+    reads = [simple_nft.ownerOf(token_id) for token_id in range(token_count)]
+    reader.flush()
+    assert web3.eth.blocks == [0x10] * 3 and web3.eth.block_number_lookups == 1
+
+    # One aggregate3 call is consistent on its own
+    single = simple_nft.nextTokenId()
+    reader.flush()
+    assert web3.eth.blocks[-1] == "latest" and web3.eth.block_number_lookups == 1
+    assert single.value == token_count and all(read.done for read in reads)
+
+
+# 🚀 STEP 2: Multicall3 on the local chain
+def test_multicall_matches_direct_calls():
+    owner = accounts.test_accounts[0]
+    simple_nft = owner.deploy(project.SimpleNFT)
+    nft_flex = owner.deploy(project.NFTFlex)
+    multicall = owner.deploy(project.Multicall3)
+
+    receipt = simple_nft.mintBatch(owner, [metadata_url] * 5, sender=owner)
+    token_ids = [event["tokenId"] for event in receipt.events.filter(simple_nft.Transfer)]
+    nft_flex.createRentals(
+        simple_nft.address,
+        [(token_id, 10 ** 18, False, "0x0000000000000000000000000000000000000000", 10 ** 18) for token_id in token_ids],
+        sender=owner,
+    )
+
+    with batch(networks.provider.web3, multicall_address=multicall.address) as reader:
+        assert reader.mode == "multicall"
+        flex = reader.contract(nft_flex.address, "NFTFlex")
+        nft = reader.contract(simple_nft.address, "SimpleNFT")
+        counter = flex.getRentalCounter()
+        rentals = [flex.s_rentals(rental_id) for rental_id in range(len(token_ids))]
+        uris = [nft.tokenURI(token_id) for token_id in token_ids]
+        missing = nft.ownerOf(10 ** 6)
+
+    assert reader.stats.rpc_requests == 2  # the Multicall3 code lookup and one eth_call
+    assert counter.value == nft_flex.getRentalCounter()
+    for rental_id, read in enumerate(rentals):
+        assert read.value.tokenId == nft_flex.s_rentals(rental_id).tokenId
+        assert read.value.owner == owner.address
+    assert [read.value for read in uris] == [simple_nft.tokenURI(token_id) for token_id in token_ids]
+    with pytest.raises(ReadError):
+        missing.value